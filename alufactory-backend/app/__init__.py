@@ -12,8 +12,16 @@ from app.routes.profiles import profile_bp
 from app.routes.accessories import accessory_bp
 from app.routes.payments import payment_bp
 from app.routes.ai_import import ai_import_bp
-from app.product_order_db import init_product_order_db
+from app.routes.sketches import sketch_bp
+from app.blob_storage import init_blob_storage
+from app.pdf_render_queue import init_pdf_rendering
+from app.product_order_db import check_product_order_db, init_product_order_db
 from app.security import init_payload_encryption
+from app.snapshot_sync_queue import init_snapshot_sync
+from app.stats_rollup import init_stats_rollups
+from app.order_item_lines import init_order_item_lines
+from app.duplicate_orders import init_duplicate_orders
+from app.stock_cache import init_stock_cache
 from app.profile_inventory import seed_profile_inventory
 from app.accessory_inventory import seed_accessory_inventory
 import os
@@ -32,6 +40,7 @@ def create_app(config_name='development'):
     # Initialize extensions
     db.init_app(app)
     init_payload_encryption(app)
+    init_blob_storage(app)
     
     # CORS configuration with explicit settings
     CORS(app, 
@@ -55,17 +64,24 @@ def create_app(config_name='development'):
     app.register_blueprint(profile_bp)
     app.register_blueprint(accessory_bp)
     app.register_blueprint(payment_bp)
+    app.register_blueprint(sketch_bp)
     # AI reconstruction stays off unless a future deployment explicitly opts
     # in after its provider and API keys are ready.
     if os.getenv('ENABLE_MAYCAD_AI_IMPORT', '0') == '1':
         app.register_blueprint(ai_import_bp)
     
+    # Registered before seeding so rows added at startup invalidate other workers' caches.
+    init_stock_cache(app)
+
     # Create database tables and run auto-migrations
     with app.app_context():
         db.create_all()
         init_product_order_db(app.instance_path)
         seed_profile_inventory()
         seed_accessory_inventory()
+        # The ALTERs below run on their own connections. On SQLite they wait for, and
+        # then fail on, any read transaction the session still holds.
+        db.session.commit()
         
         # Auto-migrate: ensure all expected columns exist in orders table
         try:
@@ -96,24 +112,53 @@ def create_app(config_name='development'):
                                 conn.execute(text(f'ALTER TABLE orders ADD COLUMN {col_name} {col_type}'))
                                 conn.commit()
                                 print(f'  ✅ Auto-migrated: added {col_name} to orders')
-                            except Exception:
-                                pass  # Column might already exist or DB doesn't support ALTER
+                            except Exception as migration_error:
+                                print(f'  ⚠️ Auto-migration failed: {col_name} on orders: {migration_error}')
 
-                # Backfill old rows once so existing repeated orders are also detected.
-                try:
-                    from app.models.user import Order
-                    from app.order_snapshot import refresh_order_json
-                    missing_snapshots = Order.query.filter(
-                        (Order.order_json.is_(None)) | (Order.duplicate_fingerprint.is_(None))
-                    ).all()
-                    for order in missing_snapshots:
-                        refresh_order_json(order)
-                    if missing_snapshots:
-                        db.session.commit()
-                        print(f'  ✅ Backfilled JSON snapshots for {len(missing_snapshots)} orders')
-                except Exception as snapshot_error:
-                    db.session.rollback()
-                    print(f'  ⚠️ Order JSON backfill skipped: {snapshot_error}')
+                existing_indexes = {index['name'] for index in inspector.get_indexes('orders')}
+                if 'idx_orders_created_at_id' not in existing_indexes:
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX idx_orders_created_at_id ON orders (created_at, id)'))
+                            conn.commit()
+                        print('  ✅ Auto-migrated: added idx_orders_created_at_id to orders')
+                    except Exception as migration_error:
+                        print(f'  ⚠️ Auto-migration failed: idx_orders_created_at_id on orders: {migration_error}')
+                if 'idx_orders_user_fingerprint' not in existing_indexes:
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX idx_orders_user_fingerprint ON orders (user_id, duplicate_fingerprint)'))
+                            conn.commit()
+                        print('  ✅ Auto-migrated: added idx_orders_user_fingerprint to orders')
+                    except Exception as migration_error:
+                        print(f'  ⚠️ Auto-migration failed: idx_orders_user_fingerprint on orders: {migration_error}')
+
+            if 'order_items' in inspector.get_table_names():
+                existing_item_cols = [col['name'] for col in inspector.get_columns('order_items')]
+                item_migrations = [
+                    ('profile_variant_id', 'VARCHAR(50)'),
+                    ('profile_color_id', 'VARCHAR(50)'),
+                    ('profile_meters', 'FLOAT'),
+                ]
+                with db.engine.connect() as conn:
+                    for col_name, col_type in item_migrations:
+                        if col_name not in existing_item_cols:
+                            try:
+                                conn.execute(text(f'ALTER TABLE order_items ADD COLUMN {col_name} {col_type}'))
+                                conn.commit()
+                                print(f'  ✅ Auto-migrated: added {col_name} to order_items')
+                            except Exception as migration_error:
+                                print(f'  ⚠️ Auto-migration failed: {col_name} on order_items: {migration_error}')
+
+                existing_item_indexes = {index['name'] for index in inspector.get_indexes('order_items')}
+                if 'ix_order_items_order_id' not in existing_item_indexes:
+                    try:
+                        with db.engine.connect() as conn:
+                            conn.execute(text('CREATE INDEX ix_order_items_order_id ON order_items (order_id)'))
+                            conn.commit()
+                        print('  ✅ Auto-migrated: added ix_order_items_order_id to order_items')
+                    except Exception as migration_error:
+                        print(f'  ⚠️ Auto-migration failed: ix_order_items_order_id on order_items: {migration_error}')
 
             if 'profiles' in inspector.get_table_names():
                 existing_profile_cols = [col['name'] for col in inspector.get_columns('profiles')]
@@ -121,6 +166,8 @@ def create_app(config_name='development'):
                     ('pdf_no_price_path', 'VARCHAR(500)'),
                     ('pdf_no_price_filename', 'VARCHAR(255)'),
                     ('pdf_no_price_base64', 'TEXT'),
+                    ('pdf_blob_key', 'VARCHAR(255)'),
+                    ('pdf_no_price_blob_key', 'VARCHAR(255)'),
                 ]
                 with db.engine.connect() as conn:
                     for col_name, col_type in profile_migrations:
@@ -129,15 +176,64 @@ def create_app(config_name='development'):
                                 conn.execute(text(f'ALTER TABLE profiles ADD COLUMN {col_name} {col_type}'))
                                 conn.commit()
                                 print(f'  ✅ Auto-migrated: added {col_name} to profiles')
-                            except Exception:
-                                pass
+                            except Exception as migration_error:
+                                print(f'  ⚠️ Auto-migration failed: {col_name} on profiles: {migration_error}')
+
+            # Backfills run once every ALTER above is done: they read through the ORM,
+            # which selects the new columns (order snapshots load the items too).
+            if 'order_items' in inspector.get_table_names():
+                # Normalize profile usage for items created before the columns existed.
+                try:
+                    from app.models.user import OrderItem
+                    backfilled = 0
+                    while True:
+                        pending_items = OrderItem.query.filter(OrderItem.profile_meters.is_(None)).limit(500).all()
+                        if not pending_items:
+                            break
+                        for item in pending_items:
+                            item.refresh_profile_usage()
+                        db.session.commit()
+                        backfilled += len(pending_items)
+                    if backfilled:
+                        print(f'  ✅ Backfilled profile usage for {backfilled} order items')
+                except Exception as usage_error:
+                    db.session.rollback()
+                    print(f'  ⚠️ Order item profile usage backfill skipped: {usage_error}')
+
+            if 'orders' in inspector.get_table_names():
+                # Backfill old rows once so existing repeated orders are also detected.
+                try:
+                    from app.models.user import Order
+                    from app.order_snapshot import refresh_order_json
+                    missing_snapshots = Order.query.filter(
+                        (Order.order_json.is_(None)) | (Order.duplicate_fingerprint.is_(None))
+                    ).all()
+                    for order in missing_snapshots:
+                        refresh_order_json(order)
+                    if missing_snapshots:
+                        db.session.commit()
+                        print(f'  ✅ Backfilled JSON snapshots for {len(missing_snapshots)} orders')
+                except Exception as snapshot_error:
+                    db.session.rollback()
+                    print(f'  ⚠️ Order JSON backfill skipped: {snapshot_error}')
         except Exception as e:
             print(f'  ⚠️ Auto-migration check skipped: {e}')
+
+    init_stats_rollups(app)
+    init_order_item_lines(app)
+    init_duplicate_orders(app)
+    init_snapshot_sync(app)
+    init_pdf_rendering(app)
     
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
     def health():
-        return {'status': 'ok', 'message': 'Alufactory Backend is running'}, 200
+        return {
+            'status': 'ok',
+            'message': 'Alufactory Backend is running',
+            'product_order_db': check_product_order_db(app.instance_path),
+            'snapshot_sync': app.extensions['snapshot_sync'].stats(),
+        }, 200
     
     # Serve admin index.html
     @app.route('/admin/', methods=['GET'])
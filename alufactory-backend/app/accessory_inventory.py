@@ -1,11 +1,11 @@
 """Accessory inventory catalog, public stock and lightweight XLSX interchange."""
 from datetime import datetime
 from io import BytesIO
-from xml.etree import ElementTree as ET
-from zipfile import ZIP_DEFLATED, ZipFile
 
+from app.bulk_upsert import upsert_rows
 from app.models.user import AccessoryInventory, db
-from app.profile_inventory import _cell_value, _column_name, _xlsx_cell
+from app.profile_inventory import inventory_diff, iter_xlsx, parse_xlsx_records
+from app.stock_cache import ACCESSORY_STOCK, bump_stock_version
 
 
 ACCESSORY_CATALOG = {
@@ -50,6 +50,8 @@ def seed_accessory_inventory():
     removed = AccessoryInventory.query.filter(
         AccessoryInventory.color_id != ACCESSORY_FINISH_ID,
     ).delete(synchronize_session=False)
+    if removed:
+        bump_stock_version(db.session.connection(), ACCESSORY_STOCK)
     existing = {
         (row.accessory_id, row.profile_size, row.color_id)
         for row in AccessoryInventory.query.filter_by(color_id=ACCESSORY_FINISH_ID).all()
@@ -82,108 +84,80 @@ def public_accessory_stock():
     ]
 
 
-def build_accessory_inventory_xlsx(rows):
-    data_rows = [ACCESSORY_INVENTORY_HEADERS]
-    data_rows.extend((
+def iter_accessory_inventory_xlsx(rows):
+    data_rows = ((
         row.accessory_id,
         ACCESSORY_CATALOG[row.accessory_id]['code'],
         ACCESSORY_CATALOG[row.accessory_id]['name'],
         row.profile_size,
         int(row.quantity or 0),
     ) for row in rows if row.color_id == ACCESSORY_FINISH_ID)
-    sheet_rows = []
-    for row_index, values in enumerate(data_rows, start=1):
-        cells = ''.join(
-            _xlsx_cell(
-                f'{_column_name(column_index)}{row_index}', value,
-                1 if row_index == 1 else (2 if column_index == 5 else 0),
-            )
-            for column_index, value in enumerate(values, start=1)
-        )
-        sheet_rows.append(f'<row r="{row_index}">{cells}</row>')
-
-    worksheet = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
-  <dimension ref="A1:E{len(data_rows)}"/>
-  <sheetViews><sheetView showGridLines="0" workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>
-  <cols><col min="1" max="1" width="28" customWidth="1"/><col min="2" max="2" width="10" customWidth="1"/><col min="3" max="3" width="34" customWidth="1"/><col min="4" max="5" width="16" customWidth="1"/></cols>
-  <sheetData>{''.join(sheet_rows)}</sheetData><autoFilter ref="A1:E{len(data_rows)}"/>
-</worksheet>'''
-    styles = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><fonts count="2"><font><sz val="11"/><name val="Aptos"/></font><font><b/><color rgb="FFFFFFFF"/><sz val="11"/><name val="Aptos"/></font></fonts><fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill><fill><patternFill patternType="solid"><fgColor rgb="FF7C3AED"/><bgColor indexed="64"/></patternFill></fill></fills><borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders><cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs><cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFill="1" applyFont="1"/><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs><cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'''
-    content_types = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/><Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/><Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/></Types>'''
-    root_rels = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>'''
-    workbook = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets><sheet name="配件库存" sheetId="1" r:id="rId1"/></sheets></workbook>'''
-    workbook_rels = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/><Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>'''
-    output = BytesIO()
-    with ZipFile(output, 'w', ZIP_DEFLATED) as archive:
-        archive.writestr('[Content_Types].xml', content_types)
-        archive.writestr('_rels/.rels', root_rels)
-        archive.writestr('xl/workbook.xml', workbook)
-        archive.writestr('xl/_rels/workbook.xml.rels', workbook_rels)
-        archive.writestr('xl/styles.xml', styles)
-        archive.writestr('xl/worksheets/sheet1.xml', worksheet)
-    output.seek(0)
-    return output
+    return iter_xlsx(
+        '配件库存', ACCESSORY_INVENTORY_HEADERS, data_rows, (28, 10, 34, 16, 16),
+        number_columns=(5,), header_fill='FF7C3AED', number_format_id=0,
+    )
+
+
+def build_accessory_inventory_xlsx(rows):
+    return BytesIO(b''.join(iter_accessory_inventory_xlsx(rows)))
+
+
+def _parse_accessory_row(row_number, values, fail):
+    accessory_id = str(values[0]).strip()
+    profile_size = str(values[3]).strip()
+    definition = ACCESSORY_CATALOG.get(accessory_id)
+    if not definition:
+        fail('A', f'配件ID不支持：{accessory_id}')
+    elif profile_size not in definition['sizes']:
+        fail('D', f'配件不支持{profile_size}型材')
+    try:
+        quantity = int(float(values[4]))
+    except (TypeError, ValueError):
+        fail('E', '库存数量不是有效整数')
+        return None
+    if quantity < 0:
+        fail('E', '库存数量不能为负数')
+    return accessory_id, profile_size, quantity
 
 
 def parse_accessory_inventory_xlsx(file_stream):
-    namespace = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-    with ZipFile(file_stream) as archive:
-        shared_strings = []
-        if 'xl/sharedStrings.xml' in archive.namelist():
-            root = ET.fromstring(archive.read('xl/sharedStrings.xml'))
-            shared_strings = [''.join(node.text or '' for node in item.findall('.//m:t', namespace)) for item in root.findall('m:si', namespace)]
-        root = ET.fromstring(archive.read('xl/worksheets/sheet1.xml'))
-        parsed_rows = []
-        for row in root.findall('.//m:sheetData/m:row', namespace):
-            values = {}
-            for cell in row.findall('m:c', namespace):
-                ref = cell.attrib.get('r', '')
-                column = ''.join(ch for ch in ref if ch.isalpha())
-                values[column] = _cell_value(cell, shared_strings)
-            parsed_rows.append([values.get(column, '') for column in ('A', 'B', 'C', 'D', 'E')])
-    if not parsed_rows:
-        raise ValueError('Excel中没有库存数据')
-    if [str(value).strip() for value in parsed_rows[0]][:5] != list(ACCESSORY_INVENTORY_HEADERS):
-        raise ValueError('Excel列格式不正确，请先下载配件库存模板后再编辑上传')
-    records = []
-    for row_number, values in enumerate(parsed_rows[1:], start=2):
-        if not any(str(value).strip() for value in values):
-            continue
-        accessory_id = str(values[0]).strip()
-        profile_size = str(values[3]).strip()
-        try:
-            quantity = int(float(values[4]))
-        except (TypeError, ValueError):
-            raise ValueError(f'第{row_number}行库存数量不是有效整数')
-        definition = ACCESSORY_CATALOG.get(accessory_id)
-        if not definition:
-            raise ValueError(f'第{row_number}行配件ID不支持：{accessory_id}')
-        if profile_size not in definition['sizes']:
-            raise ValueError(f'第{row_number}行配件不支持{profile_size}型材')
-        if quantity < 0:
-            raise ValueError(f'第{row_number}行库存数量不能为负数')
-        records.append((accessory_id, profile_size, quantity))
-    return records
+    return parse_xlsx_records(
+        file_stream,
+        ACCESSORY_INVENTORY_HEADERS,
+        'Excel中没有库存数据',
+        'Excel列格式不正确，请先下载配件库存模板后再编辑上传',
+        _parse_accessory_row,
+    )
+
+
+def _accessory_inventory_by_key():
+    return {
+        (row.accessory_id, row.profile_size): row
+        for row in AccessoryInventory.query.filter_by(color_id=ACCESSORY_FINISH_ID).all()
+    }
+
+
+def diff_accessory_inventory_records(records):
+    """Dry run of ``apply_accessory_inventory_records``: the quantities the upload would change."""
+    stored = {key: int(row.quantity or 0) for key, row in _accessory_inventory_by_key().items()}
+    uploaded = {(accessory_id, profile_size): quantity for accessory_id, profile_size, quantity in records}
+    return inventory_diff(('accessory_id', 'profile_size'), stored, uploaded, len(records))
 
 
 def apply_accessory_inventory_records(records):
-    updated = 0
-    for accessory_id, profile_size, quantity in records:
-        row = AccessoryInventory.query.filter_by(
-            accessory_id=accessory_id,
-            profile_size=profile_size,
-            color_id=ACCESSORY_FINISH_ID,
-        ).first()
-        if row is None:
-            row = AccessoryInventory(
-                accessory_id=accessory_id,
-                profile_size=profile_size,
-                color_id=ACCESSORY_FINISH_ID,
-            )
-            db.session.add(row)
-        row.quantity = quantity
-        row.updated_at = datetime.utcnow()
-        updated += 1
+    """Upsert imported quantities in bulk on ``uq_accessory_inventory_sku``."""
+    now = datetime.utcnow()
+    connection = db.session.connection()
+    updated = upsert_rows(
+        connection,
+        AccessoryInventory.__table__,
+        ('accessory_id', 'profile_size', 'color_id'),
+        (
+            {'accessory_id': accessory_id, 'profile_size': profile_size, 'color_id': ACCESSORY_FINISH_ID, 'quantity': quantity, 'updated_at': now}
+            for accessory_id, profile_size, quantity in records
+        ),
+        update_columns=('quantity', 'updated_at'),
+    )
+    bump_stock_version(connection, ACCESSORY_STOCK)
     db.session.commit()
     return updated
@@ -0,0 +1,311 @@
+"""Blob storage for PDFs and other binary files, with a local filesystem and an S3 backend.
+
+Keys are relative, slash-separated paths such as ``order_pdfs/<order_id>.pdf``. The local
+backend maps them under ``BLOB_STORAGE_ROOT`` (the instance folder by default, so existing
+``instance/order_pdfs`` files keep working); the S3 backend stores them in
+``BLOB_S3_BUCKET`` under ``BLOB_S3_PREFIX``. Downloads are streamed in chunks with
+Range and ETag handling, so a PDF is never held in memory as a whole.
+"""
+import os
+import tempfile
+from typing import BinaryIO, Iterator, Optional, Union
+from urllib.parse import quote
+
+from flask import Response, request
+
+CHUNK_SIZE = 64 * 1024
+
+_EXTENSION_KEY = 'blob_store'
+
+
+class BlobNotFound(LookupError):
+    pass
+
+
+class BlobInfo:
+    def __init__(self, key: str, size: int, etag: str, content_type: Optional[str] = None):
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.content_type = content_type
+
+
+def _validate_key(key: str) -> str:
+    parts = str(key or '').split('/')
+    if not key or key.startswith('/') or any(part in ('', '.', '..') or '\\' in part for part in parts):
+        raise ValueError(f'Invalid blob key: {key!r}')
+    return key
+
+
+def _iter_file(fileobj: BinaryIO, length: Optional[int], chunk_size: int) -> Iterator[bytes]:
+    remaining = length
+    while remaining is None or remaining > 0:
+        chunk = fileobj.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+class BlobStore:
+    """Interface shared by the backends."""
+
+    def put(self, key: str, data: Union[bytes, BinaryIO], content_type: str = 'application/octet-stream') -> BlobInfo:
+        raise NotImplementedError
+
+    def stat(self, key: str) -> BlobInfo:
+        """Return size and ETag; raises ``BlobNotFound``."""
+        raise NotImplementedError
+
+    def iter_range(self, key: str, start: int = 0, stop: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield bytes ``[start, stop)`` of a blob in chunks."""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def move(self, source_key: str, target_key: str) -> BlobInfo:
+        """Rename a blob, replacing any blob at ``target_key``."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.stat(key)
+        except BlobNotFound:
+            return False
+        return True
+
+    def read(self, key: str) -> bytes:
+        return b''.join(self.iter_range(key))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, *_validate_key(key).split('/'))
+
+    def put(self, key, data, content_type='application/octet-stream'):
+        path = self.local_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write next to the target and rename, so readers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                if isinstance(data, (bytes, bytearray, memoryview)):
+                    handle.write(data)
+                else:
+                    for chunk in _iter_file(data, None, CHUNK_SIZE):
+                        handle.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.stat(key)
+
+    def stat(self, key):
+        try:
+            st = os.stat(self.local_path(key))
+        except FileNotFoundError as error:
+            raise BlobNotFound(key) from error
+        return BlobInfo(key, st.st_size, f'{st.st_size:x}-{st.st_mtime_ns:x}')
+
+    def iter_range(self, key, start=0, stop=None, chunk_size=CHUNK_SIZE):
+        try:
+            handle = open(self.local_path(key), 'rb')
+        except FileNotFoundError as error:
+            raise BlobNotFound(key) from error
+
+        def _chunks():
+            with handle:
+                handle.seek(start)
+                yield from _iter_file(handle, None if stop is None else max(0, stop - start), chunk_size)
+
+        return _chunks()
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def move(self, source_key, target_key):
+        target = self.local_path(target_key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(self.local_path(source_key), target)
+        except FileNotFoundError as error:
+            raise BlobNotFound(source_key) from error
+        return self.stat(target_key)
+
+
+def _s3_error_code(error) -> str:
+    response = getattr(error, 'response', None) or {}
+    return str((response.get('Error') or {}).get('Code') or '')
+
+
+class S3BlobStore(BlobStore):
+    """S3-compatible backend over a boto3-style client (``put_object``/``head_object``/...)."""
+
+    _MISSING_CODES = ('404', 'NoSuchKey', 'NotFound')
+
+    def __init__(self, client, bucket: str, prefix: str = ''):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + _validate_key(key)
+
+    def put(self, key, data, content_type='application/octet-stream'):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=bytes(data), ContentType=content_type)
+        else:
+            # Managed upload reads the stream part by part and works without a known length.
+            self.client.upload_fileobj(data, self.bucket, self._object_key(key), ExtraArgs={'ContentType': content_type})
+        return self.stat(key)
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as error:
+            if _s3_error_code(error) in self._MISSING_CODES:
+                raise BlobNotFound(key) from error
+            raise
+        return BlobInfo(key, int(head['ContentLength']), str(head.get('ETag', '')).strip('"'), head.get('ContentType'))
+
+    def iter_range(self, key, start=0, stop=None, chunk_size=CHUNK_SIZE):
+        params = {'Bucket': self.bucket, 'Key': self._object_key(key)}
+        if start or stop is not None:
+            params['Range'] = f"bytes={start}-{'' if stop is None else stop - 1}"
+        try:
+            body = self.client.get_object(**params)['Body']
+        except Exception as error:
+            if _s3_error_code(error) in self._MISSING_CODES:
+                raise BlobNotFound(key) from error
+            raise
+
+        def _chunks():
+            try:
+                yield from _iter_file(body, None, chunk_size)
+            finally:
+                body.close()
+
+        return _chunks()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def move(self, source_key, target_key):
+        source = {'Bucket': self.bucket, 'Key': self._object_key(source_key)}
+        try:
+            self.client.copy_object(Bucket=self.bucket, Key=self._object_key(target_key), CopySource=source)
+        except Exception as error:
+            if _s3_error_code(error) in self._MISSING_CODES:
+                raise BlobNotFound(source_key) from error
+            raise
+        self.client.delete_object(**source)
+        return self.stat(target_key)
+
+
+def _build_s3_client(config):
+    try:
+        import boto3
+    except ImportError as error:
+        raise RuntimeError('BLOB_STORAGE_BACKEND=s3 requires the boto3 package') from error
+    return boto3.client(
+        's3',
+        endpoint_url=config.get('BLOB_S3_ENDPOINT_URL') or None,
+        region_name=config.get('BLOB_S3_REGION') or None,
+    )
+
+
+def init_blob_storage(app, store: Optional[BlobStore] = None):
+    """Attach the configured blob store to the app (``store`` overrides the config).
+
+    A local store without ``BLOB_STORAGE_ROOT`` is resolved per call against the
+    current instance folder, so nothing is attached for it here.
+    """
+    if store is None:
+        backend = str(app.config.get('BLOB_STORAGE_BACKEND') or 'local').strip().lower()
+        if backend == 's3':
+            bucket = app.config.get('BLOB_S3_BUCKET')
+            if not bucket:
+                raise RuntimeError('BLOB_S3_BUCKET must be set when BLOB_STORAGE_BACKEND=s3')
+            store = S3BlobStore(_build_s3_client(app.config), bucket, app.config.get('BLOB_S3_PREFIX') or '')
+        elif backend == 'local':
+            root = app.config.get('BLOB_STORAGE_ROOT')
+            store = LocalBlobStore(root) if root else None
+        else:
+            raise RuntimeError(f'Unknown BLOB_STORAGE_BACKEND: {backend}')
+    app.extensions[_EXTENSION_KEY] = store
+    return store
+
+
+def get_blob_store(app) -> BlobStore:
+    store = app.extensions.get(_EXTENSION_KEY)
+    return store if store is not None else LocalBlobStore(app.instance_path)
+
+
+def content_disposition(filename: str, disposition: str = 'inline') -> str:
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def blob_response(
+    store: BlobStore,
+    key: str,
+    download_name: str,
+    mimetype: str = 'application/octet-stream',
+    etag: Optional[str] = None,
+):
+    """Stream a blob for the current request, honouring If-None-Match, Range and If-Range.
+
+    ``etag`` replaces the backend's own tag, e.g. with a known content hash. Raises
+    ``BlobNotFound`` so callers can fall back to another source.
+    """
+    info = store.stat(key)
+    if etag:
+        info.etag = etag
+    headers = {
+        'ETag': f'"{info.etag}"',
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': content_disposition(download_name),
+        'Cache-Control': 'private, no-cache',
+    }
+    if request.if_none_match.contains(info.etag):
+        return Response(status=304, headers=headers)
+
+    start, stop, status = 0, info.size, 200
+    byte_range = request.range
+    if_range = request.if_range
+    range_applies = byte_range is not None and (if_range.etag is None or if_range.etag == info.etag) and not if_range.date
+    if range_applies and byte_range.units == 'bytes':
+        bounds = byte_range.range_for_length(info.size)
+        if bounds is None:
+            if len(byte_range.ranges) == 1:
+                headers['Content-Range'] = f'bytes */{info.size}'
+                return Response(status=416, headers=headers)
+        else:
+            start, stop = bounds
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{info.size}'
+
+    headers['Content-Length'] = str(stop - start)
+    return Response(
+        store.iter_range(key, start, stop),
+        status=status,
+        mimetype=mimetype,
+        headers=headers,
+        direct_passthrough=True,
+    )
@@ -0,0 +1,87 @@
+"""Dialect-aware bulk upserts keyed by a unique constraint.
+
+SQLite and PostgreSQL get ``INSERT ... ON CONFLICT (keys) DO UPDATE``, MySQL and MariaDB
+``INSERT ... ON DUPLICATE KEY UPDATE``. Rows are sent as one executemany per chunk, so
+applying thousands of rows costs a handful of round trips instead of a SELECT and an
+UPDATE per ORM object. The key columns must be covered by a unique constraint; other
+dialects fall back to an UPDATE, then an INSERT when nothing matched, per row.
+"""
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+UPSERT_CHUNK_SIZE = 500
+
+
+def _upsert_statement(dialect: str, table, key_columns: Sequence[str], update_columns: Sequence[str], increment_columns: Sequence[str]):
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table)
+        incoming = stmt.excluded
+    else:
+        stmt = mysql.insert(table)
+        incoming = stmt.inserted
+    assignments = {column: incoming[column] for column in update_columns}
+    assignments.update({column: table.c[column] + incoming[column] for column in increment_columns})
+    if dialect in ('mysql', 'mariadb'):
+        if not assignments:
+            # Assigning a key to itself is the no-op form of ON DUPLICATE KEY UPDATE.
+            assignments = {key_columns[0]: table.c[key_columns[0]]}
+        return stmt.on_duplicate_key_update(assignments)
+    if not assignments:
+        return stmt.on_conflict_do_nothing(index_elements=list(key_columns))
+    return stmt.on_conflict_do_update(index_elements=list(key_columns), set_=assignments)
+
+
+def _upsert_row_by_row(connection, table, key_columns, update_columns, increment_columns, row: Dict):
+    where = [table.c[column] == row[column] for column in key_columns]
+    assignments = {column: row[column] for column in update_columns}
+    assignments.update({column: table.c[column] + row[column] for column in increment_columns})
+    if assignments and connection.execute(table.update().where(*where).values(**assignments)).rowcount:
+        return
+    if not assignments and connection.execute(table.select().where(*where)).first() is not None:
+        return
+    connection.execute(table.insert().values(**row))
+
+
+def upsert_rows(
+    connection,
+    table,
+    key_columns: Sequence[str],
+    rows: Iterable[Dict],
+    update_columns: Sequence[str] = (),
+    increment_columns: Sequence[str] = (),
+    chunk_size: int = UPSERT_CHUNK_SIZE,
+) -> int:
+    """Insert ``rows`` or update the row with the same ``key_columns``; returns rows sent.
+
+    Existing rows get ``update_columns`` overwritten and ``increment_columns`` added to;
+    with neither, existing rows are left alone. Every row must carry the same columns.
+    When a key repeats within ``rows`` the last one wins. The caller commits.
+    """
+    key_columns = list(key_columns)
+    update_columns = list(update_columns)
+    increment_columns = list(increment_columns)
+    dialect = connection.dialect.name
+    native = dialect in ('sqlite', 'postgresql', 'mysql', 'mariadb')
+    stmt = _upsert_statement(dialect, table, key_columns, update_columns, increment_columns) if native else None
+
+    sent = 0
+    chunk: List[Dict] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            sent += _flush_chunk(connection, stmt, table, key_columns, update_columns, increment_columns, chunk)
+            chunk = []
+    if chunk:
+        sent += _flush_chunk(connection, stmt, table, key_columns, update_columns, increment_columns, chunk)
+    return sent
+
+
+def _flush_chunk(connection, stmt, table, key_columns, update_columns, increment_columns, chunk) -> int:
+    if stmt is not None:
+        connection.execute(stmt, chunk)
+    else:
+        for row in chunk:
+            _upsert_row_by_row(connection, table, key_columns, update_columns, increment_columns, row)
+    return len(chunk)
@@ -0,0 +1,225 @@
+"""Cut plans: pack ordered profile lengths into stock bars per variant and colour.
+
+Pieces are packed first-fit-decreasing, with the first bar that still has room found
+through a max segment tree over the bars' free lengths, so thousands of cuts pack in
+O(n log n). An optional improvement pass pools the pieces of the least used bars and
+repacks them one bar at a time, each filled as full as a subset sum allows (the
+"minimum bin slack" idea). A repack is kept only when it needs fewer bars, and rounds
+repeat while they save bars, up to ``IMPROVE_ROUNDS``.
+
+Every cut takes the saw ``kerf_mm`` as well as its length. The last cut of a bar needs
+no kerf after it, so a bar holds pieces whose ``length + kerf`` sum to at most
+``bar_length + kerf``. Pieces longer than a bar are returned as ``oversize``: they
+cannot be cut from stock and are spliced from ``ceil(length / bar)`` bars each.
+"""
+import math
+import time
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, List, Optional
+
+from app.order_utils import item_quantity
+from app.profile_inventory import ALLOWED_BAR_LENGTHS, INVENTORY_COLORS, PROFILE_VARIANTS
+
+STOCK_BAR_LENGTH_MM = int(round(ALLOWED_BAR_LENGTHS[0] * 1000))
+DEFAULT_KERF_MM = 3
+# The improvement pass repacks at most this many of the least used bars.
+IMPROVE_POOL_BARS = 256
+IMPROVE_ROUNDS = 4
+
+Cut = namedtuple('Cut', 'length_mm order_id item_id')
+
+
+class _FirstFitTree:
+    """Max segment tree over bar free lengths; finds the leftmost bar with enough room."""
+
+    def __init__(self, bars: int, capacity: int):
+        size = 1
+        while size < max(1, bars):
+            size *= 2
+        self.size = size
+        self.tree = [capacity] * (2 * size)
+
+    def first_fit(self, need: int) -> int:
+        node = 1
+        while node < self.size:
+            node = 2 * node if self.tree[2 * node] >= need else 2 * node + 1
+        return node - self.size
+
+    def set(self, index: int, free: int):
+        node = index + self.size
+        self.tree[node] = free
+        node //= 2
+        while node:
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+
+def _first_fit_decreasing(cuts: List[Cut], capacity: int, kerf_mm: int) -> List[List[Cut]]:
+    tree = _FirstFitTree(len(cuts), capacity)
+    bars: List[List[Cut]] = []
+    free: List[int] = []
+    for cut in sorted(cuts, key=lambda cut: cut.length_mm, reverse=True):
+        need = cut.length_mm + kerf_mm
+        index = tree.first_fit(need)
+        if index == len(bars):
+            bars.append([])
+            free.append(capacity)
+        bars[index].append(cut)
+        free[index] -= need
+        tree.set(index, free[index])
+    return bars
+
+
+def _fullest_subset(needs: List[int], capacity: int) -> List[int]:
+    """Indices of ``needs`` whose sum comes closest to ``capacity`` without passing it.
+
+    Subset sum with Python ints as bitsets: bit ``s`` of ``states[i]`` is set when the
+    first ``i`` needs can sum to ``s``.
+    """
+    mask = (1 << (capacity + 1)) - 1
+    states = [1]
+    for need in needs:
+        states.append((states[-1] | (states[-1] << need)) & mask)
+    total = states[-1].bit_length() - 1
+    chosen = []
+    for index in range(len(needs) - 1, -1, -1):
+        if not (states[index] >> total) & 1:
+            chosen.append(index)
+            total -= needs[index]
+    return chosen
+
+
+def _repack(cuts: List[Cut], capacity: int, kerf_mm: int) -> List[List[Cut]]:
+    """Fill one bar at a time as full as possible, always starting from the longest piece."""
+    pool = sorted(cuts, key=lambda cut: cut.length_mm, reverse=True)
+    bars = []
+    while pool:
+        first, rest = pool[0], pool[1:]
+        chosen = set(_fullest_subset([cut.length_mm + kerf_mm for cut in rest], capacity - first.length_mm - kerf_mm))
+        bars.append([first] + [rest[index] for index in sorted(chosen)])
+        pool = [cut for index, cut in enumerate(rest) if index not in chosen]
+    return bars
+
+
+def _improve(bars: List[List[Cut]], capacity: int, kerf_mm: int, lower_bound: int, pool_bars: int) -> List[List[Cut]]:
+    """Repack the pieces of the least used bars, keeping the result only when it saves bars."""
+    if len(bars) <= lower_bound:
+        return bars
+
+    def free_of(bar):
+        return capacity - sum(cut.length_mm + kerf_mm for cut in bar)
+
+    # Offcuts are where FFD lost bars; exactly full bars stay as they are.
+    ranked = sorted(range(len(bars)), key=lambda index: free_of(bars[index]), reverse=True)
+    loose = [index for index in ranked[:pool_bars] if free_of(bars[index]) > 0]
+    if len(loose) < 2:
+        return bars
+    repacked = _repack([cut for index in loose for cut in bars[index]], capacity, kerf_mm)
+    if len(repacked) >= len(loose):
+        return bars
+    kept = set(loose)
+    return [bar for index, bar in enumerate(bars) if index not in kept] + repacked
+
+
+def pack_cuts(
+    cuts: Iterable[Cut],
+    bar_length_mm: int = STOCK_BAR_LENGTH_MM,
+    kerf_mm: int = DEFAULT_KERF_MM,
+    improve: bool = True,
+    pool_bars: int = IMPROVE_POOL_BARS,
+) -> Dict:
+    """Pack ``cuts`` into bars; returns the layouts with bar count, waste and runtime."""
+    started = time.perf_counter()
+    capacity = bar_length_mm + kerf_mm
+    cuts = [cut for cut in cuts if cut.length_mm > 0]
+    fitting = [cut for cut in cuts if cut.length_mm <= bar_length_mm]
+    oversize = [cut for cut in cuts if cut.length_mm > bar_length_mm]
+
+    bars = _first_fit_decreasing(fitting, capacity, kerf_mm)
+    ffd_bars = len(bars)
+    lower_bound = math.ceil(sum(cut.length_mm + kerf_mm for cut in fitting) / capacity) if fitting else 0
+    if improve:
+        for _ in range(IMPROVE_ROUNDS):
+            count = len(bars)
+            bars = _improve(bars, capacity, kerf_mm, lower_bound, pool_bars)
+            if len(bars) == count:
+                break
+
+    layouts = []
+    for bar in sorted(bars, key=lambda bar: sorted((cut.length_mm for cut in bar), reverse=True), reverse=True):
+        bar = sorted(bar, key=lambda cut: cut.length_mm, reverse=True)
+        used = sum(cut.length_mm for cut in bar) + kerf_mm * (len(bar) - 1)
+        layouts.append({
+            'cuts': [{'length_mm': cut.length_mm, 'order_id': cut.order_id, 'item_id': cut.item_id} for cut in bar],
+            'offcut_mm': bar_length_mm - used,
+        })
+
+    oversize_bars = sum(math.ceil(cut.length_mm / bar_length_mm) for cut in oversize)
+    stock_mm = len(layouts) * bar_length_mm
+    cut_mm = sum(cut.length_mm for cut in fitting)
+    return {
+        'bar_length_mm': bar_length_mm,
+        'kerf_mm': kerf_mm,
+        'cuts': len(fitting),
+        'bars': len(layouts),
+        'ffd_bars': ffd_bars,
+        'lower_bound': lower_bound,
+        'waste_pct': round((stock_mm - cut_mm) / stock_mm * 100, 2) if stock_mm else 0.0,
+        'layouts': layouts,
+        'oversize': [{'length_mm': cut.length_mm, 'order_id': cut.order_id, 'item_id': cut.item_id} for cut in oversize],
+        'oversize_bars': oversize_bars,
+        'runtime_ms': round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def profile_item_cuts(item) -> Optional[tuple]:
+    """``(variant_id, color_id, length_mm, pieces)`` of a stocked profile order item, else None."""
+    if str(item.product_type or '').upper() != 'PROFILE':
+        return None
+    config = item.config if isinstance(item.config, dict) else {}
+    variant_id = str(config.get('variantId') or config.get('variant_id') or item.product_id or '')
+    color_id = str(config.get('colorId') or config.get('color_id') or 'natural')
+    if variant_id not in PROFILE_VARIANTS or color_id not in INVENTORY_COLORS:
+        return None
+    try:
+        length_mm = int(round(float(config.get('length') or 0)))
+    except (TypeError, ValueError):
+        return None
+    pieces = item_quantity(item.quantity)
+    if length_mm <= 0 or pieces <= 0:
+        return None
+    return variant_id, color_id, length_mm, pieces
+
+
+def build_cut_plans(
+    items: Iterable,
+    bar_length_mm: int = STOCK_BAR_LENGTH_MM,
+    kerf_mm: int = DEFAULT_KERF_MM,
+    improve: bool = True,
+) -> Dict:
+    """Cut plans per (variant, colour) for the profile items of a batch of orders."""
+    started = time.perf_counter()
+    cuts_by_sku = defaultdict(list)
+    for item in items:
+        parsed = profile_item_cuts(item)
+        if parsed is None:
+            continue
+        variant_id, color_id, length_mm, pieces = parsed
+        cuts_by_sku[(variant_id, color_id)].extend([Cut(length_mm, item.order_id, item.id)] * pieces)
+
+    plans = []
+    for (variant_id, color_id), cuts in sorted(cuts_by_sku.items()):
+        plan = pack_cuts(cuts, bar_length_mm, kerf_mm, improve)
+        plans.append({'variant_id': variant_id, 'color_id': color_id, **plan})
+
+    stock_mm = sum(plan['bars'] for plan in plans) * bar_length_mm
+    cut_mm = sum(cut['length_mm'] for plan in plans for layout in plan['layouts'] for cut in layout['cuts'])
+    return {
+        'plans': plans,
+        'summary': {
+            'cuts': sum(plan['cuts'] for plan in plans),
+            'bars': sum(plan['bars'] + plan['oversize_bars'] for plan in plans),
+            'waste_pct': round((stock_mm - cut_mm) / stock_mm * 100, 2) if stock_mm else 0.0,
+            'runtime_ms': round((time.perf_counter() - started) * 1000, 3),
+        },
+    }
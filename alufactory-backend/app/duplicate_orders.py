@@ -0,0 +1,371 @@
+"""Duplicate-order detection across the whole order history.
+
+Exact duplicates share ``user_id`` and ``duplicate_fingerprint``. An ``after_flush`` hook
+keeps one ``order_duplicate_keys`` row per order (the key it was last counted under) and
+moves the order between ``duplicate_order_groups`` counts when its key changes, on the
+same connection as the write. Looking up an order's group is then one primary-key read,
+and the members of a group come from the ``(user_id, duplicate_fingerprint)`` index on
+``orders``.
+
+Near duplicates are orders of one customer whose item lines match while the memo,
+shipping fee or address differ. Each order keeps a MinHash signature of its item lines.
+The report buckets signatures by LSH band, so only orders sharing a band are compared,
+and joins those whose estimated Jaccard similarity reaches the threshold.
+"""
+import hashlib
+import json
+from collections import Counter, defaultdict
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.bulk_upsert import upsert_rows
+from app.models.user import DuplicateOrderGroup, Order, OrderDuplicateKey, OrderItem, db
+from app.stats_rollup import touched_order_ids
+
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+_IN_CHUNK = 500
+_PRIME = (1 << 61) - 1
+# Fixed, so signatures stored by earlier runs stay comparable.
+_PERMUTATIONS = tuple(
+    (
+        int.from_bytes(hashlib.sha256(f'minhash-a-{index}'.encode('ascii')).digest()[:8], 'big') % (_PRIME - 1) + 1,
+        int.from_bytes(hashlib.sha256(f'minhash-b-{index}'.encode('ascii')).digest()[:8], 'big') % _PRIME,
+    )
+    for index in range(MINHASH_PERMUTATIONS)
+)
+_ROWS_PER_BAND = MINHASH_PERMUTATIONS // LSH_BANDS
+
+
+def item_line_tokens(order_json) -> List[str]:
+    """One token per item line of an ``order_json`` snapshot; prices and order fields are left out."""
+    tokens = []
+    seen = Counter()
+    for item in (order_json or {}).get('items') or []:
+        if not isinstance(item, dict):
+            continue
+        line = json.dumps(
+            [item.get('product_id'), item.get('product_type'), item.get('product_name'), item.get('quantity'), item.get('config')],
+            ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str,
+        )
+        # Repeated identical lines stay distinct tokens, so the token set is a multiset.
+        seen[line] += 1
+        tokens.append(f'{line}#{seen[line]}')
+    return tokens
+
+
+def minhash_signature(tokens: Iterable[str]) -> Optional[Tuple[int, ...]]:
+    hashed = [
+        int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+        for token in set(tokens)
+    ]
+    if not hashed:
+        return None
+    return tuple(min((a * value + b) % _PRIME for value in hashed) & 0xFFFFFFFF for a, b in _PERMUTATIONS)
+
+
+def encode_signature(signature: Optional[Sequence[int]]) -> Optional[str]:
+    return ''.join(f'{value:08x}' for value in signature) if signature else None
+
+
+def decode_signature(text: Optional[str]) -> Optional[Tuple[int, ...]]:
+    if not text or len(text) != MINHASH_PERMUTATIONS * 8:
+        return None
+    return tuple(int(text[index:index + 8], 16) for index in range(0, len(text), 8))
+
+
+def signature_similarity(left: Sequence[int], right: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the token sets behind two signatures."""
+    return sum(1 for a, b in zip(left, right) if a == b) / MINHASH_PERMUTATIONS
+
+
+# -- incremental index ------------------------------------------------------
+
+def _chunks(values: List[str]):
+    for start in range(0, len(values), _IN_CHUNK):
+        yield values[start:start + _IN_CHUNK]
+
+
+def sync_duplicate_keys(connection, order_ids: Iterable[str]) -> int:
+    """Re-key ``order_ids`` from the orders table and adjust the group counts; returns keys changed."""
+    orders = Order.__table__
+    keys = OrderDuplicateKey.__table__
+    groups = DuplicateOrderGroup.__table__
+    delta = Counter()
+    changed = 0
+    for chunk in _chunks(sorted(set(order_ids))):
+        previous = {
+            row.order_id: (row.user_id, row.fingerprint)
+            for row in connection.execute(
+                db.select(keys.c.order_id, keys.c.user_id, keys.c.fingerprint).where(keys.c.order_id.in_(chunk))
+            )
+        }
+        current = {
+            row.id: (str(row.user_id), row.duplicate_fingerprint)
+            for row in connection.execute(
+                db.select(orders.c.id, orders.c.user_id, orders.c.duplicate_fingerprint).where(orders.c.id.in_(chunk))
+            )
+        }
+        # The fingerprint covers the item lines, so an unchanged key keeps its signature.
+        stale = [order_id for order_id in chunk if previous.get(order_id) != current.get(order_id)]
+        if not stale:
+            continue
+        changed += len(stale)
+        for order_id in stale:
+            if order_id in previous and previous[order_id][1]:
+                delta[previous[order_id]] -= 1
+            if order_id in current and current[order_id][1]:
+                delta[current[order_id]] += 1
+        connection.execute(keys.delete().where(keys.c.order_id.in_(stale)))
+        rows = [
+            {
+                'order_id': row.id,
+                'user_id': str(row.user_id),
+                'fingerprint': row.duplicate_fingerprint,
+                'minhash': encode_signature(minhash_signature(item_line_tokens(row.order_json))),
+            }
+            for row in connection.execute(
+                db.select(orders.c.id, orders.c.user_id, orders.c.duplicate_fingerprint, orders.c.order_json)
+                .where(orders.c.id.in_([order_id for order_id in stale if order_id in current]))
+            )
+        ]
+        if rows:
+            connection.execute(keys.insert(), rows)
+
+    increments = [
+        {'user_id': user_id, 'fingerprint': fingerprint, 'order_count': count}
+        for (user_id, fingerprint), count in sorted(delta.items())
+        if count
+    ]
+    if increments:
+        upsert_rows(connection, groups, ('user_id', 'fingerprint'), increments, increment_columns=('order_count',))
+        if any(row['order_count'] < 0 for row in increments):
+            connection.execute(groups.delete().where(groups.c.order_count <= 0))
+    return changed
+
+
+def _after_flush(session, flush_context):
+    order_ids = touched_order_ids(session)
+    for obj in session.new:
+        if isinstance(obj, Order):
+            order_ids.add(obj.id)
+        elif isinstance(obj, OrderItem) and obj.order_id:
+            order_ids.add(obj.order_id)
+    order_ids.discard(None)
+    if order_ids:
+        sync_duplicate_keys(session.connection(), order_ids)
+
+
+def backfill_duplicate_keys(batch_size: int = _IN_CHUNK) -> int:
+    """Key every order that has no ``order_duplicate_keys`` row yet; the caller commits."""
+    connection = db.session.connection()
+    orders = Order.__table__
+    keys = OrderDuplicateKey.__table__
+    written = 0
+    last_id = ''
+    while True:
+        order_ids = [
+            row.id for row in connection.execute(
+                db.select(orders.c.id)
+                .select_from(orders.outerjoin(keys, keys.c.order_id == orders.c.id))
+                .where(keys.c.order_id.is_(None), orders.c.id > last_id)
+                .order_by(orders.c.id).limit(batch_size)
+            )
+        ]
+        if not order_ids:
+            break
+        written += sync_duplicate_keys(connection, order_ids)
+        last_id = order_ids[-1]
+    return written
+
+
+def init_duplicate_orders(app):
+    """Register the flush hook and key any orders written while it was not registered."""
+    if not db.event.contains(db.session, 'after_flush', _after_flush):
+        db.event.listen(db.session, 'after_flush', _after_flush)
+    with app.app_context():
+        try:
+            written = backfill_duplicate_keys()
+            db.session.commit()
+            if written:
+                print(f'  ✅ Indexed {written} orders for duplicate detection')
+        except Exception as error:
+            db.session.rollback()
+            app.logger.warning(f'Duplicate order backfill skipped: {error}')
+
+
+# -- lookups ----------------------------------------------------------------
+
+def _group_members(group_keys) -> Dict[Tuple[str, str], List]:
+    """``(user_id, fingerprint) -> [order rows]`` from the composite index on orders."""
+    members = defaultdict(list)
+    group_keys = sorted(set(group_keys))
+    for start in range(0, len(group_keys), _IN_CHUNK):
+        chunk = group_keys[start:start + _IN_CHUNK]
+        rows = db.session.query(
+            Order.id, Order.order_number, Order.user_id, Order.duplicate_fingerprint,
+            Order.status, Order.total_amount, Order.memo, Order.shipping_fee, Order.created_at,
+        ).filter(db.or_(*(
+            db.and_(Order.user_id == user_id, Order.duplicate_fingerprint == fingerprint)
+            for user_id, fingerprint in chunk
+        ))).order_by(Order.created_at.asc(), Order.id.asc())
+        for row in rows:
+            members[(str(row.user_id), row.duplicate_fingerprint)].append(row)
+    return members
+
+
+def find_duplicate_groups(orders) -> Dict[Tuple[str, str], List]:
+    """Group members for each ``(user_id, fingerprint)`` of ``orders``; an order alone matches itself."""
+    keys = {(str(order.user_id), order.duplicate_fingerprint) for order in orders if order.duplicate_fingerprint}
+    if not keys:
+        return {}
+    counts = {}
+    key_list = sorted(keys)
+    for start in range(0, len(key_list), _IN_CHUNK):
+        chunk = key_list[start:start + _IN_CHUNK]
+        counts.update({
+            (row.user_id, row.fingerprint): row.order_count
+            for row in DuplicateOrderGroup.query.filter(db.or_(*(
+                db.and_(DuplicateOrderGroup.user_id == user_id, DuplicateOrderGroup.fingerprint == fingerprint)
+                for user_id, fingerprint in chunk
+            )))
+        })
+    matches = _group_members(key for key in keys if counts.get(key, 0) > 1)
+    for order in orders:
+        key = (str(order.user_id), order.duplicate_fingerprint)
+        if key in keys and key not in matches:
+            matches[key] = [order]
+    return dict(matches)
+
+
+def _order_summary(row) -> Dict:
+    return {
+        'id': row.id,
+        'order_number': row.order_number,
+        'status': row.status,
+        'total_amount': float(row.total_amount or 0),
+        'shipping_fee': float(row.shipping_fee or 0),
+        'memo': row.memo,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def exact_duplicate_report(user_id: Optional[str] = None, limit: int = 100) -> Dict:
+    """Largest exact duplicate groups first, with their orders."""
+    query = DuplicateOrderGroup.query.filter(DuplicateOrderGroup.order_count > 1)
+    if user_id:
+        query = query.filter(DuplicateOrderGroup.user_id == user_id)
+    total = query.count()
+    groups = query.order_by(
+        DuplicateOrderGroup.order_count.desc(), DuplicateOrderGroup.user_id.asc(), DuplicateOrderGroup.fingerprint.asc()
+    ).limit(limit).all()
+    members = _group_members((group.user_id, group.fingerprint) for group in groups)
+    return {
+        'mode': 'exact',
+        'total_groups': total,
+        'groups': [
+            {
+                'user_id': group.user_id,
+                'fingerprint': group.fingerprint,
+                'order_count': group.order_count,
+                'orders': [_order_summary(row) for row in members.get((group.user_id, group.fingerprint), [])],
+            }
+            for group in groups
+        ],
+    }
+
+
+def _near_groups_of_user(entries, threshold: float) -> List[Dict]:
+    """Union the orders of one customer whose signatures reach ``threshold``."""
+    parent = {order_id: order_id for order_id, _fingerprint, _signature in entries}
+
+    def find(order_id):
+        while parent[order_id] != order_id:
+            parent[order_id] = parent[parent[order_id]]
+            order_id = parent[order_id]
+        return order_id
+
+    buckets = defaultdict(list)
+    for entry in entries:
+        signature = entry[2]
+        for band in range(LSH_BANDS):
+            buckets[(band, signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND])].append(entry)
+
+    similarity = {}
+    for bucket in buckets.values():
+        for index, (left_id, _left_fp, left_sig) in enumerate(bucket):
+            for right_id, _right_fp, right_sig in bucket[index + 1:]:
+                pair = (left_id, right_id) if left_id < right_id else (right_id, left_id)
+                if pair in similarity:
+                    continue
+                similarity[pair] = signature_similarity(left_sig, right_sig)
+                if similarity[pair] >= threshold:
+                    parent[find(left_id)] = find(right_id)
+
+    components = defaultdict(list)
+    for order_id, fingerprint, _signature in entries:
+        components[find(order_id)].append((order_id, fingerprint))
+    groups = []
+    for members in components.values():
+        if len(members) < 2:
+            continue
+        ids = {order_id for order_id, _fingerprint in members}
+        scores = [score for (left, right), score in similarity.items() if left in ids and right in ids and score >= threshold]
+        groups.append({
+            'order_ids': sorted(ids),
+            'fingerprints': len({fingerprint for _order_id, fingerprint in members}),
+            'min_similarity': round(min(scores), 3) if scores else 1.0,
+        })
+    return groups
+
+
+def near_duplicate_report(threshold: float = NEAR_DUPLICATE_THRESHOLD, user_id: Optional[str] = None, limit: int = 100) -> Dict:
+    """Groups of one customer's orders with near-identical item lines, largest first.
+
+    ``fingerprints`` above 1 marks groups that differ in memo, shipping or address rather
+    than being exact repeats.
+    """
+    query = db.session.query(
+        OrderDuplicateKey.user_id, OrderDuplicateKey.order_id, OrderDuplicateKey.fingerprint, OrderDuplicateKey.minhash,
+    ).filter(OrderDuplicateKey.minhash.isnot(None))
+    if user_id:
+        query = query.filter(OrderDuplicateKey.user_id == user_id)
+    rows = query.order_by(OrderDuplicateKey.user_id.asc(), OrderDuplicateKey.order_id.asc()).yield_per(1000)
+
+    groups = []
+    for group_user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+        entries = [
+            (row.order_id, row.fingerprint, signature)
+            for row in user_rows
+            for signature in (decode_signature(row.minhash),)
+            if signature is not None
+        ]
+        for group in _near_groups_of_user(entries, threshold):
+            groups.append({'user_id': group_user_id, **group})
+    groups.sort(key=lambda group: (-len(group['order_ids']), group['user_id'], group['order_ids'][0]))
+
+    shown = groups[:limit]
+    order_rows = {}
+    shown_ids = sorted({order_id for group in shown for order_id in group['order_ids']})
+    for start in range(0, len(shown_ids), _IN_CHUNK):
+        for row in db.session.query(
+            Order.id, Order.order_number, Order.status, Order.total_amount, Order.memo, Order.shipping_fee, Order.created_at,
+        ).filter(Order.id.in_(shown_ids[start:start + _IN_CHUNK])):
+            order_rows[row.id] = row
+    return {
+        'mode': 'near',
+        'threshold': threshold,
+        'total_groups': len(groups),
+        'groups': [
+            {
+                'user_id': group['user_id'],
+                'order_count': len(group['order_ids']),
+                'fingerprints': group['fingerprints'],
+                'min_similarity': group['min_similarity'],
+                'orders': [_order_summary(order_rows[order_id]) for order_id in group['order_ids'] if order_id in order_rows],
+            }
+            for group in shown
+        ],
+    }
@@ -0,0 +1,254 @@
+"""Take stock for orders as they are placed and give it back on cancel or delete.
+
+With ``INVENTORY_RESERVATION_MODE = 'strict'`` an order's profile pieces are packed into
+full bars by ``app.cut_list`` (with ``CUT_KERF_MM``) and its silver-white accessory lines
+are counted in pieces. Each inventory row is decremented with
+``UPDATE ... SET n = n - k WHERE id = ? AND n >= k``. The check and the write are one
+statement, so concurrent orders can never take the same bar twice:
+whichever loses finds no row updated and the whole order is rolled back. What was taken
+is recorded in ``inventory_reservations`` so release returns exactly that, even after a
+mode change. Items that map to no inventory row (custom products, unknown variants) are
+not stock-tracked and pass through.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from flask import current_app
+
+from app.accessory_inventory import ACCESSORY_CATALOG, ACCESSORY_FINISH_ID
+from app.cut_list import DEFAULT_KERF_MM, STOCK_BAR_LENGTH_MM, Cut, pack_cuts, profile_item_cuts
+from app.models.user import AccessoryInventory, InventoryReservation, ProfileInventory, db
+from app.order_utils import item_quantity
+from app.profile_inventory import ALLOWED_BAR_LENGTHS, INVENTORY_COLORS
+from app.stock_cache import ACCESSORY_STOCK, PROFILE_STOCK, bump_stock_version
+
+RESERVATION_MODE_OFF = 'off'
+RESERVATION_MODE_STRICT = 'strict'
+
+DEFAULT_ORDER_ITEM_MAX_QUANTITY = 10000
+
+PROFILE_RESERVATION = 'profile'
+ACCESSORY_RESERVATION = 'accessory'
+
+_STOCK_TABLES = {
+    PROFILE_RESERVATION: (ProfileInventory, 'bar_count', PROFILE_STOCK),
+    ACCESSORY_RESERVATION: (AccessoryInventory, 'quantity', ACCESSORY_STOCK),
+}
+
+
+class InsufficientStock(ValueError):
+    """Stock could not cover an order; ``shortages`` lists each short SKU."""
+
+    def __init__(self, shortages: List[Dict]):
+        self.shortages = shortages
+        super().__init__('库存不足：' + '，'.join(shortage['label'] for shortage in shortages))
+
+
+class ItemQuantityTooLarge(ValueError):
+    """An order item asks for more than ``ORDER_ITEM_MAX_QUANTITY`` pieces."""
+
+    def __init__(self, quantity: int, limit: int):
+        self.quantity = quantity
+        self.limit = limit
+        super().__init__(f'单个商品数量不能超过{limit}（当前{quantity}）')
+
+
+def reservation_mode() -> str:
+    return str(current_app.config.get('INVENTORY_RESERVATION_MODE') or RESERVATION_MODE_OFF).strip().lower()
+
+
+def item_quantity_limit() -> int:
+    return int(current_app.config.get('ORDER_ITEM_MAX_QUANTITY') or DEFAULT_ORDER_ITEM_MAX_QUANTITY)
+
+
+def check_item_quantities(items):
+    """Raise ``ItemQuantityTooLarge`` if an item's quantity exceeds the configured maximum.
+
+    Cut packing builds one cut per piece, so the limit bounds the work an order can cause.
+    """
+    limit = item_quantity_limit()
+    for item in items:
+        quantity = item_quantity(item.quantity)
+        if quantity > limit:
+            raise ItemQuantityTooLarge(quantity, limit)
+
+
+def _profile_demand(items, demand):
+    """Bars per stocked variant and colour, from packing the order's cuts into stock bars."""
+    limit = item_quantity_limit()
+    cuts = defaultdict(list)
+    for item in items:
+        parsed = profile_item_cuts(item)
+        if parsed is not None:
+            variant_id, color_id, length_mm, pieces = parsed
+            if pieces > limit:
+                raise ItemQuantityTooLarge(pieces, limit)
+            cuts[(variant_id, color_id)].extend([Cut(length_mm, item.order_id, item.id)] * pieces)
+    kerf_mm = current_app.config.get('CUT_KERF_MM', DEFAULT_KERF_MM)
+    for (variant_id, color_id), sku_cuts in cuts.items():
+        plan = pack_cuts(sku_cuts, STOCK_BAR_LENGTH_MM, kerf_mm)
+        bars = plan['bars'] + plan['oversize_bars']
+        if bars:
+            demand[(PROFILE_RESERVATION, (variant_id, color_id, ALLOWED_BAR_LENGTHS[0]))] += bars
+
+
+def _accessory_demand(item, demand):
+    config = item.config if isinstance(item.config, dict) else {}
+    if config.get('colorMode') == 'colored':
+        return  # Only the silver-white finish is stocked.
+    profile_size = str(config.get('profileSize') or config.get('size') or '')
+    sets = item_quantity(item.quantity)
+    for line in config.get('lines') or ():
+        if not isinstance(line, dict):
+            continue
+        accessory_id = str(line.get('id') or '')
+        definition = ACCESSORY_CATALOG.get(accessory_id)
+        if definition is None or profile_size not in definition['sizes']:
+            continue
+        pieces = item_quantity(line.get('quantity'), 0) * sets
+        if pieces:
+            demand[(ACCESSORY_RESERVATION, (accessory_id, profile_size))] += pieces
+
+
+def order_stock_demand(items) -> Dict[Tuple[str, tuple], int]:
+    """``(inventory_type, sku) -> units`` the order items take from stock."""
+    items = list(items)
+    demand = defaultdict(int)
+    _profile_demand(items, demand)
+    for item in items:
+        if str(item.product_type or '').upper() == 'ACCESSORY':
+            _accessory_demand(item, demand)
+    return dict(demand)
+
+
+def _inventory_ids(demand) -> Dict[Tuple[str, tuple], int]:
+    """``key -> inventory row id`` for the SKUs in ``demand`` that are stocked."""
+    found = {}
+    profile_keys = [sku for inventory_type, sku in demand if inventory_type == PROFILE_RESERVATION]
+    if profile_keys:
+        rows = db.session.query(
+            ProfileInventory.id, ProfileInventory.variant_id, ProfileInventory.color_id,
+            ProfileInventory.bar_length_m,
+        ).filter(
+            ProfileInventory.variant_id.in_({sku[0] for sku in profile_keys}),
+            ProfileInventory.bar_length_m.in_(ALLOWED_BAR_LENGTHS),
+        )
+        for row in rows:
+            key = (PROFILE_RESERVATION, (row.variant_id, row.color_id, round(float(row.bar_length_m), 2)))
+            if key in demand:
+                found[key] = row.id
+    accessory_keys = [sku for inventory_type, sku in demand if inventory_type == ACCESSORY_RESERVATION]
+    if accessory_keys:
+        rows = db.session.query(
+            AccessoryInventory.id, AccessoryInventory.accessory_id, AccessoryInventory.profile_size,
+        ).filter(
+            AccessoryInventory.accessory_id.in_({sku[0] for sku in accessory_keys}),
+            AccessoryInventory.color_id == ACCESSORY_FINISH_ID,
+        )
+        for row in rows:
+            key = (ACCESSORY_RESERVATION, (row.accessory_id, row.profile_size))
+            if key in demand:
+                found[key] = row.id
+    return found
+
+
+def _shortage(key, requested, available) -> Dict:
+    inventory_type, sku = key
+    if inventory_type == PROFILE_RESERVATION:
+        variant_id, color_id, bar_length = sku
+        return {
+            'inventory_type': inventory_type, 'variant_id': variant_id, 'color_id': color_id,
+            'bar_length_m': bar_length, 'requested': requested, 'available': available,
+            'label': f'{variant_id} {INVENTORY_COLORS.get(color_id, color_id)} 需{requested}支，剩余{available}支',
+        }
+    accessory_id, profile_size = sku
+    return {
+        'inventory_type': inventory_type, 'accessory_id': accessory_id, 'profile_size': profile_size,
+        'requested': requested, 'available': available,
+        'label': f"{ACCESSORY_CATALOG[accessory_id]['name']}({profile_size}) 需{requested}个，剩余{available}个",
+    }
+
+
+def _take(connection, inventory_type: str, inventory_id: int, units: int) -> bool:
+    model, column, _scope = _STOCK_TABLES[inventory_type]
+    table = model.__table__
+    result = connection.execute(
+        table.update()
+        .where(table.c.id == inventory_id, table.c[column] >= units)
+        .values({column: table.c[column] - units, 'updated_at': datetime.utcnow()})
+    )
+    return result.rowcount == 1
+
+
+def _stock_of(connection, inventory_type: str, inventory_id: int) -> int:
+    model, column, _scope = _STOCK_TABLES[inventory_type]
+    table = model.__table__
+    return int(connection.execute(db.select(table.c[column]).where(table.c.id == inventory_id)).scalar() or 0)
+
+
+def _give_back(connection, inventory_type: str, inventory_id: int, units: int):
+    model, column, _scope = _STOCK_TABLES[inventory_type]
+    table = model.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == inventory_id)
+        .values({column: table.c[column] + units, 'updated_at': datetime.utcnow()})
+    )
+
+
+def reserve_order_stock(order) -> List[InventoryReservation]:
+    """Decrement stock for ``order``'s items in the caller's transaction.
+
+    Only reserves in strict mode, and only for an order with no reservations yet; otherwise
+    it does nothing and returns ``[]``. Raises ``InsufficientStock`` (after trying every SKU,
+    so all shortages are reported); the caller must then roll back to undo the SKUs that
+    were taken.
+    """
+    if reservation_mode() != RESERVATION_MODE_STRICT:
+        return []
+    if InventoryReservation.query.filter_by(order_id=order.id).first() is not None:
+        return []
+    demand = order_stock_demand(order.items)
+    stocked = _inventory_ids(demand)
+    connection = db.session.connection()
+    reservations, shortages = [], []
+    # A fixed order keeps concurrent orders from taking row locks in opposite orders.
+    for key in sorted(stocked):
+        inventory_id = stocked[key]
+        units = demand[key]
+        if _take(connection, key[0], inventory_id, units):
+            reservations.append(InventoryReservation(
+                order_id=order.id, inventory_type=key[0], inventory_id=inventory_id, quantity=units,
+            ))
+        else:
+            shortages.append(_shortage(key, units, _stock_of(connection, key[0], inventory_id)))
+    if shortages:
+        raise InsufficientStock(shortages)
+    if reservations:
+        db.session.add_all(reservations)
+        bump_stock_version(connection, *sorted({_STOCK_TABLES[r.inventory_type][2] for r in reservations}))
+    return reservations
+
+
+def release_order_stock(order_id: str) -> int:
+    """Return everything ``order_id`` holds to stock; safe to call twice. The caller commits."""
+    reservations = InventoryReservation.query.filter_by(order_id=order_id).all()
+    if not reservations:
+        return 0
+    connection = db.session.connection()
+    for reservation in sorted(reservations, key=lambda r: (r.inventory_type, r.inventory_id)):
+        _give_back(connection, reservation.inventory_type, reservation.inventory_id, reservation.quantity)
+        db.session.delete(reservation)
+    bump_stock_version(connection, *sorted({_STOCK_TABLES[r.inventory_type][2] for r in reservations}))
+    return len(reservations)
+
+
+def order_status_changed(order, previous_status: str):
+    """Release stock when an order is cancelled and take it again if it is reopened."""
+    if order.status == previous_status:
+        return
+    if order.status == 'cancelled':
+        release_order_stock(order.id)
+    elif previous_status == 'cancelled':
+        reserve_order_stock(order)
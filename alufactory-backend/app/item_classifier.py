@@ -0,0 +1,126 @@
+"""Order-item category rules, compiled once into lookup tables.
+
+``classify_order_item`` used to run a chain of substring tests per item. The same rules
+now live in ``CATEGORY_RULES`` (in priority order) and are compiled into exact-match
+dicts for ``product_type`` and ``product_id`` plus two Aho–Corasick automata, one over
+the type and one over the name, so each field is scanned once whatever the number of
+patterns. Every rule that matches is found; the earliest in ``CATEGORY_RULES`` wins, as
+it did in the if-chain. Results are memoized by the raw ``(type, name, id)`` triple,
+since an order book repeats a few dozen products many times over.
+"""
+from collections import deque, namedtuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CLASSIFIER_CACHE_SIZE = 4096
+
+# ``types``/``ids`` match the whole lowercased value; ``type_patterns``/``name_patterns``
+# match anywhere inside it.
+CategoryRule = namedtuple('CategoryRule', 'category_code types type_patterns name_patterns ids')
+
+CATEGORY_RULES: Tuple[CategoryRule, ...] = (
+    CategoryRule('profile', ('profile',), (), ('铝型材',), ()),
+    CategoryRule('aluminum_plate', (), ('aluminum_plate',), ('铝板',), ('p5',)),
+    CategoryRule('marine_board', (), ('marine_board',), ('海洋板',), ('p6',)),
+    CategoryRule('aluminum_frame_door', (), ('cabinet_door',), ('铝框门',), ('p3',)),
+    CategoryRule(
+        'calligraphy_cabinet', (), ('calligraphy_cabinet',),
+        ('舒法特柜子', '宜家舒法特柜子', '书法特柜子', '宜家书法特柜子'), ('p7',),
+    ),
+    CategoryRule('wardrobe', (), ('wardrobe',), ('衣柜',), ('p8',)),
+    CategoryRule('accessory', ('accessory',), (), ('配件', 'connector'), ('accessory',)),
+    CategoryRule('pegboard', ('pegboard',), (), ('洞洞板',), ('p1',)),
+)
+
+
+class PatternMatcher:
+    """Aho–Corasick automaton returning the best (lowest) rank among patterns in a text."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, int]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.rank: List[Optional[int]] = [None]
+        for pattern, rank in patterns:
+            state = 0
+            for char in pattern:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto[state][char] = following
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.rank.append(None)
+                state = following
+            self.rank[state] = _best(self.rank[state], rank)
+
+        # Breadth first, so a state's fail target is final before its children use it,
+        # and each state's rank already includes every pattern ending at its suffixes.
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[following] = target if target != following else 0
+                self.rank[following] = _best(self.rank[following], self.rank[self.fail[following]])
+                queue.append(following)
+
+    def best_rank(self, text: str) -> Optional[int]:
+        goto, fail, ranks = self.goto, self.fail, self.rank
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            rank = ranks[state]
+            if rank is not None and (best is None or rank < best):
+                if rank == 0:
+                    return 0
+                best = rank
+        return best
+
+
+def _best(*ranks: Optional[int]) -> Optional[int]:
+    found = [rank for rank in ranks if rank is not None]
+    return min(found) if found else None
+
+
+def _compile(rules: Tuple[CategoryRule, ...]):
+    types: Dict[str, int] = {}
+    ids: Dict[str, int] = {}
+    for rank, rule in enumerate(rules):
+        for value in rule.types:
+            types.setdefault(value, rank)
+        for value in rule.ids:
+            ids.setdefault(value, rank)
+    type_matcher = PatternMatcher((pattern, rank) for rank, rule in enumerate(rules) for pattern in rule.type_patterns)
+    name_matcher = PatternMatcher((pattern, rank) for rank, rule in enumerate(rules) for pattern in rule.name_patterns)
+    return types, ids, type_matcher, name_matcher
+
+
+_TYPES, _IDS, _TYPE_MATCHER, _NAME_MATCHER = _compile(CATEGORY_RULES)
+
+
+def _normalize(value) -> str:
+    return str(value or '').strip().lower()
+
+
+@lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
+def _classify(product_type, product_name, product_id) -> Optional[str]:
+    ptype = _normalize(product_type)
+    pid = _normalize(product_id)
+    rank = _best(_TYPES.get(ptype), _IDS.get(pid), _TYPE_MATCHER.best_rank(ptype))
+    if rank != 0:
+        rank = _best(rank, _NAME_MATCHER.best_rank(_normalize(product_name)))
+    return CATEGORY_RULES[rank].category_code if rank is not None else None
+
+
+def classify_order_item(product_type: str, product_name: str, product_id: str) -> Optional[str]:
+    """Category code of an order item, or None when no rule matches."""
+    try:
+        return _classify(product_type, product_name, product_id)
+    except TypeError:  # Unhashable values cannot be memoized.
+        return _classify.__wrapped__(product_type, product_name, product_id)
@@ -2,7 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
-from app.order_utils import to_east8_isoformat
+from app.order_utils import profile_item_usage, to_east8_isoformat
 
 db = SQLAlchemy()
 
@@ -159,6 +159,12 @@ class CartItem(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Newest-first keyset pagination in the admin order list.
+        db.Index('idx_orders_created_at_id', 'created_at', 'id'),
+        # Members of one customer's duplicate group (app.duplicate_orders).
+        db.Index('idx_orders_user_fingerprint', 'user_id', 'duplicate_fingerprint'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     order_number = db.Column(db.String(50), unique=True, nullable=False)  # User-friendly order number
@@ -247,7 +253,7 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    order_id = db.Column(db.String(36), db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.String(36), db.ForeignKey('orders.id'), nullable=False, index=True)
     
     product_id = db.Column(db.String(50), nullable=False)
     product_name = db.Column(db.String(255), nullable=False)
@@ -259,8 +265,18 @@ class OrderItem(db.Model):
     
     # Config stored as JSON for complex product configurations
     config = db.Column(db.JSON, nullable=True)
+
+    # Profile usage normalized out of config for SQL aggregation; meters is 0 for
+    # non-profile items and NULL only on rows not yet backfilled.
+    profile_variant_id = db.Column(db.String(50), nullable=True)
+    profile_color_id = db.Column(db.String(50), nullable=True)
+    profile_meters = db.Column(db.Float, nullable=True)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def refresh_profile_usage(self):
+        usage = profile_item_usage(self.product_type, self.product_id, self.quantity, self.config)
+        self.profile_variant_id, self.profile_color_id, self.profile_meters = usage or (None, None, 0.0)
     
     def to_dict(self):
         return {
@@ -276,6 +292,142 @@ class OrderItem(db.Model):
         }
 
 
+@db.event.listens_for(OrderItem, 'before_insert')
+@db.event.listens_for(OrderItem, 'before_update')
+def _order_item_profile_usage(mapper, connection, item):
+    item.refresh_profile_usage()
+
+
+class OrderItemLine(db.Model):
+    """Typed analytics copy of one order item, kept in step by app.order_item_lines.
+
+    ``paid_month`` (YYYY-MM of paid_at, else created_at) is set only while the order is in
+    a paid status, matching the monthly revenue rollup.
+    """
+    __tablename__ = 'order_item_lines'
+    __table_args__ = (
+        db.Index('idx_order_item_lines_status_month', 'order_status', 'paid_month', 'category_code'),
+        db.Index('idx_order_item_lines_profile', 'variant_id', 'color_id', 'paid_month'),
+        db.Index('idx_order_item_lines_category_month', 'category_code', 'paid_month'),
+    )
+
+    order_item_id = db.Column(db.String(36), primary_key=True)
+    order_id = db.Column(db.String(36), nullable=False, index=True)
+    category_code = db.Column(db.String(50), nullable=True)
+    product_type = db.Column(db.String(50), nullable=True)
+    variant_id = db.Column(db.String(50), nullable=True)
+    color_id = db.Column(db.String(50), nullable=True)
+    length_mm = db.Column(db.Float, nullable=True)
+    width_mm = db.Column(db.Float, nullable=True)
+    height_mm = db.Column(db.Float, nullable=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    meters = db.Column(db.Float, nullable=False, default=0)
+    total_price = db.Column(db.Float, nullable=False, default=0)
+    order_status = db.Column(db.String(50), nullable=False)
+    paid_month = db.Column(db.String(7), nullable=True)
+
+
+class OrderDuplicateKey(db.Model):
+    """Duplicate-detection keys of one order as last counted by app.duplicate_orders.
+
+    ``minhash`` is the hex MinHash signature of the order's item lines, for near-duplicate
+    matching; None when the order has no items.
+    """
+    __tablename__ = 'order_duplicate_keys'
+
+    order_id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.String(36), nullable=False, index=True)
+    fingerprint = db.Column(db.String(64), nullable=True)
+    minhash = db.Column(db.Text, nullable=True)
+
+
+class DuplicateOrderGroup(db.Model):
+    """Orders per customer and ``duplicate_fingerprint``, maintained by app.duplicate_orders."""
+    __tablename__ = 'duplicate_order_groups'
+    __table_args__ = (
+        db.Index('idx_duplicate_order_groups_count', 'order_count'),
+    )
+
+    user_id = db.Column(db.String(36), primary_key=True)
+    fingerprint = db.Column(db.String(64), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class OrderDocument(db.Model):
+    """Stored PDF of an order per variant; rows with equal sha256 share one blob."""
+    __tablename__ = 'order_documents'
+    __table_args__ = (
+        db.UniqueConstraint('order_id', 'variant', name='uq_order_documents_order_variant'),
+        db.Index('idx_order_documents_sha256', 'sha256'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # No foreign key: like the PDF files before it, a document outlives a deleted order.
+    order_id = db.Column(db.String(36), nullable=False)
+    variant = db.Column(db.String(20), nullable=False)  # with_price / no_price
+    sha256 = db.Column(db.String(64), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    blob_key = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=True)
+    content_type = db.Column(db.String(100), nullable=False, default='application/pdf')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'variant': self.variant,
+            'sha256': self.sha256,
+            'size': self.size,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class OrderPdfRender(db.Model):
+    """Server-rendered order PDF cached per order content (duplicate_fingerprint) and template."""
+    __tablename__ = 'order_pdf_renders'
+
+    fingerprint = db.Column(db.String(64), primary_key=True)
+    template_version = db.Column(db.String(20), primary_key=True)
+    variant = db.Column(db.String(20), primary_key=True)  # with_price / no_price
+    sha256 = db.Column(db.String(64), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    page_count = db.Column(db.Integer, nullable=False)
+    page_render_ms = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class OrderStatusRollup(db.Model):
+    """Order count and amount per status, maintained by app.stats_rollup."""
+    __tablename__ = 'order_status_rollup'
+
+    status = db.Column(db.String(50), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+
+
+class MonthlyRevenueRollup(db.Model):
+    """Paid order revenue per YYYY-MM of paid_at (or created_at), maintained by app.stats_rollup."""
+    __tablename__ = 'monthly_revenue_rollup'
+
+    month = db.Column(db.String(7), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class ProfileUsageRollup(db.Model):
+    """Profile meters of paid orders per colour and variant, maintained by app.stats_rollup."""
+    __tablename__ = 'profile_usage_rollup'
+
+    color_id = db.Column(db.String(50), primary_key=True)
+    variant_id = db.Column(db.String(50), primary_key=True)
+    meters = db.Column(db.Float, nullable=False, default=0)
+
+
 class ProfileInventory(db.Model):
     """Raw profile stock, tracked as full bars by model, color and bar length."""
     __tablename__ = 'profile_inventory'
@@ -336,6 +488,33 @@ class AccessoryInventory(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
 
+
+class InventoryReservation(db.Model):
+    """Stock taken by an order: bars of a profile_inventory row or pieces of an accessory_inventory row.
+
+    Kept after the order row is deleted until app.inventory_reservation returns the stock.
+    """
+    __tablename__ = 'inventory_reservations'
+    __table_args__ = (
+        db.UniqueConstraint('order_id', 'inventory_type', 'inventory_id', name='uq_inventory_reservations_order_sku'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    order_id = db.Column(db.String(36), nullable=False, index=True)
+    inventory_type = db.Column(db.String(20), nullable=False)
+    inventory_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class InventoryVersion(db.Model):
+    """Change counter per stock scope, bumped with every inventory write by app.stock_cache."""
+    __tablename__ = 'inventory_versions'
+
+    scope = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
 class Profile(db.Model):
     """Store user profile data with PDF uploads"""
     __tablename__ = 'profiles'
@@ -356,10 +535,13 @@ class Profile(db.Model):
     # PDF file path
     pdf_path = db.Column(db.String(500), nullable=True)
     pdf_filename = db.Column(db.String(255), nullable=True)
-    pdf_base64 = db.Column(db.Text, nullable=True)  # Store base64 encoded PDF
+    pdf_blob_key = db.Column(db.String(255), nullable=True)  # Key in the blob store
     pdf_no_price_path = db.Column(db.String(500), nullable=True)
     pdf_no_price_filename = db.Column(db.String(255), nullable=True)
-    pdf_no_price_base64 = db.Column(db.Text, nullable=True)  # Store base64 encoded no-price PDF
+    pdf_no_price_blob_key = db.Column(db.String(255), nullable=True)
+    # Legacy base64 PDFs, emptied by migrate_pdf_blobs.py; deferred so profile loads skip them.
+    pdf_base64 = db.deferred(db.Column(db.Text, nullable=True))
+    pdf_no_price_base64 = db.deferred(db.Column(db.Text, nullable=True))
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -382,6 +564,7 @@ class Profile(db.Model):
             },
             'pdf_filename': self.pdf_filename,
             'pdf_no_price_filename': self.pdf_no_price_filename,
+            'pdf_url': f'/api/profiles/{self.id}/pdf' if self.pdf_blob_key else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
         }
@@ -0,0 +1,167 @@
+"""Per-order PDF documents: one ``order_documents`` row per (order, variant).
+
+Blobs are content addressed (``order_documents/<sha256[:2]>/<sha256>.pdf``), so an
+identical upload for another order, or a re-upload, reuses the stored blob. Replaced
+blobs are kept, matching how order PDFs were never deleted before.
+"""
+import hashlib
+import os
+import uuid
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from flask import current_app
+
+from app.blob_storage import CHUNK_SIZE, get_blob_store
+from app.models.user import Order, OrderDocument, Profile, db
+from app.order_pdf_index import NO_PRICE_SUFFIX, get_order_pdf_index, order_pdf_dir
+from app.order_utils import build_order_pdf_filename
+from app.pdf_upload import HashingUploadReader, iter_request_body
+
+VARIANT_WITH_PRICE = 'with_price'
+VARIANT_NO_PRICE = 'no_price'
+DOCUMENT_CONTENT_TYPE = 'application/pdf'
+
+
+def document_variant(no_price: bool = False) -> str:
+    return VARIANT_NO_PRICE if no_price else VARIANT_WITH_PRICE
+
+
+def document_blob_key(sha256: str) -> str:
+    return f'order_documents/{sha256[:2]}/{sha256}.pdf'
+
+
+def order_pdf_download_name(order, no_price: bool = False) -> str:
+    base_filename = build_order_pdf_filename(order)
+    if not no_price:
+        return base_filename
+    return base_filename[:-4] + NO_PRICE_SUFFIX if base_filename.lower().endswith('.pdf') else f'{base_filename}{NO_PRICE_SUFFIX}'
+
+
+def get_order_document(order_id, no_price: bool = False) -> Optional[OrderDocument]:
+    return OrderDocument.query.filter_by(order_id=order_id, variant=document_variant(no_price)).first()
+
+
+def _store_content(data) -> Tuple[str, int, str]:
+    """Write bytes or a hashing upload reader to its content key; returns ``(sha256, size, key)``."""
+    store = get_blob_store(current_app)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        sha256 = hashlib.sha256(data).hexdigest()
+        key = document_blob_key(sha256)
+        if not store.exists(key):
+            store.put(key, bytes(data), content_type=DOCUMENT_CONTENT_TYPE)
+        return sha256, len(data), key
+
+    # A stream's hash is only known once it has been read, so it lands on a staging key first.
+    staging_key = f'order_documents/incoming/{uuid.uuid4().hex}.pdf'
+    store.put(staging_key, data, content_type=DOCUMENT_CONTENT_TYPE)
+    sha256 = data.sha256
+    key = document_blob_key(sha256)
+    if store.exists(key):
+        store.delete(staging_key)
+    else:
+        store.move(staging_key, key)
+    return sha256, data.size, key
+
+
+def save_order_document(order, data, no_price: bool = False, filename: Optional[str] = None) -> OrderDocument:
+    """Store a PDF (bytes or a ``HashingUploadReader``) and upsert its row; the caller commits."""
+    sha256, size, key = _store_content(data)
+    return _upsert_document(order, no_price, sha256, size, key, filename)
+
+
+def link_order_document(order, sha256: str, size: int, no_price: bool = False, filename: Optional[str] = None) -> Optional[OrderDocument]:
+    """Point the order at an already stored blob; returns None when that blob is gone."""
+    key = document_blob_key(sha256)
+    if not get_blob_store(current_app).exists(key):
+        return None
+    return _upsert_document(order, no_price, sha256, size, key, filename)
+
+
+def _upsert_document(order, no_price: bool, sha256: str, size: int, key: str, filename: Optional[str]) -> OrderDocument:
+    variant = document_variant(no_price)
+    document = OrderDocument.query.filter_by(order_id=order.id, variant=variant).first()
+    if document is None:
+        document = OrderDocument(order_id=order.id, variant=variant)
+        db.session.add(document)
+    document.sha256 = sha256
+    document.size = size
+    document.blob_key = key
+    document.filename = filename
+    document.content_type = DOCUMENT_CONTENT_TYPE
+    return document
+
+
+def profile_pdf_filenames(user_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """``user_id -> pdf_filename`` for profiles holding a PDF, skipping any base64 blob."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    rows = db.session.query(Profile.user_id, Profile.pdf_filename).filter(
+        Profile.user_id.in_(user_ids),
+        db.or_(
+            Profile.pdf_blob_key.isnot(None),
+            db.and_(Profile.pdf_base64.isnot(None), Profile.pdf_base64 != ''),
+        ),
+    ).all()
+    return {user_id: filename for user_id, filename in rows}
+
+
+def order_pdf_availability(instance_path: str, orders) -> Dict[str, Tuple[bool, bool]]:
+    """``order_id -> (with_price, no_price)`` for a batch of orders in two IN queries.
+
+    Besides ``order_documents`` rows, legacy ``order_pdfs`` files count, and so does the
+    single profile PDF slot when its filename names this order.
+    """
+    orders = list(orders)
+    if not orders:
+        return {}
+    order_ids = [order.id for order in orders]
+    documents: Set[Tuple[str, str]] = set(
+        db.session.query(OrderDocument.order_id, OrderDocument.variant)
+        .filter(OrderDocument.order_id.in_(order_ids))
+        .all()
+    )
+    profile_filenames = profile_pdf_filenames(order.user_id for order in orders)
+    pdf_index = get_order_pdf_index(instance_path)
+
+    availability = {}
+    for order in orders:
+        with_price = (
+            (order.id, VARIANT_WITH_PRICE) in documents
+            or pdf_index.has_pdf(order.id)
+            or (order.user_id in profile_filenames and profile_filenames[order.user_id] == build_order_pdf_filename(order))
+        )
+        no_price = (order.id, VARIANT_NO_PRICE) in documents or pdf_index.has_pdf(order.id, no_price=True)
+        availability[order.id] = (with_price, no_price)
+    return availability
+
+
+def index_legacy_order_pdfs(progress=None) -> Dict[str, int]:
+    """Create ``order_documents`` rows for PDFs still only in ``instance/order_pdfs``.
+
+    Files are hashed while streaming and copied to their content key in the configured
+    store; files of deleted orders or with an existing row are left alone.
+    """
+    pdf_dir = order_pdf_dir(current_app.instance_path)
+    try:
+        with os.scandir(pdf_dir) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_file() and entry.name.endswith('.pdf'))
+    except FileNotFoundError:
+        names = []
+
+    stats = {'files': len(names), 'indexed': 0, 'skipped': 0}
+    for name in names:
+        no_price = name.endswith(NO_PRICE_SUFFIX)
+        order_id = name[:-len(NO_PRICE_SUFFIX)] if no_price else name[:-len('.pdf')]
+        order = db.session.get(Order, order_id)
+        if order is None or get_order_document(order_id, no_price) is not None:
+            stats['skipped'] += 1
+            continue
+        with open(os.path.join(pdf_dir, name), 'rb') as handle:
+            reader = HashingUploadReader(iter_request_body(handle, CHUNK_SIZE), max_bytes=os.fstat(handle.fileno()).st_size, require_pdf=False)
+            save_order_document(order, reader, no_price, order_pdf_download_name(order, no_price))
+        db.session.commit()
+        stats['indexed'] += 1
+        if progress:
+            progress(dict(stats))
+    return stats
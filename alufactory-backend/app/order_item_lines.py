@@ -0,0 +1,176 @@
+"""Typed ``order_item_lines`` kept in step with orders, so analytics never decode JSON.
+
+An ``after_flush`` hook rewrites the lines of every order the flush touched on the same
+connection, so item config JSON is parsed once per write instead of once per report.
+Lines follow the order's status: ``paid_month`` is only set while it is paid.
+``rebuild_order_item_lines`` backfills the table in batches.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from app.models.user import Order, OrderItem, OrderItemLine, db
+from app.order_utils import item_quantity, profile_item_usage
+from app.product_order_db import classify_order_item
+from app.stats_rollup import PAID_ORDER_STATUSES, touched_order_ids
+
+_IN_CHUNK = 500
+
+
+def _positive(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def order_item_line(order, item) -> Dict:
+    """Column values of the line for ``item``; ``order`` needs status, paid_at and created_at."""
+    config = item.config if isinstance(item.config, dict) else {}
+    category_code = classify_order_item(item.product_type, item.product_name, item.product_id)
+    quantity = item_quantity(item.quantity)
+    length_mm = _positive(config.get('length'))
+    variant_id = config.get('variantId') or config.get('variant_id')
+    color_id = config.get('colorId') or config.get('color_id')
+    if category_code == 'profile':
+        variant_id = variant_id or item.product_id
+        color_id = color_id or 'natural'
+    elif category_code == 'accessory':
+        variant_id = variant_id or config.get('profileSize') or config.get('size')
+    # Meters use the same rule as OrderItem.profile_meters and ProfileUsageRollup.
+    usage = profile_item_usage(item.product_type, item.product_id, item.quantity, config)
+    paid_month = None
+    if order.status in PAID_ORDER_STATUSES:
+        moment = order.paid_at or order.created_at
+        paid_month = moment.strftime('%Y-%m') if moment is not None else None
+    return {
+        'order_item_id': item.id,
+        'order_id': item.order_id,
+        'category_code': category_code,
+        'product_type': item.product_type,
+        'variant_id': str(variant_id) if variant_id else None,
+        'color_id': str(color_id) if color_id else None,
+        'length_mm': length_mm,
+        'width_mm': _positive(config.get('width')),
+        'height_mm': _positive(config.get('height')),
+        'quantity': quantity,
+        'meters': round(usage[2], 6) if usage else 0.0,
+        'total_price': float(item.total_price or 0),
+        'order_status': order.status or 'pending',
+        'paid_month': paid_month,
+    }
+
+
+def _chunks(values: List[str]):
+    for start in range(0, len(values), _IN_CHUNK):
+        yield values[start:start + _IN_CHUNK]
+
+
+def sync_order_item_lines(connection, order_ids: Iterable[str]) -> int:
+    """Rewrite the lines of ``order_ids`` from the orders and order_items tables."""
+    orders = Order.__table__
+    items = OrderItem.__table__
+    lines = OrderItemLine.__table__
+    written = 0
+    for chunk in _chunks(sorted(set(order_ids))):
+        connection.execute(lines.delete().where(lines.c.order_id.in_(chunk)))
+        order_rows = {
+            row.id: row
+            for row in connection.execute(
+                db.select(orders.c.id, orders.c.status, orders.c.paid_at, orders.c.created_at)
+                .where(orders.c.id.in_(chunk))
+            )
+        }
+        if not order_rows:
+            continue
+        values = [
+            order_item_line(order_rows[item.order_id], item)
+            for item in connection.execute(
+                db.select(
+                    items.c.id, items.c.order_id, items.c.product_id, items.c.product_name,
+                    items.c.product_type, items.c.quantity, items.c.total_price, items.c.config,
+                ).where(items.c.order_id.in_(list(order_rows)))
+            )
+        ]
+        if values:
+            connection.execute(lines.insert(), values)
+            written += len(values)
+    return written
+
+
+def _after_flush(session, flush_context):
+    order_ids = touched_order_ids(session)
+    for obj in session.new:
+        if isinstance(obj, Order):
+            order_ids.add(obj.id)
+        elif isinstance(obj, OrderItem) and obj.order_id:
+            order_ids.add(obj.order_id)
+    order_ids.discard(None)
+    if order_ids:
+        sync_order_item_lines(session.connection(), order_ids)
+
+
+def rebuild_order_item_lines(batch_size: int = _IN_CHUNK) -> int:
+    """Rewrite every line, ``batch_size`` orders per statement; the caller commits."""
+    connection = db.session.connection()
+    connection.execute(OrderItemLine.__table__.delete())
+    written = 0
+    last_id = ''
+    while True:
+        order_ids = [
+            row.id for row in connection.execute(
+                db.select(Order.__table__.c.id).where(Order.__table__.c.id > last_id)
+                .order_by(Order.__table__.c.id).limit(batch_size)
+            )
+        ]
+        if not order_ids:
+            break
+        written += sync_order_item_lines(connection, order_ids)
+        last_id = order_ids[-1]
+    return written
+
+
+def profile_usage_report(month_from: Optional[str] = None, month_to: Optional[str] = None) -> List[Dict]:
+    """Paid profile pieces and meters per variant and colour, optionally for a month range."""
+    meters = db.func.sum(OrderItemLine.meters)
+    query = db.session.query(
+        OrderItemLine.variant_id,
+        OrderItemLine.color_id,
+        db.func.sum(OrderItemLine.quantity),
+        meters,
+        db.func.count(db.distinct(OrderItemLine.order_id)),
+    ).filter(
+        OrderItemLine.category_code == 'profile',
+        OrderItemLine.paid_month.isnot(None),
+    )
+    if month_from:
+        query = query.filter(OrderItemLine.paid_month >= month_from)
+    if month_to:
+        query = query.filter(OrderItemLine.paid_month <= month_to)
+    rows = query.group_by(OrderItemLine.variant_id, OrderItemLine.color_id).order_by(
+        meters.desc(), OrderItemLine.variant_id.asc(), OrderItemLine.color_id.asc()
+    )
+    return [
+        {
+            'variant_id': variant_id,
+            'color_id': color_id,
+            'pieces': int(pieces or 0),
+            'meters': round(float(total or 0), 3),
+            'orders': int(orders or 0),
+        }
+        for variant_id, color_id, pieces, total, orders in rows
+    ]
+
+
+def init_order_item_lines(app):
+    """Register the flush hook and backfill the lines once for existing orders."""
+    if not db.event.contains(db.session, 'after_flush', _after_flush):
+        db.event.listen(db.session, 'after_flush', _after_flush)
+    with app.app_context():
+        try:
+            if OrderItemLine.query.first() is None and OrderItem.query.first() is not None:
+                written = rebuild_order_item_lines()
+                db.session.commit()
+                print(f'  ✅ Backfilled {written} order item lines')
+        except Exception as error:
+            db.session.rollback()
+            app.logger.warning(f'Order item line backfill skipped: {error}')
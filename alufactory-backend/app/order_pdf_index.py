@@ -0,0 +1,50 @@
+"""Cached listing of the legacy ``instance/order_pdfs`` files, checked per order without I/O."""
+import os
+import threading
+from typing import Dict, FrozenSet, Optional, Tuple
+
+NO_PRICE_SUFFIX = '_no_price.pdf'
+
+# pdf_dir -> (directory mtime_ns, file names)
+_index_cache: Dict[str, Tuple[Optional[int], FrozenSet[str]]] = {}
+_index_lock = threading.Lock()
+
+
+def order_pdf_dir(instance_path: str) -> str:
+    return os.path.join(instance_path, 'order_pdfs')
+
+
+class OrderPdfIndex:
+    def __init__(self, names: FrozenSet[str]):
+        self._names = names
+
+    def has_pdf(self, order_id, no_price: bool = False) -> bool:
+        return f"{order_id}{NO_PRICE_SUFFIX if no_price else '.pdf'}" in self._names
+
+
+def get_order_pdf_index(instance_path: str) -> OrderPdfIndex:
+    """Return the set of stored order PDFs, rescanning only when the directory changed.
+
+    Adding or removing a file bumps the directory mtime, so one ``stat`` per call is
+    enough to keep the cached listing exact.
+    """
+    pdf_dir = order_pdf_dir(instance_path)
+    try:
+        mtime_ns = os.stat(pdf_dir).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+
+    cached = _index_cache.get(pdf_dir)
+    if cached is not None and cached[0] == mtime_ns and mtime_ns is not None:
+        return OrderPdfIndex(cached[1])
+
+    names = frozenset()
+    if mtime_ns is not None:
+        try:
+            with os.scandir(pdf_dir) as entries:
+                names = frozenset(entry.name for entry in entries if entry.is_file())
+        except OSError:
+            names = frozenset()
+    with _index_lock:
+        _index_cache[pdf_dir] = (mtime_ns, names)
+    return OrderPdfIndex(names)
@@ -0,0 +1,352 @@
+"""Library-free renderer for the order PDFs, written as raw PDF objects like the sketch PNGs.
+
+Text uses the non-embedded ``STSong-Light`` CJK font (``UniGB-UCS2-H``) that PDF viewers
+ship, so Chinese names need no font file. Item sketches are the snapshot PNGs, embedded
+by copying their zlib stream with the PNG predictor instead of decoding them. Output is
+a pure function of the payload and the variant: no order number, date or document id is
+written, so identical order content renders to identical bytes.
+"""
+import struct
+import time
+import zlib
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+# Bump when the layout changes so cached renders are not reused.
+TEMPLATE_VERSION = 1
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 36
+TITLE_SIZE = 16
+TEXT_SIZE = 9
+SMALL_SIZE = 7
+HEADER_ROW_HEIGHT = 18
+ROW_HEIGHT = 44
+INFO_LINE_HEIGHT = 14
+FOOTER_HEIGHT = 72
+SKETCH_WIDTH = 52
+SKETCH_HEIGHT = 36
+CONTENT_COMPRESS_LEVEL = 6
+
+CATEGORY_NAMES = {
+    'profile': '铝型材',
+    'pegboard': '洞洞板',
+    'aluminum_plate': '铝板',
+    'aluminum_frame_door': '铝框门',
+    'marine_board': '海洋板',
+    'calligraphy_cabinet': '舒法特柜子',
+    'wardrobe': '衣柜',
+    'accessory': '配件',
+}
+
+# (key, header, width); the no-price layout drops the price columns and widens the name.
+_PRICE_COLUMNS = (
+    ('index', '序号', 24),
+    ('category', '分类', 62),
+    ('name', '品名', 118),
+    ('spec', '规格', 80),
+    ('color', '颜色', 50),
+    ('quantity', '数量', 32),
+    ('unit_price', '单价', 45),
+    ('total_price', '金额', 50),
+    ('sketch', '示意图', 62),
+)
+_NO_PRICE_COLUMNS = tuple(
+    (key, header, width + 95 if key == 'name' else width)
+    for key, header, width in _PRICE_COLUMNS
+    if key not in ('unit_price', 'total_price')
+)
+# Remarks run as a second, smaller line from the name column up to the quantity column.
+_REMARK_START, _REMARK_END = 'name', 'quantity'
+
+RenderedPdf = namedtuple('RenderedPdf', 'data page_render_ms')
+
+
+def _hex_text(text: str) -> str:
+    # UniGB-UCS2-H takes UCS-2 code units; characters outside the BMP cannot be shown.
+    return ''.join(f'{ord(ch):04X}' if ord(ch) <= 0xFFFF else '003F' for ch in text)
+
+
+def _text_width(text: str, size: float) -> float:
+    # Matches the font's /W entry: ASCII is half width, everything else full width.
+    return sum(0.5 if ord(ch) < 0x80 else 1.0 for ch in text) * size
+
+
+def _fit(text: str, width: float, size: float) -> str:
+    text = ' '.join(str(text or '').split())
+    if _text_width(text, size) <= width:
+        return text
+    while text and _text_width(text, size) + size > width:
+        text = text[:-1]
+    return text + '…'
+
+
+def _number(value) -> str:
+    try:
+        return f'{float(value or 0):.2f}'
+    except (TypeError, ValueError):
+        return '0.00'
+
+
+def _fmt(value: float) -> str:
+    return ('%.2f' % value).rstrip('0').rstrip('.')
+
+
+def _png_image(png: bytes) -> Optional[Tuple[int, int, bytes]]:
+    """``(width, height, zlib data)`` of an 8-bit RGB non-interlaced PNG, else None."""
+    if not png or not png.startswith(b'\x89PNG\r\n\x1a\n'):
+        return None
+    pos = 8
+    header = None
+    idat = []
+    while pos + 8 <= len(png):
+        length, tag = struct.unpack('>I4s', png[pos:pos + 8])
+        body = png[pos + 8:pos + 8 + length]
+        if tag == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif tag == b'IDAT':
+            idat.append(body)
+        elif tag == b'IEND':
+            break
+        pos += 12 + length
+    if header is None or header[2:4] != (8, 2) or header[6] != 0 or not idat:
+        return None
+    return header[0], header[1], b''.join(idat)
+
+
+class _PdfWriter:
+    """Numbered objects written in order, followed by the xref table."""
+
+    def __init__(self):
+        self.objects: List[Optional[bytes]] = []
+
+    def reserve(self) -> int:
+        self.objects.append(None)
+        return len(self.objects)
+
+    def set(self, number: int, body):
+        self.objects[number - 1] = body.encode('latin-1') if isinstance(body, str) else body
+
+    def add(self, body) -> int:
+        number = self.reserve()
+        self.set(number, body)
+        return number
+
+    def add_stream(self, dictionary: str, data: bytes) -> int:
+        return self.add(f'<< {dictionary} /Length {len(data)} >>\nstream\n'.encode('latin-1') + data + b'\nendstream')
+
+    def to_bytes(self, root: int) -> bytes:
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(self.objects, 1):
+            offsets.append(len(out))
+            out += f'{number} 0 obj\n'.encode('latin-1') + body + b'\nendobj\n'
+        xref = len(out)
+        out += f'xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+        for offset in offsets:
+            out += f'{offset:010d} 00000 n \n'.encode('latin-1')
+        out += f'trailer\n<< /Size {len(offsets) + 1} /Root {root} 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+        return bytes(out)
+
+
+class _Page:
+    def __init__(self):
+        self.ops: List[str] = []
+        self.images: Dict[str, int] = {}
+
+    def text(self, x: float, y: float, text: str, size: float = TEXT_SIZE, gray: float = 0.0):
+        if not text:
+            return
+        color = f'{_fmt(gray)} g ' if gray else ''
+        reset = ' 0 g' if gray else ''
+        self.ops.append(f'{color}BT /F1 {_fmt(size)} Tf {_fmt(x)} {_fmt(y)} Td <{_hex_text(text)}> Tj ET{reset}')
+
+    def text_right(self, right: float, y: float, text: str, size: float = TEXT_SIZE):
+        self.text(right - _text_width(text, size), y, text, size)
+
+    def fill_rect(self, x: float, y: float, w: float, h: float, gray: float):
+        self.ops.append(f'{_fmt(gray)} g {_fmt(x)} {_fmt(y)} {_fmt(w)} {_fmt(h)} re f 0 g')
+
+    def line(self, x0: float, y0: float, x1: float, y1: float, gray: float = 0.75):
+        self.ops.append(f'{_fmt(gray)} G 0.5 w {_fmt(x0)} {_fmt(y0)} m {_fmt(x1)} {_fmt(y1)} l S 0 G')
+
+    def image(self, name: str, number: int, x: float, y: float, w: float, h: float):
+        self.images[name] = number
+        self.ops.append(f'q {_fmt(w)} 0 0 {_fmt(h)} {_fmt(x)} {_fmt(y)} cm /{name} Do Q')
+
+
+def _paginate(row_count: int) -> List[Tuple[int, int]]:
+    """Row ranges per page; the first page holds the address block, the last the totals."""
+    table_top_first = PAGE_HEIGHT - MARGIN - 30 - 4 * INFO_LINE_HEIGHT - 10
+    table_top_other = PAGE_HEIGHT - MARGIN - 30
+    bottom = MARGIN + 14
+
+    def capacity(first: bool) -> int:
+        top = table_top_first if first else table_top_other
+        return int((top - HEADER_ROW_HEIGHT - bottom) // ROW_HEIGHT)
+
+    pages = []
+    start = 0
+    while True:
+        fits = capacity(not pages)
+        end = min(row_count, start + fits)
+        pages.append((start, end))
+        start = end
+        if start >= row_count:
+            break
+    # The totals need FOOTER_HEIGHT below the last row; push them to a page of their own if not.
+    last_start, last_end = pages[-1]
+    used = (last_end - last_start) * ROW_HEIGHT + FOOTER_HEIGHT
+    if used > capacity(len(pages) == 1) * ROW_HEIGHT:
+        pages.append((row_count, row_count))
+    return pages
+
+
+def _row_values(index: int, row: Dict) -> Dict[str, str]:
+    width, height = row.get('width'), row.get('height')
+    spec_parts = []
+    if width and height:
+        spec_parts.append(f'{_fmt(float(width))}×{_fmt(float(height))}')
+    if row.get('thickness'):
+        spec_parts.append(str(row['thickness']))
+    return {
+        'index': str(index + 1),
+        'category': CATEGORY_NAMES.get(row.get('category_code') or '', row.get('product_type') or ''),
+        'name': row.get('product_name') or '',
+        'spec': ' '.join(spec_parts),
+        'color': row.get('color') or '',
+        'quantity': str(int(row.get('quantity') or 0)),
+        'unit_price': _number(row.get('unit_price')),
+        'total_price': _number(row.get('total_price')),
+    }
+
+
+def render_order_pdf(payload: Dict, no_price: bool = False) -> RenderedPdf:
+    """Render one variant; returns the PDF bytes and the milliseconds spent on each page.
+
+    ``payload`` is a plain dict (see ``app.pdf_render_queue.build_order_pdf_payload``) so
+    it can be sent to a worker process.
+    """
+    columns = _NO_PRICE_COLUMNS if no_price else _PRICE_COLUMNS
+    column_x = {}
+    x = MARGIN
+    for key, _header, width in columns:
+        column_x[key] = (x, width)
+        x += width
+    remark_x = column_x[_REMARK_START][0] + 2
+    remark_width = column_x[_REMARK_END][0] - remark_x - 4
+    table_right = x
+
+    rows = payload.get('rows') or []
+    pages = _paginate(len(rows))
+    writer = _PdfWriter()
+    catalog = writer.reserve()
+    pages_node = writer.reserve()
+    descriptor = writer.add(
+        '<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] '
+        '/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>'
+    )
+    cid_font = writer.add(
+        '<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light '
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> '
+        f'/FontDescriptor {descriptor} 0 R /DW 1000 /W [1 95 500] >>'
+    )
+    font = writer.add(
+        '<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light-UniGB-UCS2-H '
+        f'/Encoding /UniGB-UCS2-H /DescendantFonts [{cid_font} 0 R] >>'
+    )
+
+    address = payload.get('shipping_address') or {}
+    shipping = payload.get('shipping') or {}
+    amounts = payload.get('amounts') or {}
+    title = '订单明细（不含价格）' if no_price else '订单明细'
+    images: Dict[str, Tuple[str, int]] = {}
+    page_numbers = []
+    page_render_ms = []
+
+    for page_index, (start, end) in enumerate(pages):
+        started = time.perf_counter()
+        page = _Page()
+        top = PAGE_HEIGHT - MARGIN
+        page.text(MARGIN, top - TITLE_SIZE, title, TITLE_SIZE)
+        page.text_right(table_right, top - TITLE_SIZE, f'第 {page_index + 1}/{len(pages)} 页')
+        y = top - 30
+
+        if page_index == 0:
+            info_lines = (
+                f"收货人：{address.get('recipient_name') or ''}    电话：{address.get('phone') or ''}",
+                f"地址：{address.get('province') or ''} {address.get('address_detail') or ''}",
+                f"配送方式：{shipping.get('method') or '-'}",
+                f"备注：{payload.get('memo') or '-'}",
+            )
+            for line in info_lines:
+                y -= INFO_LINE_HEIGHT
+                page.text(MARGIN, y + 3, _fit(line, table_right - MARGIN, TEXT_SIZE + 1), TEXT_SIZE + 1)
+            y -= 10
+
+        if end > start or page_index == 0:
+            page.fill_rect(MARGIN, y - HEADER_ROW_HEIGHT, table_right - MARGIN, HEADER_ROW_HEIGHT, 0.92)
+            for key, header, _width in columns:
+                page.text(column_x[key][0] + 2, y - HEADER_ROW_HEIGHT + 5, header)
+            y -= HEADER_ROW_HEIGHT
+
+        for index in range(start, end):
+            row = rows[index]
+            values = _row_values(index, row)
+            for key, _header, width in columns:
+                if key == 'sketch':
+                    continue
+                page.text(column_x[key][0] + 2, y - 14, _fit(values[key], width - 4, TEXT_SIZE))
+            if row.get('remark'):
+                page.text(remark_x, y - 28, _fit(row['remark'], remark_width, SMALL_SIZE), SMALL_SIZE, gray=0.35)
+            sketch_key = row.get('sketch_key')
+            if sketch_key and row.get('sketch_png'):
+                if sketch_key not in images:
+                    decoded = _png_image(row['sketch_png'])
+                    if decoded is not None:
+                        width, height, data = decoded
+                        number = writer.add_stream(
+                            f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                            '/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode '
+                            f'/DecodeParms << /Predictor 15 /Colors 3 /BitsPerComponent 8 /Columns {width} >>',
+                            data,
+                        )
+                        images[sketch_key] = (f'Im{len(images) + 1}', number)
+                if sketch_key in images:
+                    name, number = images[sketch_key]
+                    sketch_x = column_x['sketch'][0] + (column_x['sketch'][1] - SKETCH_WIDTH) / 2
+                    page.image(name, number, sketch_x, y - ROW_HEIGHT + (ROW_HEIGHT - SKETCH_HEIGHT) / 2, SKETCH_WIDTH, SKETCH_HEIGHT)
+            y -= ROW_HEIGHT
+            page.line(MARGIN, y, table_right, y)
+
+        if page_index == len(pages) - 1:
+            y -= 18
+            if no_price:
+                total_quantity = sum(int(row.get('quantity') or 0) for row in rows)
+                page.text_right(table_right, y, f'合计数量：{total_quantity}', TEXT_SIZE + 1)
+            else:
+                summary = (
+                    f"小计：{_number(amounts.get('subtotal'))}",
+                    f"运费：{_number(shipping.get('fee'))}",
+                    f"超长费：{_number(shipping.get('overlength_fee'))}",
+                    f"合计：{_number(amounts.get('total'))}",
+                )
+                for line in summary:
+                    page.text_right(table_right, y, line, TEXT_SIZE + 1)
+                    y -= 14
+
+        content = zlib.compress('\n'.join(page.ops).encode('latin-1'), CONTENT_COMPRESS_LEVEL)
+        content_number = writer.add_stream('/Filter /FlateDecode', content)
+        xobjects = ' '.join(f'/{name} {number} 0 R' for name, number in sorted(page.images.items()))
+        resources = f'<< /Font << /F1 {font} 0 R >>' + (f' /XObject << {xobjects} >>' if xobjects else '') + ' >>'
+        page_numbers.append(writer.add(
+            f'<< /Type /Page /Parent {pages_node} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources {resources} /Contents {content_number} 0 R >>'
+        ))
+        page_render_ms.append(round((time.perf_counter() - started) * 1000, 3))
+
+    kids = ' '.join(f'{number} 0 R' for number in page_numbers)
+    writer.set(pages_node, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>')
+    writer.set(catalog, f'<< /Type /Catalog /Pages {pages_node} 0 R >>')
+    return RenderedPdf(writer.to_bytes(catalog), page_render_ms)
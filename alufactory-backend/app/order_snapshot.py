@@ -1,6 +1,19 @@
+"""Stable order-content JSON and its SHA-256 duplicate fingerprint.
+
+The fingerprint is the SHA-256 of ``json.dumps(order_json, ensure_ascii=False,
+sort_keys=True, separators=(',', ':'))``, which is schema_version 1. Stored fingerprints
+compare against new ones, so that byte stream must never change. It is fed to the hash
+piece by piece rather than built as one string. Each item is encoded once: that text is
+both the item's sort key and its part of the hashed stream.
+"""
 import hashlib
 import json
 
+# Produces exactly what ``json.dumps(..., ensure_ascii=False, sort_keys=True,
+# separators=(',', ':'))`` does.
+_CANONICAL = json.JSONEncoder(ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
 
 def _number(value):
     try:
@@ -9,15 +22,38 @@ def _number(value):
         return 0
 
 
+def _plain_copy(value):
+    """Deep copy of plain JSON data with keys in sorted order; raises TypeError otherwise."""
+    kind = type(value)
+    if kind is dict:
+        copied = {}
+        for key in sorted(value):
+            if type(key) is not str:
+                raise TypeError(key)
+            element = value[key]
+            copied[key] = element if type(element) in _SCALARS else _plain_copy(element)
+        return copied
+    if kind is list or kind is tuple:
+        return [element if type(element) in _SCALARS else _plain_copy(element) for element in value]
+    if kind in _SCALARS:
+        return value
+    raise TypeError(value)
+
+
 def _json_safe(value):
+    try:
+        return _plain_copy(value)
+    except (TypeError, RecursionError):
+        pass
+    # Non-string keys, custom objects and the like: let the encoder coerce them.
     try:
         return json.loads(json.dumps(value, ensure_ascii=False, sort_keys=True, default=str))
     except (TypeError, ValueError):
         return str(value or '')
 
 
-def build_order_json(order):
-    """Build the stable order-content JSON used for admin review and duplicate checks."""
+def _build_order_json(order):
+    """``(order_json, canonical text of each item in list order)``."""
     items = []
     for item in list(getattr(order, 'items', []) or []):
         items.append({
@@ -31,8 +67,8 @@ def build_order_json(order):
         })
 
     # Sorting prevents harmless cart-line order changes from hiding a duplicate.
-    items.sort(key=lambda item: json.dumps(item, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
-    return {
+    encoded = sorted(((_CANONICAL.encode(item), item) for item in items), key=lambda pair: pair[0])
+    order_json = {
         'schema_version': 1,
         'user_id': str(getattr(order, 'user_id', '') or ''),
         'shipping_address': {
@@ -51,17 +87,43 @@ def build_order_json(order):
             'total': _number(getattr(order, 'total_amount', 0)),
         },
         'memo': str(getattr(order, 'memo', '') or ''),
-        'items': items,
+        'items': [item for _text, item in encoded],
     }
+    return order_json, [text for text, _item in encoded]
+
+
+def build_order_json(order):
+    """Build the stable order-content JSON used for admin review and duplicate checks."""
+    return _build_order_json(order)[0]
+
+
+def _fingerprint(order_json, item_texts=None):
+    if not isinstance(order_json, dict) or any(type(key) is not str for key in order_json):
+        return hashlib.sha256(_CANONICAL.encode(order_json).encode('utf-8')).hexdigest()
+    digest = hashlib.sha256()
+    separator = '{'
+    for key in sorted(order_json):
+        value = order_json[key]
+        digest.update(f'{separator}{_CANONICAL.encode(key)}:'.encode('utf-8'))
+        separator = ','
+        if key == 'items' and type(value) is list:
+            texts = item_texts if item_texts is not None else (_CANONICAL.encode(item) for item in value)
+            digest.update(b'[')
+            for index, text in enumerate(texts):
+                digest.update(text.encode('utf-8') if not index else f',{text}'.encode('utf-8'))
+            digest.update(b']')
+        else:
+            digest.update(_CANONICAL.encode(value).encode('utf-8'))
+    digest.update(b'}' if order_json else b'{}')
+    return digest.hexdigest()
 
 
 def fingerprint_order_json(order_json):
-    canonical = json.dumps(order_json, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
-    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return _fingerprint(order_json)
 
 
 def refresh_order_json(order):
-    snapshot = build_order_json(order)
+    snapshot, item_texts = _build_order_json(order)
     order.order_json = snapshot
-    order.duplicate_fingerprint = fingerprint_order_json(snapshot)
+    order.duplicate_fingerprint = _fingerprint(snapshot, item_texts)
     return snapshot
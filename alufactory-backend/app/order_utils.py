@@ -36,3 +36,25 @@ def build_order_pdf_filename(order):
         fallback='ORDER'
     )
     return f'{order_ref}.pdf'
+
+
+def item_quantity(value, default=1):
+    """Whole non-negative count; ``default`` when unset (as the order_items column), 0 when invalid."""
+    try:
+        return max(0, int(value if value is not None else default))
+    except (TypeError, ValueError):
+        return 0
+
+
+def profile_item_usage(product_type, product_id, quantity, config):
+    """Return ``(variant_id, color_id, meters)`` consumed by a profile order item, else None."""
+    if str(product_type or '').upper() != 'PROFILE':
+        return None
+    config = config if isinstance(config, dict) else {}
+    variant_id = str(config.get('variantId') or config.get('variant_id') or product_id or 'unknown')
+    color_id = str(config.get('colorId') or config.get('color_id') or 'natural')
+    try:
+        length_m = max(0.0, float(config.get('length') or 0) / 1000.0)
+    except (TypeError, ValueError):
+        return None
+    return variant_id, color_id, length_m * item_quantity(quantity)
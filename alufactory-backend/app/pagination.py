@@ -0,0 +1,33 @@
+"""Opaque keyset cursors for newest-first listings ordered by ``(created_at, id)``."""
+import base64
+import binascii
+import json
+from typing import Any, Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(kind: str, created_at: Optional[str], row_id: Any) -> str:
+    """Encode the sort key of the last row on a page; ``kind`` stops cursors crossing listings."""
+    payload = json.dumps([kind, created_at, row_id], separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(kind: str, token: str) -> Tuple[Optional[str], Any]:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        decoded = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError) as error:
+        raise InvalidCursor('Invalid cursor') from error
+    if not isinstance(decoded, list) or len(decoded) != 3 or decoded[0] != kind:
+        raise InvalidCursor('Invalid cursor')
+    _, created_at, row_id = decoded
+    if created_at is not None and not isinstance(created_at, str):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, row_id
+
+
+def wants_total(args) -> bool:
+    return str(args.get('include_total', '0')).strip().lower() in ('1', 'true', 'yes')
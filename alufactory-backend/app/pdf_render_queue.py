@@ -0,0 +1,292 @@
+"""Server-side order PDF generation on a process pool, for orders the browser never rendered.
+
+``request_order_pdf_render`` builds a payload from ``Order.order_json`` plus the item
+detail and sketches the snapshot rows are built from, and renders the with-price and
+no-price variants in worker processes. Open jobs are bounded by ``PDF_RENDER_WORKERS``
+plus ``PDF_RENDER_QUEUE_SIZE``; past that ``PdfRenderQueueFull`` is raised.
+
+Renders are cached in ``order_pdf_renders`` by the order's ``duplicate_fingerprint`` and
+``RENDER_CACHE_VERSION``, so a repeated order links the stored blob without rendering.
+Job state, including the render time of every page, is kept in this process for polling.
+"""
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from app.models.user import Order, OrderPdfRender, db
+from app.order_documents import (
+    VARIANT_NO_PRICE,
+    VARIANT_WITH_PRICE,
+    get_order_document,
+    link_order_document,
+    order_pdf_download_name,
+    save_order_document,
+)
+from app.order_pdf_render import TEMPLATE_VERSION, render_order_pdf
+from app.order_snapshot import refresh_order_json
+from app.product_order_db import load_item_sketch, order_json_item_rows
+from app.sketch_cache import SKETCH_RENDERER_VERSION, sketch_key
+from app.sketch_render import render_sketch_png
+from app.snapshot_sync_queue import enqueue_snapshot_sync
+
+# Sketches are part of the document, so their renderer version is part of the cache key.
+RENDER_CACHE_VERSION = f'{TEMPLATE_VERSION}.{SKETCH_RENDERER_VERSION}'
+PDF_RENDER_VARIANTS = (VARIANT_WITH_PRICE, VARIANT_NO_PRICE)
+JOB_TTL_SECONDS = 3600
+
+
+class PdfRenderQueueFull(RuntimeError):
+    pass
+
+
+def build_order_pdf_payload(instance_path: str, order) -> Dict:
+    """Picklable render input; depends only on the order content behind its fingerprint."""
+    order_json = order.order_json or refresh_order_json(order)
+    rows = []
+    for item in order_json_item_rows(order_json):
+        spec = item['item_sketch_spec']
+        key = sketch_key(spec) if spec else None
+        rows.append({
+            'category_code': item['category_code'],
+            'product_name': item['product_name'],
+            'product_type': item['product_type'],
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price'],
+            'total_price': item['total_price'],
+            'width': item['item_width'],
+            'height': item['item_height'],
+            'thickness': item['item_thickness'],
+            'color': item['item_color'],
+            'remark': item['item_remark'],
+            'sketch_key': key,
+            'sketch_png': (load_item_sketch(instance_path, key) or render_sketch_png(spec)) if key else None,
+        })
+    return {
+        'shipping_address': order_json.get('shipping_address') or {},
+        'shipping': order_json.get('shipping') or {},
+        'amounts': order_json.get('amounts') or {},
+        'memo': order_json.get('memo') or '',
+        'rows': rows,
+    }
+
+
+def _render_info(page_render_ms, sha256: str, size: int) -> Dict:
+    page_render_ms = list(page_render_ms or [])
+    return {
+        'pages': len(page_render_ms),
+        'page_render_ms': page_render_ms,
+        'render_ms': round(sum(page_render_ms), 3),
+        'sha256': sha256,
+        'size': size,
+    }
+
+
+class PdfRenderService:
+    def __init__(self, app, workers=2, queue_size=8, use_processes=True):
+        self.app = app
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.use_processes = use_processes
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._jobs: Dict[str, Dict] = {}
+        self._active: Dict[str, str] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded server with open DB connections is unsafe, so spawn.
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _prune(self, now: float):
+        for job_id in [key for key, job in self._jobs.items() if job['status'] != 'queued' and now - job['created'] > JOB_TTL_SECONDS]:
+            self._jobs.pop(job_id, None)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, 'variants': {variant: dict(info) for variant, info in job['variants'].items()}}
+
+    def submit(self, order, variants: Iterable[str] = PDF_RENDER_VARIANTS, force: bool = False) -> Dict:
+        """Link cached renders and queue the rest; returns the job (``status`` queued or done).
+
+        Variants that already have a document are left alone unless ``force`` is set.
+        """
+        with self._lock:
+            self._prune(time.time())
+            running = self._active.get(order.id)
+        if running:
+            return self.get_job(running)
+
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'order_id': order.id,
+            'user_id': order.user_id,
+            'fingerprint': order.duplicate_fingerprint,
+            'template_version': RENDER_CACHE_VERSION,
+            'status': 'queued',
+            'variants': {},
+            'created': time.time(),
+        }
+        pending = []
+        for variant in dict.fromkeys(variants):
+            no_price = variant == VARIANT_NO_PRICE
+            if not force and get_order_document(order.id, no_price) is not None:
+                job['variants'][variant] = {'status': 'exists'}
+                continue
+            cached = db.session.get(OrderPdfRender, (order.duplicate_fingerprint, RENDER_CACHE_VERSION, variant))
+            if cached is not None and link_order_document(order, cached.sha256, cached.size, no_price, order_pdf_download_name(order, no_price)):
+                job['variants'][variant] = {'status': 'cached', **_render_info(cached.page_render_ms, cached.sha256, cached.size)}
+                continue
+            pending.append(variant)
+
+        if any(info['status'] == 'cached' for info in job['variants'].values()):
+            db.session.commit()
+            enqueue_snapshot_sync(order.id, pdf_available=True)
+
+        payload = None
+        if pending:
+            if not self._slots.acquire(blocking=False):
+                raise PdfRenderQueueFull('PDF render queue is full, try again later')
+            try:
+                payload = build_order_pdf_payload(self.app.instance_path, order)
+            except Exception:
+                self._slots.release()
+                raise
+
+        with self._lock:
+            for variant in pending:
+                job['variants'][variant] = {'status': 'queued'}
+            if not pending:
+                job['status'] = 'done'
+            else:
+                self._active[order.id] = job['job_id']
+            self._jobs[job['job_id']] = job
+
+        for index, variant in enumerate(pending):
+            no_price = variant == VARIANT_NO_PRICE
+            if not self.use_processes:
+                try:
+                    rendered, error = render_order_pdf(payload, no_price), None
+                except Exception as render_error:
+                    rendered, error = None, render_error
+                self._finish(job['job_id'], variant, rendered, error)
+                continue
+            try:
+                future = self._pool().submit(render_order_pdf, payload, no_price)
+            except Exception as submit_error:
+                # Fail what was not handed to the pool; the last _finish frees the slot.
+                for unsubmitted in pending[index:]:
+                    self._finish(job['job_id'], unsubmitted, None, submit_error)
+                break
+            future.add_done_callback(
+                lambda done, job_id=job['job_id'], variant=variant: self._on_done(job_id, variant, done)
+            )
+        return self.get_job(job['job_id'])
+
+    def _on_done(self, job_id: str, variant: str, future):
+        try:
+            rendered, error = future.result(), None
+        except Exception as render_error:
+            rendered, error = None, render_error
+        self._finish(job_id, variant, rendered, error)
+
+    def _finish(self, job_id: str, variant: str, rendered, error):
+        with self._lock:
+            job = dict(self._jobs[job_id])
+        info = {'status': 'failed', 'error': str(error)} if error is not None else None
+        if info is None:
+            with self.app.app_context():
+                try:
+                    info = self._save(job, variant, rendered)
+                except Exception as save_error:
+                    db.session.rollback()
+                    info = {'status': 'failed', 'error': str(save_error)}
+                finally:
+                    db.session.remove()
+        if info['status'] == 'failed':
+            self.app.logger.error(f"PDF render of order {job['order_id']} ({variant}) failed: {info['error']}")
+        else:
+            self.app.logger.info(
+                f"Rendered {variant} PDF of order {job['order_id']}: {info['pages']} pages, "
+                f"{info['render_ms']} ms ({', '.join(str(ms) for ms in info['page_render_ms'])} ms per page)"
+            )
+        with self._lock:
+            job = self._jobs[job_id]
+            job['variants'][variant] = info
+            statuses = [entry['status'] for entry in job['variants'].values()]
+            if 'queued' in statuses:
+                return
+            job['status'] = 'failed' if 'failed' in statuses else 'done'
+            self._active.pop(job['order_id'], None)
+            self._idle.notify_all()
+        self._slots.release()
+
+    def _save(self, job: Dict, variant: str, rendered) -> Dict:
+        no_price = variant == VARIANT_NO_PRICE
+        order = db.session.get(Order, job['order_id'])
+        if order is None or order.duplicate_fingerprint != job['fingerprint']:
+            # Edited or deleted while rendering: the output no longer matches the order.
+            return {'status': 'stale', **_render_info(rendered.page_render_ms, None, len(rendered.data))}
+
+        document = save_order_document(order, rendered.data, no_price, order_pdf_download_name(order, no_price))
+        cache_key = (job['fingerprint'], RENDER_CACHE_VERSION, variant)
+        if db.session.get(OrderPdfRender, cache_key) is None:
+            db.session.add(OrderPdfRender(
+                fingerprint=job['fingerprint'],
+                template_version=RENDER_CACHE_VERSION,
+                variant=variant,
+                sha256=document.sha256,
+                size=document.size,
+                page_count=len(rendered.page_render_ms),
+                page_render_ms=list(rendered.page_render_ms),
+            ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another process cached the same content first; keep just the document.
+            db.session.rollback()
+            order = db.session.get(Order, job['order_id'])
+            document = save_order_document(order, rendered.data, no_price, order_pdf_download_name(order, no_price))
+            db.session.commit()
+        enqueue_snapshot_sync(order.id, pdf_available=True)
+        return {'status': 'done', **_render_info(rendered.page_render_ms, document.sha256, document.size)}
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no job is running; returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._active, timeout)
+
+    def stop(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+def init_pdf_rendering(app):
+    service = PdfRenderService(
+        app,
+        workers=app.config.get('PDF_RENDER_WORKERS', 2),
+        queue_size=app.config.get('PDF_RENDER_QUEUE_SIZE', 8),
+        use_processes=app.config.get('PDF_RENDER_ASYNC', True),
+    )
+    app.extensions['pdf_render'] = service
+    return service
+
+
+def request_order_pdf_render(order, variants: Iterable[str] = PDF_RENDER_VARIANTS, force: bool = False) -> Dict:
+    """Render ``order``'s PDFs in the background; raises ``PdfRenderQueueFull``."""
+    from flask import current_app
+
+    return current_app.extensions['pdf_render'].submit(order, variants, force)
@@ -0,0 +1,142 @@
+"""Serving order and profile PDFs from the blob store, plus the move of legacy base64 columns."""
+import base64
+import binascii
+from typing import Callable, Dict, Optional
+
+from flask import Response, current_app, jsonify
+
+from app.blob_storage import BlobNotFound, blob_response, content_disposition, get_blob_store
+from app.models.user import Profile, db
+from app.order_documents import get_order_document, order_pdf_download_name
+from app.order_pdf_index import NO_PRICE_SUFFIX
+
+PDF_MIMETYPE = 'application/pdf'
+
+
+def order_pdf_key(order_id, no_price: bool = False) -> str:
+    """Per-order file written before ``order_documents``; still served when present."""
+    return f"order_pdfs/{order_id}{NO_PRICE_SUFFIX if no_price else '.pdf'}"
+
+
+def profile_pdf_key(profile_id, no_price: bool = False) -> str:
+    return f"profile_pdfs/{profile_id}{NO_PRICE_SUFFIX if no_price else '.pdf'}"
+
+
+def decode_pdf_base64(value) -> bytes:
+    """Decode a base64 PDF, accepting a data URI prefix; raises ``ValueError``."""
+    if isinstance(value, str) and ',' in value:
+        value = value.split(',', 1)[1]
+    try:
+        return base64.b64decode(value)
+    except (binascii.Error, TypeError) as error:
+        raise ValueError('Invalid PDF data') from error
+
+
+def store_profile_pdf(profile, data, no_price: bool = False) -> str:
+    key = profile_pdf_key(profile.id, no_price)
+    get_blob_store(current_app).put(key, data, content_type=PDF_MIMETYPE)
+    return key
+
+
+def _legacy_pdf_response(value, filename):
+    try:
+        pdf_bytes = decode_pdf_base64(value)
+    except ValueError:
+        return jsonify({'error': 'Invalid PDF data'}), 500
+    return Response(pdf_bytes, mimetype=PDF_MIMETYPE, headers={'Content-Disposition': content_disposition(filename)})
+
+
+def profile_pdf_response(profile, filename: Optional[str] = None, no_price: bool = False):
+    """Stream a profile PDF from the blob store, or decode a not yet migrated base64 column."""
+    filename = filename or (profile.pdf_no_price_filename if no_price else profile.pdf_filename) or 'profile.pdf'
+    blob_key = profile.pdf_no_price_blob_key if no_price else profile.pdf_blob_key
+    if blob_key:
+        try:
+            return blob_response(get_blob_store(current_app), blob_key, filename, PDF_MIMETYPE)
+        except BlobNotFound:
+            current_app.logger.warning(f'Profile PDF blob missing: {blob_key}')
+
+    legacy_value = profile.pdf_no_price_base64 if no_price else profile.pdf_base64
+    if not legacy_value:
+        return jsonify({'error': 'PDF not found'}), 404
+    return _legacy_pdf_response(legacy_value, filename)
+
+
+def order_pdf_response(order, no_price: bool = False):
+    """Serve an order PDF from its ``order_documents`` row or the legacy per-order file.
+
+    Before order documents existed only one PDF per customer was kept on the profile; it
+    is served when its filename shows it belongs to this order.
+    """
+    filename = order_pdf_download_name(order, no_price)
+    store = get_blob_store(current_app)
+    document = get_order_document(order.id, no_price)
+    if document is not None:
+        try:
+            return blob_response(store, document.blob_key, filename, document.content_type, etag=document.sha256)
+        except BlobNotFound:
+            current_app.logger.warning(f'Order document blob missing: {document.blob_key}')
+
+    try:
+        return blob_response(store, order_pdf_key(order.id, no_price), filename, PDF_MIMETYPE)
+    except BlobNotFound:
+        pass
+
+    if no_price:
+        return jsonify({'error': 'No-price PDF not found for this order'}), 404
+
+    profile = Profile.query.filter_by(user_id=order.user_id).first()
+    if not profile or profile.pdf_filename != filename:
+        return jsonify({'error': 'PDF not found'}), 404
+    return profile_pdf_response(profile, filename)
+
+
+def migrate_profile_pdf_blobs(
+    batch_size: int = 50,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict[str, int]:
+    """Move ``Profile.pdf_base64``/``pdf_no_price_base64`` into the blob store.
+
+    Runs in batches of ``batch_size`` profiles with a commit after each, so it can be
+    interrupted and rerun; rows that cannot be decoded are left in place and counted.
+    """
+    stats = {'profiles': 0, 'blobs': 0, 'bytes': 0, 'failed': 0}
+    last_id = ''
+    pending = db.or_(Profile.pdf_base64.isnot(None), Profile.pdf_no_price_base64.isnot(None))
+    while True:
+        profiles = (
+            Profile.query
+            .options(db.undefer(Profile.pdf_base64), db.undefer(Profile.pdf_no_price_base64))
+            .filter(pending, Profile.id > last_id)
+            .order_by(Profile.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not profiles:
+            break
+        for profile in profiles:
+            last_id = profile.id
+            for no_price, column, key_column in (
+                (False, 'pdf_base64', 'pdf_blob_key'),
+                (True, 'pdf_no_price_base64', 'pdf_no_price_blob_key'),
+            ):
+                value = getattr(profile, column)
+                if not value:
+                    if value is not None:
+                        setattr(profile, column, None)
+                    continue
+                try:
+                    pdf_bytes = decode_pdf_base64(value)
+                except ValueError:
+                    stats['failed'] += 1
+                    continue
+                setattr(profile, key_column, store_profile_pdf(profile, pdf_bytes, no_price))
+                setattr(profile, column, None)
+                stats['blobs'] += 1
+                stats['bytes'] += len(pdf_bytes)
+            stats['profiles'] += 1
+        db.session.commit()
+        db.session.expunge_all()
+        if progress:
+            progress(dict(stats))
+    return stats
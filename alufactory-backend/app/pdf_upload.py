@@ -0,0 +1,172 @@
+"""Streaming PDF uploads: raw or multipart bodies piped to the blob store in chunks.
+
+The body is read from ``request.stream`` and never buffered whole: a reader hashes
+(SHA-256), counts and size-checks each chunk as the blob store pulls it, so an
+oversized upload is cut off at the limit and the partial blob is discarded. Progress
+is kept per upload id (``X-Upload-Id``) in this process for polling clients.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 64 * 1024
+PDF_MAGIC = b'%PDF-'
+# Small form fields (e.g. pdf_type) sent before the file part.
+MAX_FORM_FIELD_BYTES = 4 * 1024
+PROGRESS_TTL_SECONDS = 600
+
+_progress_lock = threading.Lock()
+_progress: Dict[str, Dict] = {}
+
+
+class UploadError(ValueError):
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+def iter_request_body(stream, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_multipart_file(stream, boundary: str, fields: Dict[str, str], file_field: str = 'file') -> Iterator[bytes]:
+    """Yield the bytes of the ``file_field`` part as they arrive.
+
+    Plain fields that precede the file part are collected into ``fields``; anything
+    after the file is not read.
+    """
+    # Field sizes are checked below; the decoder's own limit would count whole body chunks.
+    decoder = MultipartDecoder(boundary.encode('latin-1'))
+    chunks = iter_request_body(stream)
+    current = None
+    field_value = bytearray()
+    exhausted = False
+    while True:
+        try:
+            event = decoder.next_event()
+        except ValueError as error:
+            raise UploadError(f'Malformed multipart body: {error}') from error
+        if isinstance(event, NeedData):
+            if exhausted:
+                break
+            chunk = next(chunks, None)
+            exhausted = chunk is None
+            decoder.receive_data(chunk)
+        elif isinstance(event, Epilogue):
+            break
+        elif isinstance(event, (Field, File)):
+            current = event
+            field_value = bytearray()
+        elif isinstance(event, Data):
+            if isinstance(current, File) and current.name == file_field:
+                if event.data:
+                    yield event.data
+                if not event.more_data:
+                    return
+            elif isinstance(current, Field):
+                field_value += event.data
+                if len(field_value) > MAX_FORM_FIELD_BYTES:
+                    raise UploadError(f'Form field {current.name} is too large')
+                if not event.more_data:
+                    fields[current.name] = field_value.decode('utf-8', 'replace')
+    raise UploadError(f'Missing file part "{file_field}"')
+
+
+class HashingUploadReader:
+    """File-like view over body chunks that hashes, counts and limits what is read."""
+
+    def __init__(self, chunks: Iterable[bytes], max_bytes: int, upload_id: Optional[str] = None, require_pdf: bool = True):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self._head = b''
+        self._sha256 = hashlib.sha256()
+        self._require_pdf = require_pdf
+        self._done = False
+        self.max_bytes = max_bytes
+        self.upload_id = upload_id
+        self.size = 0
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def _check_head(self, final: bool):
+        if not self._require_pdf or (len(self._head) < len(PDF_MAGIC) and not final):
+            return
+        if self.size == 0:
+            raise UploadError('Empty upload')
+        if not self._head.startswith(PDF_MAGIC):
+            raise UploadError('Uploaded file is not a PDF')
+        self._require_pdf = False
+
+    def _pull(self) -> bytes:
+        chunk = b'' if self._done else next(self._chunks, b'')
+        if not chunk:
+            self._done = True
+            self._check_head(final=True)
+            return b''
+        self.size += len(chunk)
+        if self.upload_id:
+            update_upload_progress(self.upload_id, received=self.size)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f'PDF exceeds the {self.max_bytes} byte limit')
+        self._sha256.update(chunk)
+        if len(self._head) < len(PDF_MAGIC):
+            self._head += chunk[:len(PDF_MAGIC) - len(self._head)]
+            self._check_head(final=False)
+        return chunk
+
+    def read(self, size: int = -1) -> bytes:
+        while size is None or size < 0 or len(self._buffer) < size:
+            chunk = self._pull()
+            if not chunk:
+                break
+            self._buffer = self._buffer + chunk if self._buffer else chunk
+        if size is None or size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _prune_progress(now: float):
+    for upload_id in [key for key, entry in _progress.items() if now - entry['updated'] > PROGRESS_TTL_SECONDS]:
+        _progress.pop(upload_id, None)
+
+
+def start_upload_progress(upload_id: str, order_id: str, user_id: str, expected: Optional[int]):
+    now = time.time()
+    with _progress_lock:
+        _prune_progress(now)
+        _progress[upload_id] = {
+            'upload_id': upload_id,
+            'order_id': order_id,
+            'user_id': user_id,
+            'status': 'receiving',
+            'received': 0,
+            'expected': expected,
+            'error': None,
+            'updated': now,
+        }
+
+
+def update_upload_progress(upload_id: str, **changes):
+    with _progress_lock:
+        entry = _progress.get(upload_id)
+        if entry is not None:
+            entry.update(changes, updated=time.time())
+
+
+def get_upload_progress(upload_id: str) -> Optional[Dict]:
+    with _progress_lock:
+        entry = _progress.get(upload_id)
+        return dict(entry) if entry else None
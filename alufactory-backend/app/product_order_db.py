@@ -1,11 +1,24 @@
 import os
 import sqlite3
 import json
-import base64
-import io
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+from app.item_classifier import classify_order_item
+from app.sketch_cache import (
+    SketchSpec,
+    load_sketch_png,
+    prepare_sketches,
+    remember_sketches,
+    sketch_key,
+    sketch_spec,
+    sketch_url,
+    store_sketches,
+)
+
 
 CATEGORY_LABELS = {
     'all': '总订单管理',
@@ -49,29 +62,32 @@ def _build_progress_lookup_key(
     )
 
 
-def _load_existing_task_progress(conn: sqlite3.Connection, order_id: str) -> Dict[Tuple[int, str, str, str, str], str]:
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
-        '''
-        SELECT is_total_order, category_code, item_id, item_product_id, item_name, task_progress
-        FROM product_order_entries
-        WHERE source_order_id = ?
-        ''',
-        (str(order_id),),
-    ).fetchall()
-
-    progress_map: Dict[Tuple[int, str, str, str, str], str] = {}
-    for row in rows:
-        progress_map[
-            _build_progress_lookup_key(
-                row['is_total_order'],
-                row['category_code'],
-                row['item_id'],
-                row['item_product_id'],
-                row['item_name'],
-            )
-        ] = normalize_task_progress(row['task_progress'])
-    return progress_map
+def _load_existing_task_progress(
+    conn: sqlite3.Connection,
+    order_ids: List[str],
+) -> Dict[str, Dict[Tuple[int, str, str, str, str], str]]:
+    """Map each order id to its ``{lookup key: task_progress}`` table in one pass per chunk."""
+    progress_maps: Dict[str, Dict[Tuple[int, str, str, str, str], str]] = {}
+    for order_ids_chunk in _chunked(order_ids):
+        rows = conn.execute(
+            f'''
+            SELECT source_order_id, is_total_order, category_code, item_id, item_product_id, item_name, task_progress
+            FROM product_order_entries
+            WHERE source_order_id IN ({', '.join('?' for _ in order_ids_chunk)})
+            ''',
+            order_ids_chunk,
+        ).fetchall()
+        for row in rows:
+            progress_maps.setdefault(str(row['source_order_id']), {})[
+                _build_progress_lookup_key(
+                    row['is_total_order'],
+                    row['category_code'],
+                    row['item_id'],
+                    row['item_product_id'],
+                    row['item_name'],
+                )
+            ] = normalize_task_progress(row['task_progress'])
+    return progress_maps
 
 
 def _resolve_existing_task_progress(
@@ -102,53 +118,81 @@ def _normalize_text(value):
     return str(value or '').strip().lower()
 
 
+def _text_value(value) -> Optional[str]:
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, (int, float)):
+        return str(value)
+    return None
+
+
 def _pick_first_non_empty(*values) -> Optional[str]:
     for value in values:
-        if value is None:
-            continue
-        if isinstance(value, str):
-            text = value.strip()
-            if text:
-                return text
-            continue
-        if isinstance(value, (int, float)):
-            return str(value)
+        text = _text_value(value)
+        if text is not None:
+            return text
     return None
 
 
+# Colour keys of an item config, highest priority first. ``color`` and ``selectedColor``
+# may also hold a dict, whose ``_NESTED_COLOR_FIELDS`` rank below every top-level key.
+_COLOR_KEYS = (
+    'colorName', 'color_name', 'colorLabel', 'color_label', 'displayColorName',
+    'materialColorName', 'boardColorName', 'color', 'colour', 'materialColor', 'boardColor',
+    'selectedColorName', 'colorId', 'colourId', 'materialColorId', 'boardColorId',
+)
+_NESTED_COLOR_FIELDS = ('name', 'label', 'value', 'id')
+_COLOR_KEY_RANKS = {key: rank for rank, key in enumerate(_COLOR_KEYS)}
+_NESTED_COLOR_RANKS = {
+    key: len(_COLOR_KEYS) + index * len(_NESTED_COLOR_FIELDS)
+    for index, key in enumerate(('color', 'selectedColor'))
+}
+
+
 def _extract_color_value(config: Dict) -> Optional[str]:
+    """Highest-ranked non-empty colour in ``config``, found in one walk over its keys."""
     if not isinstance(config, dict):
         return None
-
-    nested_color = config.get('color') if isinstance(config.get('color'), dict) else {}
-    selected_color = config.get('selectedColor') if isinstance(config.get('selectedColor'), dict) else {}
-
-    return _pick_first_non_empty(
-        config.get('colorName'),
-        config.get('color_name'),
-        config.get('colorLabel'),
-        config.get('color_label'),
-        config.get('displayColorName'),
-        config.get('materialColorName'),
-        config.get('boardColorName'),
-        config.get('color'),
-        config.get('colour'),
-        config.get('materialColor'),
-        config.get('boardColor'),
-        config.get('selectedColorName'),
-        config.get('colorId'),
-        config.get('colourId'),
-        config.get('materialColorId'),
-        config.get('boardColorId'),
-        nested_color.get('name'),
-        nested_color.get('label'),
-        nested_color.get('value'),
-        nested_color.get('id'),
-        selected_color.get('name'),
-        selected_color.get('label'),
-        selected_color.get('value'),
-        selected_color.get('id'),
-    )
+    best_rank = len(_COLOR_KEYS) + len(_NESTED_COLOR_RANKS) * len(_NESTED_COLOR_FIELDS)
+    best = None
+    for key, value in config.items():
+        rank = _COLOR_KEY_RANKS.get(key)
+        if rank is not None and rank < best_rank:
+            text = _text_value(value)
+            if text is not None:
+                if rank == 0:
+                    return text
+                best_rank, best = rank, text
+                continue
+        rank = _NESTED_COLOR_RANKS.get(key)
+        if rank is not None and rank < best_rank and isinstance(value, dict):
+            for field in _NESTED_COLOR_FIELDS:
+                if rank >= best_rank:
+                    break
+                text = _text_value(value.get(field))
+                if text is not None:
+                    best_rank, best = rank, text
+                    break
+                rank += 1
+    return best
+
+
+def _parse_item_config(item_config) -> Tuple[Dict, str]:
+    """``(config dict, snapshot text)`` of an item's config, parsed at most once.
+
+    Configs stored as a JSON object string are kept as that text rather than encoded
+    again as a JSON string.
+    """
+    if isinstance(item_config, dict):
+        return item_config, json.dumps(item_config, ensure_ascii=False)
+    if isinstance(item_config, str):
+        try:
+            config = json.loads(item_config)
+        except ValueError:
+            config = None
+        if isinstance(config, dict):
+            return config, item_config
+    return {}, json.dumps(item_config, ensure_ascii=False)
 
 
 def _to_positive_float(value) -> Optional[float]:
@@ -170,81 +214,8 @@ def _normalize_opening_side(value) -> Optional[str]:
     return None
 
 
-def _build_sketch_svg(category_code: str, width: Optional[float], height: Optional[float], opening_side: Optional[str], hinge_positions: List[float]) -> Optional[str]:
-    """Build a PNG data URL sketch (stored in legacy `item_sketch_svg` column for compatibility)."""
-    try:
-        from PIL import Image, ImageDraw
-    except Exception:
-        return None
-
-    w = max(1.0, float(width or 1.0))
-    h = max(1.0, float(height or 1.0))
-    ratio = w / h
-    area_w = 120.0
-    area_h = 80.0
-    rw = area_w
-    rh = rw / ratio
-    if rh > area_h:
-        rh = area_h
-        rw = rh * ratio
-    rx = 5.0 + (area_w - rw) / 2.0
-    ry = 5.0 + (area_h - rh) / 2.0
-
-    canvas_w = 130
-    canvas_h = 90
-    img = Image.new('RGB', (canvas_w, canvas_h), '#f8fafc')
-    draw = ImageDraw.Draw(img)
-
-    x0 = int(round(rx))
-    y0 = int(round(ry))
-    x1 = int(round(rx + rw))
-    y1 = int(round(ry + rh))
-    draw.rounded_rectangle((x0, y0, x1, y1), radius=2, fill='#ffffff', outline='#334155', width=2)
-
-    if category_code == 'pegboard':
-        for c in range(6):
-            for r in range(4):
-                cx = rx + ((c + 1) * rw) / 7.0
-                cy = ry + ((r + 1) * rh) / 5.0
-                draw.ellipse((cx - 1.4, cy - 2.0, cx + 1.4, cy + 2.0), fill='#94a3b8')
-
-    if category_code == 'aluminum_frame_door':
-        for hp in hinge_positions:
-            hp_clamped = max(0.0, min(h, float(hp or 0.0)))
-            hy = ry + (hp_clamped / h) * rh
-            hx = rx if opening_side == 'left' else (rx + rw - 2.5)
-            draw.rounded_rectangle(
-                (int(round(hx)), int(round(hy - 1.2)), int(round(hx + 2.5)), int(round(hy + 1.3))),
-                radius=1,
-                fill='#ef4444',
-            )
-
-        handle_x = (rx + rw - 3.5) if opening_side == 'left' else (rx - 1.0)
-        handle_y = ry + rh / 2.0 - 6.0
-        draw.rounded_rectangle(
-            (
-                int(round(handle_x)),
-                int(round(handle_y)),
-                int(round(handle_x + 3.5)),
-                int(round(handle_y + 12.0)),
-            ),
-            radius=1,
-            fill='#2563eb',
-        )
-
-    buf = io.BytesIO()
-    img.save(buf, format='PNG', optimize=True)
-    encoded = base64.b64encode(buf.getvalue()).decode('ascii')
-    return f'data:image/png;base64,{encoded}'
-
-
 def _extract_item_detail_payload(category_code: str, item_config) -> Dict[str, Optional[str]]:
-    config = item_config if isinstance(item_config, dict) else {}
-    if isinstance(item_config, str):
-        try:
-            config = json.loads(item_config)
-        except Exception:
-            config = {}
+    config = item_config if isinstance(item_config, dict) else _parse_item_config(item_config)[0]
 
     width = _to_positive_float(config.get('width'))
     height = _to_positive_float(config.get('height'))
@@ -269,7 +240,7 @@ def _extract_item_detail_payload(category_code: str, item_config) -> Dict[str, O
         gap_text = '/'.join([f"{float(g):.0f}mm" for g in hinge_gaps if _to_positive_float(g) is not None]) or '-'
         remark = f'铰链{hinge_count}个；上{top_offset:.0f}mm，下{bottom_offset:.0f}mm；间距{gap_text}'
 
-    sketch_svg = _build_sketch_svg(category_code, width, height, opening_side, hinge_positions)
+    sketch = sketch_spec(category_code, width, height, opening_side, hinge_positions)
 
     if category_code == 'accessory':
         size_text = _pick_first_non_empty(config.get('size'), config.get('variantId'), config.get('model'))
@@ -301,7 +272,7 @@ def _extract_item_detail_payload(category_code: str, item_config) -> Dict[str, O
             remark = '；'.join(summary_parts)
 
         opening_side = None
-        sketch_svg = None
+        sketch = None
 
     return {
         'item_width': width,
@@ -310,42 +281,164 @@ def _extract_item_detail_payload(category_code: str, item_config) -> Dict[str, O
         'item_color': color,
         'item_opening_side': opening_side,
         'item_remark': remark or None,
-        'item_sketch_svg': sketch_svg,
+        'item_sketch_spec': sketch,
     }
 
 
-def classify_order_item(product_type: str, product_name: str, product_id: str) -> Optional[str]:
-    ptype = _normalize_text(product_type)
-    pname = _normalize_text(product_name)
-    pid = _normalize_text(product_id)
-
-    if ptype == 'profile' or '铝型材' in pname:
-        return 'profile'
-    if 'aluminum_plate' in ptype or '铝板' in pname or pid == 'p5':
-        return 'aluminum_plate'
-    if 'marine_board' in ptype or '海洋板' in pname or pid == 'p6':
-        return 'marine_board'
-    if 'cabinet_door' in ptype or '铝框门' in pname or pid == 'p3':
-        return 'aluminum_frame_door'
-    if 'calligraphy_cabinet' in ptype or '舒法特柜子' in pname or '宜家舒法特柜子' in pname or '书法特柜子' in pname or '宜家书法特柜子' in pname or pid == 'p7':
-        return 'calligraphy_cabinet'
-    if 'wardrobe' in ptype or '衣柜' in pname or pid == 'p8':
-        return 'wardrobe'
-    if ptype == 'accessory' or '配件' in pname or 'connector' in pname or pid == 'accessory':
-        return 'accessory'
-    if ptype == 'pegboard' or '洞洞板' in pname or pid == 'p1':
-        return 'pegboard'
-    return None
+def order_json_item_rows(order_json) -> List[Dict]:
+    """Per-item detail of an ``order_json`` snapshot, derived as the snapshot rows derive it.
+
+    Unlike the snapshot tabs, unclassified items are kept (``category_code`` None), since
+    documents list every line of the order.
+    """
+    rows = []
+    for item in (order_json or {}).get('items') or []:
+        category_code = classify_order_item(
+            item.get('product_type', ''),
+            item.get('product_name', ''),
+            item.get('product_id', ''),
+        )
+        quantity = int(item.get('quantity') or 0)
+        total_price = float(item.get('total_price') or 0)
+        unit_price = float(item.get('unit_price') or 0)
+        if unit_price <= 0 and quantity > 0:
+            unit_price = total_price / quantity
+        detail = _extract_item_detail_payload(category_code or '', item.get('config'))
+        rows.append({
+            'category_code': category_code,
+            'product_id': item.get('product_id', ''),
+            'product_name': item.get('product_name', ''),
+            'product_type': item.get('product_type', ''),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': total_price,
+            **detail,
+        })
+    return rows
 
 
 def _get_db_path(instance_path: str) -> str:
-    os.makedirs(instance_path, exist_ok=True)
     return os.path.join(instance_path, 'product_orders.db')
 
 
+# Connections are tuned once when opened: WAL lets admin reads proceed while a
+# snapshot sync holds the write lock, and NORMAL sync is durable under WAL.
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',
+)
+
+_schema_lock = threading.Lock()
+_initialized_db_paths = set()
+_thread_local = threading.local()
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _thread_connections() -> Dict[str, sqlite3.Connection]:
+    # Connections must not cross a fork (gunicorn preload), so key the cache by pid.
+    pid = os.getpid()
+    if getattr(_thread_local, 'pid', None) != pid:
+        _thread_local.pid = pid
+        _thread_local.connections = {}
+    return _thread_local.connections
+
+
+def get_product_order_connection(instance_path: str) -> sqlite3.Connection:
+    """Return this thread's long-lived connection, creating the schema on first use only."""
+    db_path = _get_db_path(instance_path)
+    if db_path not in _initialized_db_paths:
+        init_product_order_db(instance_path)
+    connections = _thread_connections()
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = _open_connection(db_path)
+        connections[db_path] = conn
+    return conn
+
+
+@contextmanager
+def product_order_transaction(instance_path: str, immediate: bool = False):
+    """Yield the pooled connection and commit, or roll back so the connection stays reusable.
+
+    ``immediate`` takes the write lock up front so read-then-write sequences cannot be
+    interleaved with another writer.
+    """
+    conn = get_product_order_connection(instance_path)
+    if immediate:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def close_product_order_connections():
+    """Close the calling thread's pooled connections (worker shutdown and tests)."""
+    connections = _thread_connections()
+    for conn in connections.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    connections.clear()
+
+
+def reset_product_order_db_state(instance_path: str):
+    """Forget cached schema state so the next call re-creates a deleted or replaced DB file."""
+    db_path = _get_db_path(instance_path)
+    with _schema_lock:
+        _initialized_db_paths.discard(db_path)
+    conn = _thread_connections().pop(db_path, None)
+    if conn is not None:
+        conn.close()
+
+
+def check_product_order_db(instance_path: str) -> Dict:
+    """Cheap health probe for the snapshot DB used by `/api/health`."""
+    db_path = _get_db_path(instance_path)
+    if db_path in _initialized_db_paths and not os.path.exists(db_path):
+        # The file was removed underneath us (manual reset); reconnect to a fresh schema.
+        reset_product_order_db_state(instance_path)
+    started = time.perf_counter()
+    try:
+        conn = get_product_order_connection(instance_path)
+        conn.execute('SELECT 1 FROM product_order_entries LIMIT 1').fetchall()
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    except sqlite3.Error as error:
+        reset_product_order_db_state(instance_path)
+        return {'status': 'error', 'error': str(error)}
+    return {
+        'status': 'ok',
+        'journal_mode': journal_mode,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
 def init_product_order_db(instance_path: str):
+    """Create or upgrade the snapshot schema. Runs once per DB path per process."""
     db_path = _get_db_path(instance_path)
-    conn = sqlite3.connect(db_path)
+    with _schema_lock:
+        if db_path in _initialized_db_paths:
+            return
+        os.makedirs(instance_path, exist_ok=True)
+        _create_schema(db_path)
+        _initialized_db_paths.add(db_path)
+
+
+def _create_schema(db_path: str):
+    conn = _open_connection(db_path)
     try:
         conn.execute(
             '''
@@ -387,6 +480,7 @@ def init_product_order_db(instance_path: str):
                 item_opening_side TEXT,
                 item_remark TEXT,
                 item_sketch_svg TEXT,
+                item_sketch_key TEXT,
                 created_at TEXT,
                 updated_at TEXT,
                 pdf_available INTEGER DEFAULT 0
@@ -412,6 +506,7 @@ def init_product_order_db(instance_path: str):
             'item_opening_side': 'TEXT',
             'item_remark': 'TEXT',
             'item_sketch_svg': 'TEXT',
+            'item_sketch_key': 'TEXT',
             'task_progress': "TEXT DEFAULT 'started'",
         }
         for col, col_type in required_cols.items():
@@ -420,179 +515,261 @@ def init_product_order_db(instance_path: str):
         conn.execute('CREATE INDEX IF NOT EXISTS idx_product_orders_category ON product_order_entries(category_code)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_product_orders_order_id ON product_order_entries(source_order_id)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_product_orders_status ON product_order_entries(status)')
+        # Keyset pagination walks (created_at, id) newest-first, optionally within one category.
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_product_orders_created ON product_order_entries(created_at, id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_product_orders_category_created ON product_order_entries(category_code, created_at, id)')
+        # Durable outbox for app.snapshot_sync_queue: one row per order awaiting a snapshot sync.
+        conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS snapshot_sync_outbox (
+                order_id TEXT PRIMARY KEY,
+                pdf_available INTEGER DEFAULT 0,
+                version INTEGER DEFAULT 1,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                enqueued_at TEXT,
+                next_attempt_at REAL
+            )
+            '''
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_snapshot_sync_outbox_due ON snapshot_sync_outbox(next_attempt_at)')
+        # Checkpoints of the resumable snapshot backfill jobs (see app.snapshot_backfill).
+        conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS snapshot_backfill_state (
+                job TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                last_order_id TEXT,
+                processed INTEGER DEFAULT 0,
+                batches INTEGER DEFAULT 0,
+                total INTEGER,
+                started_at TEXT,
+                updated_at TEXT,
+                finished_at TEXT,
+                last_error TEXT
+            )
+            '''
+        )
+        # Content-addressed sketch images referenced by product_order_entries.item_sketch_key.
+        conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS item_sketches (
+                sketch_key TEXT PRIMARY KEY,
+                mime_type TEXT NOT NULL,
+                image BLOB NOT NULL,
+                created_at TEXT
+            )
+            '''
+        )
         conn.commit()
     finally:
         conn.close()
 
 
+SNAPSHOT_COLUMNS = (
+    'source_order_id', 'order_number', 'category_code', 'category_label', 'is_total_order',
+    'user_id', 'user_name', 'user_phone',
+    'customer_phone', 'recipient_name', 'province', 'address_detail',
+    'shipping_method', 'subtotal', 'shipping_fee', 'total_amount',
+    'status', 'task_progress', 'tracking_number', 'memo', 'admin_memo',
+    'item_id', 'item_product_id', 'item_name', 'item_type', 'item_quantity', 'item_unit_price', 'item_total_price',
+    'item_config',
+    'item_width', 'item_height', 'item_thickness', 'item_color', 'item_opening_side', 'item_remark', 'item_sketch_svg',
+    'item_sketch_key',
+    'created_at', 'updated_at', 'pdf_available',
+)
+_SKETCH_KEY_INDEX = SNAPSHOT_COLUMNS.index('item_sketch_key')
+_SOURCE_ORDER_INDEX = SNAPSHOT_COLUMNS.index('source_order_id')
+_TASK_PROGRESS_INDEX = SNAPSHOT_COLUMNS.index('task_progress')
+_INSERT_SNAPSHOT_SQL = (
+    f"INSERT INTO product_order_entries ({', '.join(SNAPSHOT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in SNAPSHOT_COLUMNS)})"
+)
+# Stay below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds.
+_SQL_IN_CHUNK = 500
+
+
+def _chunked(values: List[str], size: int = _SQL_IN_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
 def _delete_existing_for_order(conn: sqlite3.Connection, order_id: str):
     conn.execute('DELETE FROM product_order_entries WHERE source_order_id = ?', (order_id,))
 
 
-def sync_order_snapshot(instance_path: str, order, user=None, pdf_available: bool = False):
-    init_product_order_db(instance_path)
-    db_path = _get_db_path(instance_path)
-    items = list(getattr(order, 'items', []) or [])
+def _isoformat_or_none(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def build_order_snapshot_rows(order, user=None, pdf_available: bool = False) -> List[Tuple[Dict, list, Optional[SketchSpec]]]:
+    """Build every snapshot row for one order without touching the DB.
+
+    Each entry is ``(task-progress lookup arguments, column values, sketch spec)``; the
+    ``task_progress`` slot is filled in by the writer once existing progress is read
+    inside the write transaction.
+    """
+    order_id = str(order.id)
+    shared = {
+        'order_number': getattr(order, 'order_number', ''),
+        'user_id': getattr(order, 'user_id', ''),
+        'user_name': getattr(user, 'username', '') if user else '',
+        'user_phone': getattr(user, 'phone', '') if user else '',
+        'customer_phone': getattr(order, 'phone', ''),
+        'recipient_name': getattr(order, 'recipient_name', ''),
+        'province': getattr(order, 'province', ''),
+        'address_detail': getattr(order, 'address_detail', ''),
+        'shipping_method': getattr(order, 'shipping_method', ''),
+        'status': getattr(order, 'status', ''),
+        'tracking_number': getattr(order, 'tracking_number', ''),
+        'memo': getattr(order, 'memo', ''),
+        'admin_memo': getattr(order, 'admin_memo', ''),
+        'created_at': _isoformat_or_none(getattr(order, 'created_at', None)),
+        'updated_at': _isoformat_or_none(getattr(order, 'updated_at', None)),
+        'pdf_available': 1 if pdf_available else 0,
+    }
 
-    conn = sqlite3.connect(db_path)
-    try:
-        existing_progress_map = _load_existing_task_progress(conn, str(order.id))
-        _delete_existing_for_order(conn, str(order.id))
+    # 1) Total-order row (总订单)
+    rows = [(
+        {
+            'is_total_order': 1,
+            'category_code': 'all',
+            'item_id': None,
+            'item_product_id': None,
+            'item_name': 'ALL_ITEMS',
+        },
+        {
+            **shared,
+            'source_order_id': order_id,
+            'category_code': 'all',
+            'category_label': CATEGORY_LABELS.get('all', '总订单管理'),
+            'is_total_order': 1,
+            'subtotal': float(getattr(order, 'subtotal', 0) or 0),
+            'shipping_fee': float(getattr(order, 'shipping_fee', 0) or 0),
+            'total_amount': float(getattr(order, 'total_amount', 0) or 0),
+            'item_name': 'ALL_ITEMS',
+            'item_type': 'ALL',
+            'item_quantity': 0,
+            'item_unit_price': 0,
+            'item_total_price': 0,
+        },
+        None,
+    )]
+
+    # 2) Section-item rows (one row per item, grouped by category tabs)
+    for item in list(getattr(order, 'items', []) or []):
+        category_code = classify_order_item(
+            getattr(item, 'product_type', ''),
+            getattr(item, 'product_name', ''),
+            getattr(item, 'product_id', ''),
+        )
+        if not category_code:
+            continue
+        item_qty = int(getattr(item, 'quantity', 0) or 0)
+        item_total = float(getattr(item, 'total_price', 0) or 0)
+        item_unit = float(getattr(item, 'unit_price', 0) or 0)
+        if item_unit <= 0 and item_qty > 0:
+            item_unit = item_total / item_qty
+        item_config, item_config_text = _parse_item_config(getattr(item, 'config', None))
+        detail_payload = _extract_item_detail_payload(category_code, item_config)
+        spec = detail_payload.pop('item_sketch_spec')
+        rows.append((
+            {
+                'is_total_order': 0,
+                'category_code': category_code,
+                'item_id': getattr(item, 'id', ''),
+                'item_product_id': getattr(item, 'product_id', ''),
+                'item_name': getattr(item, 'product_name', ''),
+            },
+            {
+                **shared,
+                **detail_payload,
+                'item_sketch_key': sketch_key(spec) if spec else None,
+                'source_order_id': order_id,
+                'category_code': category_code,
+                'category_label': CATEGORY_LABELS.get(category_code, category_code),
+                'is_total_order': 0,
+                'subtotal': item_total,
+                'shipping_fee': 0.0,
+                'total_amount': item_total,
+                'item_id': getattr(item, 'id', ''),
+                'item_product_id': getattr(item, 'product_id', ''),
+                'item_name': getattr(item, 'product_name', ''),
+                'item_type': getattr(item, 'product_type', ''),
+                'item_quantity': item_qty,
+                'item_unit_price': item_unit,
+                'item_total_price': item_total,
+                'item_config': item_config_text,
+            },
+            spec,
+        ))
+    return [
+        (lookup, [values.get(column) for column in SNAPSHOT_COLUMNS], spec)
+        for lookup, values, spec in rows
+    ]
 
-        # 1) Total-order row (总订单)
+
+def _write_snapshot_rows(conn: sqlite3.Connection, order_ids: List[str], pending_rows: List[Tuple[Dict, list, Optional[SketchSpec]]]) -> int:
+    progress_maps = _load_existing_task_progress(conn, order_ids)
+    for order_ids_chunk in _chunked(order_ids):
         conn.execute(
-            '''
-            INSERT INTO product_order_entries (
-                source_order_id, order_number, category_code, category_label, is_total_order,
-                user_id, user_name, user_phone,
-                customer_phone, recipient_name, province, address_detail,
-                shipping_method, subtotal, shipping_fee, total_amount,
-                status, task_progress, tracking_number, memo, admin_memo,
-                item_id, item_product_id, item_name, item_type, item_quantity, item_unit_price, item_total_price,
-                item_config,
-                item_width, item_height, item_thickness, item_color, item_opening_side, item_remark, item_sketch_svg,
-                created_at, updated_at, pdf_available
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''',
-            (
-                str(order.id),
-                getattr(order, 'order_number', ''),
-                'all',
-                CATEGORY_LABELS.get('all', '总订单管理'),
-                1,
-                getattr(order, 'user_id', ''),
-                getattr(user, 'username', '') if user else '',
-                getattr(user, 'phone', '') if user else '',
-                getattr(order, 'phone', ''),
-                getattr(order, 'recipient_name', ''),
-                getattr(order, 'province', ''),
-                getattr(order, 'address_detail', ''),
-                getattr(order, 'shipping_method', ''),
-                float(getattr(order, 'subtotal', 0) or 0),
-                float(getattr(order, 'shipping_fee', 0) or 0),
-                float(getattr(order, 'total_amount', 0) or 0),
-                getattr(order, 'status', ''),
-                _resolve_existing_task_progress(
-                    existing_progress_map,
-                    is_total_order=1,
-                    category_code='all',
-                    item_id=None,
-                    item_product_id=None,
-                    item_name='ALL_ITEMS',
-                ),
-                getattr(order, 'tracking_number', ''),
-                getattr(order, 'memo', ''),
-                getattr(order, 'admin_memo', ''),
-                None,
-                None,
-                'ALL_ITEMS',
-                'ALL',
-                0,
-                0,
-                0,
-                None,
-                None,
-                None,
-                None,
-                None,
-                None,
-                None,
-                None,
-                getattr(order, 'created_at', None).isoformat() if getattr(order, 'created_at', None) else None,
-                getattr(order, 'updated_at', None).isoformat() if getattr(order, 'updated_at', None) else None,
-                1 if pdf_available else 0,
-            ),
+            f"DELETE FROM product_order_entries WHERE source_order_id IN ({', '.join('?' for _ in order_ids_chunk)})",
+            order_ids_chunk,
+        )
+    params = []
+    for lookup, values, _ in pending_rows:
+        values[_TASK_PROGRESS_INDEX] = _resolve_existing_task_progress(
+            progress_maps.get(values[_SOURCE_ORDER_INDEX], {}),
+            **lookup,
         )
+        params.append(values)
+    conn.executemany(_INSERT_SNAPSHOT_SQL, params)
+    return len(params)
+
+
+def sync_order_snapshots(instance_path: str, entries) -> int:
+    """Rewrite snapshots for many orders in a single write transaction.
+
+    ``entries`` yields ``(order, user, pdf_available)`` tuples. All row tuples are built
+    (classification, detail extraction, sketches) before the write lock is taken, so a
+    backfill of thousands of orders holds the lock only for the DELETE + executemany.
+    Returns the number of snapshot rows written.
+    """
+    latest = {}
+    for order, user, pdf_available in entries:
+        latest[str(order.id)] = (order, user, pdf_available)
+    if not latest:
+        return 0
+
+    pending_rows = []
+    for order, user, pdf_available in latest.values():
+        pending_rows.extend(build_order_snapshot_rows(order, user=user, pdf_available=pdf_available))
+    order_ids = list(latest)
+
+    # Render only sketches neither cache tier has, still outside the write lock.
+    scope = _get_db_path(instance_path)
+    rendered = prepare_sketches(
+        get_product_order_connection(instance_path),
+        scope,
+        (spec for _, _, spec in pending_rows if spec is not None),
+    )
+    for _, values, _ in pending_rows:
+        if values[_SKETCH_KEY_INDEX] not in rendered:
+            values[_SKETCH_KEY_INDEX] = None
 
-        # 2) Section-item rows (one row per item, grouped by category tabs)
-        for item in items:
-            category_code = classify_order_item(
-                getattr(item, 'product_type', ''),
-                getattr(item, 'product_name', ''),
-                getattr(item, 'product_id', ''),
-            )
-            if category_code:
-                item_qty = int(getattr(item, 'quantity', 0) or 0)
-                item_total = float(getattr(item, 'total_price', 0) or 0)
-                item_unit = float(getattr(item, 'unit_price', 0) or 0)
-                if item_unit <= 0 and item_qty > 0:
-                    item_unit = item_total / item_qty
-                item_config = getattr(item, 'config', None)
-                detail_payload = _extract_item_detail_payload(category_code, item_config)
-                conn.execute(
-                    '''
-                    INSERT INTO product_order_entries (
-                        source_order_id, order_number, category_code, category_label, is_total_order,
-                        user_id, user_name, user_phone,
-                        customer_phone, recipient_name, province, address_detail,
-                        shipping_method, subtotal, shipping_fee, total_amount,
-                        status, task_progress, tracking_number, memo, admin_memo,
-                        item_id, item_product_id, item_name, item_type, item_quantity, item_unit_price, item_total_price,
-                        item_config,
-                        item_width, item_height, item_thickness, item_color, item_opening_side, item_remark, item_sketch_svg,
-                        created_at, updated_at, pdf_available
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''',
-                    (
-                        str(order.id),
-                        getattr(order, 'order_number', ''),
-                        category_code,
-                        CATEGORY_LABELS.get(category_code, category_code),
-                        0,
-                        getattr(order, 'user_id', ''),
-                        getattr(user, 'username', '') if user else '',
-                        getattr(user, 'phone', '') if user else '',
-                        getattr(order, 'phone', ''),
-                        getattr(order, 'recipient_name', ''),
-                        getattr(order, 'province', ''),
-                        getattr(order, 'address_detail', ''),
-                        getattr(order, 'shipping_method', ''),
-                        item_total,
-                        0.0,
-                        item_total,
-                        getattr(order, 'status', ''),
-                        _resolve_existing_task_progress(
-                            existing_progress_map,
-                            is_total_order=0,
-                            category_code=category_code,
-                            item_id=getattr(item, 'id', ''),
-                            item_product_id=getattr(item, 'product_id', ''),
-                            item_name=getattr(item, 'product_name', ''),
-                        ),
-                        getattr(order, 'tracking_number', ''),
-                        getattr(order, 'memo', ''),
-                        getattr(order, 'admin_memo', ''),
-                        getattr(item, 'id', ''),
-                        getattr(item, 'product_id', ''),
-                        getattr(item, 'product_name', ''),
-                        getattr(item, 'product_type', ''),
-                        item_qty,
-                        item_unit,
-                        item_total,
-                        json.dumps(item_config, ensure_ascii=False),
-                        detail_payload.get('item_width'),
-                        detail_payload.get('item_height'),
-                        detail_payload.get('item_thickness'),
-                        detail_payload.get('item_color'),
-                        detail_payload.get('item_opening_side'),
-                        detail_payload.get('item_remark'),
-                        detail_payload.get('item_sketch_svg'),
-                        getattr(order, 'created_at', None).isoformat() if getattr(order, 'created_at', None) else None,
-                        getattr(order, 'updated_at', None).isoformat() if getattr(order, 'updated_at', None) else None,
-                        1 if pdf_available else 0,
-                    ),
-                )
-        conn.commit()
-    finally:
-        conn.close()
+    with product_order_transaction(instance_path, immediate=True) as conn:
+        store_sketches(conn, rendered)
+        written = _write_snapshot_rows(conn, order_ids, pending_rows)
+    remember_sketches(scope, rendered)
+    return written
+
+
+def sync_order_snapshot(instance_path: str, order, user=None, pdf_available: bool = False):
+    return sync_order_snapshots(instance_path, [(order, user, pdf_available)])
 
 
 def update_product_order_task_progress(instance_path: str, entry_id: int, task_progress: str) -> Optional[Dict]:
-    init_product_order_db(instance_path)
-    db_path = _get_db_path(instance_path)
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    try:
+    with product_order_transaction(instance_path) as conn:
         normalized_progress = normalize_task_progress(task_progress)
         now_iso = datetime.utcnow().isoformat()
         cursor = conn.execute(
@@ -611,21 +788,22 @@ def update_product_order_task_progress(instance_path: str, entry_id: int, task_p
             'SELECT * FROM product_order_entries WHERE id = ?',
             (int(entry_id),),
         ).fetchone()
-        conn.commit()
         return dict(row) if row else None
-    finally:
-        conn.close()
 
 
 def remove_order_snapshot(instance_path: str, order_id: str):
-    init_product_order_db(instance_path)
-    db_path = _get_db_path(instance_path)
-    conn = sqlite3.connect(db_path)
-    try:
+    with product_order_transaction(instance_path) as conn:
         _delete_existing_for_order(conn, str(order_id))
-        conn.commit()
-    finally:
-        conn.close()
+
+
+def _snapshot_entry(row: sqlite3.Row) -> Dict:
+    entry = dict(row)
+    entry['item_sketch_url'] = sketch_url(entry.get('item_sketch_key'))
+    return entry
+
+
+def load_item_sketch(instance_path: str, key: str) -> Optional[bytes]:
+    return load_sketch_png(get_product_order_connection(instance_path), _get_db_path(instance_path), key)
 
 
 def query_order_snapshots(
@@ -635,11 +813,7 @@ def query_order_snapshots(
     page: int = 1,
     per_page: int = 50,
 ) -> Tuple[List[Dict], int]:
-    init_product_order_db(instance_path)
-    db_path = _get_db_path(instance_path)
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    try:
+    with product_order_transaction(instance_path) as conn:
         where = []
         params = []
 
@@ -670,38 +844,125 @@ def query_order_snapshots(
             [*params, per_page, offset],
         ).fetchall()
 
-        return [dict(r) for r in rows], total
-    finally:
-        conn.close()
+        return [_snapshot_entry(r) for r in rows], total
+
+
+def query_order_snapshots_after(
+    instance_path: str,
+    category_code: Optional[str] = None,
+    status: Optional[str] = None,
+    after: Optional[Tuple[Optional[str], int]] = None,
+    limit: int = 50,
+    include_total: bool = False,
+) -> Tuple[List[Dict], Optional[Tuple[Optional[str], int]], Optional[int]]:
+    """Keyset page of snapshots newest-first, starting after the ``(created_at, id)`` key.
+
+    Returns ``(entries, next_key, total)``; ``next_key`` is None on the last page and
+    ``total`` is only counted when ``include_total`` is set.
+    """
+    with product_order_transaction(instance_path) as conn:
+        where = []
+        params = []
+
+        if category_code:
+            where.append('category_code = ?')
+            params.append(category_code)
+        if status:
+            where.append('status = ?')
+            params.append(status)
+
+        total = None
+        if include_total:
+            where_sql = f"WHERE {' AND '.join(where)}" if where else ''
+            total = conn.execute(f'SELECT COUNT(*) AS c FROM product_order_entries {where_sql}', params).fetchone()['c']
+
+        def page(conditions, page_params, count):
+            where_sql = f"WHERE {' AND '.join(where + conditions)}" if where or conditions else ''
+            return conn.execute(
+                f'''
+                SELECT *
+                FROM product_order_entries
+                {where_sql}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+                ''',
+                [*params, *page_params, count],
+            ).fetchall()
+
+        limit = max(1, min(200, int(limit or 50)))
+        if after is None:
+            rows = page([], [], limit + 1)
+        else:
+            after_created_at, after_id = after
+            # NULL created_at sorts last in DESC order, after every dated row.
+            if after_created_at is None:
+                rows = page(['created_at IS NULL', 'id < ?'], [int(after_id)], limit + 1)
+            else:
+                # No "OR created_at IS NULL" here: that would turn the index range
+                # search into a full index scan. Undated rows are a final phase instead.
+                rows = page(['(created_at, id) < (?, ?)'], [after_created_at, int(after_id)], limit + 1)
+                if len(rows) <= limit:
+                    rows += page(['created_at IS NULL'], [], limit + 1 - len(rows))
+
+        entries = [_snapshot_entry(r) for r in rows[:limit]]
+        next_key = (entries[-1]['created_at'], entries[-1]['id']) if len(rows) > limit else None
+        return entries, next_key, total
+
+
+def iter_order_snapshots(
+    instance_path: str,
+    category_code: Optional[str] = None,
+    status: Optional[str] = None,
+    batch_size: int = 200,
+):
+    """Every matching snapshot newest-first, read in keyset batches so memory stays flat."""
+    after = None
+    while True:
+        entries, after, _total = query_order_snapshots_after(
+            instance_path,
+            category_code=category_code,
+            status=status,
+            after=after,
+            limit=batch_size,
+        )
+        yield from entries
+        if after is None:
+            return
 
 
 def find_order_ids_with_missing_item_details(
     instance_path: str,
     category_code: Optional[str] = None,
     limit: int = 200,
+    after_order_id: Optional[str] = None,
 ) -> List[str]:
-    init_product_order_db(instance_path)
-    db_path = _get_db_path(instance_path)
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    try:
+    """Order ids whose item rows predate the detail columns.
+
+    With ``after_order_id`` the ids are returned in ascending order past that id, so a
+    backfill can checkpoint on the last id it repaired.
+    """
+    with product_order_transaction(instance_path) as conn:
         where = [
             'is_total_order = 0',
-            '(item_config IS NOT NULL AND TRIM(item_config) <> "" AND item_config <> "null" AND (((item_width IS NULL OR item_height IS NULL) OR item_sketch_svg IS NULL OR item_sketch_svg = "" OR item_sketch_svg LIKE "<svg%") OR item_color IS NULL OR TRIM(item_color) = ""))',
+            '(item_config IS NOT NULL AND TRIM(item_config) <> "" AND item_config <> "null" AND ((item_width IS NULL OR item_height IS NULL) OR (category_code <> "accessory" AND (item_sketch_key IS NULL OR item_sketch_key = "") AND (item_sketch_svg IS NULL OR item_sketch_svg = "" OR item_sketch_svg LIKE "<svg%")) OR item_color IS NULL OR TRIM(item_color) = ""))',
         ]
         params = []
         if category_code:
             where.append('category_code = ?')
             params.append(category_code)
 
+        order_sql = 'ORDER BY updated_at DESC, created_at DESC, id DESC'
+        if after_order_id is not None:
+            where.append('source_order_id > ?')
+            params.append(after_order_id)
+            order_sql = 'ORDER BY source_order_id'
+
         sql = f'''
             SELECT DISTINCT source_order_id
             FROM product_order_entries
             WHERE {' AND '.join(where)}
-            ORDER BY updated_at DESC, created_at DESC, id DESC
+            {order_sql}
             LIMIT ?
         '''
         rows = conn.execute(sql, [*params, max(1, min(1000, int(limit or 200)))]).fetchall()
         return [str(r['source_order_id']) for r in rows if r['source_order_id']]
-    finally:
-        conn.close()
@@ -0,0 +1,46 @@
+"""XLSX export of the product-order snapshot tabs, streamed while the rows are read."""
+from typing import Optional
+
+from app.product_order_db import iter_order_snapshots
+from app.profile_inventory import iter_xlsx
+
+# (header, snapshot column, column width)
+PRODUCT_ORDER_EXPORT_COLUMNS = (
+    ('订单号', 'order_number', 24),
+    ('分类', 'category_label', 20),
+    ('客户', 'user_name', 14),
+    ('客户手机', 'user_phone', 16),
+    ('收货人', 'recipient_name', 12),
+    ('收货电话', 'customer_phone', 16),
+    ('省份', 'province', 10),
+    ('详细地址', 'address_detail', 30),
+    ('商品', 'item_name', 24),
+    ('数量', 'item_quantity', 8),
+    ('单价', 'item_unit_price', 10),
+    ('金额', 'total_amount', 12),
+    ('宽(mm)', 'item_width', 10),
+    ('高(mm)', 'item_height', 10),
+    ('厚度/规格', 'item_thickness', 12),
+    ('颜色', 'item_color', 12),
+    ('开门方向', 'item_opening_side', 10),
+    ('备注', 'item_remark', 30),
+    ('订单状态', 'status', 12),
+    ('任务进度', 'task_progress', 12),
+    ('下单时间', 'created_at', 20),
+)
+_NUMBER_FIELDS = ('item_quantity', 'item_unit_price', 'total_amount', 'item_width', 'item_height')
+
+
+def iter_product_orders_xlsx(instance_path: str, category_code: Optional[str] = None, status: Optional[str] = None):
+    fields = [field for _header, field, _width in PRODUCT_ORDER_EXPORT_COLUMNS]
+    rows = (
+        tuple(entry.get(field) for field in fields)
+        for entry in iter_order_snapshots(instance_path, category_code=category_code, status=status)
+    )
+    return iter_xlsx(
+        '产品订单',
+        tuple(header for header, _field, _width in PRODUCT_ORDER_EXPORT_COLUMNS),
+        rows,
+        tuple(width for _header, _field, width in PRODUCT_ORDER_EXPORT_COLUMNS),
+        number_columns=tuple(fields.index(field) + 1 for field in _NUMBER_FIELDS),
+    )
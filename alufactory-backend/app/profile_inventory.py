@@ -2,10 +2,13 @@
 from collections import defaultdict
 from datetime import datetime
 from io import BytesIO
+from itertools import chain
 from xml.etree import ElementTree as ET
-from zipfile import ZIP_DEFLATED, ZipFile
+from zipfile import ZIP_DEFLATED, BadZipFile, ZipFile
 
+from app.bulk_upsert import upsert_rows
 from app.models.user import ProfileInventory, db
+from app.stock_cache import PROFILE_STOCK, bump_stock_version
 
 
 PROFILE_VARIANTS = (
@@ -90,71 +93,186 @@ def _xlsx_cell(ref, value, style=0):
     return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t>{_xml_escape(value)}</t></is></c>'
 
 
-def build_inventory_xlsx(rows):
-    data_rows = [
-        INVENTORY_HEADERS,
-        *[
-            (
-                row.variant_id,
-                row.color_id,
-                INVENTORY_COLORS.get(row.color_id, row.color_id),
-                float(row.bar_length_m),
-                int(row.bar_count),
-                row.total_meters,
-            )
-            for row in rows
-        ],
-    ]
-    sheet_rows = []
-    for row_index, values in enumerate(data_rows, start=1):
-        cells = ''.join(
-            _xlsx_cell(f'{_column_name(column_index)}{row_index}', value, 1 if row_index == 1 else (2 if column_index >= 4 else 0))
-            for column_index, value in enumerate(values, start=1)
-        )
-        sheet_rows.append(f'<row r="{row_index}">{cells}</row>')
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Compressed bytes are handed to the response once this much has accumulated.
+XLSX_STREAM_CHUNK_SIZE = 64 * 1024
 
-    worksheet = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
-  <dimension ref="A1:F{len(data_rows)}"/>
-  <sheetViews><sheetView showGridLines="0" workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>
-  <cols><col min="1" max="1" width="18" customWidth="1"/><col min="2" max="2" width="20" customWidth="1"/><col min="3" max="3" width="16" customWidth="1"/><col min="4" max="6" width="16" customWidth="1"/></cols>
-  <sheetData>{''.join(sheet_rows)}</sheetData>
-  <autoFilter ref="A1:F{len(data_rows)}"/>
-</worksheet>'''
-    styles = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+_XLSX_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/><Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/><Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/></Types>'''
+_XLSX_ROOT_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>'''
+_XLSX_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/><Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>'''
+
+
+def _xlsx_styles(header_fill, number_format_id):
+    # Style 0: body text, 1: white bold header on ``header_fill``, 2: numeric body cell.
+    return f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
   <fonts count="2"><font><sz val="11"/><name val="Aptos"/></font><font><b/><color rgb="FFFFFFFF"/><sz val="11"/><name val="Aptos"/></font></fonts>
-  <fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill><fill><patternFill patternType="solid"><fgColor rgb="FF1D4ED8"/><bgColor indexed="64"/></patternFill></fill></fills>
+  <fills count="3"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill><fill><patternFill patternType="solid"><fgColor rgb="{header_fill}"/><bgColor indexed="64"/></patternFill></fill></fills>
   <borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
   <cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
-  <cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFill="1" applyFont="1"/><xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>
+  <cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFill="1" applyFont="1"/><xf numFmtId="{number_format_id}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>
   <cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
 </styleSheet>'''
-    content_types = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/><Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/><Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/><Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/></Types>'''
-    root_rels = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>'''
-    workbook = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets><sheet name="型材库存" sheetId="1" r:id="rId1"/></sheets></workbook>'''
-    workbook_rels = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/><Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/></Relationships>'''
-
-    output = BytesIO()
-    with ZipFile(output, 'w', ZIP_DEFLATED) as archive:
-        archive.writestr('[Content_Types].xml', content_types)
-        archive.writestr('_rels/.rels', root_rels)
+
+
+class _ZipChunkSink:
+    """Write-only, unseekable file for ``ZipFile``; the writer drains it between rows."""
+
+    def __init__(self):
+        self._parts = []
+        self.size = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        self.size = 0
+        return data
+
+
+def iter_xlsx(sheet_name, headers, rows, column_widths, number_columns=(), header_fill='FF1D4ED8', number_format_id=2):
+    """Yield a one-sheet workbook as compressed chunks while ``rows`` is consumed.
+
+    Each row is turned into XML and deflated straight into the zip stream, so memory
+    stays flat however many rows there are. ``number_columns`` are 1-based column
+    indexes that get the numeric body style; ``None`` values leave the cell empty.
+    """
+    sink = _ZipChunkSink()
+    last_column = _column_name(len(headers))
+    cols = ''.join(
+        f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+        for index, width in enumerate(column_widths, start=1)
+    )
+    workbook = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?><workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{_xml_escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    )
+    with ZipFile(sink, 'w', ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
         archive.writestr('xl/workbook.xml', workbook)
-        archive.writestr('xl/_rels/workbook.xml.rels', workbook_rels)
-        archive.writestr('xl/styles.xml', styles)
-        archive.writestr('xl/worksheets/sheet1.xml', worksheet)
-    output.seek(0)
-    return output
+        archive.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _xlsx_styles(header_fill, number_format_id))
+        # The row count is unknown up front, so the optional <dimension> is left out.
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+  <sheetViews><sheetView showGridLines="0" workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>
+  <cols>{cols}</cols>
+  <sheetData>'''.encode('utf-8'))
+            row_index = 0
+            for row_index, values in enumerate(chain((headers,), rows), start=1):
+                cells = ''.join(
+                    _xlsx_cell(
+                        f'{_column_name(column_index)}{row_index}', value,
+                        1 if row_index == 1 else (2 if column_index in number_columns else 0),
+                    )
+                    for column_index, value in enumerate(values, start=1)
+                    if value is not None
+                )
+                sheet.write(f'<row r="{row_index}">{cells}</row>'.encode('utf-8'))
+                if sink.size >= XLSX_STREAM_CHUNK_SIZE:
+                    yield sink.drain()
+            sheet.write(f'''</sheetData>
+  <autoFilter ref="A1:{last_column}{row_index}"/>
+</worksheet>'''.encode('utf-8'))
+    yield sink.drain()
+
+
+def _inventory_rows(rows):
+    for row in rows:
+        yield (
+            row.variant_id,
+            row.color_id,
+            INVENTORY_COLORS.get(row.color_id, row.color_id),
+            float(row.bar_length_m),
+            int(row.bar_count),
+            row.total_meters,
+        )
+
+
+def iter_inventory_xlsx(rows):
+    return iter_xlsx('型材库存', INVENTORY_HEADERS, _inventory_rows(rows), (18, 20, 16, 16, 16, 16), number_columns=(4, 5, 6))
+
+
+def build_inventory_xlsx(rows):
+    return BytesIO(b''.join(iter_inventory_xlsx(rows)))
+
+
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_DOC_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# Validation keeps going after the first bad cell, up to this many errors.
+MAX_IMPORT_ERRORS = 50
+
+
+class XlsxImportError(ValueError):
+    """Rejected upload; ``errors`` holds ``{'row', 'cell', 'message'}`` for each bad cell."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        message = _format_import_error(errors[0])
+        if len(errors) > 1:
+            message += f'（另有{len(errors) - 1}处错误）'
+        super().__init__(message)
+
+
+def _format_import_error(error):
+    if error.get('cell'):
+        return f"第{error['row']}行（{error['cell']}）{error['message']}"
+    return error['message']
+
+
+def _import_error(row, column, message):
+    return {'row': row, 'cell': f'{column}{row}' if column else None, 'message': message}
+
+
+def _element_text(element):
+    # Plain <t> or rich-text runs; phonetic hints (<rPh>) are not part of the value.
+    direct = element.find(f'{_SHEET_NS}t')
+    if direct is not None:
+        return direct.text or ''
+    return ''.join(run.findtext(f'{_SHEET_NS}t') or '' for run in element.findall(f'{_SHEET_NS}r'))
+
+
+def _shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as handle:
+        for _event, element in ET.iterparse(handle):
+            if element.tag == f'{_SHEET_NS}si':
+                strings.append(_element_text(element))
+                element.clear()
+    return strings
+
+
+def _first_sheet_path(archive):
+    """Path of the first worksheet, as listed in the workbook rather than assumed."""
+    try:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        relationships = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        rel_id = workbook.find(f'{_SHEET_NS}sheets/{_SHEET_NS}sheet').get(f'{_DOC_REL_NS}id')
+        target = next(rel.get('Target') for rel in relationships if rel.get('Id') == rel_id)
+    except (KeyError, AttributeError, StopIteration, ET.ParseError):
+        return 'xl/worksheets/sheet1.xml'
+    return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
 
 
 def _cell_value(cell, shared_strings):
-    namespace = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-    cell_type = cell.attrib.get('t')
+    cell_type = cell.get('t')
     if cell_type == 'inlineStr':
-        return ''.join(node.text or '' for node in cell.findall('.//m:t', namespace))
-    value_node = cell.find('m:v', namespace)
-    raw = value_node.text if value_node is not None else ''
+        inline = cell.find(f'{_SHEET_NS}is')
+        return _element_text(inline) if inline is not None else ''
+    raw = cell.findtext(f'{_SHEET_NS}v') or ''
     if cell_type == 's':
         try:
             return shared_strings[int(raw)]
@@ -163,66 +281,155 @@ def _cell_value(cell, shared_strings):
     return raw
 
 
-def parse_inventory_xlsx(file_stream):
-    namespace = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-    with ZipFile(file_stream) as archive:
-        shared_strings = []
-        if 'xl/sharedStrings.xml' in archive.namelist():
-            root = ET.fromstring(archive.read('xl/sharedStrings.xml'))
-            shared_strings = [''.join(node.text or '' for node in item.findall('.//m:t', namespace)) for item in root.findall('m:si', namespace)]
-        sheet_path = 'xl/worksheets/sheet1.xml'
-        root = ET.fromstring(archive.read(sheet_path))
-        parsed_rows = []
-        for row in root.findall('.//m:sheetData/m:row', namespace):
-            values = {}
-            for cell in row.findall('m:c', namespace):
-                ref = cell.attrib.get('r', '')
-                column = ''.join(ch for ch in ref if ch.isalpha())
-                values[column] = _cell_value(cell, shared_strings)
-            parsed_rows.append([values.get(column, '') for column in ('A', 'B', 'C', 'D', 'E', 'F')])
-
-    if not parsed_rows:
-        raise ValueError('Excel中没有库存数据')
-    header = [str(value).strip() for value in parsed_rows[0]]
-    if header[:5] != list(INVENTORY_HEADERS[:5]):
-        raise ValueError('Excel列格式不正确，请先下载库存模板后再编辑上传')
+def iter_xlsx_rows(file_stream, columns):
+    """Yield ``(row_number, values)`` for the first sheet, one row in memory at a time.
+
+    The sheet is read with ``iterparse`` and every row element is cleared and detached
+    once read; shared strings are loaded into a lookup list first. ``values`` follow
+    ``columns`` (letters such as ``'ABCDE'``). Unreadable files raise ``XlsxImportError``.
+    """
+    try:
+        with ZipFile(file_stream) as archive:
+            shared_strings = _shared_strings(archive)
+            with archive.open(_first_sheet_path(archive)) as handle:
+                sheet_data = None
+                row_number = 0
+                for event, element in ET.iterparse(handle, events=('start', 'end')):
+                    if event == 'start':
+                        if element.tag == f'{_SHEET_NS}sheetData':
+                            sheet_data = element
+                        continue
+                    if element.tag != f'{_SHEET_NS}row':
+                        continue
+                    row_number = int(element.get('r') or row_number + 1)
+                    values = {}
+                    for position, cell in enumerate(element.findall(f'{_SHEET_NS}c'), start=1):
+                        column = ''.join(ch for ch in cell.get('r', '') if ch.isalpha()) or _column_name(position)
+                        values[column] = _cell_value(cell, shared_strings)
+                    yield row_number, [values.get(column, '') for column in columns]
+                    element.clear()
+                    if sheet_data is not None:
+                        sheet_data.remove(element)
+    except (BadZipFile, KeyError, ET.ParseError) as error:
+        raise XlsxImportError([_import_error(None, None, f'Excel文件无法读取：{error}')]) from error
+
+
+def parse_xlsx_records(file_stream, headers, empty_message, header_message, parse_row):
+    """Validate every row with ``parse_row(row_number, values, fail)`` and collect the records.
+
+    ``parse_row`` reports problems through ``fail(column, message)`` and returns a record
+    or None. All errors (up to ``MAX_IMPORT_ERRORS``) are raised together.
+    """
+    columns = ''.join(_column_name(index) for index in range(1, len(headers) + 1))
+    rows = iter_xlsx_rows(file_stream, columns)
+    first = next(rows, None)
+    if first is None:
+        raise XlsxImportError([_import_error(None, None, empty_message)])
+    _row_number, header = first
+    if [str(value).strip() for value in header] != list(headers):
+        raise XlsxImportError([_import_error(None, None, header_message)])
 
     records = []
-    for row_number, values in enumerate(parsed_rows[1:], start=2):
+    errors = []
+    for row_number, values in rows:
         if not any(str(value).strip() for value in values):
             continue
-        variant_id = str(values[0]).strip()
-        color_id = str(values[1]).strip()
-        try:
-            bar_length = round(float(values[3]), 2)
-            bar_count = int(float(values[4]))
-        except (TypeError, ValueError):
-            raise ValueError(f'第{row_number}行的单支长度或库存支数不是有效数字')
-        if variant_id not in PROFILE_VARIANTS:
-            raise ValueError(f'第{row_number}行型材型号不支持：{variant_id}')
-        if color_id not in INVENTORY_COLORS:
-            raise ValueError(f'第{row_number}行颜色ID不支持：{color_id}')
-        if bar_length not in ALLOWED_BAR_LENGTHS:
-            raise ValueError(f'第{row_number}行单支长度只能是3.15米')
-        if bar_count < 0:
-            raise ValueError(f'第{row_number}行库存支数不能为负数')
-        records.append((variant_id, color_id, bar_length, bar_count))
+        row_errors = []
+        record = parse_row(row_number, values, lambda column, message: row_errors.append(_import_error(row_number, column, message)))
+        if row_errors:
+            errors.extend(row_errors)
+            if len(errors) >= MAX_IMPORT_ERRORS:
+                break
+        elif record is not None:
+            records.append(record)
+    if errors:
+        raise XlsxImportError(errors[:MAX_IMPORT_ERRORS])
     return records
 
 
+def _parse_inventory_row(row_number, values, fail):
+    variant_id = str(values[0]).strip()
+    color_id = str(values[1]).strip()
+    if variant_id not in PROFILE_VARIANTS:
+        fail('A', f'型材型号不支持：{variant_id}')
+    if color_id not in INVENTORY_COLORS:
+        fail('B', f'颜色ID不支持：{color_id}')
+    try:
+        bar_length = round(float(values[3]), 2)
+    except (TypeError, ValueError):
+        fail('D', '单支长度不是有效数字')
+        bar_length = None
+    else:
+        if bar_length not in ALLOWED_BAR_LENGTHS:
+            fail('D', '单支长度只能是3.15米')
+    try:
+        bar_count = int(float(values[4]))
+    except (TypeError, ValueError):
+        fail('E', '库存支数不是有效数字')
+        return None
+    if bar_count < 0:
+        fail('E', '库存支数不能为负数')
+    return variant_id, color_id, bar_length, bar_count
+
+
+def parse_inventory_xlsx(file_stream):
+    # The 库存总米数 column is derived, so it is neither read nor required.
+    return parse_xlsx_records(
+        file_stream,
+        INVENTORY_HEADERS[:5],
+        'Excel中没有库存数据',
+        'Excel列格式不正确，请先下载库存模板后再编辑上传',
+        _parse_inventory_row,
+    )
+
+
+def _inventory_by_key():
+    return {
+        (row.variant_id, row.color_id, round(float(row.bar_length_m), 2)): row
+        for row in ProfileInventory.query.all()
+    }
+
+
+def inventory_diff(key_fields, stored, uploaded, row_count):
+    """Changes an upload makes: ``uploaded`` and ``stored`` map a key tuple to a stock value."""
+    changes = []
+    for key, after in uploaded.items():
+        before = stored.get(key)
+        if before == after:
+            continue
+        changes.append({**dict(zip(key_fields, key)), 'before': before, 'after': after, 'delta': after - (before or 0)})
+    return {
+        'changes': changes,
+        'summary': {
+            'rows': row_count,
+            'changed': len(changes),
+            'created': sum(1 for change in changes if change['before'] is None),
+            'unchanged': len(uploaded) - len(changes),
+        },
+    }
+
+
+def diff_inventory_records(records):
+    """Dry run of ``apply_inventory_records``: the bar counts the upload would change."""
+    stored = {key: int(row.bar_count) for key, row in _inventory_by_key().items()}
+    uploaded = {(variant_id, color_id, bar_length): bar_count for variant_id, color_id, bar_length, bar_count in records}
+    return inventory_diff(('variant_id', 'color_id', 'bar_length_m'), stored, uploaded, len(records))
+
+
 def apply_inventory_records(records):
-    updated = 0
-    for variant_id, color_id, bar_length, bar_count in records:
-        row = ProfileInventory.query.filter_by(
-            variant_id=variant_id,
-            color_id=color_id,
-            bar_length_m=bar_length,
-        ).first()
-        if row is None:
-            row = ProfileInventory(variant_id=variant_id, color_id=color_id, bar_length_m=bar_length)
-            db.session.add(row)
-        row.bar_count = bar_count
-        row.updated_at = datetime.utcnow()
-        updated += 1
+    """Upsert imported bar counts in bulk on ``uq_profile_inventory_sku``."""
+    now = datetime.utcnow()
+    connection = db.session.connection()
+    updated = upsert_rows(
+        connection,
+        ProfileInventory.__table__,
+        ('variant_id', 'color_id', 'bar_length_m'),
+        (
+            {'variant_id': variant_id, 'color_id': color_id, 'bar_length_m': bar_length, 'bar_count': bar_count, 'updated_at': now}
+            for variant_id, color_id, bar_length, bar_count in records
+        ),
+        update_columns=('bar_count', 'updated_at'),
+    )
+    bump_stock_version(connection, PROFILE_STOCK)
     db.session.commit()
     return updated
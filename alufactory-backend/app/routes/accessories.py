@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint
 
-from app.accessory_inventory import public_accessory_stock, seed_accessory_inventory
+from app.accessory_inventory import public_accessory_stock
+from app.stock_cache import ACCESSORY_STOCK, cached_stock_response
 
 
 accessory_bp = Blueprint('accessories', __name__, url_prefix='/api/accessories')
@@ -9,5 +10,4 @@ accessory_bp = Blueprint('accessories', __name__, url_prefix='/api/accessories')
 @accessory_bp.route('/inventory', methods=['GET'])
 def get_accessory_inventory():
     """Public silver-white finished-accessory availability in piece counts."""
-    seed_accessory_inventory()
-    return jsonify({'inventory': public_accessory_stock()}), 200
+    return cached_stock_response(ACCESSORY_STOCK, public_accessory_stock)
@@ -1,36 +1,55 @@
-from flask import Blueprint, request, jsonify, Response, current_app, send_file
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-from app.models.user import db, User, Order, Profile, ProfileInventory, AccessoryInventory
+from app.models.user import db, User, Order, OrderItem, Profile, ProfileInventory, AccessoryInventory
+from app.models.user import MonthlyRevenueRollup, OrderStatusRollup, ProfileUsageRollup
 from app.models.user import Cart
 from app.models.user import normalize_membership_level
 from app.order_utils import build_order_pdf_filename
+from app.inventory_reservation import InsufficientStock, ItemQuantityTooLarge, order_status_changed
+from app.cut_list import DEFAULT_KERF_MM, build_cut_plans
+from app.order_item_lines import profile_usage_report
+from app.duplicate_orders import NEAR_DUPLICATE_THRESHOLD, find_duplicate_groups, exact_duplicate_report, near_duplicate_report
+from app.order_documents import order_pdf_availability
+from app.blob_storage import content_disposition
+from app.pdf_storage import order_pdf_response
+from app.product_order_export import iter_product_orders_xlsx
 from app.order_snapshot import refresh_order_json
+from app.snapshot_backfill import (
+    BACKFILL_JOBS,
+    BackfillAlreadyRunning,
+    get_backfill_status,
+    start_snapshot_backfill_thread,
+)
+from app.snapshot_sync_queue import enqueue_snapshot_sync
+from app.stats_rollup import PAID_ORDER_STATUSES
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor, wants_total
 from app.product_order_db import (
+    CATEGORY_LABELS,
     query_order_snapshots,
-    sync_order_snapshot,
-    find_order_ids_with_missing_item_details,
+    query_order_snapshots_after,
     update_product_order_task_progress,
     normalize_task_progress,
 )
 import uuid
-import base64
-import os
-from collections import defaultdict
 from app.profile_inventory import (
     ALLOWED_BAR_LENGTHS,
     INVENTORY_COLORS,
     PROFILE_COLORS,
+    XLSX_MIMETYPE,
+    XlsxImportError,
     aggregate_public_stock,
     apply_inventory_records,
-    build_inventory_xlsx,
+    diff_inventory_records,
+    iter_inventory_xlsx,
     parse_inventory_xlsx,
     seed_profile_inventory,
 )
 from app.accessory_inventory import (
     ACCESSORY_FINISH_ID,
     apply_accessory_inventory_records,
-    build_accessory_inventory_xlsx,
+    diff_accessory_inventory_records,
+    iter_accessory_inventory_xlsx,
     parse_accessory_inventory_xlsx,
     seed_accessory_inventory,
     serialize_accessory_inventory,
@@ -38,48 +57,51 @@ from app.accessory_inventory import (
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
-PAID_ORDER_STATUSES = ('confirmed', 'shipped', 'delivered')
-
 
-def _profile_usage_from_order(order):
-    totals = defaultdict(float)
-    for item in list(order.items or []):
-        if str(item.product_type or '').upper() != 'PROFILE':
-            continue
-        config = item.config if isinstance(item.config, dict) else {}
-        variant_id = str(config.get('variantId') or config.get('variant_id') or item.product_id or 'unknown')
-        color_id = str(config.get('colorId') or config.get('color_id') or 'natural')
-        try:
-            length_m = max(0.0, float(config.get('length') or 0) / 1000.0)
-            quantity = max(0, int(item.quantity or 0))
-        except (TypeError, ValueError):
-            continue
-        totals[(variant_id, color_id)] += length_m * quantity
-    return totals
-
-
-def _monthly_revenue_and_color_usage(orders):
-    monthly_revenue = defaultdict(float)
-    color_usage = defaultdict(float)
-    for order in orders:
-        if order.status not in PAID_ORDER_STATUSES:
-            continue
-        month = (order.paid_at or order.created_at or datetime.utcnow()).strftime('%Y-%m')
-        monthly_revenue[month] += float(order.total_amount or 0)
-        for (_, color_id), meters in _profile_usage_from_order(order).items():
-            if color_id != 'natural':
-                color_usage[color_id] += meters
-    return (
-        [{'month': month, 'revenue': round(value, 2)} for month, value in sorted(monthly_revenue.items())],
-        [
+def _order_statistics():
+    """Dashboard figures from the rollup tables; rows scale with statuses, months and colours."""
+    user_totals = db.session.query(
+        db.func.count(User.id),
+        db.func.sum(db.case((User.is_active.is_(True), 1), else_=0)),
+    ).one()
+
+    status_rows = OrderStatusRollup.query.filter(OrderStatusRollup.order_count > 0).all()
+    counts = {row.status: row.order_count for row in status_rows}
+    total_revenue = sum(float(row.total_amount or 0) for row in status_rows if row.status in PAID_ORDER_STATUSES)
+
+    monthly_rows = MonthlyRevenueRollup.query.filter(
+        MonthlyRevenueRollup.order_count > 0
+    ).order_by(MonthlyRevenueRollup.month.asc()).all()
+
+    meters = db.func.sum(ProfileUsageRollup.meters)
+    color_rows = db.session.query(ProfileUsageRollup.color_id, meters).filter(
+        ProfileUsageRollup.color_id != 'natural',
+    ).group_by(ProfileUsageRollup.color_id).having(meters > 1e-9).order_by(
+        meters.desc(), ProfileUsageRollup.color_id.asc()
+    ).limit(5).all()
+
+    return {
+        'total_users': int(user_totals[0] or 0),
+        'active_users': int(user_totals[1] or 0),
+        'total_orders': sum(counts.values()),
+        'pending_orders': counts.get('pending', 0),
+        'paid_orders': sum(counts.get(status, 0) for status in PAID_ORDER_STATUSES),
+        'shipped_orders': counts.get('shipped', 0),
+        'delivered_orders': counts.get('delivered', 0),
+        'total_revenue': float(total_revenue),
+        'monthly_revenue': [
+            {'month': row.month, 'revenue': round(float(row.revenue or 0), 2)}
+            for row in monthly_rows
+        ],
+        'top_profile_colors': [
             {
                 'color_id': color_id,
                 'color_name': PROFILE_COLORS.get(color_id, color_id),
-                'meters': round(meters, 3),
+                'meters': round(float(total or 0), 3),
             }
-            for color_id, meters in sorted(color_usage.items(), key=lambda item: (-item[1], item[0]))[:5]
+            for color_id, total in color_rows
         ],
-    )
+    }
 
 def admin_required(f):
     """Decorator to check if user is admin"""
@@ -326,6 +348,30 @@ def delete_user(user_id):
         return jsonify({'error': str(e)}), 500
 
 
+# Sentinel for listings requested without ``cursor``: classic page/per_page with totals.
+_PAGE_MODE = object()
+
+
+def _requested_cursor(kind):
+    """Keyset paging is opt-in via ``?cursor=`` (empty for the first page)."""
+    if 'cursor' not in request.args:
+        return _PAGE_MODE
+    token = request.args.get('cursor', '').strip()
+    return decode_cursor(kind, token) if token else None
+
+
+def _cursor_page_payload(kind, rows, next_key, total):
+    next_cursor = encode_cursor(kind, next_key[0], next_key[1]) if next_key else None
+    payload = {
+        'orders': rows,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    }
+    if total is not None:
+        payload['total'] = total
+    return payload
+
+
 @admin_bp.route('/orders', methods=['GET'])
 @admin_required
 def get_all_orders():
@@ -334,44 +380,70 @@ def get_all_orders():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         status = request.args.get('status')
+        try:
+            after = _requested_cursor('orders')
+            after_created_at = datetime.fromisoformat(after[0]) if after not in (_PAGE_MODE, None) and after[0] else None
+        except (InvalidCursor, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
         
-        query = Order.query
+        query = Order.query.options(db.selectinload(Order.items))
         if status:
             query = query.filter_by(status=status)
         
-        orders_paginated = query.order_by(Order.created_at.desc()).paginate(page=page, per_page=per_page)
+        if after is _PAGE_MODE:
+            orders_paginated = query.order_by(Order.created_at.desc()).paginate(page=page, per_page=per_page)
+            page_orders = orders_paginated.items
+        else:
+            # Keyset page on (created_at, id): no OFFSET scan and no COUNT unless asked for.
+            per_page = max(1, min(200, per_page or 50))
+            total = query.count() if wants_total(request.args) else None
+            ordered = (Order.created_at.desc(), Order.id.desc())
+            if after is None:
+                page_orders = query.order_by(*ordered).limit(per_page + 1).all()
+            elif after_created_at is None:
+                # NULL created_at sorts last in DESC order, after every dated row.
+                page_orders = query.filter(Order.created_at.is_(None), Order.id < str(after[1])) \
+                    .order_by(*ordered).limit(per_page + 1).all()
+            else:
+                # A row-value seek stays an index range search; adding "OR created_at IS NULL"
+                # would not, so undated rows are fetched as a final phase instead.
+                page_orders = query.filter(db.tuple_(Order.created_at, Order.id) < (after_created_at, str(after[1]))) \
+                    .order_by(*ordered).limit(per_page + 1).all()
+                if len(page_orders) <= per_page:
+                    page_orders += query.filter(Order.created_at.is_(None)) \
+                        .order_by(*ordered).limit(per_page + 1 - len(page_orders)).all()
+            next_key = None
+            if len(page_orders) > per_page:
+                page_orders = page_orders[:per_page]
+                last = page_orders[-1]
+                next_key = (last.created_at.isoformat() if last.created_at else None, last.id)
         
         # Ensure legacy rows have the same stored JSON/fingerprint as new orders.
         snapshot_changed = False
-        for order in orders_paginated.items:
+        for order in page_orders:
             if not order.order_json or not order.duplicate_fingerprint:
                 refresh_order_json(order)
                 snapshot_changed = True
         if snapshot_changed:
             db.session.commit()
 
-        fingerprints = {
-            order.duplicate_fingerprint for order in orders_paginated.items
-            if order.duplicate_fingerprint
-        }
-        duplicate_groups = {}
-        if fingerprints:
-            matching_orders = Order.query.filter(Order.duplicate_fingerprint.in_(fingerprints)).all()
-            for matching_order in matching_orders:
-                key = (str(matching_order.user_id), matching_order.duplicate_fingerprint)
-                duplicate_groups.setdefault(key, []).append(matching_order)
+        # Group counts are kept per (user, fingerprint); members are only read for real groups.
+        duplicate_groups = find_duplicate_groups(page_orders)
+
+        # Batch the per-order lookups: one IN query for users, two for stored PDFs.
+        user_ids = {order.user_id for order in page_orders}
+        users_by_id = {}
+        if user_ids:
+            users_by_id = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()}
+        pdf_availability = order_pdf_availability(current_app.instance_path, page_orders)
 
         orders_data = []
-        for order in orders_paginated.items:
+        for order in page_orders:
             order_dict = order.to_dict(include_order_json=True)
-            user = User.query.get(order.user_id)
-            profile = Profile.query.filter_by(user_id=order.user_id).first()
+            user = users_by_id.get(order.user_id)
 
-            pdf_dir = os.path.join(current_app.instance_path, 'order_pdfs')
-            pdf_path = os.path.join(pdf_dir, f"{order.id}.pdf")
-            pdf_no_price_path = os.path.join(pdf_dir, f"{order.id}_no_price.pdf")
-            pdf_available = os.path.exists(pdf_path) or bool(profile and profile.pdf_base64)
-            pdf_no_price_available = os.path.exists(pdf_no_price_path)
+            pdf_available, pdf_no_price_available = pdf_availability[order.id]
+            pdf_filename = build_order_pdf_filename(order)
 
             order_dict['user'] = {
                 'id': user.id if user else None,
@@ -389,16 +461,19 @@ def get_all_orders():
             order_dict['duplicate_order_ids'] = [str(match.id) for match in duplicate_matches]
             order_dict['duplicate_order_numbers'] = [match.order_number for match in duplicate_matches]
             order_dict['pdf'] = {
-                'filename': build_order_pdf_filename(order),
+                'filename': pdf_filename,
                 'available': pdf_available,
                 'url': f"/api/admin/orders/{order.id}/pdf" if pdf_available else None,
-                'no_price_filename': (build_order_pdf_filename(order)[:-4] + '_no_price.pdf') if build_order_pdf_filename(order).lower().endswith('.pdf') else (build_order_pdf_filename(order) + '_no_price.pdf'),
+                'no_price_filename': (pdf_filename[:-4] + '_no_price.pdf') if pdf_filename.lower().endswith('.pdf') else (pdf_filename + '_no_price.pdf'),
                 'no_price_available': pdf_no_price_available,
                 'no_price_url': f"/api/admin/orders/{order.id}/pdf?without_price=1" if pdf_no_price_available else None,
             }
 
             orders_data.append(order_dict)
 
+        if after is not _PAGE_MODE:
+            return jsonify(_cursor_page_payload('orders', orders_data, next_key, total)), 200
+
         return jsonify({
             'orders': orders_data,
             'total': orders_paginated.total,
@@ -411,6 +486,26 @@ def get_all_orders():
         return jsonify({'error': f'Failed to load orders: {str(e)}'}), 500
 
 
+@admin_bp.route('/orders/duplicates', methods=['GET'])
+@admin_required
+def get_duplicate_orders():
+    """Duplicate order groups over the whole history (``mode`` exact or near, ``threshold``, ``user_id``, ``limit``)"""
+    mode = request.args.get('mode', 'exact')
+    if mode not in ('exact', 'near'):
+        return jsonify({'error': 'mode must be exact or near'}), 400
+    limit = request.args.get('limit', 100, type=int)
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, 500)
+    user_id = request.args.get('user_id') or None
+    if mode == 'exact':
+        return jsonify(exact_duplicate_report(user_id, limit)), 200
+    threshold = request.args.get('threshold', NEAR_DUPLICATE_THRESHOLD, type=float)
+    if threshold is None or not 0 < threshold <= 1:
+        return jsonify({'error': 'threshold must be between 0 and 1'}), 400
+    return jsonify(near_duplicate_report(threshold, user_id, limit)), 200
+
+
 @admin_bp.route('/orders/<order_id>/pdf', methods=['GET'])
 @admin_required
 def get_order_pdf(order_id):
@@ -424,44 +519,7 @@ def get_order_pdf(order_id):
     if include_price_flag is not None:
         no_price_requested = str(include_price_flag).strip().lower() in ('0', 'false', 'no')
 
-    pdf_dir = os.path.join(current_app.instance_path, 'order_pdfs')
-    file_suffix = '_no_price.pdf' if no_price_requested else '.pdf'
-    pdf_path = os.path.join(pdf_dir, f"{order.id}{file_suffix}")
-    if os.path.exists(pdf_path):
-        base_filename = build_order_pdf_filename(order)
-        filename = base_filename[:-4] + '_no_price.pdf' if no_price_requested and base_filename.lower().endswith('.pdf') else (f"{base_filename}_no_price.pdf" if no_price_requested else base_filename)
-        return send_file(pdf_path, mimetype='application/pdf', as_attachment=False, download_name=filename)
-
-    if no_price_requested:
-        return jsonify({'error': 'No-price PDF not found for this order'}), 404
-
-    profile = Profile.query.filter_by(user_id=order.user_id).first()
-    if not profile:
-        return jsonify({'error': 'PDF not found'}), 404
-
-    pdf_base64_value = profile.pdf_no_price_base64 if no_price_requested else profile.pdf_base64
-    if not pdf_base64_value:
-        return jsonify({'error': 'PDF not found'}), 404
-
-    try:
-        pdf_bytes = base64.b64decode(pdf_base64_value)
-    except Exception:
-        return jsonify({'error': 'Invalid PDF data'}), 500
-
-    base_filename = build_order_pdf_filename(order)
-    default_no_price_filename = base_filename[:-4] + '_no_price.pdf' if base_filename.lower().endswith('.pdf') else f"{base_filename}_no_price.pdf"
-    filename = (
-        (profile.pdf_no_price_filename or default_no_price_filename)
-        if no_price_requested
-        else (profile.pdf_filename or base_filename)
-    )
-    return Response(
-        pdf_bytes,
-        mimetype='application/pdf',
-        headers={
-            'Content-Disposition': f'inline; filename="{filename}"'
-        }
-    )
+    return order_pdf_response(order, no_price_requested)
 
 
 @admin_bp.route('/carts', methods=['GET'])
@@ -552,7 +610,9 @@ def update_order_status(order_id):
         return jsonify({'error': 'Invalid status'}), 400
     
     try:
+        previous_status = order.status
         order.status = status
+        order_status_changed(order, previous_status)
         
         if status == 'confirmed':
             order.paid_at = datetime.utcnow()
@@ -574,12 +634,18 @@ def update_order_status(order_id):
         
         order.updated_at = datetime.utcnow()
         db.session.commit()
-        sync_order_snapshot(current_app.instance_path, order, user=order.user, pdf_available=bool(order and order.id))
+        enqueue_snapshot_sync(order.id, pdf_available=True)
         
         return jsonify({
             'message': 'Order status updated',
             'order': order.to_dict()
         }), 200
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'shortages': e.shortages}), 409
+    except ItemQuantityTooLarge as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -594,18 +660,21 @@ def get_product_orders():
         per_page = request.args.get('per_page', 50, type=int)
         status = request.args.get('status')
         category = request.args.get('category')
+        try:
+            after = _requested_cursor('product-orders')
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
 
-        # Backfill legacy rows that were created before item detail fields were introduced.
-        missing_detail_order_ids = find_order_ids_with_missing_item_details(
-            current_app.instance_path,
-            category_code=category,
-            limit=300,
-        )
-        if missing_detail_order_ids:
-            for order_id in missing_detail_order_ids:
-                order = Order.query.get(order_id)
-                if order:
-                    sync_order_snapshot(current_app.instance_path, order, user=order.user, pdf_available=False)
+        if after is not _PAGE_MODE:
+            entries, next_key, total = query_order_snapshots_after(
+                current_app.instance_path,
+                category_code=category,
+                status=status,
+                after=after,
+                limit=per_page,
+                include_total=wants_total(request.args),
+            )
+            return jsonify(_cursor_page_payload('product-orders', entries, next_key, total)), 200
 
         entries, total = query_order_snapshots(
             current_app.instance_path,
@@ -615,19 +684,6 @@ def get_product_orders():
             per_page=per_page,
         )
 
-        if total == 0:
-            # Backfill from current orders table into standalone product-orders DB (read-only source)
-            for order in Order.query.order_by(Order.created_at.desc()).all():
-                sync_order_snapshot(current_app.instance_path, order, user=order.user, pdf_available=False)
-
-            entries, total = query_order_snapshots(
-                current_app.instance_path,
-                category_code=category,
-                status=status,
-                page=page,
-                per_page=per_page,
-            )
-
         pages = (total + per_page - 1) // per_page if per_page > 0 else 0
         return jsonify({
             'orders': entries,
@@ -639,6 +695,49 @@ def get_product_orders():
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/product-orders/export', methods=['GET'])
+@admin_required
+def export_product_orders():
+    """Stream the product-order snapshots of a tab (``category``/``status``) as XLSX"""
+    category = request.args.get('category')
+    status = request.args.get('status')
+    label = CATEGORY_LABELS.get(category, '产品订单')
+    return _xlsx_download(
+        iter_product_orders_xlsx(current_app.instance_path, category_code=category, status=status),
+        f'{label}-{datetime.utcnow().strftime("%Y%m%d")}.xlsx',
+    )
+
+
+@admin_bp.route('/product-orders/backfill', methods=['GET'])
+@admin_required
+def get_product_orders_backfill():
+    """Progress of the snapshot backfill jobs"""
+    return jsonify({'jobs': get_backfill_status(current_app.instance_path)}), 200
+
+
+@admin_bp.route('/product-orders/backfill', methods=['POST'])
+@admin_required
+def start_product_orders_backfill():
+    """Start (or resume) a snapshot backfill job in the background"""
+    data = request.get_json(silent=True) or {}
+    job = data.get('job', 'full')
+    if job not in BACKFILL_JOBS:
+        return jsonify({'error': f"job must be one of: {', '.join(BACKFILL_JOBS)}"}), 400
+
+    try:
+        start_snapshot_backfill_thread(
+            current_app._get_current_object(),
+            job=job,
+            batch_size=current_app.config.get('SNAPSHOT_BACKFILL_BATCH_SIZE', 200),
+            throttle_seconds=current_app.config.get('SNAPSHOT_BACKFILL_THROTTLE_SECONDS', 0.2),
+            restart=bool(data.get('restart')),
+        )
+    except BackfillAlreadyRunning as e:
+        return jsonify({'error': str(e)}), 409
+
+    return jsonify({'message': f'Backfill {job} started', 'jobs': get_backfill_status(current_app.instance_path)}), 202
+
+
 @admin_bp.route('/product-orders/<int:entry_id>/task-progress', methods=['PUT'])
 @admin_required
 def update_product_order_progress(entry_id):
@@ -670,42 +769,62 @@ def update_product_order_progress(entry_id):
         return jsonify({'error': str(e)}), 500
 
 
+@admin_bp.route('/cut-plans', methods=['POST'])
+@admin_required
+def create_cut_plans():
+    """Pack the profile cuts of a batch of orders (``order_ids``, else ``status``) into stock bars"""
+    data = request.get_json(silent=True) or {}
+    order_ids = data.get('order_ids')
+    status = data.get('status', 'confirmed')
+    if order_ids is not None and (not isinstance(order_ids, list) or not all(isinstance(value, str) for value in order_ids)):
+        return jsonify({'error': 'order_ids must be an array of order IDs'}), 400
+    try:
+        kerf_mm = int(data.get('kerf_mm', current_app.config.get('CUT_KERF_MM', DEFAULT_KERF_MM)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'kerf_mm must be an integer'}), 400
+    if kerf_mm < 0:
+        return jsonify({'error': 'kerf_mm cannot be negative'}), 400
+
+    query = OrderItem.query.join(Order, Order.id == OrderItem.order_id).filter(db.func.upper(OrderItem.product_type) == 'PROFILE')
+    query = query.filter(Order.id.in_(order_ids)) if order_ids is not None else query.filter(Order.status == status)
+    items = query.all()
+    result = build_cut_plans(items, kerf_mm=kerf_mm, improve=bool(data.get('improve', True)))
+    result['summary']['orders'] = len({item.order_id for item in items})
+    return jsonify(result), 200
+
+
 @admin_bp.route('/statistics', methods=['GET'])
 @admin_required
 def get_statistics():
     """Get admin dashboard statistics"""
     try:
-        total_users = User.query.count()
-        active_users = User.query.filter_by(is_active=True).count()
-        total_orders = Order.query.count()
-        pending_orders = Order.query.filter_by(status='pending').count()
-        paid_orders = Order.query.filter(Order.status.in_(['confirmed', 'shipped', 'delivered'])).count()
-        shipped_orders = Order.query.filter_by(status='shipped').count()
-        delivered_orders = Order.query.filter_by(status='delivered').count()
-        
-        total_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.status.in_(PAID_ORDER_STATUSES)
-        ).scalar() or 0
-        monthly_revenue, top_profile_colors = _monthly_revenue_and_color_usage(Order.query.all())
-        
-        return jsonify({
-            'total_users': total_users,
-            'active_users': active_users,
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'paid_orders': paid_orders,
-            'shipped_orders': shipped_orders,
-            'delivered_orders': delivered_orders,
-            'total_revenue': float(total_revenue),
-            'monthly_revenue': monthly_revenue,
-            'top_profile_colors': top_profile_colors,
-        }), 200
+        return jsonify(_order_statistics()), 200
     except Exception as e:
         import traceback
         current_app.logger.error(f'Statistics error: {traceback.format_exc()}')
         return jsonify({'error': f'Failed to load statistics: {str(e)}'}), 500
 
 
+@admin_bp.route('/statistics/profile-usage', methods=['GET'])
+@admin_required
+def get_profile_usage_statistics():
+    """Paid profile usage per variant and colour from order_item_lines (``from``/``to`` as YYYY-MM)"""
+    month_from = request.args.get('from') or None
+    month_to = request.args.get('to') or None
+    for value in (month_from, month_to):
+        if value is not None and not _is_month(value):
+            return jsonify({'error': 'from/to must be YYYY-MM'}), 400
+    return jsonify({'usage': profile_usage_report(month_from, month_to)}), 200
+
+
+def _is_month(value):
+    try:
+        datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        return False
+    return len(value) == 7
+
+
 @admin_bp.route('/profile-inventory', methods=['GET'])
 @admin_required
 def get_profile_inventory_admin():
@@ -748,6 +867,15 @@ def update_profile_inventory(inventory_id):
     return jsonify({'inventory': row.to_dict()}), 200
 
 
+def _xlsx_download(chunks, download_name):
+    """Send a workbook as it is written; without a Content-Length it goes out chunked."""
+    return Response(
+        stream_with_context(chunks),
+        mimetype=XLSX_MIMETYPE,
+        headers={'Content-Disposition': content_disposition(download_name, 'attachment')},
+    )
+
+
 @admin_bp.route('/profile-inventory/export', methods=['GET'])
 @admin_required
 def export_profile_inventory():
@@ -760,12 +888,13 @@ def export_profile_inventory():
         ProfileInventory.color_id.asc(),
         ProfileInventory.bar_length_m.asc(),
     ).all()
-    return send_file(
-        build_inventory_xlsx(rows),
-        as_attachment=True,
-        download_name=f'型材库存-{datetime.utcnow().strftime("%Y%m%d")}.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
+    return _xlsx_download(iter_inventory_xlsx(rows), f'型材库存-{datetime.utcnow().strftime("%Y%m%d")}.xlsx')
+
+
+def _is_dry_run():
+    """``dry_run`` as a query parameter or form field previews an import without saving."""
+    value = request.args.get('dry_run') or request.form.get('dry_run') or ''
+    return value.strip().lower() in ('1', 'true', 'yes')
 
 
 @admin_bp.route('/profile-inventory/import', methods=['POST'])
@@ -778,8 +907,13 @@ def import_profile_inventory():
         return jsonify({'error': '仅支持.xlsx格式'}), 400
     try:
         records = parse_inventory_xlsx(upload.stream)
+        if _is_dry_run():
+            return jsonify({'message': '库存导入预览', 'dry_run': True, **diff_inventory_records(records)}), 200
         updated = apply_inventory_records(records)
         return jsonify({'message': '库存导入成功', 'updated': updated}), 200
+    except XlsxImportError as error:
+        db.session.rollback()
+        return jsonify({'error': str(error), 'errors': error.errors}), 400
     except (ValueError, KeyError, OSError) as error:
         db.session.rollback()
         return jsonify({'error': str(error)}), 400
@@ -828,12 +962,7 @@ def export_accessory_inventory():
         AccessoryInventory.accessory_id.asc(),
         AccessoryInventory.profile_size.asc(),
     ).all()
-    return send_file(
-        build_accessory_inventory_xlsx(rows),
-        as_attachment=True,
-        download_name=f'配件库存-{datetime.utcnow().strftime("%Y%m%d")}.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
+    return _xlsx_download(iter_accessory_inventory_xlsx(rows), f'配件库存-{datetime.utcnow().strftime("%Y%m%d")}.xlsx')
 
 
 @admin_bp.route('/accessory-inventory/import', methods=['POST'])
@@ -846,8 +975,13 @@ def import_accessory_inventory():
         return jsonify({'error': '仅支持.xlsx格式'}), 400
     try:
         records = parse_accessory_inventory_xlsx(upload.stream)
+        if _is_dry_run():
+            return jsonify({'message': '配件库存导入预览', 'dry_run': True, **diff_accessory_inventory_records(records)}), 200
         updated = apply_accessory_inventory_records(records)
         return jsonify({'message': '配件库存导入成功', 'updated': updated}), 200
+    except XlsxImportError as error:
+        db.session.rollback()
+        return jsonify({'error': str(error), 'errors': error.errors}), 400
     except (ValueError, KeyError, OSError) as error:
         db.session.rollback()
         return jsonify({'error': str(error)}), 400
@@ -1,18 +1,41 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-from app.models.user import db, User, Cart, CartItem, Order, OrderItem, Profile
-from app.order_utils import build_order_pdf_filename
-from app.product_order_db import sync_order_snapshot, remove_order_snapshot
+from app.models.user import db, User, Cart, CartItem, Order, OrderItem, OrderStatusRollup, Profile
+from app.blob_storage import get_blob_store
+from app.inventory_reservation import (
+    InsufficientStock,
+    ItemQuantityTooLarge,
+    check_item_quantities,
+    order_status_changed,
+    release_order_stock,
+    reserve_order_stock,
+)
+from app.order_documents import document_variant, order_pdf_download_name, save_order_document
+from app.pdf_render_queue import PDF_RENDER_VARIANTS, PdfRenderQueueFull, request_order_pdf_render
+from app.pdf_storage import decode_pdf_base64, order_pdf_response
+from app.pdf_upload import (
+    HashingUploadReader,
+    UploadError,
+    get_upload_progress,
+    iter_multipart_file,
+    iter_request_body,
+    start_upload_progress,
+    update_upload_progress,
+)
+from app.snapshot_sync_queue import enqueue_snapshot_sync
 from app.order_snapshot import refresh_order_json
 from app.security import get_request_json_secure
 from app.shipping_phone import SHIPPING_PHONE_ERROR, validate_shipping_phone
+import itertools
 import uuid
-import os
-import base64
 
 order_bp = Blueprint('orders', __name__, url_prefix='/api/orders')
 
+STREAMING_PDF_MIMETYPES = ('application/pdf', 'application/octet-stream', 'multipart/form-data')
+# Slack over PDF_UPLOAD_MAX_BYTES for multipart boundaries and small form fields.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
 @order_bp.route('', methods=['GET'])
 @jwt_required()
 def get_orders():
@@ -104,6 +127,7 @@ def create_order():
                 config=item_data.get('config')
             )
             order.items.append(order_item)
+        check_item_quantities(order.items)
 
         # Clear user's cart after successful order creation to avoid stale/repeated items.
         cart = Cart.query.filter_by(user_id=current_user_id).first()
@@ -113,14 +137,23 @@ def create_order():
         
         db.session.add(order)
         db.session.flush()
+        reserve_order_stock(order)
         refresh_order_json(order)
         db.session.commit()
-        sync_order_snapshot(current_app.instance_path, order, user=user, pdf_available=False)
+        enqueue_snapshot_sync(order.id)
+        if current_app.config.get('PDF_RENDER_ON_ORDER_CREATE'):
+            _render_new_order_pdf(order)
         
         return jsonify({
             'message': 'Order created successfully',
             'order': order.to_dict()
         }), 201
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'shortages': e.shortages}), 409
+    except ItemQuantityTooLarge as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -154,7 +187,9 @@ def update_order(order_id):
     try:
         if is_admin:
             if 'status' in data:
+                previous_status = order.status
                 order.status = data['status']
+                order_status_changed(order, previous_status)
 
                 # Update timestamps based on status
                 if data['status'] == 'confirmed':
@@ -207,9 +242,13 @@ def update_order(order_id):
                 if not isinstance(incoming_items, list):
                     return jsonify({'error': 'items must be an array'}), 400
 
-                # Replace current order items with provided draft snapshot.
-                OrderItem.query.filter_by(order_id=order.id).delete()
+                # Replace current order items with provided draft snapshot. Delete through
+                # the session so the statistics rollups see the removed items.
+                for existing_item in list(order.items):
+                    db.session.delete(existing_item)
+                release_order_stock(order.id)
                 db.session.flush()
+                db.session.expire(order, ['items'])
 
                 for item_data in incoming_items:
                     if not isinstance(item_data, dict):
@@ -233,17 +272,27 @@ def update_order(order_id):
                         config=item_data.get('config')
                     )
                     db.session.add(order_item)
+                db.session.flush()
+                db.session.expire(order, ['items'])
+                check_item_quantities(order.items)
+                reserve_order_stock(order)
         
         order.updated_at = datetime.utcnow()
         db.session.flush()
         refresh_order_json(order)
         db.session.commit()
-        sync_order_snapshot(current_app.instance_path, order, user=order.user, pdf_available=False)
+        enqueue_snapshot_sync(order.id)
         
         return jsonify({
             'message': 'Order updated successfully',
             'order': order.to_dict()
         }), 200
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'shortages': e.shortages}), 409
+    except ItemQuantityTooLarge as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -274,9 +323,10 @@ def delete_order(order_id):
     try:
         # Intentionally keep any stored PDF files and PDF fallback data untouched.
         order_id_for_cleanup = order.id
+        release_order_stock(order.id)
         db.session.delete(order)
         db.session.commit()
-        remove_order_snapshot(current_app.instance_path, str(order_id_for_cleanup))
+        enqueue_snapshot_sync(order_id_for_cleanup)
         
         return jsonify({'message': 'Order deleted successfully'}), 200
     except Exception as e:
@@ -284,10 +334,101 @@ def delete_order(order_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _render_new_order_pdf(order):
+    # The browser may still upload its own PDF, so a full queue must not fail the order.
+    try:
+        request_order_pdf_render(order)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f'Server-side PDF render for order {order.id} not started: {e}')
+
+
+def _is_no_price_pdf_type(value) -> bool:
+    return str(value or 'with_price').strip().lower() in ('without_price', 'no_price', 'without-price', 'no-price')
+
+
+def _attach_order_pdf(order, pdf_data, no_price_requested):
+    """Store an order PDF as the order's document, point the profile at it and commit."""
+    pdf_filename = order_pdf_download_name(order, no_price_requested)
+    document = save_order_document(order, pdf_data, no_price_requested, pdf_filename)
+    pdf_path = get_blob_store(current_app).local_path(document.blob_key)
+
+    profile = Profile.query.filter_by(user_id=order.user_id).first()
+    if not profile:
+        profile = Profile(user_id=order.user_id)
+        db.session.add(profile)
+
+    if no_price_requested:
+        profile.pdf_no_price_filename = pdf_filename
+        profile.pdf_no_price_blob_key = document.blob_key
+        profile.pdf_no_price_path = pdf_path
+        profile.pdf_no_price_base64 = None
+    else:
+        profile.pdf_filename = pdf_filename
+        profile.pdf_blob_key = document.blob_key
+        profile.pdf_path = pdf_path
+        profile.pdf_base64 = None
+    profile.updated_at = datetime.utcnow()
+
+    db.session.commit()
+    enqueue_snapshot_sync(order.id, pdf_available=True)
+
+    return jsonify({
+        'message': 'PDF uploaded',
+        'pdf_filename': pdf_filename,
+        'pdf_type': 'without_price' if no_price_requested else 'with_price',
+        'size': document.size,
+        'sha256': document.sha256,
+    }), 200
+
+
+def _stream_order_pdf_upload(order, current_user_id):
+    """Pipe a raw (application/pdf) or multipart (``file`` part) body into the blob store."""
+    max_bytes = current_app.config['PDF_UPLOAD_MAX_BYTES']
+    if request.content_length and request.content_length > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        return jsonify({'error': f'PDF exceeds the {max_bytes} byte limit'}), 413
+
+    upload_id = (request.headers.get('X-Upload-Id') or request.args.get('upload_id') or '').strip()[:64] or None
+    if upload_id:
+        start_upload_progress(upload_id, order.id, current_user_id, request.content_length)
+
+    try:
+        fields = {}
+        if request.mimetype == 'multipart/form-data':
+            boundary = request.mimetype_params.get('boundary')
+            if not boundary:
+                raise UploadError('Missing multipart boundary')
+            chunks = iter_multipart_file(request.stream, boundary, fields)
+        else:
+            chunks = iter_request_body(request.stream)
+        # Reading the first file chunk also collects the form fields sent ahead of it.
+        first_chunk = next(chunks, b'')
+        no_price_requested = _is_no_price_pdf_type(request.args.get('pdf_type') or fields.get('pdf_type'))
+        reader = HashingUploadReader(itertools.chain((first_chunk,), chunks), max_bytes, upload_id)
+        response = _attach_order_pdf(order, reader, no_price_requested)
+    except UploadError as e:
+        db.session.rollback()
+        if upload_id:
+            update_upload_progress(upload_id, status='failed', error=str(e))
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        if upload_id:
+            update_upload_progress(upload_id, status='failed', error=str(e))
+        return jsonify({'error': str(e)}), 500
+    if upload_id:
+        update_upload_progress(upload_id, status='stored', sha256=reader.sha256)
+    return response
+
+
 @order_bp.route('/<order_id>/pdf', methods=['POST'])
 @jwt_required()
 def upload_order_pdf(order_id):
-    """Upload order PDF (stores to instance/order_pdfs and associates with user profile)"""
+    """Upload order PDF (stores it in the blob store and associates it with the user profile)
+
+    Accepts a raw ``application/pdf`` body or a multipart form with a ``file`` part,
+    streamed to storage, or the legacy JSON body with ``pdf_base64``.
+    """
     current_user_id = get_jwt_identity()
     current_user = User.query.get(current_user_id)
 
@@ -298,73 +439,101 @@ def upload_order_pdf(order_id):
     if order.user_id != current_user_id and not current_user.is_admin:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    if request.mimetype in STREAMING_PDF_MIMETYPES:
+        return _stream_order_pdf_upload(order, current_user_id)
+
     data = request.get_json() or {}
     pdf_base64 = data.get('pdf_base64')
-    pdf_type_raw = str(data.get('pdf_type', 'with_price')).strip().lower()
-    no_price_requested = pdf_type_raw in ('without_price', 'no_price', 'without-price', 'no-price')
-
-    base_filename = build_order_pdf_filename(order)
-    if no_price_requested:
-        pdf_filename = base_filename[:-4] + '_no_price.pdf' if base_filename.lower().endswith('.pdf') else f"{base_filename}_no_price.pdf"
-    else:
-        pdf_filename = base_filename
+    no_price_requested = _is_no_price_pdf_type(data.get('pdf_type'))
 
     if not pdf_base64:
         return jsonify({'error': 'Missing pdf_base64'}), 400
 
-    # Strip data URI prefix if present
-    if isinstance(pdf_base64, str) and ',' in pdf_base64:
-        pdf_base64 = pdf_base64.split(',', 1)[1]
-
     try:
-        pdf_bytes = base64.b64decode(pdf_base64)
-    except Exception:
+        pdf_bytes = decode_pdf_base64(pdf_base64)
+    except ValueError:
         return jsonify({'error': 'Invalid PDF data'}), 400
 
     try:
-        # Save to database first (critical for cloud environments)
-        profile = Profile.query.filter_by(user_id=order.user_id).first()
-        if not profile:
-            profile = Profile(user_id=order.user_id)
-            db.session.add(profile)
-
-        if no_price_requested:
-            profile.pdf_no_price_filename = pdf_filename
-            profile.pdf_no_price_base64 = pdf_base64
-        else:
-            profile.pdf_filename = pdf_filename
-            profile.pdf_base64 = pdf_base64
-        profile.updated_at = datetime.utcnow()
+        return _attach_order_pdf(order, pdf_bytes, no_price_requested)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
-        # Try to save to file system (optional, may fail in cloud)
-        pdf_path = None
-        try:
-            pdf_dir = os.path.join(current_app.instance_path, 'order_pdfs')
-            os.makedirs(pdf_dir, exist_ok=True)
-            file_suffix = '_no_price.pdf' if no_price_requested else '.pdf'
-            pdf_path = os.path.join(pdf_dir, f"{order.id}{file_suffix}")
-            with open(pdf_path, 'wb') as f:
-                f.write(pdf_bytes)
-            if no_price_requested:
-                profile.pdf_no_price_path = pdf_path
-            else:
-                profile.pdf_path = pdf_path
-        except Exception as file_error:
-            # File write failed (common in cloud), but continue with DB save
-            current_app.logger.warning(f"Failed to save PDF to file system: {file_error}")
-            if no_price_requested:
-                profile.pdf_no_price_path = None
-            else:
-                profile.pdf_path = None
 
-        db.session.commit()
-        sync_order_snapshot(current_app.instance_path, order, user=order.user, pdf_available=True)
+@order_bp.route('/<order_id>/pdf/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_order_pdf_upload_progress(order_id, upload_id):
+    """Progress of a streaming PDF upload started with ``X-Upload-Id``"""
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+
+    progress = get_upload_progress(upload_id)
+    if not progress or progress['order_id'] != order_id:
+        return jsonify({'error': 'Upload not found'}), 404
+    if progress['user_id'] != current_user_id and not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    progress.pop('user_id', None)
+    progress.pop('updated', None)
+    return jsonify({'upload': progress}), 200
+
 
-        return jsonify({'message': 'PDF uploaded', 'pdf_filename': pdf_filename, 'pdf_type': 'without_price' if no_price_requested else 'with_price'}), 200
+@order_bp.route('/<order_id>/pdf/generate', methods=['POST'])
+@jwt_required()
+def generate_order_pdf(order_id):
+    """Render the order's with-price and no-price PDFs on the server
+
+    Optional JSON: ``variants`` (``with_price``/``no_price``) and ``force`` to replace
+    PDFs the order already has. Answers 202 while rendering and 200 when every variant
+    was cached or already present; poll ``/pdf/jobs/<job_id>`` for page timings.
+    """
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+
+    order = Order.query.get(order_id)
+    if not order:
+        return jsonify({'error': 'Order not found'}), 404
+
+    if order.user_id != current_user_id and not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    data = request.get_json(silent=True) or {}
+    variants = data.get('variants') or list(PDF_RENDER_VARIANTS)
+    if isinstance(variants, str):
+        variants = [variants]
+    variants = [document_variant(_is_no_price_pdf_type(variant)) for variant in variants]
+
+    try:
+        job = request_order_pdf_render(order, variants, force=bool(data.get('force')))
+    except PdfRenderQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '10'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+    job.pop('user_id', None)
+    job.pop('created', None)
+    return jsonify({'job': job}), 202 if job['status'] == 'queued' else 200
+
+
+@order_bp.route('/<order_id>/pdf/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_order_pdf_job(order_id, job_id):
+    """Status of a server-side PDF render, with the render time of every page"""
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+
+    job = current_app.extensions['pdf_render'].get_job(job_id)
+    if not job or job['order_id'] != order_id:
+        return jsonify({'error': 'Render job not found'}), 404
+    if job['user_id'] != current_user_id and not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    job.pop('user_id', None)
+    job.pop('created', None)
+    return jsonify({'job': job}), 200
+
 
 @order_bp.route('/<order_id>/pdf', methods=['GET'])
 @jwt_required()
@@ -385,47 +554,7 @@ def get_order_pdf(order_id):
     if include_price_flag is not None:
         no_price_requested = str(include_price_flag).strip().lower() in ('0', 'false', 'no')
 
-    from flask import send_file, Response
-    # Try file system first
-    pdf_dir = os.path.join(current_app.instance_path, 'order_pdfs')
-    file_suffix = '_no_price.pdf' if no_price_requested else '.pdf'
-    pdf_path = os.path.join(pdf_dir, f"{order.id}{file_suffix}")
-    if os.path.exists(pdf_path):
-        base_filename = build_order_pdf_filename(order)
-        filename = base_filename[:-4] + '_no_price.pdf' if no_price_requested and base_filename.lower().endswith('.pdf') else (f"{base_filename}_no_price.pdf" if no_price_requested else base_filename)
-        return send_file(pdf_path, mimetype='application/pdf', as_attachment=False, download_name=filename)
-
-    if no_price_requested:
-        return jsonify({'error': 'No-price PDF not found for this order'}), 404
-
-    # Try database
-    profile = Profile.query.filter_by(user_id=order.user_id).first()
-    if not profile:
-        return jsonify({'error': 'PDF not found'}), 404
-
-    pdf_base64_value = profile.pdf_no_price_base64 if no_price_requested else profile.pdf_base64
-    if not pdf_base64_value:
-        return jsonify({'error': 'PDF not found'}), 404
-
-    try:
-        pdf_bytes = base64.b64decode(pdf_base64_value)
-    except Exception:
-        return jsonify({'error': 'Invalid PDF data'}), 500
-
-    base_filename = build_order_pdf_filename(order)
-    default_no_price_filename = base_filename[:-4] + '_no_price.pdf' if base_filename.lower().endswith('.pdf') else f"{base_filename}_no_price.pdf"
-    filename = (
-        (profile.pdf_no_price_filename or default_no_price_filename)
-        if no_price_requested
-        else (profile.pdf_filename or base_filename)
-    )
-    return Response(
-        pdf_bytes,
-        mimetype='application/pdf',
-        headers={
-            'Content-Disposition': f'inline; filename="{filename}"'
-        }
-    )
+    return order_pdf_response(order, no_price_requested)
 
 
 @order_bp.route('/stats', methods=['GET'])
@@ -438,12 +567,15 @@ def get_order_stats():
     if not current_user.is_admin:
         return jsonify({'error': 'Admin access required'}), 403
     
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    shipped_orders = Order.query.filter_by(status='shipped').count()
-    delivered_orders = Order.query.filter_by(status='delivered').count()
-    
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).scalar() or 0
+    counts = {}
+    total_revenue = 0.0
+    for row in OrderStatusRollup.query.all():
+        counts[row.status] = row.order_count
+        total_revenue += float(row.total_amount or 0)
+    total_orders = sum(counts.values())
+    pending_orders = counts.get('pending', 0)
+    shipped_orders = counts.get('shipped', 0)
+    delivered_orders = counts.get('delivered', 0)
     
     return jsonify({
         'total_orders': total_orders,
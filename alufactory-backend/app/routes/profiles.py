@@ -1,9 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from app.models.user import db, User, Profile
+from app.blob_storage import get_blob_store
+from app.pdf_storage import decode_pdf_base64, profile_pdf_response, store_profile_pdf
 from app.shipping_phone import SHIPPING_PHONE_ERROR, validate_shipping_phone
-from app.profile_inventory import aggregate_public_stock, seed_profile_inventory
+from app.profile_inventory import aggregate_public_stock
+from app.stock_cache import PROFILE_STOCK, cached_stock_response
 import uuid
 import base64
 
@@ -13,8 +16,7 @@ profile_bp = Blueprint('profiles', __name__, url_prefix='/api/profiles')
 @profile_bp.route('/inventory', methods=['GET'])
 def get_profile_inventory():
     """Public stock availability expressed only as total remaining meters."""
-    seed_profile_inventory()
-    return jsonify({'inventory': aggregate_public_stock()}), 200
+    return cached_stock_response(PROFILE_STOCK, aggregate_public_stock)
 
 
 @profile_bp.route('', methods=['GET'])
@@ -50,6 +52,23 @@ def get_profile(profile_id):
     }), 200
 
 
+@profile_bp.route('/<profile_id>/pdf', methods=['GET'])
+@jwt_required()
+def get_profile_pdf(profile_id):
+    """Stream the profile PDF (supports Range and If-None-Match)"""
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+
+    profile = Profile.query.get(profile_id)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    if profile.user_id != current_user_id and not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    return profile_pdf_response(profile)
+
+
 @profile_bp.route('', methods=['POST'])
 @jwt_required()
 def create_profile():
@@ -65,6 +84,13 @@ def create_profile():
     if not data or not data.get('profile_name'):
         return jsonify({'error': 'Missing profile_name'}), 400
 
+    pdf_bytes = None
+    if data.get('pdf_base64'):
+        try:
+            pdf_bytes = decode_pdf_base64(data['pdf_base64'])
+        except ValueError:
+            return jsonify({'error': 'Invalid PDF data'}), 400
+
     address = data.get('address', {})
     if address.get('phone'):
         try:
@@ -84,12 +110,14 @@ def create_profile():
             address_detail=address.get('detail'),
         )
         
-        # Handle PDF if provided (base64 encoded)
-        if 'pdf_base64' in data:
-            profile.pdf_base64 = data['pdf_base64']
+        db.session.add(profile)
+        db.session.flush()
+
+        # Handle PDF if provided (base64 encoded); the bytes go to the blob store
+        if pdf_bytes is not None:
+            profile.pdf_blob_key = store_profile_pdf(profile, pdf_bytes)
             profile.pdf_filename = data.get('pdf_filename', f"profile_{profile.id}.pdf")
         
-        db.session.add(profile)
         db.session.commit()
         
         return jsonify({
@@ -116,6 +144,13 @@ def update_profile(profile_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
+
+    pdf_bytes = None
+    if data.get('pdf_base64'):
+        try:
+            pdf_bytes = decode_pdf_base64(data['pdf_base64'])
+        except ValueError:
+            return jsonify({'error': 'Invalid PDF data'}), 400
     
     try:
         if 'profile_name' in data:
@@ -135,8 +170,9 @@ def update_profile(profile_id):
             profile.address_detail = addr.get('detail', profile.address_detail)
         
         # Update PDF if provided
-        if 'pdf_base64' in data:
-            profile.pdf_base64 = data['pdf_base64']
+        if pdf_bytes is not None:
+            profile.pdf_blob_key = store_profile_pdf(profile, pdf_bytes)
+            profile.pdf_base64 = None
             profile.pdf_filename = data.get('pdf_filename', f"profile_{profile.id}.pdf")
         
         profile.updated_at = datetime.utcnow()
@@ -169,8 +205,14 @@ def delete_profile(profile_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
+        owned_blob_keys = [
+            key for key in (profile.pdf_blob_key, profile.pdf_no_price_blob_key)
+            if key and key.startswith('profile_pdfs/')
+        ]
         db.session.delete(profile)
         db.session.commit()
+        for key in owned_blob_keys:
+            get_blob_store(current_app).delete(key)
         
         return jsonify({'message': 'Profile deleted successfully'}), 200
     
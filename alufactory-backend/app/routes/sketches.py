@@ -0,0 +1,23 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from app.product_order_db import load_item_sketch
+from app.sketch_cache import SKETCH_MIME_TYPE
+
+sketch_bp = Blueprint('sketches', __name__, url_prefix='/api/sketches')
+
+
+@sketch_bp.route('/<key>.png', methods=['GET'])
+def get_sketch(key):
+    """Serve a cached item sketch; public because <img> tags cannot send the admin JWT.
+
+    Keys are content hashes, so a response never changes and can be cached forever.
+    """
+    etag = f'"{key}"'
+    headers = {'Cache-Control': 'public, max-age=31536000, immutable', 'ETag': etag}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+
+    png = load_item_sketch(current_app.instance_path, key)
+    if png is None:
+        return jsonify({'error': 'Sketch not found'}), 404
+    return Response(png, mimetype=SKETCH_MIME_TYPE, headers=headers)
@@ -0,0 +1,174 @@
+"""Content-addressed cache for the small item sketch PNGs shown in product-order tabs.
+
+A sketch depends only on its geometry, so identical doors and pegboards share one image.
+The key is a SHA-256 of the normalized geometry plus ``SKETCH_RENDERER_VERSION``; rendered
+PNG bytes live in an in-process LRU and in the ``item_sketches`` table of the snapshot DB,
+and snapshot rows store only the key (served by ``GET /api/sketches/<key>.png``).
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.sketch_render import render_sketch_png
+
+# Bump when the drawing changes so old cached images are not reused.
+SKETCH_RENDERER_VERSION = 3
+SKETCH_MIME_TYPE = 'image/png'
+SKETCH_URL_PREFIX = '/api/sketches/'
+SKETCH_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+LRU_MAX_ENTRIES = 1024
+
+SketchSpec = namedtuple('SketchSpec', 'category_code width height opening_side hinge_positions')
+
+
+def sketch_spec(category_code, width, height, opening_side, hinge_positions) -> SketchSpec:
+    """Normalize geometry so that everything the drawing ignores is left out of the key."""
+    category = category_code if category_code in ('pegboard', 'aluminum_frame_door') else 'plain'
+    is_door = category == 'aluminum_frame_door'
+    return SketchSpec(
+        category,
+        round(max(1.0, float(width or 1.0)), 3),
+        round(max(1.0, float(height or 1.0)), 3),
+        ('left' if opening_side == 'left' else 'right') if is_door else None,
+        tuple(round(float(hp or 0.0), 3) for hp in hinge_positions) if is_door else (),
+    )
+
+
+def sketch_key(spec: SketchSpec) -> str:
+    canonical = '|'.join((
+        f'v{SKETCH_RENDERER_VERSION}',
+        spec.category_code,
+        repr(spec.width),
+        repr(spec.height),
+        spec.opening_side or '',
+        ','.join(repr(hp) for hp in spec.hinge_positions),
+    ))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def sketch_url(key: Optional[str]) -> Optional[str]:
+    return f'{SKETCH_URL_PREFIX}{key}.png' if key else None
+
+
+class _LRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# One LRU per snapshot DB so a key cached for one DB file is never assumed to exist in another.
+_memory_tiers: Dict[str, _LRU] = {}
+_memory_tiers_lock = threading.Lock()
+
+
+def _memory_tier(scope: str) -> _LRU:
+    tier = _memory_tiers.get(scope)
+    if tier is None:
+        with _memory_tiers_lock:
+            tier = _memory_tiers.setdefault(scope, _LRU(LRU_MAX_ENTRIES))
+    return tier
+
+
+def clear_sketch_memory_cache():
+    with _memory_tiers_lock:
+        _memory_tiers.clear()
+
+
+def _stored_keys(conn: sqlite3.Connection, keys: List[str]) -> Set[str]:
+    found = set()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows = conn.execute(
+            f"SELECT sketch_key FROM item_sketches WHERE sketch_key IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        ).fetchall()
+        found.update(row[0] for row in rows)
+    return found
+
+
+def prepare_sketches(conn: sqlite3.Connection, scope: str, specs: Iterable[SketchSpec]) -> Dict[str, Optional[bytes]]:
+    """Resolve specs to keys, rendering only images neither tier has yet.
+
+    Returns ``{key: png_bytes}`` where bytes are set for freshly rendered images that still
+    need ``store_sketches`` and ``None`` for images already persisted. Specs whose render
+    failed are omitted, so callers must not reference their key.
+    """
+    memory_tier = _memory_tier(scope)
+    by_key = {}
+    for spec in specs:
+        by_key.setdefault(sketch_key(spec), spec)
+
+    resolved: Dict[str, Optional[bytes]] = {}
+    unknown = []
+    for key in by_key:
+        if memory_tier.get(key) is not None:
+            resolved[key] = None
+        else:
+            unknown.append(key)
+
+    persisted = _stored_keys(conn, unknown) if unknown else set()
+    for key in unknown:
+        if key in persisted:
+            resolved[key] = None
+            continue
+        png = render_sketch_png(by_key[key])
+        if png is not None:
+            resolved[key] = png
+    return resolved
+
+
+def store_sketches(conn: sqlite3.Connection, rendered: Dict[str, Optional[bytes]]):
+    """Persist freshly rendered images; call inside the snapshot write transaction."""
+    now_iso = datetime.utcnow().isoformat()
+    fresh = [(key, SKETCH_MIME_TYPE, png, now_iso) for key, png in rendered.items() if png is not None]
+    if fresh:
+        conn.executemany(
+            'INSERT OR IGNORE INTO item_sketches (sketch_key, mime_type, image, created_at) VALUES (?, ?, ?, ?)',
+            fresh,
+        )
+
+
+def remember_sketches(scope: str, rendered: Dict[str, Optional[bytes]]):
+    """Promote committed images into the memory tier."""
+    memory_tier = _memory_tier(scope)
+    for key, png in rendered.items():
+        if png is not None:
+            memory_tier.put(key, png)
+
+
+def load_sketch_png(conn: sqlite3.Connection, scope: str, key: str) -> Optional[bytes]:
+    if not SKETCH_KEY_PATTERN.match(key or ''):
+        return None
+    memory_tier = _memory_tier(scope)
+    png = memory_tier.get(key)
+    if png is not None:
+        return png
+    row = conn.execute('SELECT image FROM item_sketches WHERE sketch_key = ?', (key,)).fetchone()
+    if row is None:
+        return None
+    png = bytes(row[0])
+    memory_tier.put(key, png)
+    return png
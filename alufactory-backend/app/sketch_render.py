@@ -0,0 +1,87 @@
+"""Renderer for the 130x90 item sketch PNGs, drawn with Pillow's ``ImageDraw``.
+
+Rendering is the cold path: ``app.sketch_cache`` keys each image by its normalized
+geometry and ``SKETCH_RENDERER_VERSION``, so a shape is drawn once and then served from
+the memory LRU or the ``item_sketches`` table. PNGs are saved at a low zlib level rather
+than with ``optimize=True``, whose extra passes cost more than they save on images this
+small. Pillow is imported lazily; without it ``render_sketch_png`` returns None.
+"""
+import io
+from typing import Optional
+
+CANVAS_WIDTH = 130
+CANVAS_HEIGHT = 90
+AREA_WIDTH = 120.0
+AREA_HEIGHT = 80.0
+MARGIN = 5.0
+PNG_COMPRESS_LEVEL = 1
+
+BACKGROUND = '#f8fafc'
+FRAME_FILL = '#ffffff'
+FRAME_OUTLINE = '#334155'
+HOLE_FILL = '#94a3b8'
+HINGE_FILL = '#ef4444'
+HANDLE_FILL = '#2563eb'
+FRAME_OUTLINE_WIDTH = 2
+
+
+def draw_sketch(spec):
+    """Draw a ``SketchSpec`` onto a new RGB ``PIL.Image``, or None when Pillow is not installed."""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return None
+
+    w = spec.width
+    h = spec.height
+    ratio = w / h
+    rw = AREA_WIDTH
+    rh = rw / ratio
+    if rh > AREA_HEIGHT:
+        rh = AREA_HEIGHT
+        rw = rh * ratio
+    rx = MARGIN + (AREA_WIDTH - rw) / 2.0
+    ry = MARGIN + (AREA_HEIGHT - rh) / 2.0
+
+    img = Image.new('RGB', (CANVAS_WIDTH, CANVAS_HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    draw.rounded_rectangle(
+        (int(round(rx)), int(round(ry)), int(round(rx + rw)), int(round(ry + rh))),
+        radius=2, fill=FRAME_FILL, outline=FRAME_OUTLINE, width=FRAME_OUTLINE_WIDTH,
+    )
+
+    if spec.category_code == 'pegboard':
+        for c in range(6):
+            for r in range(4):
+                cx = rx + ((c + 1) * rw) / 7.0
+                cy = ry + ((r + 1) * rh) / 5.0
+                draw.ellipse((cx - 1.4, cy - 2.0, cx + 1.4, cy + 2.0), fill=HOLE_FILL)
+
+    if spec.category_code == 'aluminum_frame_door':
+        for hp in spec.hinge_positions:
+            hp_clamped = max(0.0, min(h, float(hp or 0.0)))
+            hy = ry + (hp_clamped / h) * rh
+            hx = rx if spec.opening_side == 'left' else (rx + rw - 2.5)
+            draw.rounded_rectangle(
+                (int(round(hx)), int(round(hy - 1.2)), int(round(hx + 2.5)), int(round(hy + 1.3))),
+                radius=1, fill=HINGE_FILL,
+            )
+
+        handle_x = (rx + rw - 3.5) if spec.opening_side == 'left' else (rx - 1.0)
+        handle_y = ry + rh / 2.0 - 6.0
+        draw.rounded_rectangle(
+            (int(round(handle_x)), int(round(handle_y)), int(round(handle_x + 3.5)), int(round(handle_y + 12.0))),
+            radius=1, fill=HANDLE_FILL,
+        )
+
+    return img
+
+
+def render_sketch_png(spec) -> Optional[bytes]:
+    """Render a ``SketchSpec`` to PNG bytes, or None when Pillow is not installed."""
+    img = draw_sketch(spec)
+    if img is None:
+        return None
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+    return buf.getvalue()
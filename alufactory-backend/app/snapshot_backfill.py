@@ -0,0 +1,191 @@
+"""Resumable backfill of the product-order snapshot DB from the orders table.
+
+Two jobs share the ``snapshot_backfill_state`` table in the snapshot DB: ``full`` re-syncs
+every order and ``details`` re-syncs only orders whose snapshot rows predate the item
+detail columns. Both walk order ids in ascending order and checkpoint the last finished id
+after every batch, so an interrupted run continues where it stopped. Orders created while
+a job runs are covered by the regular snapshot sync queue.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from app.models.user import Order, User, db
+from app.order_documents import order_pdf_availability
+from app.product_order_db import (
+    find_order_ids_with_missing_item_details,
+    product_order_transaction,
+    remove_order_snapshot,
+    sync_order_snapshots,
+)
+
+BACKFILL_JOBS = ('full', 'details')
+# A running job that has not checkpointed for this long is assumed to have died.
+STALE_RUN_SECONDS = 300
+
+_STATE_FIELDS = (
+    'job', 'status', 'last_order_id', 'processed', 'batches', 'total',
+    'started_at', 'updated_at', 'finished_at', 'last_error',
+)
+
+_thread_lock = threading.Lock()
+_threads: Dict[str, threading.Thread] = {}
+
+
+class BackfillAlreadyRunning(RuntimeError):
+    pass
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def get_backfill_state(instance_path: str, job: str) -> Optional[Dict]:
+    with product_order_transaction(instance_path) as conn:
+        row = conn.execute('SELECT * FROM snapshot_backfill_state WHERE job = ?', (job,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_backfill_status(instance_path: str) -> Dict[str, Optional[Dict]]:
+    return {job: get_backfill_state(instance_path, job) for job in BACKFILL_JOBS}
+
+
+def _save_state(instance_path: str, state: Dict):
+    state['updated_at'] = _now_iso()
+    with product_order_transaction(instance_path) as conn:
+        conn.execute(
+            f'''
+            INSERT OR REPLACE INTO snapshot_backfill_state ({', '.join(_STATE_FIELDS)})
+            VALUES ({', '.join('?' for _ in _STATE_FIELDS)})
+            ''',
+            [state.get(field) for field in _STATE_FIELDS],
+        )
+
+
+def _is_live_run(state: Optional[Dict]) -> bool:
+    if not state or state.get('status') != 'running' or not state.get('updated_at'):
+        return False
+    updated_at = datetime.fromisoformat(state['updated_at'])
+    return datetime.utcnow() - updated_at < timedelta(seconds=STALE_RUN_SECONDS)
+
+
+def _next_batch(instance_path: str, job: str, checkpoint: str, batch_size: int):
+    """Return ``(order ids covered by the batch, orders still present in the DB)``."""
+    if job == 'full':
+        query = Order.query.order_by(Order.id)
+        if checkpoint:
+            query = query.filter(Order.id > checkpoint)
+        orders = query.limit(batch_size).all()
+        return [order.id for order in orders], orders
+
+    order_ids = find_order_ids_with_missing_item_details(
+        instance_path,
+        limit=batch_size,
+        after_order_id=checkpoint,
+    )
+    orders = Order.query.filter(Order.id.in_(order_ids)).all() if order_ids else []
+    return order_ids, orders
+
+
+def _sync_batch(instance_path: str, order_ids, orders) -> int:
+    user_ids = {order.user_id for order in orders}
+    users_by_id = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()} if user_ids else {}
+    pdf_availability = order_pdf_availability(instance_path, orders)
+
+    sync_order_snapshots(
+        instance_path,
+        (
+            (order, users_by_id.get(order.user_id), pdf_availability[order.id][0])
+            for order in orders
+        ),
+    )
+    present = {order.id for order in orders}
+    for order_id in order_ids:
+        if order_id not in present:
+            # Snapshot rows of a deleted order.
+            remove_order_snapshot(instance_path, order_id)
+    return len(order_ids)
+
+
+def run_snapshot_backfill(
+    app,
+    job: str = 'full',
+    batch_size: int = 200,
+    throttle_seconds: float = 0.0,
+    max_batches: Optional[int] = None,
+    restart: bool = False,
+    force: bool = False,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """Run (or resume) a backfill job and return its final state.
+
+    ``throttle_seconds`` sleeps between batches to leave the databases room for live
+    traffic; ``max_batches`` stops early with the job left resumable. ``force`` takes
+    over a job whose state still says running, e.g. after the previous process crashed.
+    """
+    if job not in BACKFILL_JOBS:
+        raise ValueError(f'Unknown backfill job: {job}')
+    instance_path = app.instance_path
+    batch_size = max(1, int(batch_size))
+
+    with app.app_context():
+        state = get_backfill_state(instance_path, job)
+        if _is_live_run(state) and not force:
+            raise BackfillAlreadyRunning(f'Backfill job {job} is already running')
+        if restart or not state or state.get('status') == 'finished':
+            state = {'job': job, 'last_order_id': None, 'processed': 0, 'batches': 0, 'started_at': _now_iso()}
+            state['total'] = Order.query.count() if job == 'full' else None
+        state.update(status='running', finished_at=None, last_error=None)
+        _save_state(instance_path, state)
+
+        batches_run = 0
+        try:
+            while max_batches is None or batches_run < max_batches:
+                order_ids, orders = _next_batch(instance_path, job, state.get('last_order_id') or '', batch_size)
+                if not order_ids:
+                    state.update(status='finished', finished_at=_now_iso())
+                    break
+                state['processed'] = int(state.get('processed') or 0) + _sync_batch(instance_path, order_ids, orders)
+                state['batches'] = int(state.get('batches') or 0) + 1
+                state['last_order_id'] = max(order_ids)
+                _save_state(instance_path, state)
+                db.session.expunge_all()
+                batches_run += 1
+                if progress:
+                    progress(dict(state))
+                if throttle_seconds > 0:
+                    time.sleep(throttle_seconds)
+            else:
+                state['status'] = 'paused'
+        except Exception as error:
+            db.session.rollback()
+            state.update(status='failed', last_error=str(error))
+            _save_state(instance_path, state)
+            raise
+        finally:
+            db.session.remove()
+
+        _save_state(instance_path, state)
+        return state
+
+
+def start_snapshot_backfill_thread(app, job: str = 'full', **options) -> threading.Thread:
+    """Run a backfill job on a daemon thread; at most one thread per job and process."""
+    if job not in BACKFILL_JOBS:
+        raise ValueError(f'Unknown backfill job: {job}')
+    with _thread_lock:
+        running = _threads.get(job)
+        if (running and running.is_alive()) or _is_live_run(get_backfill_state(app.instance_path, job)):
+            raise BackfillAlreadyRunning(f'Backfill job {job} is already running')
+
+        def _run():
+            try:
+                run_snapshot_backfill(app, job=job, **options)
+            except Exception as error:
+                app.logger.error(f'Snapshot backfill {job} failed: {error}')
+
+        thread = threading.Thread(target=_run, name=f'snapshot-backfill-{job}', daemon=True)
+        _threads[job] = thread
+        thread.start()
+        return thread
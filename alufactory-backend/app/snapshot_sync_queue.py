@@ -0,0 +1,288 @@
+"""Background product-order snapshot sync, decoupled from the order request path.
+
+Order routes call ``enqueue_snapshot_sync`` after their primary commit. The order id is
+written to the ``snapshot_sync_outbox`` table in the snapshot DB first, so a pending sync
+survives a restart, and then handed to a small pool of worker threads. Repeated syncs for
+the same order coalesce into one run; failures are retried with exponential backoff until
+``SNAPSHOT_SYNC_MAX_ATTEMPTS`` is reached, after which the outbox row is kept with its
+last error for inspection. Workers sweep the outbox for due retries and expired leases
+every ``poll_interval`` seconds, however busy the in-memory queue is.
+"""
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app.models.user import Order, db
+from app.product_order_db import (
+    product_order_transaction,
+    remove_order_snapshot,
+    sync_order_snapshot,
+)
+
+# Rows claimed by a worker are hidden from the sweeper for this long, so several
+# gunicorn workers sharing one outbox do not all pick up the same order.
+CLAIM_LEASE_SECONDS = 60.0
+
+
+class SnapshotSyncQueue:
+    def __init__(self, app, workers=2, max_attempts=5, retry_base_delay=1.0, poll_interval=5.0):
+        self.app = app
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base_delay = float(retry_base_delay)
+        self.poll_interval = float(poll_interval)
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+        self._last_sweep = 0.0
+
+    @property
+    def instance_path(self):
+        # Read on every use: the app's instance_path may be changed after startup.
+        return self.app.instance_path
+
+    # -- outbox -------------------------------------------------------------
+
+    def _write_outbox(self, order_id, pdf_available):
+        # pdf_available=False means "no new PDF", not "the PDF is gone", so a coalesced
+        # request never clears the flag of one still pending. It starts over from the
+        # caller's value once the row is completed and deleted.
+        with product_order_transaction(self.instance_path) as conn:
+            conn.execute(
+                '''
+                INSERT INTO snapshot_sync_outbox (order_id, pdf_available, version, attempts, enqueued_at, next_attempt_at)
+                VALUES (?, ?, 1, 0, ?, ?)
+                ON CONFLICT(order_id) DO UPDATE SET
+                    pdf_available = MAX(pdf_available, excluded.pdf_available),
+                    version = version + 1,
+                    attempts = 0,
+                    last_error = NULL,
+                    enqueued_at = excluded.enqueued_at,
+                    next_attempt_at = excluded.next_attempt_at
+                ''',
+                (order_id, 1 if pdf_available else 0, datetime.utcnow().isoformat(), time.time()),
+            )
+
+    def _claim(self, order_id):
+        """Lease an outbox row; returns ``(pdf_available, version)`` or None if it is gone or leased."""
+        now = time.time()
+        with product_order_transaction(self.instance_path, immediate=True) as conn:
+            row = conn.execute(
+                'SELECT pdf_available, version, next_attempt_at FROM snapshot_sync_outbox WHERE order_id = ?',
+                (order_id,),
+            ).fetchone()
+            if row is None or row['next_attempt_at'] is None or row['next_attempt_at'] > now:
+                return None
+            conn.execute(
+                'UPDATE snapshot_sync_outbox SET next_attempt_at = ? WHERE order_id = ?',
+                (now + CLAIM_LEASE_SECONDS, order_id),
+            )
+            return bool(row['pdf_available']), row['version']
+
+    def _complete(self, order_id, version):
+        with product_order_transaction(self.instance_path) as conn:
+            cursor = conn.execute(
+                'DELETE FROM snapshot_sync_outbox WHERE order_id = ? AND version = ?',
+                (order_id, version),
+            )
+            if cursor.rowcount == 0:
+                # Re-enqueued while we were syncing: make the newer request due right away.
+                conn.execute(
+                    'UPDATE snapshot_sync_outbox SET next_attempt_at = ? WHERE order_id = ?',
+                    (time.time(), order_id),
+                )
+
+    def _fail(self, order_id, version, error):
+        with product_order_transaction(self.instance_path) as conn:
+            row = conn.execute(
+                'SELECT attempts, version FROM snapshot_sync_outbox WHERE order_id = ?',
+                (order_id,),
+            ).fetchone()
+            if row is None:
+                return
+            if row['version'] != version:
+                conn.execute(
+                    'UPDATE snapshot_sync_outbox SET next_attempt_at = ?, last_error = ? WHERE order_id = ?',
+                    (time.time(), str(error), order_id),
+                )
+                return
+            attempts = int(row['attempts'] or 0) + 1
+            next_attempt_at = (
+                time.time() + self.retry_base_delay * (2 ** (attempts - 1))
+                if attempts < self.max_attempts
+                else None
+            )
+            conn.execute(
+                '''
+                UPDATE snapshot_sync_outbox
+                SET attempts = ?, last_error = ?, next_attempt_at = ?
+                WHERE order_id = ?
+                ''',
+                (attempts, str(error), next_attempt_at, order_id),
+            )
+        if next_attempt_at is None:
+            self.app.logger.error(f'Snapshot sync for order {order_id} gave up after {attempts} attempts: {error}')
+        else:
+            self.app.logger.warning(f'Snapshot sync for order {order_id} failed (attempt {attempts}): {error}')
+
+    def due_order_ids(self, limit=500):
+        with product_order_transaction(self.instance_path) as conn:
+            rows = conn.execute(
+                '''
+                SELECT order_id FROM snapshot_sync_outbox
+                WHERE next_attempt_at IS NOT NULL AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+                ''',
+                (time.time(), int(limit)),
+            ).fetchall()
+        return [row['order_id'] for row in rows]
+
+    def stats(self):
+        with product_order_transaction(self.instance_path) as conn:
+            row = conn.execute(
+                '''
+                SELECT COUNT(*) AS pending,
+                       SUM(CASE WHEN next_attempt_at IS NULL THEN 1 ELSE 0 END) AS failed
+                FROM snapshot_sync_outbox
+                '''
+            ).fetchone()
+        return {
+            'pending': int(row['pending'] or 0),
+            'failed': int(row['failed'] or 0),
+            'queued_in_memory': len(self._pending),
+            'workers': len(self._threads),
+        }
+
+    # -- work ---------------------------------------------------------------
+
+    def _schedule(self, order_id):
+        with self._lock:
+            if order_id in self._pending:
+                return False
+            self._pending.add(order_id)
+        self._queue.put(order_id)
+        return True
+
+    def enqueue(self, order_id, pdf_available=False):
+        order_id = str(order_id)
+        self._write_outbox(order_id, pdf_available)
+        if self._threads:
+            self._schedule(order_id)
+        else:
+            self.process(order_id)
+
+    def process(self, order_id):
+        """Run one claimed sync; returns True when the order's snapshot is up to date."""
+        claim = self._claim(order_id)
+        if claim is None:
+            return False
+        pdf_available, version = claim
+        with self.app.app_context():
+            try:
+                order = db.session.get(Order, order_id)
+                if order is None:
+                    remove_order_snapshot(self.instance_path, order_id)
+                else:
+                    sync_order_snapshot(self.instance_path, order, user=order.user, pdf_available=pdf_available)
+            except Exception as error:
+                self._fail(order_id, version, error)
+                return False
+            finally:
+                db.session.remove()
+        self._complete(order_id, version)
+        return True
+
+    def drain(self):
+        """Process every due outbox row in the calling thread (CLI and synchronous mode)."""
+        processed = 0
+        for order_id in self.due_order_ids():
+            if self.process(order_id):
+                processed += 1
+        return processed
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                order_id = self._queue.get(timeout=self._sweep_if_due())
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._pending.discard(order_id)
+            try:
+                self.process(order_id)
+            except Exception as error:
+                self.app.logger.error(f'Snapshot sync worker error for order {order_id}: {error}')
+            finally:
+                self._queue.task_done()
+
+    def _sweep_if_due(self):
+        """Sweep when ``poll_interval`` has passed since any worker last did; returns the wait until the next one."""
+        now = time.monotonic()
+        with self._lock:
+            due = now - self._last_sweep >= self.poll_interval
+            if due:
+                self._last_sweep = now
+        if due:
+            self._sweep()
+        return max(0.0, self._last_sweep + self.poll_interval - time.monotonic())
+
+    def _sweep(self):
+        try:
+            for order_id in self.due_order_ids():
+                self._schedule(order_id)
+        except Exception as error:
+            self.app.logger.warning(f'Snapshot sync outbox sweep failed: {error}')
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._last_sweep = time.monotonic()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'snapshot-sync-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        # Pick up whatever a previous process left in the outbox.
+        self._sweep()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def join(self):
+        """Block until every in-memory job has been processed."""
+        self._queue.join()
+
+
+def init_snapshot_sync(app):
+    sync_queue = SnapshotSyncQueue(
+        app,
+        workers=app.config.get('SNAPSHOT_SYNC_WORKERS', 2),
+        max_attempts=app.config.get('SNAPSHOT_SYNC_MAX_ATTEMPTS', 5),
+        retry_base_delay=app.config.get('SNAPSHOT_SYNC_RETRY_DELAY', 1.0),
+    )
+    app.extensions['snapshot_sync'] = sync_queue
+    if app.config.get('SNAPSHOT_SYNC_ASYNC', True):
+        sync_queue.start()
+    return sync_queue
+
+
+def enqueue_snapshot_sync(order_id, pdf_available=False):
+    """Queue a snapshot rewrite for ``order_id``; a missing order removes its snapshot.
+
+    Called after the order commit, so failures are logged rather than raised: the order
+    is saved, and an error response would invite a retry that creates a duplicate. The
+    snapshot catches up on the order's next write or the snapshot backfill.
+    """
+    from flask import current_app
+
+    try:
+        current_app.extensions['snapshot_sync'].enqueue(order_id, pdf_available=pdf_available)
+    except Exception as error:
+        current_app.logger.error(f'Snapshot sync for order {order_id} could not be queued: {error}')
@@ -0,0 +1,270 @@
+"""Statistics rollups kept in step with orders inside the writing transaction.
+
+``before_flush`` reads the stored contribution of every order the flush touches and
+``after_flush`` reads it again, then adds the difference to the rollup tables on the
+same connection, so a rollback discards both. Dashboards read the few rollup rows
+instead of scanning order history. Writes that bypass the ORM unit of work (bulk
+``Query.delete``/``update`` on orders or items) are not seen; ``reconcile_statistics``
+finds and repairs any drift.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, Set
+
+from app.bulk_upsert import upsert_rows
+from app.models.user import (
+    MonthlyRevenueRollup,
+    Order,
+    OrderItem,
+    OrderStatusRollup,
+    ProfileUsageRollup,
+    db,
+)
+
+PAID_ORDER_STATUSES = ('confirmed', 'shipped', 'delivered')
+
+_PENDING_KEY = 'stats_rollup_pending'
+_IN_CHUNK = 500
+
+
+class _Contribution:
+    """What a set of orders adds to each rollup table."""
+
+    def __init__(self):
+        self.status = defaultdict(lambda: [0, 0.0])
+        self.monthly = defaultdict(lambda: [0, 0.0])
+        self.usage = defaultdict(float)
+
+    def add_order(self, status, total_amount, paid_at, created_at):
+        amount = float(total_amount or 0)
+        bucket = self.status[status]
+        bucket[0] += 1
+        bucket[1] += amount
+        if status in PAID_ORDER_STATUSES:
+            moment = paid_at or created_at
+            if moment is not None:
+                month = self.monthly[moment.strftime('%Y-%m')]
+                month[0] += 1
+                month[1] += amount
+
+    def add_usage(self, color_id, variant_id, meters):
+        if color_id is not None and meters:
+            self.usage[(color_id, variant_id or 'unknown')] += float(meters)
+
+    def minus(self, other: '_Contribution') -> '_Contribution':
+        delta = _Contribution()
+        for source, sign in ((self, 1), (other, -1)):
+            for key, (count, amount) in source.status.items():
+                delta.status[key][0] += sign * count
+                delta.status[key][1] += sign * amount
+            for key, (count, amount) in source.monthly.items():
+                delta.monthly[key][0] += sign * count
+                delta.monthly[key][1] += sign * amount
+            for key, meters in source.usage.items():
+                delta.usage[key] += sign * meters
+        return delta
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _IN_CHUNK):
+        yield values[start:start + _IN_CHUNK]
+
+
+def _contribution(connection, order_ids: Iterable[str]) -> _Contribution:
+    orders = Order.__table__
+    items = OrderItem.__table__
+    result = _Contribution()
+    for chunk in _chunks(order_ids):
+        paid_ids = []
+        for row in connection.execute(
+            db.select(orders.c.id, orders.c.status, orders.c.total_amount, orders.c.paid_at, orders.c.created_at)
+            .where(orders.c.id.in_(chunk))
+        ):
+            result.add_order(row.status, row.total_amount, row.paid_at, row.created_at)
+            if row.status in PAID_ORDER_STATUSES:
+                paid_ids.append(row.id)
+        if paid_ids:
+            for row in connection.execute(
+                db.select(items.c.profile_color_id, items.c.profile_variant_id, items.c.profile_meters)
+                .where(items.c.order_id.in_(paid_ids))
+            ):
+                result.add_usage(row.profile_color_id, row.profile_variant_id, row.profile_meters)
+    return result
+
+
+def _increment(connection, model, key_columns, rows):
+    """Upsert ``column = column + value`` for the non-key columns of every row."""
+    rows = list(rows)
+    if rows:
+        increments = [column for column in rows[0] if column not in key_columns]
+        upsert_rows(connection, model.__table__, key_columns, rows, increment_columns=increments)
+
+
+def _apply(connection, delta: _Contribution):
+    _increment(connection, OrderStatusRollup, ['status'], (
+        {'status': status, 'order_count': count, 'total_amount': amount}
+        for status, (count, amount) in delta.status.items()
+        if count or amount
+    ))
+    _increment(connection, MonthlyRevenueRollup, ['month'], (
+        {'month': month, 'order_count': count, 'revenue': revenue}
+        for month, (count, revenue) in delta.monthly.items()
+        if count or revenue
+    ))
+    _increment(connection, ProfileUsageRollup, ['color_id', 'variant_id'], (
+        {'color_id': color_id, 'variant_id': variant_id, 'meters': meters}
+        for (color_id, variant_id), meters in delta.usage.items()
+        if meters
+    ))
+
+
+def touched_order_ids(session) -> Set[str]:
+    """IDs of stored orders whose row or items the session is about to write."""
+    order_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Order):
+            if obj.id and obj not in session.new:
+                order_ids.add(obj.id)
+        elif isinstance(obj, OrderItem):
+            # Read loaded state only; lazy loads are not allowed while flushing.
+            parent = obj.__dict__.get('order')
+            for order_id in (obj.__dict__.get('order_id'), getattr(parent, 'id', None)):
+                if order_id:
+                    order_ids.add(order_id)
+    return order_ids
+
+
+def _before_flush(session, flush_context, instances):
+    tracked = [obj for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, (Order, OrderItem))]
+    if not tracked:
+        return
+    order_ids = touched_order_ids(session)
+    before = _contribution(session.connection(), order_ids) if order_ids else _Contribution()
+    new_objects = [obj for obj in session.new if isinstance(obj, (Order, OrderItem))]
+    session.info[_PENDING_KEY] = (order_ids, before, new_objects)
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending is None:
+        return
+    order_ids, before, new_objects = pending
+    order_ids = set(order_ids)
+    for obj in new_objects:
+        order_ids.add(obj.id if isinstance(obj, Order) else obj.order_id)
+    order_ids.discard(None)
+    connection = session.connection()
+    _apply(connection, _contribution(connection, order_ids).minus(before))
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_stats_rollups(app):
+    """Register the flush hooks once and build the rollups if they have never been built."""
+    if not db.event.contains(db.session, 'before_flush', _before_flush):
+        db.event.listen(db.session, 'before_flush', _before_flush)
+        db.event.listen(db.session, 'after_flush', _after_flush)
+        db.event.listen(db.session, 'after_soft_rollback', lambda session, previous_transaction: _after_rollback(session))
+    with app.app_context():
+        try:
+            if OrderStatusRollup.query.first() is None and Order.query.first() is not None:
+                rebuild_stats_rollups()
+                db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            app.logger.warning(f'Statistics rollup build skipped: {error}')
+
+
+# -- reconciliation ---------------------------------------------------------
+
+def _raw_totals() -> Dict[str, Dict]:
+    """Recompute every rollup from the orders and order_items tables."""
+    status = {
+        row_status: (int(count), float(amount or 0))
+        for row_status, count, amount in db.session.query(
+            Order.status, db.func.count(Order.id), db.func.sum(Order.total_amount)
+        ).group_by(Order.status)
+    }
+
+    monthly = defaultdict(lambda: [0, 0.0])
+    for paid_at, created_at, amount in db.session.query(
+        Order.paid_at, Order.created_at, Order.total_amount
+    ).filter(Order.status.in_(PAID_ORDER_STATUSES)).yield_per(1000):
+        moment = paid_at or created_at
+        if moment is not None:
+            bucket = monthly[moment.strftime('%Y-%m')]
+            bucket[0] += 1
+            bucket[1] += float(amount or 0)
+
+    usage = {
+        (color_id, variant_id or 'unknown'): float(meters or 0)
+        for color_id, variant_id, meters in db.session.query(
+            OrderItem.profile_color_id,
+            OrderItem.profile_variant_id,
+            db.func.sum(OrderItem.profile_meters),
+        ).join(Order, Order.id == OrderItem.order_id).filter(
+            Order.status.in_(PAID_ORDER_STATUSES),
+            OrderItem.profile_color_id.isnot(None),
+        ).group_by(OrderItem.profile_color_id, OrderItem.profile_variant_id)
+    }
+    return {
+        'status': status,
+        'monthly': {month: (count, revenue) for month, (count, revenue) in monthly.items()},
+        'usage': usage,
+    }
+
+
+def _rollup_totals() -> Dict[str, Dict]:
+    return {
+        'status': {row.status: (row.order_count, row.total_amount) for row in OrderStatusRollup.query},
+        'monthly': {row.month: (row.order_count, row.revenue) for row in MonthlyRevenueRollup.query},
+        'usage': {(row.color_id, row.variant_id): row.meters for row in ProfileUsageRollup.query},
+    }
+
+
+def _same(left, right) -> bool:
+    left = left if isinstance(left, tuple) else (left,)
+    right = right if isinstance(right, tuple) else (right,)
+    return all(abs(float(a or 0) - float(b or 0)) < 1e-6 for a, b in zip(left, right))
+
+
+def reconcile_stats_rollups(fix: bool = False):
+    """Compare rollups with the raw tables; returns a list of mismatches.
+
+    With ``fix`` the rollups are rebuilt when anything differs (caller commits).
+    """
+    raw = _raw_totals()
+    stored = _rollup_totals()
+    mismatches = []
+    for table, raw_rows in raw.items():
+        stored_rows = stored[table]
+        for key in sorted(set(raw_rows) | set(stored_rows), key=str):
+            expected = raw_rows.get(key, (0, 0.0) if table != 'usage' else 0.0)
+            actual = stored_rows.get(key, (0, 0.0) if table != 'usage' else 0.0)
+            if not _same(expected, actual):
+                mismatches.append({'table': table, 'key': key, 'expected': expected, 'actual': actual})
+    if mismatches and fix:
+        rebuild_stats_rollups(raw)
+    return mismatches
+
+
+def rebuild_stats_rollups(raw=None):
+    raw = raw or _raw_totals()
+    OrderStatusRollup.query.delete()
+    MonthlyRevenueRollup.query.delete()
+    ProfileUsageRollup.query.delete()
+    db.session.add_all(
+        OrderStatusRollup(status=status, order_count=count, total_amount=amount)
+        for status, (count, amount) in raw['status'].items()
+    )
+    db.session.add_all(
+        MonthlyRevenueRollup(month=month, order_count=count, revenue=revenue)
+        for month, (count, revenue) in raw['monthly'].items()
+    )
+    db.session.add_all(
+        ProfileUsageRollup(color_id=color_id, variant_id=variant_id, meters=meters)
+        for (color_id, variant_id), meters in raw['usage'].items()
+    )
+    db.session.flush()
@@ -0,0 +1,92 @@
+"""Cached public stock responses, invalidated by a per-scope change counter.
+
+Every write to ``profile_inventory`` or ``accessory_inventory`` bumps the scope's row in
+``inventory_versions`` inside the writing transaction: ORM flushes through a session
+hook, Core statements (bulk imports, reservations) through ``bump_stock_version``. The
+public endpoints then cost one primary-key read while the version is unchanged, and the
+serialized body carries a content ETag so repeat visitors get a 304.
+"""
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Tuple
+
+from flask import Response, current_app, request
+
+from app.bulk_upsert import upsert_rows
+from app.models.user import AccessoryInventory, InventoryVersion, ProfileInventory, db
+
+PROFILE_STOCK = 'profile_stock'
+ACCESSORY_STOCK = 'accessory_stock'
+
+_MODEL_SCOPES = {ProfileInventory: PROFILE_STOCK, AccessoryInventory: ACCESSORY_STOCK}
+
+
+def bump_stock_version(connection, *scopes: str):
+    """Invalidate cached stock of ``scopes`` once the caller's transaction commits."""
+    if scopes:
+        upsert_rows(
+            connection,
+            InventoryVersion.__table__,
+            ('scope',),
+            [{'scope': scope, 'version': 1} for scope in dict.fromkeys(scopes)],
+            increment_columns=('version',),
+        )
+
+
+def stock_version(scope: str) -> int:
+    return db.session.execute(
+        db.select(InventoryVersion.version).where(InventoryVersion.scope == scope)
+    ).scalar() or 0
+
+
+def _after_flush(session, flush_context):
+    scopes = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        scope = _MODEL_SCOPES.get(type(obj))
+        if scope is not None and (obj not in session.dirty or session.is_modified(obj)):
+            scopes.add(scope)
+    if scopes:
+        bump_stock_version(session.connection(), *sorted(scopes))
+
+
+class StockCache:
+    """Serialized stock bodies of one app, keyed by scope and valid for one version."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[int, bytes, str]] = {}
+
+    def get(self, scope: str, build: Callable[[], list]) -> Tuple[bytes, str]:
+        version = stock_version(scope)
+        with self._lock:
+            entry = self._entries.get(scope)
+        if entry is not None and entry[0] == version:
+            return entry[1], entry[2]
+        # The rows are read after the version, so they are at least that new.
+        body = json.dumps({'inventory': build()}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._entries[scope] = (version, body, etag)
+        return body, etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def init_stock_cache(app):
+    if not db.event.contains(db.session, 'after_flush', _after_flush):
+        db.event.listen(db.session, 'after_flush', _after_flush)
+    cache = StockCache()
+    app.extensions['stock_cache'] = cache
+    return cache
+
+
+def cached_stock_response(scope: str, build: Callable[[], list]) -> Response:
+    """JSON ``{'inventory': build()}`` from the cache, or 304 when the client's ETag matches."""
+    body, etag = current_app.extensions['stock_cache'].get(scope, build)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
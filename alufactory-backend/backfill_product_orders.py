@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Backfill the product-order snapshot DB (instance/product_orders.db) from the orders table.
+
+Runs in batches ordered by order id and checkpoints after each batch, so an
+interrupted run resumes where it stopped. Use --job details to re-sync only
+orders whose snapshot rows predate the item detail columns.
+
+Usage:
+  python backfill_product_orders.py [--job full|details] [--batch-size 200]
+                                    [--throttle 0.2] [--max-batches N] [--restart]
+  python backfill_product_orders.py --status
+"""
+
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+load_dotenv()
+
+# The backfill writes snapshots itself; no background sync workers needed here.
+os.environ.setdefault('SNAPSHOT_SYNC_ASYNC', '0')
+
+from app import create_app
+from app.snapshot_backfill import (
+    BACKFILL_JOBS,
+    BackfillAlreadyRunning,
+    get_backfill_status,
+    run_snapshot_backfill,
+)
+
+
+def _print_progress(state):
+    total = state.get('total')
+    done = f"{state['processed']}/{total}" if total else str(state['processed'])
+    print(f"  • batch {state['batches']}: {done} orders, checkpoint {state['last_order_id']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill product-order snapshots')
+    parser.add_argument('--job', choices=BACKFILL_JOBS, default='full')
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--throttle', type=float, default=0.0, help='seconds to sleep between batches')
+    parser.add_argument('--max-batches', type=int, default=None)
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start from the first order')
+    parser.add_argument('--force', action='store_true', help='take over a job still marked as running')
+    parser.add_argument('--status', action='store_true', help='print job progress and exit')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+    if args.status:
+        for job, state in get_backfill_status(app.instance_path).items():
+            print(f'{job}: {state or "never run"}')
+        return 0
+
+    try:
+        state = run_snapshot_backfill(
+            app,
+            job=args.job,
+            batch_size=args.batch_size,
+            throttle_seconds=args.throttle,
+            max_batches=args.max_batches,
+            restart=args.restart,
+            force=args.force,
+            progress=_print_progress,
+        )
+    except BackfillAlreadyRunning as error:
+        print(f'✗ {error} (use --force if that process is gone)')
+        return 1
+    except Exception as error:
+        print(f'✗ Backfill failed: {error}; rerun to resume from the last checkpoint')
+        return 1
+
+    print(f"✓ Backfill {args.job} {state['status']}: {state['processed']} orders")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
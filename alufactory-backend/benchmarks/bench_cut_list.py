@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Bars needed for a batch of profile cuts: summed meters vs FFD vs FFD + improvement.
+
+"meters" is what summing ordered length gives (ceil(total / bar), ignoring kerf and
+offcuts); the packer's bar counts are what the saw actually needs. Three length mixes
+are measured: uniform 200-3000 mm, a handful of standard cabinet lengths, and short
+300-1200 mm pieces.
+
+Usage:
+  python benchmarks/bench_cut_list.py [--cuts 5000] [--kerf 3] [--seed 1]
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.cut_list import STOCK_BAR_LENGTH_MM, Cut, pack_cuts  # noqa: E402
+
+MIXES = {
+    'uniform': lambda rng: rng.randint(200, 3000),
+    'standard': lambda rng: rng.choice((400, 600, 750, 1200, 1500, 2100)),
+    'short': lambda rng: rng.randint(300, 1200),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cuts', type=int, default=5000)
+    parser.add_argument('--kerf', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'mix':<10} {'cuts':>6} {'meters':>7} {'FFD':>6} {'FFD ms':>8} {'improved':>9} {'ms':>8} {'waste %':>8}")
+    for name, length in MIXES.items():
+        rng = random.Random(args.seed)
+        cuts = [Cut(length(rng), None, str(index)) for index in range(args.cuts)]
+        by_meters = math.ceil(sum(cut.length_mm for cut in cuts) / STOCK_BAR_LENGTH_MM)
+
+        started = time.perf_counter()
+        ffd = pack_cuts(cuts, kerf_mm=args.kerf, improve=False)
+        ffd_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        improved = pack_cuts(cuts, kerf_mm=args.kerf)
+        improved_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"{name:<10} {args.cuts:>6} {by_meters:>7} {ffd['bars']:>6} {ffd_ms:>8.1f} "
+            f"{improved['bars']:>9} {improved_ms:>8.1f} {improved['waste_pct']:>8.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
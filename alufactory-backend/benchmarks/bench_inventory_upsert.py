@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Applying a stock-take import: legacy per-row ORM writes vs the bulk upsert.
+
+Builds ``--rows`` records over every PROFILE_VARIANTS x INVENTORY_COLORS pair (with as
+many bar lengths as needed to reach the count) and applies them to a file-backed SQLite
+database twice: once into an empty table (inserts) and once more with new counts
+(updates), reporting the time of each pass for both paths.
+
+Usage:
+  python benchmarks/bench_inventory_upsert.py [--rows 10000]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import create_app  # noqa: E402
+from app.models.user import ProfileInventory, db  # noqa: E402
+from app.profile_inventory import INVENTORY_COLORS, PROFILE_VARIANTS, apply_inventory_records  # noqa: E402
+from config import TestingConfig, config  # noqa: E402
+
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = None
+
+
+config['benchmark'] = BenchmarkConfig
+
+
+def _legacy_apply(records):
+    """The per-row ORM loop apply_inventory_records used before the bulk upsert."""
+    existing = {
+        (row.variant_id, row.color_id, round(float(row.bar_length_m), 2)): row
+        for row in ProfileInventory.query.all()
+    }
+    for variant_id, color_id, bar_length, bar_count in records:
+        row = existing.get((variant_id, color_id, bar_length))
+        if row is None:
+            row = ProfileInventory(variant_id=variant_id, color_id=color_id, bar_length_m=bar_length)
+            db.session.add(row)
+            existing[(variant_id, color_id, bar_length)] = row
+        row.bar_count = bar_count
+        row.updated_at = datetime.utcnow()
+    db.session.commit()
+    return len(records)
+
+
+def _records(count, bar_count):
+    pairs = [(variant_id, color_id) for variant_id in PROFILE_VARIANTS for color_id in INVENTORY_COLORS]
+    records = []
+    length_index = 0
+    while len(records) < count:
+        bar_length = round(1.0 + length_index * 0.05, 2)
+        for variant_id, color_id in pairs[:count - len(records)]:
+            records.append((variant_id, color_id, bar_length, bar_count))
+        length_index += 1
+    return records
+
+
+def _measure(apply, records):
+    started = time.perf_counter()
+    apply(records)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'path':<12} {'rows':>7} {'insert ms':>10} {'update ms':>10}")
+    for label, apply in (('legacy ORM', _legacy_apply), ('bulk upsert', apply_inventory_records)):
+        with tempfile.TemporaryDirectory() as instance_path:
+            BenchmarkConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{instance_path}/bench.db'
+            app = create_app('benchmark')
+            app.instance_path = instance_path
+            with app.app_context():
+                ProfileInventory.query.delete()
+                db.session.commit()
+                insert_ms = _measure(apply, _records(args.rows, 5))
+                update_ms = _measure(apply, _records(args.rows, 7))
+                assert ProfileInventory.query.count() == args.rows
+                db.session.remove()
+                db.engine.dispose()
+        print(f'{label:<12} {args.rows:>7} {insert_ms:>10.1f} {update_ms:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Order JSON snapshot + duplicate fingerprint: schema_version 1 as first shipped vs now.
+
+The first implementation round-tripped every item config through json.dumps/loads,
+sorted the items by a json.dumps of each, then serialized the whole order again to
+hash it. The current one copies plain configs directly, encodes each item once and
+streams the pieces into SHA-256. Every fingerprint is checked to be identical.
+
+Usage:
+  python benchmarks/bench_order_fingerprint.py [--orders 200] [--items 300] [--seed 1]
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.order_snapshot import refresh_order_json  # noqa: E402
+
+
+def _v1_number(value):
+    try:
+        return round(float(value or 0), 6)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _v1_json_safe(value):
+    try:
+        return json.loads(json.dumps(value, ensure_ascii=False, sort_keys=True, default=str))
+    except (TypeError, ValueError):
+        return str(value or '')
+
+
+def _v1_refresh(order):
+    items = [{
+        'product_id': str(item.product_id or ''),
+        'product_name': str(item.product_name or ''),
+        'product_type': str(item.product_type or ''),
+        'quantity': int(item.quantity or 0),
+        'unit_price': _v1_number(item.unit_price),
+        'total_price': _v1_number(item.total_price),
+        'config': _v1_json_safe(item.config),
+    } for item in order.items]
+    items.sort(key=lambda item: json.dumps(item, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
+    order_json = {
+        'schema_version': 1,
+        'user_id': str(order.user_id or ''),
+        'shipping_address': {
+            'recipient_name': str(order.recipient_name or ''),
+            'phone': str(order.phone or ''),
+            'province': str(order.province or ''),
+            'address_detail': str(order.address_detail or ''),
+        },
+        'shipping': {
+            'method': str(order.shipping_method or ''),
+            'fee': _v1_number(order.shipping_fee),
+            'overlength_fee': _v1_number(order.overlength_fee),
+        },
+        'amounts': {'subtotal': _v1_number(order.subtotal), 'total': _v1_number(order.total_amount)},
+        'memo': str(order.memo or ''),
+        'items': items,
+    }
+    canonical = json.dumps(order_json, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    order.order_json = order_json
+    order.duplicate_fingerprint = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _config(rng):
+    kind = rng.randrange(3)
+    if kind == 0:
+        return {'variantId': rng.choice(['2020', '3030', '4040']), 'colorId': rng.choice(['black', 'natural']), 'length': rng.randint(200, 3000)}
+    if kind == 1:
+        return {
+            'width': rng.randint(200, 900), 'height': rng.randint(300, 2000), 'color': '黑色', 'openingSide': 'left',
+            'hingePositions': [100, 700], 'hingeGaps': [600], 'hingeCount': 2, 'remark': '',
+        }
+    return {
+        'profileSize': '2020', 'colorMode': 'silver', 'totalQuantity': 12,
+        'lines': [{'id': f'a{index}', 'name': '角码', 'quantity': rng.randint(1, 8)} for index in range(4)],
+    }
+
+
+def _orders(count, items, seed):
+    rng = random.Random(seed)
+    return [
+        SimpleNamespace(
+            user_id=rng.randint(1, 50), recipient_name='张三', phone='13900000001', province='上海',
+            address_detail='浦东新区测试路1号', shipping_method='express', shipping_fee=20, overlength_fee=0,
+            subtotal=1000, total_amount=1020, memo='',
+            items=[
+                SimpleNamespace(
+                    product_id=f'p{rng.randint(1, 8)}', product_name='铝型材', product_type='profile',
+                    quantity=rng.randint(1, 9), unit_price=rng.random() * 100, total_price=rng.random() * 900,
+                    config=_config(rng),
+                )
+                for _ in range(items)
+            ],
+        )
+        for _ in range(count)
+    ]
+
+
+def _measure(label, refresh, orders):
+    started = time.perf_counter()
+    for order in orders:
+        refresh(order)
+    elapsed = time.perf_counter() - started
+    print(f'{label:<22} {elapsed * 1000:>9.1f} ms  {elapsed / len(orders) * 1000:>7.2f} ms/order')
+    return [order.duplicate_fingerprint for order in orders], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--items', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    orders = _orders(args.orders, args.items, args.seed)
+    print(f'{args.orders} orders x {args.items} items')
+    expected, v1 = _measure('schema v1 (original)', _v1_refresh, orders)
+    fingerprints, current = _measure('streaming', refresh_order_json, orders)
+    assert fingerprints == expected
+    print(f'speedup: {v1 / current:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
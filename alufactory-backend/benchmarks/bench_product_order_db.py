@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Per-call latency of the product-order snapshot DB: legacy connect-per-call vs pooled.
+
+The legacy path re-ran the schema DDL and opened a fresh sqlite3 connection on
+every call; the pooled path reuses the per-thread WAL connection.
+
+Usage:
+  python benchmarks/bench_product_order_db.py [--calls 500]
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.product_order_db import (  # noqa: E402
+    _create_schema,
+    _get_db_path,
+    close_product_order_connections,
+    query_order_snapshots,
+    reset_product_order_db_state,
+)
+
+
+def _legacy_query(instance_path):
+    db_path = _get_db_path(instance_path)
+    _create_schema(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        total = conn.execute('SELECT COUNT(*) AS c FROM product_order_entries').fetchone()['c']
+        rows = conn.execute(
+            'SELECT * FROM product_order_entries ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?',
+            (50, 0),
+        ).fetchall()
+        return [dict(r) for r in rows], total
+    finally:
+        conn.close()
+
+
+def _pooled_query(instance_path):
+    return query_order_snapshots(instance_path, page=1, per_page=50)
+
+
+def _measure(label, fn, instance_path, calls):
+    fn(instance_path)
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn(instance_path)
+    elapsed = time.perf_counter() - started
+    per_call_us = elapsed / calls * 1_000_000
+    print(f'{label:<28} {calls:>6} calls  {per_call_us:>10.1f} us/call')
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as instance_path:
+        legacy = _measure('legacy (init + connect)', _legacy_query, instance_path, args.calls)
+        pooled = _measure('pooled connection', _pooled_query, instance_path, args.calls)
+        print(f'speedup: {legacy / pooled:.1f}x')
+        close_product_order_connections()
+        reset_product_order_db_state(instance_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Per-item cost of an item sketch: cold render vs cache hit.
+
+For one representative sketch per category in CATEGORY_LABELS, reports microseconds
+for the ImageDraw render saved with ``optimize=True`` (the original encoder setting),
+the render as shipped (low zlib level) and a memory-tier hit (key hash plus LRU
+lookup), and the PNG sizes of both encodings.
+
+Usage:
+  python benchmarks/bench_sketch_render.py [--renders 500]
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.product_order_db import CATEGORY_LABELS  # noqa: E402
+from app.sketch_cache import _LRU, sketch_key, sketch_spec  # noqa: E402
+from app.sketch_render import draw_sketch, render_sketch_png  # noqa: E402
+
+GEOMETRY = {
+    'pegboard': (600, 400, None, []),
+    'aluminum_frame_door': (450, 1200, 'left', [100, 600, 1100]),
+}
+
+
+def _optimized_png(spec):
+    """The same drawing, saved the way the original code saved it."""
+    buf = io.BytesIO()
+    draw_sketch(spec).save(buf, format='PNG', optimize=True)
+    return buf.getvalue()
+
+
+def _measure(fn, spec, renders):
+    result = fn(spec)
+    started = time.perf_counter()
+    for _ in range(renders):
+        fn(spec)
+    return (time.perf_counter() - started) / renders * 1_000_000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=500)
+    args = parser.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print('Pillow is not installed; sketches cannot be rendered.')
+        return
+
+    tier = _LRU(16)
+    print(f"{'category':<22} {'optimize us':>12} {'render us':>10} {'cached us':>10} {'optimize B':>11} {'render B':>9}")
+    for category_code in CATEGORY_LABELS:
+        width, height, side, hinges = GEOMETRY.get(category_code, (800, 600, None, []))
+        spec = sketch_spec(category_code, width, height, side, hinges)
+        tier.put(sketch_key(spec), render_sketch_png(spec))
+        optimize_us, optimized = _measure(_optimized_png, spec, args.renders)
+        render_us, rendered = _measure(render_sketch_png, spec, args.renders)
+        cached_us, _ = _measure(lambda s: tier.get(sketch_key(s)), spec, args.renders)
+        print(
+            f'{category_code:<22} {optimize_us:>12.1f} {render_us:>10.1f} {cached_us:>10.1f} '
+            f'{len(optimized):>11} {len(rendered):>9}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,33 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=30)
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB max request size (for PDF uploads)
+    # Streaming PDF uploads are cut off once this many bytes have been received.
+    PDF_UPLOAD_MAX_BYTES = int(os.getenv('PDF_UPLOAD_MAX_BYTES', str(40 * 1024 * 1024)))
+    # Product-order snapshot sync runs on background workers after the order commit.
+    SNAPSHOT_SYNC_ASYNC = os.getenv('SNAPSHOT_SYNC_ASYNC', '1') == '1'
+    SNAPSHOT_SYNC_WORKERS = int(os.getenv('SNAPSHOT_SYNC_WORKERS', '2'))
+    SNAPSHOT_SYNC_MAX_ATTEMPTS = int(os.getenv('SNAPSHOT_SYNC_MAX_ATTEMPTS', '5'))
+    SNAPSHOT_BACKFILL_BATCH_SIZE = int(os.getenv('SNAPSHOT_BACKFILL_BATCH_SIZE', '200'))
+    SNAPSHOT_BACKFILL_THROTTLE_SECONDS = float(os.getenv('SNAPSHOT_BACKFILL_THROTTLE_SECONDS', '0.2'))
+    # Server-side order PDFs render on a process pool; at most PDF_RENDER_QUEUE_SIZE jobs wait.
+    PDF_RENDER_ASYNC = os.getenv('PDF_RENDER_ASYNC', '1') == '1'
+    PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', '2'))
+    PDF_RENDER_QUEUE_SIZE = int(os.getenv('PDF_RENDER_QUEUE_SIZE', '8'))
+    PDF_RENDER_ON_ORDER_CREATE = os.getenv('PDF_RENDER_ON_ORDER_CREATE', '0') == '1'
+    # 'strict' takes profile bars and accessory pieces from stock when an order is placed
+    # and rejects orders stock cannot cover; 'off' leaves stock to manual admin edits.
+    INVENTORY_RESERVATION_MODE = os.getenv('INVENTORY_RESERVATION_MODE', 'off')
+    # Saw kerf taken by every cut when packing profile lengths into stock bars.
+    CUT_KERF_MM = int(os.getenv('CUT_KERF_MM', '3'))
+    # Orders with an item quantity above this are rejected; cut packing works per piece.
+    ORDER_ITEM_MAX_QUANTITY = int(os.getenv('ORDER_ITEM_MAX_QUANTITY', '10000'))
+    # PDFs live in a blob store: 'local' (BLOB_STORAGE_ROOT, default the instance folder) or 's3'.
+    BLOB_STORAGE_BACKEND = os.getenv('BLOB_STORAGE_BACKEND', 'local')
+    BLOB_STORAGE_ROOT = os.getenv('BLOB_STORAGE_ROOT')
+    BLOB_S3_BUCKET = os.getenv('BLOB_S3_BUCKET')
+    BLOB_S3_PREFIX = os.getenv('BLOB_S3_PREFIX', '')
+    BLOB_S3_ENDPOINT_URL = os.getenv('BLOB_S3_ENDPOINT_URL')
+    BLOB_S3_REGION = os.getenv('BLOB_S3_REGION')
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -26,6 +53,8 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SNAPSHOT_SYNC_ASYNC = False
+    PDF_RENDER_ASYNC = False
 
 config = {
     'development': DevelopmentConfig,
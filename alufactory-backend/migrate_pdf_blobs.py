@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Move base64 PDFs stored in profiles.pdf_base64 / pdf_no_price_base64 into the
+configured blob store (BLOB_STORAGE_BACKEND) and clear the columns, then index
+legacy instance/order_pdfs files as order_documents rows.
+
+Commits after every batch, so it is safe to interrupt and rerun. Rows whose
+base64 cannot be decoded are left untouched and reported.
+
+Usage:
+  python migrate_pdf_blobs.py [--batch-size 50]
+"""
+
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+load_dotenv()
+
+os.environ.setdefault('SNAPSHOT_SYNC_ASYNC', '0')
+
+from app import create_app
+from app.order_documents import index_legacy_order_pdfs
+from app.pdf_storage import migrate_profile_pdf_blobs
+
+
+def _print_progress(stats):
+    print(f"  • {stats['profiles']} profiles, {stats['blobs']} PDFs moved ({stats['bytes']} bytes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move profile PDFs out of the database')
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    with app.app_context():
+        stats = migrate_profile_pdf_blobs(batch_size=max(1, args.batch_size), progress=_print_progress)
+        documents = index_legacy_order_pdfs()
+
+    print(f"✓ Moved {stats['blobs']} PDFs from {stats['profiles']} profiles into blob storage")
+    print(f"✓ Indexed {documents['indexed']} of {documents['files']} order_pdfs files as order documents")
+    if stats['failed']:
+        print(f"✗ {stats['failed']} PDFs could not be decoded and were left in the database")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
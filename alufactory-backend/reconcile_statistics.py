@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Verify the dashboard statistics rollups against the orders and order_items tables.
+
+Prints every mismatching rollup row and exits 1 when drift is found. With --fix
+the rollup tables are rebuilt from the raw tables in one transaction.
+
+Usage:
+  python reconcile_statistics.py [--fix]
+"""
+
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+load_dotenv()
+
+os.environ.setdefault('SNAPSHOT_SYNC_ASYNC', '0')
+
+from app import create_app
+from app.models.user import db
+from app.stats_rollup import reconcile_stats_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile statistics rollups')
+    parser.add_argument('--fix', action='store_true', help='rebuild the rollups when they differ')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV', 'development'))
+    with app.app_context():
+        mismatches = reconcile_stats_rollups(fix=args.fix)
+        if not mismatches:
+            print('✓ Statistics rollups match the order tables')
+            return 0
+
+        for mismatch in mismatches:
+            print(f"  • {mismatch['table']} {mismatch['key']}: expected {mismatch['expected']}, found {mismatch['actual']}")
+        if args.fix:
+            db.session.commit()
+            print(f'✓ Rebuilt statistics rollups ({len(mismatches)} rows differed)')
+            return 0
+        print(f'✗ {len(mismatches)} rollup rows differ; rerun with --fix to rebuild')
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import pytest
+
+from app import create_app
+from app.models.user import db
+from app.product_order_db import reset_product_order_db_state
+
+
+@pytest.fixture
+def app(tmp_path):
+    # instance_path holds the product-order database; keep it out of the real instance/.
+    app = create_app('testing')
+    app.instance_path = str(tmp_path)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+    reset_product_order_db_state(str(tmp_path))
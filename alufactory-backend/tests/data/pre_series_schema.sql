@@ -0,0 +1,149 @@
+CREATE TABLE accessory_inventory (
+	id INTEGER NOT NULL, 
+	accessory_id VARCHAR(80) NOT NULL, 
+	profile_size VARCHAR(20) NOT NULL, 
+	color_id VARCHAR(50) NOT NULL, 
+	quantity INTEGER NOT NULL, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_accessory_inventory_sku UNIQUE (accessory_id, profile_size, color_id)
+);
+CREATE TABLE addresses (
+	id VARCHAR(36) NOT NULL, 
+	user_id VARCHAR(36) NOT NULL, 
+	recipient_name VARCHAR(120) NOT NULL, 
+	phone VARCHAR(20) NOT NULL, 
+	province VARCHAR(50) NOT NULL, 
+	detail TEXT NOT NULL, 
+	is_default BOOLEAN, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE cart_items (
+	id VARCHAR(36) NOT NULL, 
+	cart_id VARCHAR(36) NOT NULL, 
+	product_id VARCHAR(50) NOT NULL, 
+	product_name VARCHAR(255) NOT NULL, 
+	product_type VARCHAR(50) NOT NULL, 
+	quantity INTEGER NOT NULL, 
+	unit_price FLOAT NOT NULL, 
+	total_price FLOAT NOT NULL, 
+	config JSON, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(cart_id) REFERENCES carts (id)
+);
+CREATE TABLE carts (
+	id VARCHAR(36) NOT NULL, 
+	user_id VARCHAR(36) NOT NULL, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	UNIQUE (user_id), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE order_items (
+	id VARCHAR(36) NOT NULL, 
+	order_id VARCHAR(36) NOT NULL, 
+	product_id VARCHAR(50) NOT NULL, 
+	product_name VARCHAR(255) NOT NULL, 
+	product_type VARCHAR(50) NOT NULL, 
+	quantity INTEGER NOT NULL, 
+	unit_price FLOAT NOT NULL, 
+	total_price FLOAT NOT NULL, 
+	config JSON, 
+	created_at DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(order_id) REFERENCES orders (id)
+);
+CREATE TABLE orders (
+	id VARCHAR(36) NOT NULL, 
+	order_number VARCHAR(50) NOT NULL, 
+	user_id VARCHAR(36) NOT NULL, 
+	address_id VARCHAR(36), 
+	recipient_name VARCHAR(120) NOT NULL, 
+	phone VARCHAR(20) NOT NULL, 
+	province VARCHAR(50) NOT NULL, 
+	address_detail TEXT NOT NULL, 
+	subtotal FLOAT, 
+	shipping_fee FLOAT, 
+	total_amount FLOAT NOT NULL, 
+	shipping_method VARCHAR(50), 
+	overlength_fee FLOAT, 
+	order_json JSON, 
+	duplicate_fingerprint VARCHAR(64), 
+	status VARCHAR(50) NOT NULL, 
+	payment_method VARCHAR(50), 
+	payment_transaction_no VARCHAR(120), 
+	paid_at DATETIME, 
+	tracking_number VARCHAR(100), 
+	memo TEXT, 
+	admin_memo TEXT, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	shipped_at DATETIME, 
+	delivered_at DATETIME, 
+	cancelled_at DATETIME, 
+	PRIMARY KEY (id), 
+	UNIQUE (order_number), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE profile_inventory (
+	id INTEGER NOT NULL, 
+	variant_id VARCHAR(50) NOT NULL, 
+	color_id VARCHAR(50) NOT NULL, 
+	bar_length_m FLOAT NOT NULL, 
+	bar_count INTEGER NOT NULL, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_profile_inventory_sku UNIQUE (variant_id, color_id, bar_length_m)
+);
+CREATE TABLE profiles (
+	id VARCHAR(36) NOT NULL, 
+	user_id VARCHAR(36) NOT NULL, 
+	profile_name VARCHAR(255), 
+	profile_data JSON, 
+	address_recipient_name VARCHAR(120), 
+	address_phone VARCHAR(20), 
+	address_province VARCHAR(50), 
+	address_detail TEXT, 
+	pdf_path VARCHAR(500), 
+	pdf_filename VARCHAR(255), 
+	pdf_base64 TEXT, 
+	pdf_no_price_path VARCHAR(500), 
+	pdf_no_price_filename VARCHAR(255), 
+	pdf_no_price_base64 TEXT, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	PRIMARY KEY (id), 
+	UNIQUE (user_id), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE users (
+	id VARCHAR(36) NOT NULL, 
+	username VARCHAR(80) NOT NULL, 
+	phone VARCHAR(20) NOT NULL, 
+	email VARCHAR(120), 
+	password_hash VARCHAR(255) NOT NULL, 
+	full_name VARCHAR(120), 
+	membership_level VARCHAR(50), 
+	membership_points INTEGER, 
+	is_active BOOLEAN, 
+	is_admin BOOLEAN, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	last_login DATETIME, 
+	PRIMARY KEY (id), 
+	UNIQUE (username), 
+	UNIQUE (phone), 
+	UNIQUE (email)
+);
+CREATE INDEX ix_accessory_inventory_accessory_id ON accessory_inventory (accessory_id);
+CREATE INDEX ix_accessory_inventory_color_id ON accessory_inventory (color_id);
+CREATE INDEX ix_accessory_inventory_profile_size ON accessory_inventory (profile_size);
+CREATE INDEX ix_orders_duplicate_fingerprint ON orders (duplicate_fingerprint);
+CREATE INDEX ix_profile_inventory_color_id ON profile_inventory (color_id);
+CREATE INDEX ix_profile_inventory_variant_id ON profile_inventory (variant_id);
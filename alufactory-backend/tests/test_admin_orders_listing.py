@@ -0,0 +1,184 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app.models.user import Order, OrderItem, Profile, User, db
+from app.order_pdf_index import order_pdf_dir
+from app.order_snapshot import refresh_order_json
+from app.snapshot_backfill import run_snapshot_backfill
+
+
+def _admin_headers(client):
+    admin = User(username='orders-admin', phone='13800000001', is_admin=True)
+    admin.set_password('admin')
+    db.session.add(admin)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'phone': admin.phone, 'password': 'admin'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def _seed_orders(count):
+    users = []
+    for index in range(5):
+        user = User(username=f'customer-{index}', phone=f'1390000{index:04d}')
+        user.set_password('secret')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+    # The single profile PDF slot holds the PDF of ORD00035 only.
+    db.session.add(Profile(user_id=users[0].id, pdf_filename='ORD00035.pdf', pdf_base64='JVBERi0='))
+
+    orders = []
+    started = datetime(2026, 7, 1, 10, 0, 0)
+    for index in range(count):
+        user = users[index % len(users)]
+        order = Order(
+            order_number=f'ORD{index:05d}',
+            user_id=user.id,
+            recipient_name='测试客户',
+            phone=user.phone,
+            province='上海',
+            address_detail=f'测试地址{index}号',
+            total_amount=28,
+            created_at=started + timedelta(minutes=index),
+        )
+        order.items.append(OrderItem(
+            product_id='2020', product_name='2020', product_type='profile',
+            quantity=1, unit_price=20, total_price=20, config={'length': 500},
+        ))
+        db.session.add(order)
+        orders.append(order)
+    db.session.flush()
+    for order in orders:
+        refresh_order_json(order)
+    db.session.commit()
+    return orders
+
+
+def _count_queries(client, url, headers):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _record)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), len(statements)
+
+
+def test_admin_orders_listing_uses_fixed_query_count(app, tmp_path):
+    client = app.test_client()
+    headers = _admin_headers(client)
+    orders = _seed_orders(40)
+
+    pdf_dir = tmp_path / 'order_pdfs'
+    pdf_dir.mkdir()
+    (pdf_dir / f'{orders[-2].id}.pdf').write_bytes(b'%PDF-1.4')
+    (pdf_dir / f'{orders[-2].id}_no_price.pdf').write_bytes(b'%PDF-1.4')
+    assert order_pdf_dir(str(tmp_path)) == str(pdf_dir)
+
+    small_page, small_count = _count_queries(client, '/api/admin/orders?per_page=5', headers)
+    large_page, large_count = _count_queries(client, '/api/admin/orders?per_page=40', headers)
+
+    assert len(small_page['orders']) == 5
+    assert len(large_page['orders']) == 40
+    assert small_count == large_count
+
+    by_number = {order['order_number']: order for order in large_page['orders']}
+    with_file = by_number['ORD00038']
+    assert with_file['pdf']['available'] and with_file['pdf']['no_price_available']
+    assert with_file['pdf']['no_price_filename'] == 'ORD00038_no_price.pdf'
+    assert with_file['items'][0]['product_id'] == '2020'
+    assert by_number['ORD00035']['pdf']['available']  # customer-0's profile PDF is this order's
+    assert not by_number['ORD00030']['pdf']['available']  # ...and not another order's
+    assert not by_number['ORD00036']['pdf']['available']
+    assert not by_number['ORD00036']['pdf']['no_price_available']
+    assert by_number['ORD00036']['user']['username'] == 'customer-1'
+
+    # A newly stored PDF shows up without restarting the process.
+    (pdf_dir / f'{orders[-4].id}.pdf').write_bytes(b'%PDF-1.4')
+    refreshed, _ = _count_queries(client, '/api/admin/orders?per_page=40', headers)
+    assert next(o for o in refreshed['orders'] if o['order_number'] == 'ORD00036')['pdf']['available']
+
+
+def test_admin_orders_cursor_pagination_walks_every_order_once(app):
+    client = app.test_client()
+    headers = _admin_headers(client)
+    orders = _seed_orders(23)
+    for order in orders[:6]:
+        order.created_at = datetime(2026, 8, 1, 9, 0, 0)  # ties are broken by id
+    db.session.commit()
+
+    seen = []
+    cursor = ''
+    while True:
+        response = client.get(f'/api/admin/orders?cursor={cursor}&per_page=5', headers=headers)
+        assert response.status_code == 200
+        payload = response.get_json()
+        assert 'total' not in payload
+        seen.extend(order['id'] for order in payload['orders'])
+        if not payload['has_more']:
+            assert payload['next_cursor'] is None
+            break
+        cursor = payload['next_cursor']
+
+    expected = sorted(orders, key=lambda order: (order.created_at, order.id), reverse=True)
+    assert seen == [order.id for order in expected]
+
+    with_total = client.get('/api/admin/orders?cursor=&per_page=5&include_total=1', headers=headers).get_json()
+    assert with_total['total'] == 23
+    assert client.get('/api/admin/orders?cursor=not-a-cursor', headers=headers).status_code == 400
+    run_snapshot_backfill(app)
+    snapshot_cursor = client.get('/api/admin/product-orders?cursor=&per_page=1', headers=headers).get_json()['next_cursor']
+    assert snapshot_cursor
+    assert client.get(f'/api/admin/orders?cursor={snapshot_cursor}', headers=headers).status_code == 400
+
+
+def test_admin_orders_cursor_pagination_puts_undated_orders_last(app):
+    client = app.test_client()
+    headers = _admin_headers(client)
+    orders = _seed_orders(9)
+    for order in orders[2:5]:
+        order.created_at = None
+    db.session.commit()
+
+    seen = []
+    cursor = ''
+    while True:
+        payload = client.get(f'/api/admin/orders?cursor={cursor}&per_page=4', headers=headers).get_json()
+        seen.extend(order['id'] for order in payload['orders'])
+        if not payload['has_more']:
+            break
+        cursor = payload['next_cursor']
+
+    dated = sorted(orders[:2] + orders[5:], key=lambda order: (order.created_at, order.id), reverse=True)
+    undated = sorted(orders[2:5], key=lambda order: order.id, reverse=True)
+    assert seen == [order.id for order in dated + undated]
+
+
+def test_admin_orders_cursor_seek_is_an_index_range_search(app):
+    client = app.test_client()
+    headers = _admin_headers(client)
+    _seed_orders(6)
+    cursor = client.get('/api/admin/orders?cursor=&per_page=2', headers=headers).get_json()['next_cursor']
+
+    seeks = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM orders' in statement and '(orders.created_at, orders.id) <' in statement:
+            seeks.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', _record)
+    try:
+        assert client.get(f'/api/admin/orders?cursor={cursor}&per_page=2', headers=headers).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _record)
+
+    statement, parameters = seeks[0]
+    plan = ' '.join(row[3] for row in db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+    assert 'SEARCH orders USING INDEX idx_orders_created_at_id ((created_at,id)<(?,?))' in plan
+    assert 'SCAN' not in plan and 'TEMP B-TREE' not in plan
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app.models.user import Order, OrderItem, User, db
+
+
+def _admin_headers(client):
+    admin = User(username='stats-admin', phone='13800000001', is_admin=True)
+    admin.set_password('admin')
+    db.session.add(admin)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'phone': admin.phone, 'password': 'admin'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def _add_orders(user, count, status, month, color_id='red'):
+    for index in range(count):
+        order = Order(
+            order_number=f'ORD-{status}-{month}-{color_id}-{index}',
+            user_id=user.id,
+            recipient_name='测试客户',
+            phone=user.phone,
+            province='上海',
+            address_detail='测试地址',
+            total_amount=100,
+            status=status,
+            created_at=datetime(2026, month, 3, 10, 0, 0),
+        )
+        order.items.append(OrderItem(
+            product_id='2020', product_name='2020', product_type='profile',
+            quantity=2, unit_price=10, total_price=20,
+            config={'variantId': '2020', 'colorId': color_id, 'length': 1500},
+        ))
+        order.items.append(OrderItem(
+            product_id='hinge', product_name='铰链', product_type='accessory',
+            quantity=4, unit_price=5, total_price=20, config={'colorId': 'black'},
+        ))
+        db.session.add(order)
+    db.session.commit()
+
+
+def _statistics(client, headers):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _record)
+    try:
+        response = client.get('/api/admin/statistics', headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _record)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), len(statements)
+
+
+def test_statistics_are_sql_aggregates_with_flat_query_count(app):
+    client = app.test_client()
+    headers = _admin_headers(client)
+    customer = User(username='stats-customer', phone='13900000001', is_active=False)
+    customer.set_password('secret')
+    db.session.add(customer)
+    db.session.commit()
+
+    _add_orders(customer, 1, 'confirmed', 7)
+    _add_orders(customer, 1, 'pending', 7, color_id='black')
+    small, small_queries = _statistics(client, headers)
+    assert small['top_profile_colors'] == [{'color_id': 'red', 'color_name': '中国红', 'meters': 3.0}]
+
+    _add_orders(customer, 20, 'delivered', 8, color_id='black')
+    _add_orders(customer, 5, 'shipped', 7, color_id='natural')
+    _add_orders(customer, 3, 'cancelled', 8)
+    stats, large_queries = _statistics(client, headers)
+
+    assert large_queries == small_queries
+    assert stats['total_users'] == 2
+    assert stats['active_users'] == 1
+    assert stats['total_orders'] == 30
+    assert stats['pending_orders'] == 1
+    assert stats['paid_orders'] == 26
+    assert stats['shipped_orders'] == 5
+    assert stats['delivered_orders'] == 20
+    assert stats['total_revenue'] == 2600.0
+    assert stats['monthly_revenue'] == [
+        {'month': '2026-07', 'revenue': 600.0},
+        {'month': '2026-08', 'revenue': 2000.0},
+    ]
+    assert [(row['color_id'], row['meters']) for row in stats['top_profile_colors']] == [
+        ('black', 60.0),
+        ('red', 3.0),
+    ]
+
+    item = OrderItem.query.filter_by(product_type='accessory').first()
+    assert (item.profile_color_id, item.profile_meters) == (None, 0.0)
+    db.session.remove()
+    db.drop_all()
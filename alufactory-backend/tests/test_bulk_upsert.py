@@ -0,0 +1,40 @@
+from sqlalchemy.dialects import mysql
+
+from app.accessory_inventory import ACCESSORY_FINISH_ID, apply_accessory_inventory_records
+from app.bulk_upsert import _upsert_statement, upsert_rows
+from app.models.user import AccessoryInventory, ProfileInventory, ProfileUsageRollup, db
+from app.profile_inventory import apply_inventory_records
+
+
+def test_inventory_records_are_upserted_on_their_unique_keys(app):
+    seeded = ProfileInventory.query.count()
+    applied = apply_inventory_records([
+        ('2020', 'red', 3.15, 12),
+        ('2020', 'red', 3.15, 15),  # repeated key: the last row wins
+        ('4040', 'black', 6.0, 3),
+    ])
+    assert applied == 3
+    assert ProfileInventory.query.count() == seeded + 1
+    assert ProfileInventory.query.filter_by(variant_id='2020', color_id='red').one().bar_count == 15
+    assert ProfileInventory.query.filter_by(variant_id='4040', bar_length_m=6.0).one().bar_count == 3
+
+    apply_accessory_inventory_records([('1', '2020', 7), ('1', '2020', 9)])
+    row = AccessoryInventory.query.filter_by(accessory_id='1', profile_size='2020').one()
+    assert (row.color_id, row.quantity) == (ACCESSORY_FINISH_ID, 9)
+
+
+def test_increment_upsert_and_mysql_statement(app):
+    table = ProfileUsageRollup.__table__
+    rows = [
+        {'color_id': 'red', 'variant_id': '2020', 'meters': 1.5},
+        {'color_id': 'red', 'variant_id': '2020', 'meters': 2.0},
+        {'color_id': 'black', 'variant_id': '3030', 'meters': 4.0},
+    ]
+    with db.engine.begin() as connection:
+        assert upsert_rows(connection, table, ('color_id', 'variant_id'), rows, increment_columns=('meters',), chunk_size=2) == 3
+        # Without columns to update, existing rows are kept as they are.
+        upsert_rows(connection, table, ('color_id', 'variant_id'), [{'color_id': 'red', 'variant_id': '2020', 'meters': 99.0}])
+    assert {(row.color_id, row.meters) for row in ProfileUsageRollup.query} == {('red', 3.5), ('black', 4.0)}
+
+    compiled = str(_upsert_statement('mysql', table, ['color_id', 'variant_id'], [], ['meters']).compile(dialect=mysql.dialect()))
+    assert 'ON DUPLICATE KEY UPDATE meters = (profile_usage_rollup.meters + VALUES(meters))' in compiled
@@ -0,0 +1,69 @@
+import random
+
+from app.cut_list import Cut, pack_cuts
+from app.models.user import Order, User, db
+
+
+def _cuts(*lengths):
+    return [Cut(length, 'order', str(index)) for index, length in enumerate(lengths)]
+
+
+def test_packing_respects_kerf_and_improves_on_first_fit_decreasing():
+    # FFD puts 4+4 and 3+3+3 together and needs a third bar; 4+3+3 twice fits in two.
+    assert pack_cuts(_cuts(4, 4, 3, 3, 3, 3), bar_length_mm=10, kerf_mm=0, improve=False)['bars'] == 3
+    plan = pack_cuts(_cuts(4, 4, 3, 3, 3, 3), bar_length_mm=10, kerf_mm=0)
+    assert (plan['ffd_bars'], plan['bars'], plan['waste_pct']) == (3, 2, 0.0)
+
+    # Two 1575 mm pieces fill a 3150 mm bar only without a saw kerf.
+    assert pack_cuts(_cuts(1575, 1575), kerf_mm=0)['bars'] == 1
+    assert pack_cuts(_cuts(1575, 1575))['bars'] == 2
+    plan = pack_cuts(_cuts(1575, 1575, 1570, 1570, 4000))
+    assert plan['bars'] == 2
+    assert [layout['offcut_mm'] for layout in plan['layouts']] == [2, 2]
+    assert plan['oversize'][0]['length_mm'] == 4000 and plan['oversize_bars'] == 2
+
+    rng = random.Random(7)
+    cuts = _cuts(*(rng.randint(200, 3000) for _ in range(2000)))
+    plan = pack_cuts(cuts)
+    assert plan['lower_bound'] <= plan['bars'] <= plan['ffd_bars']
+    packed = sorted(cut['item_id'] for layout in plan['layouts'] for cut in layout['cuts'])
+    assert packed == sorted(cut.item_id for cut in cuts)
+    assert all(layout['offcut_mm'] >= 0 for layout in plan['layouts'])
+
+
+def test_cut_plan_endpoint_groups_orders_by_variant_and_colour(app):
+    client = app.test_client()
+    admin = User(username='cut-admin', phone='13800000091', is_admin=True)
+    admin.set_password('admin')
+    db.session.add(admin)
+    db.session.commit()
+    headers = {'Authorization': f"Bearer {client.post('/api/auth/login', json={'phone': admin.phone, 'password': 'admin'}).get_json()['access_token']}"}
+
+    def profile(variant_id, color_id, length, quantity):
+        return {
+            'product_id': variant_id, 'product_name': variant_id, 'product_type': 'profile', 'quantity': quantity,
+            'unit_price': 10, 'total_price': 10 * quantity, 'config': {'variantId': variant_id, 'colorId': color_id, 'length': length},
+        }
+
+    order_ids = []
+    for items in ([profile('2020', 'black', 1000, 4), profile('3030', 'natural', 2500, 1)], [profile('2020', 'black', 1100, 2)]):
+        response = client.post('/api/orders', headers=headers, json={
+            'items': items, 'recipient_name': '钱七', 'phone': '13800000091', 'province': '上海',
+            'address_detail': '下料路1号', 'total_amount': 100,
+        })
+        order_ids.append(response.get_json()['order']['id'])
+    Order.query.filter(Order.id == order_ids[0]).one().status = 'confirmed'
+    db.session.commit()
+
+    both = client.post('/api/admin/cut-plans', headers=headers, json={'order_ids': order_ids})
+    assert both.status_code == 200
+    plans = {(plan['variant_id'], plan['color_id']): plan for plan in both.get_json()['plans']}
+    # 4 x 1000 + 2 x 1100: 1000+1000+1000 and 1100+1100+1000 -> two bars.
+    assert plans[('2020', 'black')]['cuts'] == 6 and plans[('2020', 'black')]['bars'] == 2
+    assert plans[('3030', 'natural')]['bars'] == 1
+    summary = both.get_json()['summary']
+    assert summary['orders'] == 2 and summary['bars'] == 3 and summary['runtime_ms'] >= 0
+
+    confirmed = client.post('/api/admin/cut-plans', headers=headers, json={'kerf_mm': 0})
+    assert {plan['variant_id']: plan['cuts'] for plan in confirmed.get_json()['plans']} == {'2020': 4, '3030': 1}
+    assert client.post('/api/admin/cut-plans', headers=headers, json={'kerf_mm': -1}).status_code == 400
@@ -0,0 +1,104 @@
+from app.duplicate_orders import (
+    backfill_duplicate_keys,
+    item_line_tokens,
+    minhash_signature,
+    signature_similarity,
+)
+from app.models.user import DuplicateOrderGroup, OrderDuplicateKey, User, db
+
+
+def _profile(length, quantity=2):
+    return {
+        'product_id': '2020', 'product_name': '2020', 'product_type': 'profile', 'quantity': quantity,
+        'unit_price': 10, 'total_price': 10 * quantity, 'config': {'variantId': '2020', 'colorId': 'black', 'length': length},
+    }
+
+
+def _login(client, phone, is_admin=False):
+    user = User(username=f'dup-{phone}', phone=phone, is_admin=is_admin)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    token = client.post('/api/auth/login', json={'phone': phone, 'password': 'secret'}).get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _create(client, headers, items, memo='', shipping_fee=8):
+    response = client.post('/api/orders', headers=headers, json={
+        'items': items, 'recipient_name': '周九', 'phone': '13900000071', 'province': '上海',
+        'address_detail': '重复路1号', 'subtotal': 100, 'shipping_fee': shipping_fee, 'total_amount': 100 + shipping_fee,
+        'memo': memo,
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['order']['id']
+
+
+def _groups():
+    db.session.expire_all()
+    return sorted(group.order_count for group in DuplicateOrderGroup.query)
+
+
+def test_group_counts_follow_writes_and_report_covers_history(app):
+    client = app.test_client()
+    admin = _login(client, '13800000071', is_admin=True)
+    customer = _login(client, '13900000071')
+    other = _login(client, '13900000072')
+    items = [_profile(500), _profile(1200, 1)]
+
+    repeats = [_create(client, customer, items) for _ in range(3)]
+    edited = _create(client, customer, list(reversed(items)), memo='加急', shipping_fee=20)
+    different = _create(client, customer, [_profile(900)])
+    _create(client, other, items)
+    assert _groups() == [1, 1, 1, 3]
+    assert OrderDuplicateKey.query.count() == 6
+
+    listing = client.get('/api/admin/orders?per_page=200', headers=admin).get_json()['orders']
+    by_id = {order['id']: order for order in listing}
+    assert {by_id[order_id]['duplicate_count'] for order_id in repeats} == {3}
+    assert sorted(by_id[repeats[0]]['duplicate_order_ids']) == sorted(repeats)
+    assert by_id[edited]['duplicate_count'] == 1 and not by_id[edited]['is_duplicate']
+
+    exact = client.get('/api/admin/orders/duplicates', headers=admin).get_json()
+    assert exact['total_groups'] == 1
+    assert sorted(order['id'] for order in exact['groups'][0]['orders']) == sorted(repeats)
+
+    near = client.get('/api/admin/orders/duplicates?mode=near', headers=admin).get_json()
+    assert near['total_groups'] == 1
+    group = near['groups'][0]
+    assert sorted(order['id'] for order in group['orders']) == sorted(repeats + [edited])
+    assert group['fingerprints'] == 2 and group['min_similarity'] == 1.0
+    assert different not in {order['id'] for order in group['orders']}
+
+    # Deleting a repeat moves the count down; the last one leaves the group at one.
+    assert client.delete(f'/api/orders/{repeats[0]}', headers=customer).status_code == 200
+    assert _groups() == [1, 1, 1, 2]
+    client.delete(f'/api/orders/{repeats[1]}', headers=customer)
+    assert _groups() == [1, 1, 1, 1]
+    assert client.get('/api/admin/orders/duplicates', headers=admin).get_json()['groups'] == []
+
+    # A status change keeps the key; the startup backfill rebuilds lost keys.
+    client.put(f'/api/admin/orders/{repeats[2]}/status', headers=admin, json={'status': 'confirmed'})
+    assert _groups() == [1, 1, 1, 1]
+    OrderDuplicateKey.query.delete()
+    DuplicateOrderGroup.query.delete()
+    db.session.commit()
+    assert backfill_duplicate_keys() == 4
+    db.session.commit()
+    assert _groups() == [1, 1, 1, 1]
+
+    for query in ('mode=fuzzy', 'mode=near&threshold=1.5', 'limit=0'):
+        assert client.get(f'/api/admin/orders/duplicates?{query}', headers=admin).status_code == 400
+
+
+def test_minhash_estimates_item_line_similarity():
+    base = {'items': [dict(_profile(100 * index), config={'length': 100 * index}) for index in range(1, 21)]}
+    changed = {'items': base['items'][:18] + [_profile(5000), _profile(6000)]}
+    unrelated = {'items': [_profile(7000 + index) for index in range(20)]}
+
+    signature = minhash_signature(item_line_tokens(base))
+    assert signature_similarity(signature, minhash_signature(item_line_tokens({'items': base['items'][::-1]}))) == 1.0
+    assert 0.6 <= signature_similarity(signature, minhash_signature(item_line_tokens(changed))) < 1.0
+    assert signature_similarity(signature, minhash_signature(item_line_tokens(unrelated))) < 0.2
+    # Repeated lines count separately, and an order without items has no signature.
+    assert len(set(item_line_tokens({'items': [_profile(500), _profile(500)]}))) == 2
+    assert minhash_signature(item_line_tokens({'items': []})) is None
@@ -0,0 +1,163 @@
+import threading
+
+import pytest
+
+from app import create_app
+from app.inventory_reservation import ItemQuantityTooLarge, order_stock_demand
+from app.models.user import AccessoryInventory, InventoryReservation, OrderItem, ProfileInventory, User, db
+from app.product_order_db import reset_product_order_db_state
+from config import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A file database so concurrent requests really contend for the same row.
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'shop.db'}")
+    app = create_app('testing')
+    app.instance_path = str(tmp_path)
+    app.config['INVENTORY_RESERVATION_MODE'] = 'strict'
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+    reset_product_order_db_state(str(tmp_path))
+
+
+def _login(client, phone, is_admin=False):
+    user = User(username=f'stock-{phone}', phone=phone, is_admin=is_admin)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'phone': phone, 'password': 'secret'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def _order(items):
+    return {
+        'items': items,
+        'recipient_name': '赵六',
+        'phone': '13900000061',
+        'province': '上海',
+        'address_detail': '库存测试路1号',
+        'subtotal': 30,
+        'shipping_fee': 8,
+        'total_amount': 38,
+    }
+
+
+RED_BAR = {
+    'product_id': '2020', 'product_name': '2020', 'product_type': 'profile', 'quantity': 1,
+    'unit_price': 30, 'total_price': 30, 'config': {'variantId': '2020', 'colorId': 'red', 'length': 2000},
+}
+
+
+def _red_stock():
+    db.session.expire_all()
+    return ProfileInventory.query.filter_by(variant_id='2020', color_id='red').one().bar_count
+
+
+def test_concurrent_orders_never_oversell_and_release_on_cancel_and_delete(app):
+    client = app.test_client()
+    headers = _login(client, '13900000061')
+    admin_headers = _login(client, '13900000062', is_admin=True)
+    ProfileInventory.query.filter_by(variant_id='2020', color_id='red').one().bar_count = 5
+    db.session.commit()
+
+    statuses, created = [], []
+    start = threading.Barrier(16)
+
+    def place_order():
+        thread_client = app.test_client()
+        start.wait()
+        response = thread_client.post('/api/orders', headers=headers, json=_order([RED_BAR]))
+        statuses.append(response.status_code)
+        if response.status_code == 201:
+            created.append(response.get_json()['order']['id'])
+        else:
+            assert response.get_json()['shortages'][0]['variant_id'] == '2020'
+
+    threads = [threading.Thread(target=place_order) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [201] * 5 + [409] * 11
+    assert _red_stock() == 0
+    assert InventoryReservation.query.count() == 5
+
+    cancelled = client.put(f'/api/admin/orders/{created[0]}/status', headers=admin_headers, json={'status': 'cancelled'})
+    assert cancelled.status_code == 200
+    assert _red_stock() == 1
+    assert client.delete(f'/api/orders/{created[0]}', headers=headers).status_code == 200
+    assert _red_stock() == 1  # already given back on cancel
+    assert client.delete(f'/api/orders/{created[1]}', headers=headers).status_code == 200
+    assert _red_stock() == 2
+    assert InventoryReservation.query.count() == 3
+
+    # An order that needs more than is left is rejected whole.
+    too_many = client.post('/api/orders', headers=headers, json=_order([dict(RED_BAR, quantity=3)]))
+    assert too_many.status_code == 409
+    assert too_many.get_json()['shortages'][0]['available'] == 2
+    assert _red_stock() == 2
+
+
+def test_order_items_convert_into_bars_and_accessory_pieces(app):
+    items = [
+        # 4 x 1500 and 2 x 1000 pack into three 3.15 m bars; 4000 mm is spliced from two.
+        OrderItem(product_id='2020', product_type='profile', quantity=4, config={'variantId': '2020', 'colorId': 'black', 'length': 1500}),
+        OrderItem(product_id='2020', product_type='profile', quantity=2, config={'variantId': '2020', 'colorId': 'black', 'length': 1000}),
+        OrderItem(product_id='2020', product_type='profile', quantity=1, config={'variantId': '2020', 'colorId': 'black', 'length': 4000}),
+        OrderItem(product_id='x', product_type='profile', quantity=1, config={'variantId': 'custom', 'length': 500}),
+        OrderItem(product_id='acc', product_type='accessory', quantity=2, config={
+            'profileSize': '2020', 'colorMode': 'natural',
+            'lines': [{'id': '1', 'quantity': 10}, {'id': '7L', 'quantity': 4}, {'id': 'unknown', 'quantity': 3}],
+        }),
+        OrderItem(product_id='acc', product_type='accessory', quantity=1, config={
+            'profileSize': '2020', 'colorMode': 'colored', 'lines': [{'id': '1', 'quantity': 5}],
+        }),
+    ]
+    assert order_stock_demand(items) == {
+        ('profile', ('2020', 'black', 3.15)): 5,
+        ('accessory', ('1', '2020')): 20,
+        ('accessory', ('7L', '2020')): 8,
+    }
+
+    client = app.test_client()
+    headers = _login(client, '13900000063')
+    AccessoryInventory.query.filter_by(accessory_id='1', profile_size='2020').one().quantity = 25
+    db.session.commit()
+    accessory = {
+        'product_id': 'acc', 'product_name': '配件', 'product_type': 'accessory', 'quantity': 2,
+        'unit_price': 15, 'total_price': 30, 'config': {'profileSize': '2020', 'lines': [{'id': '1', 'quantity': 10}]},
+    }
+    response = client.post('/api/orders', headers=headers, json=_order([accessory]))
+    assert response.status_code == 201
+    db.session.expire_all()
+    assert AccessoryInventory.query.filter_by(accessory_id='1', profile_size='2020').one().quantity == 5
+    public = client.get('/api/accessories/inventory').get_json()['inventory']
+    assert next(item for item in public if (item['accessory_id'], item['profile_size']) == ('1', '2020'))['quantity'] == 5
+
+
+def test_item_quantities_above_the_limit_are_rejected_before_packing(app):
+    app.config['ORDER_ITEM_MAX_QUANTITY'] = 50
+    with pytest.raises(ItemQuantityTooLarge):
+        order_stock_demand([OrderItem(product_id='2020', product_type='profile', quantity=51, config=RED_BAR['config'])])
+
+    client = app.test_client()
+    headers = _login(client, '13900000064')
+    ProfileInventory.query.filter_by(variant_id='2020', color_id='red').one().bar_count = 5
+    db.session.commit()
+    response = client.post('/api/orders', headers=headers, json=_order([dict(RED_BAR, quantity=51)]))
+    assert response.status_code == 400 and '50' in response.get_json()['error']
+    assert InventoryReservation.query.count() == 0
+
+    created = client.post('/api/orders', headers=headers, json=_order([RED_BAR]))
+    assert created.status_code == 201
+    order_id = created.get_json()['order']['id']
+    assert _red_stock() == 4
+    response = client.put(f'/api/orders/{order_id}', headers=headers, json={'items': [dict(RED_BAR, quantity=51)]})
+    assert response.status_code == 400
+    assert _red_stock() == 4
+    assert [item['quantity'] for item in client.get(f'/api/orders/{order_id}', headers=headers).get_json()['items']] == [1]
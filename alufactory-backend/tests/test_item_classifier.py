@@ -0,0 +1,89 @@
+import itertools
+
+import pytest
+
+from app.item_classifier import PatternMatcher, classify_order_item
+
+
+def _reference(product_type, product_name, product_id):
+    """The if-chain the compiled rules replaced."""
+    ptype = str(product_type or '').strip().lower()
+    pname = str(product_name or '').strip().lower()
+    pid = str(product_id or '').strip().lower()
+    if ptype == 'profile' or '铝型材' in pname:
+        return 'profile'
+    if 'aluminum_plate' in ptype or '铝板' in pname or pid == 'p5':
+        return 'aluminum_plate'
+    if 'marine_board' in ptype or '海洋板' in pname or pid == 'p6':
+        return 'marine_board'
+    if 'cabinet_door' in ptype or '铝框门' in pname or pid == 'p3':
+        return 'aluminum_frame_door'
+    if 'calligraphy_cabinet' in ptype or '舒法特柜子' in pname or '书法特柜子' in pname or pid == 'p7':
+        return 'calligraphy_cabinet'
+    if 'wardrobe' in ptype or '衣柜' in pname or pid == 'p8':
+        return 'wardrobe'
+    if ptype == 'accessory' or '配件' in pname or 'connector' in pname or pid == 'accessory':
+        return 'accessory'
+    if ptype == 'pegboard' or '洞洞板' in pname or pid == 'p1':
+        return 'pegboard'
+    return None
+
+
+CASES = [
+    # (product_type, product_name, product_id, category_code)
+    ('profile', '2020 欧标', '2020', 'profile'),
+    (' Profile ', '', '', 'profile'),
+    ('', '欧标铝型材 2020', '', 'profile'),
+    ('profile_kit', '', '', None),
+    ('aluminum_plate', '', '', 'aluminum_plate'),
+    ('custom_aluminum_plate_v2', '', '', 'aluminum_plate'),
+    ('', '3mm铝板', '', 'aluminum_plate'),
+    ('', '', 'P5', 'aluminum_plate'),
+    ('marine_board', '', '', 'marine_board'),
+    ('', '白色海洋板', 'p6', 'marine_board'),
+    ('cabinet_door', '', '', 'aluminum_frame_door'),
+    ('', '铝框门', 'p3', 'aluminum_frame_door'),
+    ('calligraphy_cabinet', '', '', 'calligraphy_cabinet'),
+    ('', '宜家舒法特柜子', '', 'calligraphy_cabinet'),
+    ('', '书法特柜子 改', '', 'calligraphy_cabinet'),
+    ('', '', 'p7', 'calligraphy_cabinet'),
+    ('wardrobe', '', '', 'wardrobe'),
+    ('', '衣柜', 'p8', 'wardrobe'),
+    ('accessory', '', '', 'accessory'),
+    ('', '角码配件', '', 'accessory'),
+    ('', 'T-Connector', '', 'accessory'),
+    ('', '', 'accessory', 'accessory'),
+    ('accessory_pack', '', '', None),
+    ('pegboard', '', '', 'pegboard'),
+    ('', '铝合金洞洞板', 'p1', 'pegboard'),
+    ('', '', 'p10', None),
+    (None, None, None, None),
+    # Earlier rules win when several match.
+    ('pegboard', '铝板', '', 'aluminum_plate'),
+    ('wardrobe', '铝型材', 'p1', 'profile'),
+    ('accessory', '衣柜配件', 'p8', 'wardrobe'),
+    ('', '铝框门配件', 'accessory', 'aluminum_frame_door'),
+]
+
+
+@pytest.mark.parametrize('product_type,product_name,product_id,expected', CASES)
+def test_classifies_current_mappings(product_type, product_name, product_id, expected):
+    assert classify_order_item(product_type, product_name, product_id) == expected
+    assert _reference(product_type, product_name, product_id) == expected
+
+
+def test_matches_the_if_chain_on_combined_fields():
+    types = ['', 'profile', 'x_aluminum_plate', 'marine_board', 'cabinet_door', 'calligraphy_cabinet', 'wardrobe', 'accessory', 'pegboard', 'other']
+    names = ['', '铝型材', '铝板', '海洋板', '铝框门', '宜家书法特柜子', '衣柜', '配件', 'connector', '洞洞板', '铝框门衣柜', '洞洞板配件', '普通']
+    ids = ['', 'p1', 'p3', 'p5', 'p6', 'p7', 'p8', 'accessory', 'p9']
+    for combination in itertools.product(types, names, ids):
+        assert classify_order_item(*combination) == _reference(*combination), combination
+
+
+def test_pattern_matcher_follows_failure_links():
+    matcher = PatternMatcher([('he', 3), ('she', 2), ('hers', 1), ('is', 0)])
+    assert matcher.best_rank('ushers') == 1
+    assert matcher.best_rank('ushe') == 2
+    assert matcher.best_rank('ahe') == 3
+    assert matcher.best_rank('this') == 0
+    assert matcher.best_rank('xyz') is None
@@ -0,0 +1,91 @@
+import base64
+import hashlib
+from datetime import datetime
+
+from app.models.user import Order, OrderDocument, User, db
+from app.order_documents import document_blob_key, index_legacy_order_pdfs
+
+FIRST_PDF = b'%PDF-1.4\nfirst order sheet\n%%EOF'
+SECOND_PDF = b'%PDF-1.4\nrevised order sheet\n%%EOF'
+
+
+def _customer_with_orders(client, count):
+    user = User(username='documents-customer', phone='13900000041')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    orders = []
+    for index in range(count):
+        order = Order(
+            order_number=f'ORDDOC{index:04d}',
+            user_id=user.id,
+            recipient_name='测试客户',
+            phone=user.phone,
+            province='上海',
+            address_detail='测试地址',
+            total_amount=100,
+            created_at=datetime(2026, 9, 1, 10, index),
+        )
+        db.session.add(order)
+        orders.append(order)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'phone': user.phone, 'password': 'secret'})
+    return orders, {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def _upload_json(client, headers, order, pdf_bytes, pdf_type='with_price'):
+    return client.post(
+        f'/api/orders/{order.id}/pdf',
+        headers=headers,
+        json={'pdf_base64': base64.b64encode(pdf_bytes).decode('ascii'), 'pdf_type': pdf_type},
+    )
+
+
+def test_documents_are_per_order_and_deduplicated_by_hash(app, tmp_path):
+    client = app.test_client()
+    (first, second, third), headers = _customer_with_orders(client, 3)
+
+    assert _upload_json(client, headers, first, FIRST_PDF).status_code == 200
+    raw = client.post(f'/api/orders/{second.id}/pdf', headers=headers, data=FIRST_PDF, content_type='application/pdf')
+    assert raw.status_code == 200
+    assert _upload_json(client, headers, first, FIRST_PDF, pdf_type='without_price').status_code == 200
+
+    documents = OrderDocument.query.order_by(OrderDocument.order_id, OrderDocument.variant).all()
+    assert len(documents) == 3
+    first_sha = hashlib.sha256(FIRST_PDF).hexdigest()
+    assert {document.blob_key for document in documents} == {document_blob_key(first_sha)}
+    stored_files = [path for path in tmp_path.glob('order_documents/**/*') if path.is_file()]
+    assert len(stored_files) == 1
+
+    # Re-uploading replaces this order's row only.
+    assert _upload_json(client, headers, first, SECOND_PDF).status_code == 200
+    first_pdf = client.get(f'/api/orders/{first.id}/pdf', headers=headers)
+    assert first_pdf.data == SECOND_PDF
+    assert first_pdf.headers['ETag'] == f'"{hashlib.sha256(SECOND_PDF).hexdigest()}"'
+    assert client.get(f'/api/orders/{second.id}/pdf', headers=headers).data == FIRST_PDF
+    assert client.get(f'/api/orders/{first.id}/pdf?without_price=1', headers=headers).data == FIRST_PDF
+
+    # The profile still holds the latest upload, but it is not served for another order.
+    assert client.get(f'/api/orders/{third.id}/pdf', headers=headers).status_code == 404
+
+
+def test_legacy_order_pdf_files_are_indexed(app, tmp_path):
+    client = app.test_client()
+    (order,), headers = _customer_with_orders(client, 1)
+    pdf_dir = tmp_path / 'order_pdfs'
+    pdf_dir.mkdir()
+    (pdf_dir / f'{order.id}.pdf').write_bytes(FIRST_PDF)
+    (pdf_dir / f'{order.id}_no_price.pdf').write_bytes(SECOND_PDF)
+    (pdf_dir / 'deleted-order.pdf').write_bytes(FIRST_PDF)
+
+    assert index_legacy_order_pdfs() == {'files': 3, 'indexed': 2, 'skipped': 1}
+    assert index_legacy_order_pdfs()['indexed'] == 0
+
+    no_price = OrderDocument.query.filter_by(order_id=order.id, variant='no_price').one()
+    assert no_price.sha256 == hashlib.sha256(SECOND_PDF).hexdigest()
+    assert no_price.size == len(SECOND_PDF)
+    assert no_price.filename == 'ORDDOC0000_no_price.pdf'
+    assert (tmp_path / no_price.blob_key).read_bytes() == SECOND_PDF
+
+    response = client.get(f'/api/orders/{order.id}/pdf', headers=headers)
+    assert response.headers['ETag'] == f'"{hashlib.sha256(FIRST_PDF).hexdigest()}"'
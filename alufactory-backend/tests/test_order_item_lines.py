@@ -0,0 +1,88 @@
+from app.models.user import OrderItem, OrderItemLine, User, db
+from app.order_item_lines import rebuild_order_item_lines
+
+
+def _profile(variant_id, color_id, length, quantity):
+    return {
+        'product_id': variant_id, 'product_name': variant_id, 'product_type': 'profile', 'quantity': quantity,
+        'unit_price': 5, 'total_price': 5 * quantity, 'config': {'variantId': variant_id, 'colorId': color_id, 'length': length},
+    }
+
+
+PLATE = {
+    'product_id': 'p5', 'product_name': '铝板', 'product_type': 'aluminum_plate', 'quantity': 1,
+    'unit_price': 80, 'total_price': 80, 'config': {'width': 300, 'height': 200, 'thickness': '3mm'},
+}
+
+
+def _lines(order_id):
+    db.session.expire_all()
+    return sorted(
+        (line.category_code, line.variant_id, line.color_id, line.length_mm, line.width_mm, line.quantity, line.meters, line.order_status, line.paid_month)
+        for line in OrderItemLine.query.filter_by(order_id=order_id)
+    )
+
+
+def test_lines_follow_order_writes_and_back_the_usage_report(app):
+    client = app.test_client()
+    admin = User(username='lines-admin', phone='13800000101', is_admin=True)
+    admin.set_password('admin')
+    db.session.add(admin)
+    db.session.commit()
+    headers = {'Authorization': f"Bearer {client.post('/api/auth/login', json={'phone': admin.phone, 'password': 'admin'}).get_json()['access_token']}"}
+
+    def create(items):
+        response = client.post('/api/orders', headers=headers, json={
+            'items': items, 'recipient_name': '孙八', 'phone': '13800000101', 'province': '上海',
+            'address_detail': '分析路1号', 'total_amount': 100,
+        })
+        return response.get_json()['order']['id']
+
+    # Named like a profile but not of the PROFILE product type: no meters, as in profile_meters.
+    named_only = dict(_profile('4040', 'black', 1000, 2), product_type='custom', product_name='4040 铝型材')
+    first = create([_profile('2020', 'black', 1200, 3), PLATE, named_only])
+    assert _lines(first) == [
+        ('aluminum_plate', None, None, None, 300.0, 1, 0.0, 'pending', None),
+        ('profile', '2020', 'black', 1200.0, None, 3, 3.6, 'pending', None),
+        ('profile', '4040', 'black', 1000.0, None, 2, 0.0, 'pending', None),
+    ]
+    stored = {item.product_id: round(item.profile_meters, 6) for item in OrderItem.query.filter_by(order_id=first)}
+    assert stored == {'2020': 3.6, 'p5': 0.0, '4040': 0.0}
+
+    assert client.put(f'/api/admin/orders/{first}/status', headers=headers, json={'status': 'confirmed'}).status_code == 200
+    month = OrderItemLine.query.filter_by(order_id=first).first().paid_month
+    assert month is not None and {line[7] for line in _lines(first)} == {'confirmed'}
+
+    second = create([_profile('2020', 'black', 500, 2), _profile('3030', 'natural', 2000, 1)])
+    client.put(f'/api/orders/{second}', headers=headers, json={'status': 'confirmed'})
+    report = client.get('/api/admin/statistics/profile-usage', headers=headers).get_json()['usage']
+    assert report == [
+        {'variant_id': '2020', 'color_id': 'black', 'pieces': 5, 'meters': 4.6, 'orders': 2},
+        {'variant_id': '3030', 'color_id': 'natural', 'pieces': 1, 'meters': 2.0, 'orders': 1},
+        {'variant_id': '4040', 'color_id': 'black', 'pieces': 2, 'meters': 0.0, 'orders': 1},
+    ]
+    assert client.get(f'/api/admin/statistics/profile-usage?from={month}&to={month}', headers=headers).get_json()['usage'] == report
+    assert client.get('/api/admin/statistics/profile-usage?from=2001-01&to=2001-12', headers=headers).get_json()['usage'] == []
+    assert client.get('/api/admin/statistics/profile-usage?from=2024', headers=headers).status_code == 400
+
+    # Cancelling drops the order out of the paid months; deleting removes its lines.
+    client.put(f'/api/admin/orders/{second}/status', headers=headers, json={'status': 'cancelled'})
+    assert {line[8] for line in _lines(second)} == {None}
+    assert client.delete(f'/api/orders/{second}', headers=headers).status_code == 200
+    assert _lines(second) == []
+
+    # The one-off backfill rebuilds the same lines from the order tables.
+    expected = _lines(first)
+    OrderItemLine.query.delete()
+    db.session.commit()
+    assert rebuild_order_item_lines() == 3
+    db.session.commit()
+    assert _lines(first) == expected
+
+
+def test_usage_report_is_served_from_the_composite_index(app):
+    plan = db.session.execute(db.text(
+        "EXPLAIN QUERY PLAN SELECT variant_id, color_id, SUM(meters) FROM order_item_lines "
+        "WHERE category_code = 'profile' AND paid_month >= '2024-01' GROUP BY variant_id, color_id"
+    )).all()
+    assert any('idx_order_item_lines' in row[-1] for row in plan)
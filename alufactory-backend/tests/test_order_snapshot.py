@@ -0,0 +1,112 @@
+import hashlib
+import json
+import random
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from app.order_snapshot import build_order_json, fingerprint_order_json, refresh_order_json
+
+
+def _v1_number(value):
+    try:
+        return round(float(value or 0), 6)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _v1_json_safe(value):
+    try:
+        return json.loads(json.dumps(value, ensure_ascii=False, sort_keys=True, default=str))
+    except (TypeError, ValueError):
+        return str(value or '')
+
+
+def _v1_fingerprint(order):
+    """schema_version 1 as first shipped: round-trip configs, sort by dumps, hash one dumps."""
+    items = [{
+        'product_id': str(item.product_id or ''),
+        'product_name': str(item.product_name or ''),
+        'product_type': str(item.product_type or ''),
+        'quantity': int(item.quantity or 0),
+        'unit_price': _v1_number(item.unit_price),
+        'total_price': _v1_number(item.total_price),
+        'config': _v1_json_safe(item.config),
+    } for item in order.items]
+    items.sort(key=lambda item: json.dumps(item, ensure_ascii=False, sort_keys=True, separators=(',', ':')))
+    order_json = {
+        'schema_version': 1,
+        'user_id': str(order.user_id or ''),
+        'shipping_address': {
+            'recipient_name': str(order.recipient_name or ''),
+            'phone': str(order.phone or ''),
+            'province': str(order.province or ''),
+            'address_detail': str(order.address_detail or ''),
+        },
+        'shipping': {
+            'method': str(order.shipping_method or ''),
+            'fee': _v1_number(order.shipping_fee),
+            'overlength_fee': _v1_number(order.overlength_fee),
+        },
+        'amounts': {'subtotal': _v1_number(order.subtotal), 'total': _v1_number(order.total_amount)},
+        'memo': str(order.memo or ''),
+        'items': items,
+    }
+    canonical = json.dumps(order_json, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return order_json, hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+CONFIGS = [
+    None,
+    {},
+    {'width': 600, 'height': 800, 'color': '黑色', 'hingePositions': [100, 700], 'openingSide': 'left'},
+    {'lines': [{'id': 'a', 'name': '角码', 'quantity': 2}], 'profileSize': '2020', 'ratio': 0.1 + 0.2},
+    {'nested': {'z': [1, (2, 3)], 'a': {'b': None, 'é': True}}, 'nan': float('nan'), 'neg': -0.0},
+    {10: 'ten', 9: 'nine'},
+    {'when': datetime(2026, 7, 1, 8, 30), 'price': Decimal('12.50'), 'tags': {'x'}},
+    {1: 'int key', 'a': 'mixed keys'},
+    '{"width": 300}',
+    ['loose', 'list'],
+]
+
+
+def _order(rng, items):
+    return SimpleNamespace(
+        user_id=rng.randint(1, 5), recipient_name='张三 ', phone='13900000001', province='上海',
+        address_detail='测试"地址"\\1号', shipping_method='express', shipping_fee=rng.choice([0, 12.5, '8']),
+        overlength_fee=None, subtotal=rng.random() * 1000, total_amount=Decimal('99.999999'), memo='备注\n',
+        items=[
+            SimpleNamespace(
+                product_id=rng.choice(['p1', 'p5', None]), product_name=rng.choice(['铝板', '衣柜', '']),
+                product_type=rng.choice(['profile', 'aluminum_plate']), quantity=rng.randint(0, 9),
+                unit_price=rng.choice([1, 2.345678912, None, 'bad']), total_price=rng.random() * 100,
+                config=rng.choice(CONFIGS),
+            )
+            for _ in range(items)
+        ],
+    )
+
+
+def test_fingerprint_is_byte_identical_to_schema_version_1():
+    rng = random.Random(7)
+    for items in [0, 1, 2, 5, 40, 300]:
+        for _ in range(5):
+            order = _order(rng, items)
+            expected_json, expected = _v1_fingerprint(order)
+            assert fingerprint_order_json(build_order_json(order)) == expected
+            assert fingerprint_order_json(expected_json) == expected
+            snapshot = refresh_order_json(order)
+            assert order.duplicate_fingerprint == expected
+            assert repr(snapshot) == repr(expected_json)
+
+
+def test_item_order_and_config_key_order_do_not_change_the_fingerprint():
+    rng = random.Random(3)
+    order = _order(rng, 20)
+    before = fingerprint_order_json(build_order_json(order))
+    order.items.reverse()
+    for item in order.items:
+        if isinstance(item.config, dict) and all(isinstance(key, str) for key in item.config):
+            item.config = dict(reversed(list(item.config.items())))
+    assert fingerprint_order_json(build_order_json(order)) == before
+    assert fingerprint_order_json({}) == hashlib.sha256(b'{}').hexdigest()
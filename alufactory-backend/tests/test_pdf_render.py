@@ -0,0 +1,189 @@
+import re
+import zlib
+from concurrent.futures import Future
+
+import pytest
+
+from app.models.user import Order, OrderDocument, OrderPdfRender, User, db
+from app.order_pdf_render import render_order_pdf
+from app.pdf_render_queue import PdfRenderQueueFull, PdfRenderService, build_order_pdf_payload
+
+DOOR_ITEM = {
+    'product_id': 'p3',
+    'product_name': '铝框门',
+    'product_type': 'cabinet_door',
+    'quantity': 2,
+    'unit_price': 150,
+    'total_price': 300,
+    'config': {'width': 600, 'height': 800, 'color': '黑色', 'openingSide': 'left', 'hingePositions': [100, 700]},
+}
+PLATE_ITEM = {
+    'product_id': 'p5',
+    'product_name': '铝板',
+    'product_type': 'aluminum_plate',
+    'quantity': 1,
+    'unit_price': 88.5,
+    'total_price': 88.5,
+    'config': {'width': 300, 'height': 200, 'thickness': '3mm'},
+}
+
+
+@pytest.fixture
+def app(app):
+    yield app
+    app.extensions['pdf_render'].stop()
+
+
+def _login_customer(client):
+    user = User(username='render-customer', phone='13900000051')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'phone': user.phone, 'password': 'secret'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def _create_order(client, headers, items):
+    response = client.post('/api/orders', headers=headers, json={
+        'items': items,
+        'recipient_name': '王五',
+        'phone': '13900000051',
+        'province': '上海',
+        'address_detail': '浦东新区测试路1号',
+        'subtotal': sum(item['total_price'] for item in items),
+        'shipping_fee': 20,
+        'total_amount': sum(item['total_price'] for item in items) + 20,
+    })
+    assert response.status_code == 201
+    return response.get_json()['order']['id']
+
+
+def _hex(text):
+    return ''.join(f'{ord(ch):04X}' for ch in text).encode('ascii')
+
+
+def test_generates_both_variants_and_reuses_render_for_identical_order(app):
+    client = app.test_client()
+    headers = _login_customer(client)
+    first_id = _create_order(client, headers, [DOOR_ITEM, PLATE_ITEM])
+
+    response = client.post(f'/api/orders/{first_id}/pdf/generate', headers=headers)
+    assert response.status_code == 200
+    job = response.get_json()['job']
+    assert job['status'] == 'done'
+    for variant in ('with_price', 'no_price'):
+        info = job['variants'][variant]
+        assert info['status'] == 'done'
+        assert info['pages'] == len(info['page_render_ms']) == 1
+        assert all(ms >= 0 for ms in info['page_render_ms'])
+
+    with_price = client.get(f'/api/orders/{first_id}/pdf', headers=headers).data
+    no_price = client.get(f'/api/orders/{first_id}/pdf?without_price=1', headers=headers).data
+    for pdf in (with_price, no_price):
+        assert pdf.startswith(b'%PDF-1.4') and pdf.rstrip().endswith(b'%%EOF')
+        assert b'/STSong-Light' in pdf
+        # The door and plate sketches, embedded as PNG-predicted images.
+        assert pdf.count(b'/Subtype /Image') == 2
+        xref_offset = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+        assert pdf[xref_offset:xref_offset + 4] == b'xref'
+    assert with_price != no_price
+
+    job_status = client.get(f"/api/orders/{first_id}/pdf/jobs/{job['job_id']}", headers=headers)
+    assert job_status.status_code == 200
+    assert job_status.get_json()['job']['variants']['with_price']['sha256'] == job['variants']['with_price']['sha256']
+
+    # Same content (only the order number differs): linked from the cache, nothing rendered.
+    second_id = _create_order(client, headers, [PLATE_ITEM, DOOR_ITEM])
+    second_job = client.post(f'/api/orders/{second_id}/pdf/generate', headers=headers).get_json()['job']
+    assert {info['status'] for info in second_job['variants'].values()} == {'cached'}
+    assert second_job['variants']['no_price']['sha256'] == job['variants']['no_price']['sha256']
+    assert client.get(f'/api/orders/{second_id}/pdf', headers=headers).data == with_price
+    assert OrderPdfRender.query.count() == 2
+    assert OrderDocument.query.count() == 4
+
+    # Existing documents are kept unless forced.
+    again = client.post(f'/api/orders/{second_id}/pdf/generate', headers=headers, json={'variants': ['no_price']})
+    assert again.get_json()['job']['variants'] == {'no_price': {'status': 'exists'}}
+
+
+def test_no_price_variant_omits_prices_and_long_orders_paginate(app):
+    client = app.test_client()
+    headers = _login_customer(client)
+    items = [dict(PLATE_ITEM, product_name=f'铝板{index}', unit_price=1234.5, total_price=1234.5) for index in range(40)]
+    order = db.session.get(Order, _create_order(client, headers, items))
+
+    payload = build_order_pdf_payload(app.instance_path, order)
+    with_price = render_order_pdf(payload)
+    no_price = render_order_pdf(payload, no_price=True)
+
+    assert len(with_price.page_render_ms) == len(no_price.page_render_ms) >= 3
+    assert with_price.data.count(b'/Type /Page ') == len(with_price.page_render_ms)
+    # Deterministic: the cache relies on identical input giving identical bytes.
+    assert render_order_pdf(payload).data == with_price.data
+
+    texts = b''.join(
+        zlib.decompress(match.group(2)[:int(match.group(1))])
+        for match in re.finditer(rb'/Filter /FlateDecode /Length (\d+) >>\nstream\n(.*?)\nendstream', no_price.data, re.S)
+    )
+    assert _hex('1234.50') not in texts
+    assert _hex('合计数量：40') in texts
+
+
+def test_process_pool_queue_is_bounded(app):
+    client = app.test_client()
+    headers = _login_customer(client)
+    first = db.session.get(Order, _create_order(client, headers, [DOOR_ITEM]))
+    second = db.session.get(Order, _create_order(client, headers, [PLATE_ITEM]))
+
+    service = PdfRenderService(app, workers=1, queue_size=0, use_processes=True)
+    try:
+        job = service.submit(first)
+        assert job['status'] == 'queued'
+        with pytest.raises(PdfRenderQueueFull):
+            service.submit(second)
+        assert service.join(timeout=120)
+    finally:
+        service.stop()
+
+    job = service.get_job(job['job_id'])
+    assert job['status'] == 'done'
+    assert job['variants']['with_price']['pages'] == 1
+    db.session.expire_all()
+    assert OrderDocument.query.filter_by(order_id=first.id).count() == 2
+
+
+def test_failed_pool_submit_fails_the_job_and_frees_its_slot(app, monkeypatch):
+    client = app.test_client()
+    headers = _login_customer(client)
+    order = db.session.get(Order, _create_order(client, headers, [DOOR_ITEM]))
+
+    class _BrokenPool:
+        def __init__(self):
+            self.futures = []
+
+        def submit(self, fn, *args):
+            if self.futures:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            self.futures.append(Future())
+            return self.futures[0]
+
+    pool = _BrokenPool()
+    service = PdfRenderService(app, workers=1, queue_size=0, use_processes=True)
+    monkeypatch.setattr(service, '_pool', lambda: pool)
+
+    job = service.submit(order)
+    assert job['status'] == 'queued'
+    assert job['variants']['with_price'] == {'status': 'queued'}
+    assert job['variants']['no_price']['status'] == 'failed'
+    assert 'cannot schedule' in job['variants']['no_price']['error']
+
+    pool.futures[0].set_exception(RuntimeError('worker died'))
+    job = service.get_job(job['job_id'])
+    assert job['status'] == 'failed'
+    assert service.join(timeout=1)
+
+    # The order is no longer stuck on the old job and the slot is free again.
+    retried = service.submit(order)
+    assert retried['job_id'] != job['job_id']
+    assert retried['status'] == 'failed'
+    assert {info['status'] for info in retried['variants'].values()} == {'failed'}
@@ -0,0 +1,118 @@
+import hashlib
+import io
+from datetime import datetime
+
+from app.models.user import Order, OrderDocument, Profile, User, db
+
+PDF_BYTES = b'%PDF-1.7\n' + bytes(range(256)) * 1024 + b'\n%%EOF'
+
+
+def _order_and_headers(client):
+    user = User(username='upload-customer', phone='13900000031')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    order = Order(
+        order_number='ORDUPLOAD01',
+        user_id=user.id,
+        recipient_name='测试客户',
+        phone=user.phone,
+        province='上海',
+        address_detail='测试地址',
+        total_amount=100,
+        created_at=datetime(2026, 9, 1),
+    )
+    db.session.add(order)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'phone': user.phone, 'password': 'secret'})
+    return order, {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def test_raw_upload_streams_to_store_with_hash_and_progress(app, tmp_path):
+    client = app.test_client()
+    order, headers = _order_and_headers(client)
+
+    response = client.post(
+        f'/api/orders/{order.id}/pdf',
+        headers={**headers, 'X-Upload-Id': 'upload-1'},
+        data=PDF_BYTES,
+        content_type='application/pdf',
+    )
+    assert response.status_code == 200, response.get_json()
+    payload = response.get_json()
+    assert payload['sha256'] == hashlib.sha256(PDF_BYTES).hexdigest()
+    assert payload['size'] == len(PDF_BYTES)
+    assert payload['pdf_type'] == 'with_price'
+    document = OrderDocument.query.filter_by(order_id=order.id, variant='with_price').one()
+    assert document.sha256 == payload['sha256']
+    assert (tmp_path / document.blob_key).read_bytes() == PDF_BYTES
+    assert Profile.query.filter_by(user_id=order.user_id).one().pdf_blob_key == document.blob_key
+
+    progress = client.get(f'/api/orders/{order.id}/pdf/uploads/upload-1', headers=headers).get_json()['upload']
+    assert progress['status'] == 'stored'
+    assert progress['received'] == progress['expected'] == len(PDF_BYTES)
+    assert client.get(f'/api/orders/{order.id}/pdf', headers=headers).data == PDF_BYTES
+
+
+def test_multipart_upload_reads_fields_before_the_file_part(app, tmp_path):
+    client = app.test_client()
+    order, headers = _order_and_headers(client)
+
+    response = client.post(
+        f'/api/orders/{order.id}/pdf',
+        headers=headers,
+        data={'pdf_type': 'without_price', 'file': (io.BytesIO(PDF_BYTES), 'order.pdf')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['pdf_type'] == 'without_price'
+    assert response.get_json()['sha256'] == hashlib.sha256(PDF_BYTES).hexdigest()
+    document = OrderDocument.query.filter_by(order_id=order.id, variant='no_price').one()
+    assert (tmp_path / document.blob_key).read_bytes() == PDF_BYTES
+
+    missing_file = client.post(
+        f'/api/orders/{order.id}/pdf',
+        headers=headers,
+        data={'pdf_type': 'with_price'},
+        content_type='multipart/form-data',
+    )
+    assert missing_file.status_code == 400
+
+
+def test_size_limit_and_pdf_check_apply_while_streaming(app, tmp_path):
+    client = app.test_client()
+    order, headers = _order_and_headers(client)
+    # Within the multipart slack, so only the streaming check can stop this body.
+    app.config['PDF_UPLOAD_MAX_BYTES'] = len(PDF_BYTES) - 10 * 1024
+
+    too_large = client.post(
+        f'/api/orders/{order.id}/pdf',
+        headers={**headers, 'X-Upload-Id': 'big'},
+        data=PDF_BYTES,
+        content_type='application/pdf',
+    )
+    assert too_large.status_code == 413
+    progress = client.get(f'/api/orders/{order.id}/pdf/uploads/big', headers=headers).get_json()['upload']
+    assert progress['status'] == 'failed'
+    assert len(PDF_BYTES) - 10 * 1024 < progress['received'] <= len(PDF_BYTES)
+
+    rejected_up_front = client.post(
+        f'/api/orders/{order.id}/pdf',
+        headers=headers,
+        data=PDF_BYTES * 2,
+        content_type='application/pdf',
+    )
+    assert rejected_up_front.status_code == 413
+
+    not_pdf = client.post(
+        f'/api/orders/{order.id}/pdf',
+        headers=headers,
+        data=b'<html>not a pdf</html>',
+        content_type='application/pdf',
+    )
+    assert not_pdf.status_code == 400
+
+    # Nothing partial is left behind for the failed uploads.
+    assert not any(path.is_file() for path in tmp_path.glob('order_documents/**/*'))
+    assert OrderDocument.query.count() == 0
+    assert Profile.query.filter_by(user_id=order.user_id).first() is None
@@ -0,0 +1,211 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app import product_order_db
+from app.product_order_db import (
+    check_product_order_db,
+    get_product_order_connection,
+    product_order_transaction,
+    query_order_snapshots,
+    query_order_snapshots_after,
+    reset_product_order_db_state,
+    sync_order_snapshot,
+    sync_order_snapshots,
+    update_product_order_task_progress,
+)
+
+
+def _order(order_id='order-1', items=()):
+    return SimpleNamespace(
+        id=order_id,
+        order_number=f'ORD-{order_id}',
+        user_id='user-1',
+        phone='13900000001',
+        recipient_name='测试客户',
+        province='上海',
+        address_detail='测试地址',
+        shipping_method='standard',
+        subtotal=20,
+        shipping_fee=8,
+        total_amount=28,
+        status='pending',
+        tracking_number='',
+        memo='',
+        admin_memo='',
+        created_at=datetime(2026, 7, 1, 10, 0, 0),
+        updated_at=datetime(2026, 7, 1, 10, 0, 0),
+        items=list(items),
+    )
+
+
+def _item(item_id, product_type='profile', product_name='2020 铝型材', product_id='2020', config=None):
+    return SimpleNamespace(
+        id=item_id,
+        product_id=product_id,
+        product_name=product_name,
+        product_type=product_type,
+        quantity=2,
+        unit_price=10,
+        total_price=20,
+        config=config if config is not None else {'variantId': '2020', 'colorId': 'red', 'length': 500},
+    )
+
+
+@pytest.fixture
+def instance_path(tmp_path):
+    yield str(tmp_path)
+    reset_product_order_db_state(str(tmp_path))
+
+
+def test_schema_runs_once_and_connection_is_reused(instance_path, monkeypatch):
+    calls = []
+    original = product_order_db._create_schema
+    monkeypatch.setattr(product_order_db, '_create_schema', lambda path: calls.append(path) or original(path))
+
+    sync_order_snapshot(instance_path, _order(items=[_item('item-1')]))
+    first = get_product_order_connection(instance_path)
+    entries, total = query_order_snapshots(instance_path)
+    query_order_snapshots(instance_path, category_code='profile')
+
+    assert len(calls) == 1
+    assert get_product_order_connection(instance_path) is first
+    assert total == 2
+    assert {entry['category_code'] for entry in entries} == {'all', 'profile'}
+    assert first.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_failed_transaction_rolls_back_and_connection_stays_usable(instance_path):
+    sync_order_snapshot(instance_path, _order())
+    with pytest.raises(RuntimeError):
+        with product_order_transaction(instance_path) as conn:
+            conn.execute('DELETE FROM product_order_entries')
+            raise RuntimeError('boom')
+
+    _, total = query_order_snapshots(instance_path)
+    assert total == 1
+
+
+def test_health_check_recovers_from_deleted_db_file(instance_path, tmp_path):
+    assert check_product_order_db(instance_path)['status'] == 'ok'
+    for path in tmp_path.glob('product_orders.db*'):
+        path.unlink()
+
+    health = check_product_order_db(instance_path)
+    assert health['status'] == 'ok'
+    assert health['journal_mode'] == 'wal'
+    assert query_order_snapshots(instance_path) == ([], 0)
+
+
+def test_bulk_sync_replaces_rows_and_keeps_task_progress(instance_path):
+    orders = [_order(f'order-{index}', items=[_item(f'item-{index}-{n}') for n in range(3)]) for index in range(50)]
+    assert sync_order_snapshots(instance_path, ((order, None, False) for order in orders)) == 200
+
+    entries, _ = query_order_snapshots(instance_path, category_code='profile', per_page=200)
+    tracked = next(entry for entry in entries if entry['item_id'] == 'item-7-1')
+    update_product_order_task_progress(instance_path, tracked['id'], 'in_progress')
+
+    orders[7].status = 'confirmed'
+    written = sync_order_snapshots(instance_path, [(orders[7], None, True), (orders[8], None, False), (orders[7], None, True)])
+    assert written == 8
+
+    entries, total = query_order_snapshots(instance_path, per_page=200)
+    assert total == 200
+    resynced = [entry for entry in entries if entry['source_order_id'] == 'order-7']
+    assert {entry['status'] for entry in resynced} == {'confirmed'}
+    assert {entry['pdf_available'] for entry in resynced} == {1}
+    assert next(entry for entry in resynced if entry['item_id'] == 'item-7-1')['task_progress'] == 'in_progress'
+    assert sync_order_snapshots(instance_path, []) == 0
+
+
+def test_keyset_pages_cover_every_row_without_offset(instance_path):
+    orders = [_order(f'order-{index}', items=[_item(f'item-{index}-{n}') for n in range(2)]) for index in range(12)]
+    sync_order_snapshots(instance_path, ((order, None, False) for order in orders))
+
+    seen = []
+    after = None
+    while True:
+        entries, after, total = query_order_snapshots_after(instance_path, category_code='profile', after=after, limit=5)
+        assert total is None
+        seen.extend(entry['id'] for entry in entries)
+        if after is None:
+            break
+
+    expected, expected_total = query_order_snapshots(instance_path, category_code='profile', per_page=200)
+    assert seen == [entry['id'] for entry in expected]
+    assert query_order_snapshots_after(instance_path, category_code='profile', include_total=True)[2] == expected_total == 24
+
+
+def test_keyset_pages_put_undated_rows_last(instance_path):
+    orders = [_order(f'order-{index}', items=[_item(f'item-{index}')]) for index in range(7)]
+    for order in orders[:3]:
+        order.created_at = None
+    sync_order_snapshots(instance_path, ((order, None, False) for order in orders))
+
+    seen = []
+    after = None
+    while True:
+        entries, after, _ = query_order_snapshots_after(instance_path, after=after, limit=3)
+        seen.extend((entry['created_at'], entry['id']) for entry in entries)
+        if after is None:
+            break
+
+    total = query_order_snapshots_after(instance_path, include_total=True)[2]
+    undated = [created_at is None for created_at, _ in seen]
+    assert len(seen) == len({row_id for _, row_id in seen}) == total
+    assert undated == sorted(undated) and 0 < undated.count(True) < total
+
+
+@pytest.mark.parametrize('category_code, index', [
+    (None, 'idx_product_orders_created'),
+    ('profile', 'idx_product_orders_category_created'),
+])
+def test_keyset_seek_is_an_index_range_search(instance_path, category_code, index):
+    orders = [_order(f'order-{index}', items=[_item(f'item-{index}')]) for index in range(6)]
+    sync_order_snapshots(instance_path, ((order, None, False) for order in orders))
+    _, after, _ = query_order_snapshots_after(instance_path, category_code=category_code, limit=2)
+
+    conn = get_product_order_connection(instance_path)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        query_order_snapshots_after(instance_path, category_code=category_code, after=after, limit=2)
+    finally:
+        conn.set_trace_callback(None)
+
+    seek = next(statement for statement in statements if '(created_at, id) <' in statement)
+    plan = ' '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {seek}'))
+    assert f'SEARCH product_order_entries USING INDEX {index}' in plan
+    assert 'created_at<?' in plan.replace('(created_at,id)<(?,?)', 'created_at<?')
+    assert 'SCAN' not in plan and 'TEMP B-TREE' not in plan
+
+
+@pytest.mark.parametrize('config,expected', [
+    ({'colorId': 'black', 'color': '黑色'}, '黑色'),
+    ({'boardColorId': 'w', 'colorName': '  白色 ', 'color': 'white'}, '白色'),
+    ({'color': '  ', 'colour': 'grey'}, 'grey'),
+    ({'color': {'label': '银白', 'id': 'silver'}, 'colorId': 'silver'}, 'silver'),
+    ({'selectedColor': {'id': 'sc'}, 'color': {'value': 'cv'}}, 'cv'),
+    ({'selectedColor': {'name': '', 'label': '香槟'}}, '香槟'),
+    ({'materialColorId': 3}, '3'),
+    ({'colorName': None, 'color': [], 'selectedColorName': '灰'}, '灰'),
+    ({'width': 300}, None),
+    ('not a dict', None),
+])
+def test_color_priority_table(config, expected):
+    assert product_order_db._extract_color_value(config) == expected
+
+
+def test_string_configs_are_parsed_once_and_stored_as_is(instance_path):
+    text = '{"width": 300, "height": 200, "color": "黑色"}'
+    plate = _item('item-s', product_type='aluminum_plate', product_name='铝板', product_id='p5', config=text)
+    broken = _item('item-b', product_type='aluminum_plate', product_name='铝板', product_id='p5', config='{broken')
+    sync_order_snapshot(instance_path, _order('order-s', items=[plate, broken]))
+
+    entries, _ = query_order_snapshots(instance_path, category_code='aluminum_plate')
+    by_item = {entry['item_id']: entry for entry in entries}
+    assert by_item['item-s']['item_config'] == text
+    assert (by_item['item-s']['item_width'], by_item['item-s']['item_color']) == (300.0, '黑色')
+    assert by_item['item-b']['item_config'] == '"{broken"'
+    assert by_item['item-b']['item_width'] is None
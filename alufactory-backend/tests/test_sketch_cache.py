@@ -0,0 +1,116 @@
+import io
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app, sketch_cache
+from app.product_order_db import (
+    CATEGORY_LABELS,
+    get_product_order_connection,
+    query_order_snapshots,
+    reset_product_order_db_state,
+    sync_order_snapshots,
+)
+from app.sketch_cache import clear_sketch_memory_cache, sketch_spec
+from app.sketch_render import CANVAS_HEIGHT, CANVAS_WIDTH, render_sketch_png
+
+
+def _door(item_id, width=600, height=900, side='left'):
+    return SimpleNamespace(
+        id=item_id,
+        product_id='door',
+        product_name='铝框门',
+        product_type='aluminum_frame_door',
+        quantity=1,
+        unit_price=100,
+        total_price=100,
+        config={'width': width, 'height': height, 'openingSide': side, 'hingePositions': [100, 800], 'colorId': 'black'},
+    )
+
+
+def _order(order_id, items):
+    return SimpleNamespace(
+        id=order_id,
+        order_number=f'ORD-{order_id}',
+        user_id='user-1',
+        phone='13900000001',
+        recipient_name='测试客户',
+        province='上海',
+        address_detail='测试地址',
+        shipping_method='standard',
+        subtotal=100,
+        shipping_fee=0,
+        total_amount=100,
+        status='pending',
+        tracking_number='',
+        memo='',
+        admin_memo='',
+        created_at=datetime(2026, 7, 1, 10, 0, 0),
+        updated_at=datetime(2026, 7, 1, 10, 0, 0),
+        items=list(items),
+    )
+
+
+@pytest.fixture
+def instance_path(tmp_path):
+    clear_sketch_memory_cache()
+    yield str(tmp_path)
+    reset_product_order_db_state(str(tmp_path))
+    clear_sketch_memory_cache()
+
+
+def test_identical_geometry_is_rendered_and_stored_once(instance_path, monkeypatch):
+    renders = []
+    original = sketch_cache.render_sketch_png
+    monkeypatch.setattr(sketch_cache, 'render_sketch_png', lambda spec: renders.append(spec) or original(spec))
+
+    orders = [
+        _order('order-1', [_door('a'), _door('b'), _door('c', side='right')]),
+        _order('order-2', [_door('d')]),
+    ]
+    sync_order_snapshots(instance_path, ((order, None, False) for order in orders))
+    # A re-sync finds every image in the cache tiers and renders nothing.
+    sync_order_snapshots(instance_path, [(orders[1], None, False)])
+
+    entries, _ = query_order_snapshots(instance_path, category_code='aluminum_frame_door')
+    keys = {entry['item_id']: entry['item_sketch_key'] for entry in entries}
+    assert keys['a'] == keys['b'] == keys['d'] != keys['c']
+    assert len(renders) == 2
+    assert all(entry['item_sketch_svg'] is None for entry in entries)
+    assert entries[0]['item_sketch_url'] == f"/api/sketches/{entries[0]['item_sketch_key']}.png"
+    stored = get_product_order_connection(instance_path).execute('SELECT COUNT(*) FROM item_sketches').fetchone()[0]
+    assert stored == 2
+
+
+def test_sketch_endpoint_serves_png_with_etag(instance_path):
+    app = create_app('testing')
+    app.instance_path = instance_path
+    sync_order_snapshots(instance_path, [(_order('order-1', [_door('a')]), None, False)])
+    key = query_order_snapshots(instance_path, category_code='aluminum_frame_door')[0][0]['item_sketch_key']
+    clear_sketch_memory_cache()
+
+    client = app.test_client()
+    response = client.get(f'/api/sketches/{key}.png')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data.startswith(b'\x89PNG')
+    assert 'immutable' in response.headers['Cache-Control']
+
+    cached = client.get(f'/api/sketches/{key}.png', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert client.get(f"/api/sketches/{'0' * 64}.png").status_code == 404
+    assert client.get('/api/sketches/not-a-key.png').status_code == 404
+
+
+@pytest.mark.parametrize('category_code', sorted(CATEGORY_LABELS))
+def test_renderer_draws_every_category(category_code):
+    Image = pytest.importorskip('PIL.Image')
+    spec = sketch_spec(category_code, 450, 1200, 'left', [100, 600, 1100])
+    image = Image.open(io.BytesIO(render_sketch_png(spec))).convert('RGB')
+
+    assert image.size == (CANVAS_WIDTH, CANVAS_HEIGHT)
+    colors = {color for _, color in image.getcolors(CANVAS_WIDTH * CANVAS_HEIGHT)}
+    assert {(0xf8, 0xfa, 0xfc), (0xff, 0xff, 0xff), (0x33, 0x41, 0x55)} <= colors
+    assert ((0x94, 0xa3, 0xb8) in colors) == (category_code == 'pegboard')
+    assert ((0xef, 0x44, 0x44) in colors) == (category_code == 'aluminum_frame_door')
@@ -0,0 +1,51 @@
+import io
+import sys
+
+import pytest
+
+from app.sketch_cache import sketch_spec
+from app.sketch_render import CANVAS_HEIGHT, CANVAS_WIDTH, render_sketch_png
+
+Image = pytest.importorskip('PIL.Image')
+
+HINGE = (0xef, 0x44, 0x44)
+HANDLE = (0x25, 0x63, 0xeb)
+
+
+def _image(spec):
+    image = Image.open(io.BytesIO(render_sketch_png(spec))).convert('RGB')
+    assert image.size == (CANVAS_WIDTH, CANVAS_HEIGHT)
+    return image
+
+
+def _columns(image, color):
+    return {x for x in range(CANVAS_WIDTH) for y in range(CANVAS_HEIGHT) if image.getpixel((x, y)) == color}
+
+
+@pytest.mark.parametrize('side', ['left', 'right'])
+def test_door_hinges_and_handle_sit_on_opposite_edges(side):
+    image = _image(sketch_spec('aluminum_frame_door', 450, 1200, side, [100, 600, 1100]))
+    hinges, handle = _columns(image, HINGE), _columns(image, HANDLE)
+
+    assert hinges and handle
+    if side == 'left':
+        assert max(hinges) < CANVAS_WIDTH / 2 < min(handle)
+    else:
+        assert max(handle) < CANVAS_WIDTH / 2 < min(hinges)
+
+
+def test_extreme_aspect_ratios_stay_inside_the_drawing_area():
+    for width, height in [(10, 3000), (3000, 10), (1, 1)]:
+        image = _image(sketch_spec('plain', width, height, None, []))
+        background = image.getpixel((0, 0))
+        drawn = [
+            (x, y) for x in range(CANVAS_WIDTH) for y in range(CANVAS_HEIGHT)
+            if image.getpixel((x, y)) != background
+        ]
+        assert drawn
+        assert all(4 <= x <= CANVAS_WIDTH - 4 and 4 <= y <= CANVAS_HEIGHT - 4 for x, y in drawn)
+
+
+def test_renderer_returns_none_without_pillow(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'PIL', None)
+    assert render_sketch_png(sketch_spec('pegboard', 600, 400, None, [])) is None
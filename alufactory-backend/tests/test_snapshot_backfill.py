@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+from app.models.user import Order, OrderItem, User, db
+from app.order_snapshot import refresh_order_json
+from app.product_order_db import product_order_transaction, query_order_snapshots
+from app.snapshot_backfill import _threads, get_backfill_state, run_snapshot_backfill
+
+
+def _admin_headers(client):
+    admin = User(username='backfill-admin', phone='13800000001', is_admin=True)
+    admin.set_password('admin')
+    db.session.add(admin)
+    db.session.commit()
+    response = client.post('/api/auth/login', json={'phone': admin.phone, 'password': 'admin'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def _seed_orders(count):
+    user = User(username='backfill-customer', phone='13900000001')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.flush()
+    orders = []
+    for index in range(count):
+        order = Order(
+            order_number=f'ORD{index:05d}',
+            user_id=user.id,
+            recipient_name='测试客户',
+            phone=user.phone,
+            province='上海',
+            address_detail='测试地址',
+            total_amount=100,
+            created_at=datetime(2026, 7, 1) + timedelta(minutes=index),
+        )
+        order.items.append(OrderItem(
+            product_id='door', product_name='铝框门', product_type='aluminum_frame_door',
+            quantity=1, unit_price=100, total_price=100,
+            config={'width': 600, 'height': 900, 'openingSide': 'left', 'colorId': 'black'},
+        ))
+        db.session.add(order)
+        orders.append(order)
+    db.session.flush()
+    for order in orders:
+        refresh_order_json(order)
+    db.session.commit()
+    return [order.id for order in orders]
+
+
+def test_product_orders_get_does_no_backfill(app):
+    client = app.test_client()
+    headers = _admin_headers(client)
+    _seed_orders(3)
+
+    response = client.get('/api/admin/product-orders?category=aluminum_frame_door', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['total'] == 0
+    assert query_order_snapshots(app.instance_path) == ([], 0)
+
+
+def test_backfill_checkpoints_and_resumes(app):
+    order_ids = sorted(_seed_orders(8))
+    seen = []
+
+    paused = run_snapshot_backfill(app, batch_size=3, max_batches=2, progress=seen.append)
+    assert paused['status'] == 'paused'
+    assert paused['processed'] == 6
+    assert paused['last_order_id'] == order_ids[5]
+    assert [state['batches'] for state in seen] == [1, 2]
+    _, total = query_order_snapshots(app.instance_path)
+    assert total == 12  # summary row + item row per order
+
+    finished = run_snapshot_backfill(app, batch_size=3)
+    assert finished['status'] == 'finished'
+    assert finished['processed'] == finished['total'] == 8
+    _, total = query_order_snapshots(app.instance_path)
+    assert total == 16
+    assert get_backfill_state(app.instance_path, 'full')['status'] == 'finished'
+
+
+def test_details_job_repairs_stale_rows_and_drops_deleted_orders(app):
+    order_ids = sorted(_seed_orders(4))
+    run_snapshot_backfill(app)
+    with product_order_transaction(app.instance_path) as conn:
+        conn.execute('UPDATE product_order_entries SET item_width = NULL WHERE is_total_order = 0')
+    Order.query.filter_by(id=order_ids[0]).delete()
+    db.session.commit()
+
+    state = run_snapshot_backfill(app, job='details', batch_size=2)
+    assert state['status'] == 'finished'
+    assert state['processed'] == 4
+
+    entries, _ = query_order_snapshots(app.instance_path, category_code='aluminum_frame_door')
+    assert sorted(entry['source_order_id'] for entry in entries) == order_ids[1:]
+    assert {entry['item_width'] for entry in entries} == {600.0}
+
+
+def test_backfill_endpoint_runs_in_background(app):
+    client = app.test_client()
+    headers = _admin_headers(client)
+    _seed_orders(5)
+
+    assert client.post('/api/admin/product-orders/backfill', headers=headers, json={'job': 'nope'}).status_code == 400
+    started = client.post('/api/admin/product-orders/backfill', headers=headers, json={'job': 'full'})
+    assert started.status_code == 202
+    _threads['full'].join(timeout=30)
+
+    jobs = client.get('/api/admin/product-orders/backfill', headers=headers).get_json()['jobs']
+    assert jobs['full']['status'] == 'finished'
+    assert jobs['full']['processed'] == 5
+    assert jobs['details'] is None
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from app.models.user import Order, User, db
+from app import snapshot_sync_queue
+from app.product_order_db import reset_product_order_db_state
+from app.snapshot_sync_queue import SnapshotSyncQueue
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('testing')
+    app.instance_path = str(tmp_path)
+    yield app
+    reset_product_order_db_state(str(tmp_path))
+
+
+def _outbox(sync_queue):
+    from app.product_order_db import product_order_transaction
+
+    with product_order_transaction(sync_queue.instance_path) as conn:
+        return [dict(row) for row in conn.execute('SELECT * FROM snapshot_sync_outbox ORDER BY order_id')]
+
+
+def test_outbox_coalesces_and_survives_restart(app, monkeypatch):
+    removed = []
+    monkeypatch.setattr(snapshot_sync_queue, 'remove_order_snapshot', lambda path, order_id: removed.append(order_id))
+
+    first = SnapshotSyncQueue(app)
+    for pdf_available in (False, True, False):
+        first._write_outbox('order-1', pdf_available)
+    first._write_outbox('order-2', False)
+    rows = _outbox(first)
+    assert [(row['order_id'], row['version'], row['pdf_available']) for row in rows] == [
+        ('order-1', 3, 1),
+        ('order-2', 1, 0),
+    ]
+
+    # A fresh queue (new process) drains what the previous one left behind.
+    restarted = SnapshotSyncQueue(app)
+    assert restarted.drain() == 2
+    assert sorted(removed) == ['order-1', 'order-2']
+    assert _outbox(restarted) == []
+
+    # The flag only survives coalescing: once synced, a new request starts from its own value.
+    restarted._write_outbox('order-1', False)
+    assert _outbox(restarted)[0]['pdf_available'] == 0
+
+
+def test_failed_sync_retries_then_parks_row(app, monkeypatch):
+    def failing_remove(path, order_id):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(snapshot_sync_queue, 'remove_order_snapshot', failing_remove)
+    sync_queue = SnapshotSyncQueue(app, max_attempts=3, retry_base_delay=0)
+    sync_queue.enqueue('order-1')
+    assert _outbox(sync_queue)[0]['attempts'] == 1
+
+    assert sync_queue.drain() == 0
+    assert sync_queue.drain() == 0
+    parked = _outbox(sync_queue)[0]
+    assert parked['attempts'] == 3
+    assert parked['next_attempt_at'] is None
+    assert parked['last_error'] == 'disk full'
+    assert sync_queue.stats()['failed'] == 1
+    assert sync_queue.drain() == 0
+
+    monkeypatch.setattr(snapshot_sync_queue, 'remove_order_snapshot', lambda path, order_id: None)
+    sync_queue.enqueue('order-1')
+    assert _outbox(sync_queue) == []
+
+
+def test_worker_pool_coalesces_repeated_syncs_for_busy_order(app, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_remove(path, order_id):
+        calls.append(order_id)
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(snapshot_sync_queue, 'remove_order_snapshot', slow_remove)
+    sync_queue = SnapshotSyncQueue(app, workers=1, poll_interval=0.05)
+    sync_queue.start()
+    try:
+        sync_queue.enqueue('order-1')
+        assert started.wait(5)
+        for _ in range(5):
+            sync_queue.enqueue('order-1')
+        release.set()
+        sync_queue.join()
+    finally:
+        sync_queue.stop()
+
+    assert calls == ['order-1', 'order-1']
+    assert _outbox(sync_queue) == []
+
+
+def test_busy_worker_still_sweeps_outbox_on_a_timer(app, monkeypatch):
+    calls = []
+
+    def busy_remove(path, order_id):
+        calls.append(order_id)
+        # Every job queues another, so the worker never waits on an empty queue.
+        if 'left-behind' not in calls and len(calls) < 500:
+            sync_queue.enqueue(f'busy-{len(calls)}')
+            time.sleep(0.005)
+
+    monkeypatch.setattr(snapshot_sync_queue, 'remove_order_snapshot', busy_remove)
+    sync_queue = SnapshotSyncQueue(app, workers=1, poll_interval=0.05)
+    sync_queue.start()
+    try:
+        sync_queue.enqueue('busy-0')
+        # Written by another process: only the outbox sweep can find it.
+        sync_queue._write_outbox('left-behind', False)
+        deadline = time.time() + 5
+        while 'left-behind' not in calls and time.time() < deadline:
+            time.sleep(0.01)
+        sync_queue.join()
+    finally:
+        sync_queue.stop()
+
+    assert 'left-behind' in calls
+    assert len(calls) < 500
+
+
+def test_outbox_write_failure_does_not_fail_the_saved_order(app, monkeypatch):
+    def locked(self, order_id, pdf_available):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(SnapshotSyncQueue, '_write_outbox', locked)
+    with app.app_context():
+        user = User(username='outbox-customer', phone='13900000071')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        token = client.post('/api/auth/login', json={'phone': user.phone, 'password': 'secret'}).get_json()['access_token']
+        response = client.post('/api/orders', headers={'Authorization': f'Bearer {token}'}, json={
+            'items': [], 'recipient_name': '周九', 'phone': '13900000071', 'province': '上海',
+            'address_detail': '队列路1号', 'total_amount': 0,
+        })
+
+        assert response.status_code == 201
+        assert db.session.get(Order, response.get_json()['order']['id']) is not None
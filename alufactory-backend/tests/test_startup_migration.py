@@ -0,0 +1,84 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.models.user import Order, OrderItem, db
+from app.product_order_db import reset_product_order_db_state
+from config import TestingConfig
+
+# The schema create_all() built before the order_items profile columns, rollups and the
+# other tables added since; deployments upgrade from this through the auto-migration.
+PRE_SERIES_SCHEMA = Path(__file__).with_name('data') / 'pre_series_schema.sql'
+
+
+def _legacy_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(PRE_SERIES_SCHEMA.read_text(encoding='utf-8'))
+    conn.executemany(
+        'INSERT INTO users (id, username, phone, password_hash, is_active, is_admin, created_at, updated_at) '
+        "VALUES (?, ?, ?, ?, 1, ?, '2025-01-01 00:00:00', '2025-01-01 00:00:00')",
+        [
+            ('u-admin', 'legacy-admin', '13800000091', generate_password_hash('admin'), 1),
+            ('u-customer', 'legacy-customer', '13900000091', generate_password_hash('secret'), 0),
+        ],
+    )
+    conn.execute(
+        "INSERT INTO orders (id, order_number, user_id, recipient_name, phone, province, address_detail, "
+        "subtotal, shipping_fee, total_amount, status, created_at) VALUES "
+        "('o-1', 'ORD-LEGACY-1', 'u-customer', '老客户', '13900000091', '上海', '旧地址1号', 30, 0, 30, 'confirmed', '2025-03-04 10:00:00')"
+    )
+    conn.execute(
+        "INSERT INTO order_items (id, order_id, product_id, product_name, product_type, quantity, unit_price, total_price, config, created_at) "
+        "VALUES ('i-1', 'o-1', '2020', '2020铝型材', 'profile', 3, 10, 30, '{\"variantId\": \"2020\", \"colorId\": \"black\", \"length\": 1500}', '2025-03-04 10:00:00')"
+    )
+    conn.execute("INSERT INTO carts (id, user_id, created_at, updated_at) VALUES ('c-1', 'u-customer', '2025-03-04 10:00:00', '2025-03-04 10:00:00')")
+    conn.execute(
+        "INSERT INTO cart_items (id, cart_id, product_id, product_name, product_type, quantity, unit_price, total_price, config, created_at, updated_at) "
+        "VALUES ('ci-1', 'c-1', 'p5', '铝板', 'aluminum_plate', 1, 80, 80, '{}', '2025-03-04 10:00:00', '2025-03-04 10:00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def legacy_app(tmp_path, monkeypatch):
+    path = tmp_path / 'legacy.db'
+    _legacy_database(path)
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    app = create_app('testing')
+    app.instance_path = str(tmp_path)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    reset_product_order_db_state(str(tmp_path))
+
+
+def _headers(client, phone, password):
+    response = client.post('/api/auth/login', json={'phone': phone, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    token = response.get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_startup_migrates_a_pre_series_database(legacy_app):
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('order_items')}
+    assert {'profile_variant_id', 'profile_color_id', 'profile_meters'} <= columns
+
+    item = db.session.get(OrderItem, 'i-1')
+    assert (item.profile_variant_id, item.profile_color_id, item.profile_meters) == ('2020', 'black', 4.5)
+    assert db.session.get(Order, 'o-1').duplicate_fingerprint
+
+    client = legacy_app.test_client()
+    cart = client.get('/api/cart', headers=_headers(client, '13900000091', 'secret'))
+    assert cart.status_code == 200, cart.get_json()
+
+    admin = _headers(client, '13800000091', 'admin')
+    statistics = client.get('/api/admin/statistics', headers=admin)
+    assert statistics.status_code == 200, statistics.get_json()
+    usage = client.get('/api/admin/statistics/profile-usage', headers=admin).get_json()['usage']
+    assert usage == [{'variant_id': '2020', 'color_id': 'black', 'pieces': 3, 'meters': 4.5, 'orders': 1}]
+    assert client.get('/api/admin/orders', headers=admin).status_code == 200
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from app.models.user import MonthlyRevenueRollup, Order, OrderItem, OrderStatusRollup, ProfileUsageRollup, User, db
+from app.stats_rollup import reconcile_stats_rollups
+
+
+def _order(user, number, status='pending', amount=100, color_id='red'):
+    order = Order(
+        order_number=number,
+        user_id=user.id,
+        recipient_name='测试客户',
+        phone=user.phone,
+        province='上海',
+        address_detail='测试地址',
+        total_amount=amount,
+        status=status,
+        created_at=datetime(2026, 9, 5, 10, 0, 0),
+    )
+    order.items.append(OrderItem(
+        product_id='2020', product_name='2020', product_type='profile',
+        quantity=2, unit_price=10, total_price=20,
+        config={'variantId': '2020', 'colorId': color_id, 'length': 1000},
+    ))
+    return order
+
+
+def _status_rollups():
+    return {row.status: (row.order_count, row.total_amount) for row in OrderStatusRollup.query if row.order_count}
+
+
+def _usage_rollups():
+    return {(row.color_id, row.variant_id): round(row.meters, 6) for row in ProfileUsageRollup.query if row.meters}
+
+
+def test_rollups_follow_order_writes_and_reconcile_repairs_drift(app):
+    customer = User(username='rollup-customer', phone='13900000011')
+    customer.set_password('secret')
+    db.session.add(customer)
+    db.session.commit()
+
+    first = _order(customer, 'ORD-ROLLUP-1')
+    second = _order(customer, 'ORD-ROLLUP-2', status='confirmed', amount=250, color_id='black')
+    db.session.add_all([first, second])
+    db.session.commit()
+    assert _status_rollups() == {'pending': (1, 100.0), 'confirmed': (1, 250.0)}
+    assert _usage_rollups() == {('black', '2020'): 2.0}
+
+    first.status = 'delivered'
+    first.paid_at = datetime(2026, 10, 1, 9, 0, 0)
+    db.session.commit()
+    assert _status_rollups() == {'confirmed': (1, 250.0), 'delivered': (1, 100.0)}
+    months = {row.month: (row.order_count, row.revenue) for row in MonthlyRevenueRollup.query if row.order_count}
+    assert months == {'2026-09': (1, 250.0), '2026-10': (1, 100.0)}
+    assert _usage_rollups() == {('black', '2020'): 2.0, ('red', '2020'): 2.0}
+
+    db.session.delete(first.items[0])
+    first.items.append(OrderItem(
+        product_id='2020', product_name='2020', product_type='profile',
+        quantity=3, unit_price=10, total_price=30,
+        config={'variantId': '2020', 'colorId': 'red', 'length': 2000},
+    ))
+    db.session.commit()
+    assert _usage_rollups() == {('black', '2020'): 2.0, ('red', '2020'): 6.0}
+
+    db.session.delete(second)
+    db.session.commit()
+    assert _status_rollups() == {'delivered': (1, 100.0)}
+    assert _usage_rollups() == {('red', '2020'): 6.0}
+    assert reconcile_stats_rollups() == []
+
+    OrderStatusRollup.query.filter_by(status='delivered').update({'order_count': 7})
+    db.session.commit()
+    mismatches = reconcile_stats_rollups()
+    assert [(m['table'], m['key']) for m in mismatches] == [('status', 'delivered')]
+
+    reconcile_stats_rollups(fix=True)
+    db.session.commit()
+    assert reconcile_stats_rollups() == []
+    assert _status_rollups() == {'delivered': (1, 100.0)}
+
+    db.drop_all()
@@ -0,0 +1,54 @@
+import pytest
+
+from app.accessory_inventory import apply_accessory_inventory_records
+from app.models.user import ProfileInventory, User, db
+from app.profile_inventory import apply_inventory_records
+from app.stock_cache import ACCESSORY_STOCK, PROFILE_STOCK, stock_version
+
+
+def _red_2020(response):
+    return next(item for item in response.get_json()['inventory'] if (item['variant_id'], item['color_id']) == ('2020', 'red'))
+
+
+def test_public_stock_is_cached_until_an_inventory_write(app, monkeypatch):
+    client = app.test_client()
+    first = client.get('/api/profiles/inventory')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get('/api/profiles/inventory', headers={'If-None-Match': etag}).status_code == 304
+
+    # Unchanged version: served from the cache without aggregating the table again.
+    monkeypatch.setattr('app.routes.profiles.aggregate_public_stock', lambda: pytest.fail('stock rebuilt'))
+    assert client.get('/api/profiles/inventory').data == first.data
+    monkeypatch.undo()
+
+    # An ORM write bumps the version in its own flush.
+    version = stock_version(PROFILE_STOCK)
+    row = ProfileInventory.query.filter_by(variant_id='2020', color_id='red').first()
+    row.bar_count = 4
+    db.session.commit()
+    assert stock_version(PROFILE_STOCK) == version + 1
+    changed = client.get('/api/profiles/inventory', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert _red_2020(changed)['total_meters'] == 12.6
+
+    # So does a bulk import that bypasses the ORM.
+    apply_inventory_records([('2020', 'red', 3.15, 10)])
+    assert _red_2020(client.get('/api/profiles/inventory'))['total_meters'] == 31.5
+
+    accessories = client.get('/api/accessories/inventory')
+    accessory_version = stock_version(ACCESSORY_STOCK)
+    apply_accessory_inventory_records([('1', '2020', 6)])
+    assert stock_version(ACCESSORY_STOCK) == accessory_version + 1
+    refreshed = client.get('/api/accessories/inventory', headers={'If-None-Match': accessories.headers['ETag']})
+    assert refreshed.status_code == 200
+    item = next(item for item in refreshed.get_json()['inventory'] if (item['accessory_id'], item['profile_size']) == ('1', '2020'))
+    assert item['quantity'] == 6
+
+    # Writes to other tables leave the stock versions alone.
+    user = User(username='stock-visitor', phone='13800000081')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    assert stock_version(PROFILE_STOCK) == version + 2
@@ -0,0 +1,83 @@
+import re
+from io import BytesIO
+from zipfile import ZipFile
+
+from app.models.user import Order, OrderItem, User, db
+from app.product_order_db import sync_order_snapshots
+from app.profile_inventory import XLSX_STREAM_CHUNK_SIZE, iter_inventory_xlsx, parse_inventory_xlsx
+
+
+class _InventoryRow:
+    def __init__(self, index):
+        self.variant_id = '2020'
+        self.color_id = 'red' if index % 2 else 'black'
+        self.bar_length_m = 3.15
+        self.bar_count = index
+        self.total_meters = round(index * 3.15, 3)
+
+
+def test_inventory_workbook_streams_in_bounded_chunks_and_round_trips():
+    consumed = []
+
+    def rows():
+        for index in range(20000):
+            consumed.append(index)
+            yield _InventoryRow(index)
+
+    chunks = iter_inventory_xlsx(rows())
+    first = next(chunks)
+    # The first chunk leaves before the rows are exhausted.
+    assert first[:2] == b'PK'
+    assert len(consumed) < 20000
+    rest = list(chunks)
+    assert len(rest) > 1
+    assert max(len(chunk) for chunk in rest[:-1]) < XLSX_STREAM_CHUNK_SIZE * 2
+
+    records = parse_inventory_xlsx(BytesIO(first + b''.join(rest)))
+    assert len(records) == 20000
+    assert records[7] == ('2020', 'red', 3.15, 7)
+
+
+def test_product_order_export_is_a_chunked_workbook(app):
+    client = app.test_client()
+    admin = User(username='export-admin', phone='13800000061', is_admin=True)
+    admin.set_password('admin')
+    customer = User(username='export-customer', phone='13800000062')
+    customer.set_password('secret')
+    db.session.add_all([admin, customer])
+    db.session.flush()
+    orders = []
+    for index in range(3):
+        order = Order(
+            order_number=f'EXPORT{index}',
+            user_id=customer.id,
+            recipient_name='导出客户',
+            phone=customer.phone,
+            province='上海',
+            address_detail='测试地址',
+            total_amount=50 + index,
+            status='pending',
+        )
+        order.items.append(OrderItem(
+            product_id='p5', product_name='铝板', product_type='aluminum_plate',
+            quantity=2, unit_price=25, total_price=50,
+            config={'width': 300, 'height': 200, 'thickness': '3mm'},
+        ))
+        orders.append(order)
+    db.session.add_all(orders)
+    db.session.commit()
+    sync_order_snapshots(app.instance_path, [(order, customer, False) for order in orders])
+
+    login = client.post('/api/auth/login', json={'phone': admin.phone, 'password': 'admin'})
+    headers = {'Authorization': f"Bearer {login.get_json()['access_token']}"}
+    response = client.get('/api/admin/product-orders/export?category=aluminum_plate', headers=headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert 'Content-Length' not in response.headers
+    assert response.headers['Content-Disposition'].startswith('attachment;')
+
+    with ZipFile(BytesIO(response.data)) as archive:
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert len(re.findall(r'<row r="\d+">', sheet)) == 4
+    assert '<autoFilter ref="A1:U4"/>' in sheet
+    assert 'EXPORT2' in sheet and '铝板' in sheet
@@ -0,0 +1,118 @@
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+from app.models.user import AccessoryInventory, ProfileInventory, User, db
+from app.accessory_inventory import ACCESSORY_FINISH_ID
+from app.profile_inventory import INVENTORY_HEADERS, XlsxImportError, parse_inventory_xlsx
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def _supplier_workbook(rows):
+    """Workbook as spreadsheet apps save it: shared strings, rich text and a renamed sheet part."""
+    strings = []
+
+    def shared(value):
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    sheet_rows = []
+    for row_index, values in enumerate(rows, start=1):
+        cells = []
+        for column, value in zip('ABCDEF', values):
+            ref = f'{column}{row_index}'
+            if isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}" t="s"><v>{shared(value)}</v></c>')
+        sheet_rows.append(f'<row r="{row_index}">{"".join(cells)}</row>')
+    # The first string is stored as rich-text runs with a phonetic hint that must be ignored.
+    items = [f'<si><r><t>{strings[0][:2]}</t></r><r><t>{strings[0][2:]}</t></r><rPh sb="0" eb="1"><t>x</t></rPh></si>']
+    items += [f'<si><t>{value}</t></si>' for value in strings[1:]]
+
+    output = BytesIO()
+    with ZipFile(output, 'w') as archive:
+        archive.writestr('xl/workbook.xml', f'<workbook xmlns="{MAIN_NS}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets><sheet name="库存" sheetId="1" r:id="rId7"/></sheets></workbook>')
+        archive.writestr('xl/_rels/workbook.xml.rels', '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"><Relationship Id="rId7" Type="worksheet" Target="worksheets/stock.xml"/></Relationships>')
+        archive.writestr('xl/sharedStrings.xml', f'<sst xmlns="{MAIN_NS}">{"".join(items)}</sst>')
+        archive.writestr('xl/worksheets/stock.xml', f'<worksheet xmlns="{MAIN_NS}"><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>')
+    output.seek(0)
+    return output
+
+
+def test_streaming_parser_reads_shared_strings_and_reports_every_bad_cell():
+    workbook = _supplier_workbook([
+        INVENTORY_HEADERS,
+        ('2020', 'red', '中国红', 3.15, 12, 37.8),
+        ('9999', 'red', '中国红', 3.15, 4, 12.6),
+        ('2020', 'black', '暗夜黑', 2.5, -1, 0),
+        ('2020', 'blue', '蓝', 3.15, 'abc', 0),
+    ])
+    with pytest.raises(XlsxImportError) as raised:
+        parse_inventory_xlsx(workbook)
+    assert [error['cell'] for error in raised.value.errors] == ['A3', 'D4', 'E4', 'B5', 'E5']
+    assert str(raised.value).startswith('第3行（A3）型材型号不支持：9999')
+
+    records = parse_inventory_xlsx(_supplier_workbook([INVENTORY_HEADERS, ('2020', 'red', '中国红', 3.15, 12, 37.8)]))
+    assert records == [('2020', 'red', 3.15, 12)]
+
+    with pytest.raises(XlsxImportError):
+        parse_inventory_xlsx(BytesIO(b'not a workbook'))
+
+
+def test_dry_run_returns_stock_diff_without_saving(app):
+    client = app.test_client()
+    admin = User(username='import-admin', phone='13800000071', is_admin=True)
+    admin.set_password('admin')
+    db.session.add(admin)
+    db.session.commit()
+    login = client.post('/api/auth/login', json={'phone': admin.phone, 'password': 'admin'})
+    headers = {'Authorization': f"Bearer {login.get_json()['access_token']}"}
+    red = ProfileInventory.query.filter_by(variant_id='2020', color_id='red').first()
+    red.bar_count = 5
+    db.session.commit()
+
+    def upload(dry_run):
+        workbook = _supplier_workbook([
+            INVENTORY_HEADERS,
+            ('2020', 'red', '中国红', 3.15, 12, 37.8),
+            ('2020', 'black', '暗夜黑', 3.15, 0, 0),
+        ])
+        return client.post(
+            '/api/admin/profile-inventory/import' + ('?dry_run=1' if dry_run else ''),
+            headers=headers,
+            data={'file': (workbook, '供应商库存.xlsx')},
+            content_type='multipart/form-data',
+        )
+
+    preview = upload(dry_run=True)
+    assert preview.status_code == 200
+    body = preview.get_json()
+    assert body['dry_run'] is True
+    assert body['changes'] == [{
+        'variant_id': '2020', 'color_id': 'red', 'bar_length_m': 3.15,
+        'before': 5, 'after': 12, 'delta': 7,
+    }]
+    assert body['summary'] == {'rows': 2, 'changed': 1, 'created': 0, 'unchanged': 1}
+    db.session.expire_all()
+    assert db.session.get(ProfileInventory, red.id).bar_count == 5
+
+    assert upload(dry_run=False).get_json()['updated'] == 2
+    db.session.expire_all()
+    assert db.session.get(ProfileInventory, red.id).bar_count == 12
+
+    bad = client.post(
+        '/api/admin/accessory-inventory/import?dry_run=1',
+        headers=headers,
+        data={'file': (_supplier_workbook([
+            ('配件ID', '编号', '配件名称', '适配型号', '库存数量'),
+            ('1', '1', '1号角码配螺丝', '4040', 3),
+        ]), '配件.xlsx')},
+        content_type='multipart/form-data',
+    )
+    assert bad.status_code == 400
+    assert bad.get_json()['errors'] == [{'row': 2, 'cell': 'D2', 'message': '配件不支持4040型材'}]
+    assert AccessoryInventory.query.filter_by(color_id=ACCESSORY_FINISH_ID, quantity=3).count() == 0